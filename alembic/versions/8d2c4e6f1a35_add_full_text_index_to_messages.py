@@ -0,0 +1,33 @@
+"""add full text index to messages
+
+Revision ID: 8d2c4e6f1a35
+Revises: 6b9e0f4c2d17
+Create Date: 2025-03-06 10:12:05.218843
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8d2c4e6f1a35"
+down_revision: Union[str, None] = "6b9e0f4c2d17"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_messages_text_tsv",
+        "messages",
+        [sa.text("to_tsvector('english', coalesce(text, ''))")],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_messages_text_tsv", table_name="messages", postgresql_using="gin")
@@ -0,0 +1,35 @@
+"""add full text index to passages
+
+Revision ID: a4f7c1d9e2b6
+Revises: 8d2c4e6f1a35
+Create Date: 2025-03-07 09:41:27.503118
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a4f7c1d9e2b6"
+down_revision: Union[str, None] = "8d2c4e6f1a35"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    for table in ("agent_passages", "source_passages"):
+        op.create_index(
+            f"ix_{table}_text_tsv",
+            table,
+            [sa.text("to_tsvector('english', coalesce(text, ''))")],
+            unique=False,
+            postgresql_using="gin",
+        )
+
+
+def downgrade() -> None:
+    for table in ("agent_passages", "source_passages"):
+        op.drop_index(f"ix_{table}_text_tsv", table_name=table, postgresql_using="gin")
@@ -0,0 +1,33 @@
+"""add run queue columns to jobs
+
+Revision ID: b7e3a9c5d1f8
+Revises: a4f7c1d9e2b6
+Create Date: 2025-03-08 14:12:05.271936
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b7e3a9c5d1f8"
+down_revision: Union[str, None] = "a4f7c1d9e2b6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("jobs", sa.Column("worker_id", sa.String(), nullable=True))
+    op.add_column("jobs", sa.Column("heartbeat_at", sa.DateTime(timezone=True), nullable=True))
+    op.add_column("jobs", sa.Column("attempts", sa.Integer(), nullable=True))
+    op.create_index("ix_jobs_queue", "jobs", ["job_type", "status", "created_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_jobs_queue", table_name="jobs")
+    op.drop_column("jobs", "attempts")
+    op.drop_column("jobs", "heartbeat_at")
+    op.drop_column("jobs", "worker_id")
@@ -0,0 +1,58 @@
+"""store passage embeddings at their dimension with an hnsw index per dimension
+
+Revision ID: c2d8f4a6b9e1
+Revises: b7e3a9c5d1f8
+Create Date: 2025-03-10 09:41:27.604218
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+from letta.constants import MAX_EMBEDDING_DIM
+from letta.orm.pgvector_functions import create_embedding_index
+
+# revision identifiers, used by Alembic.
+revision: str = "c2d8f4a6b9e1"
+down_revision: Union[str, None] = "b7e3a9c5d1f8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("agent_passages", "source_passages")
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    for table in TABLES:
+        op.add_column(table, sa.Column("embedding_dim", sa.Integer(), nullable=True))
+        op.execute(
+            f"UPDATE {table} SET embedding_dim = (embedding_config->>'embedding_dim')::integer "
+            f"WHERE embedding IS NOT NULL AND embedding_config IS NOT NULL"
+        )
+        # drop the zero padding, vector(4096) can't be indexed by HNSW
+        op.execute(
+            f"ALTER TABLE {table} ALTER COLUMN embedding TYPE vector USING CASE WHEN embedding_dim IS NULL THEN embedding::vector "
+            f"ELSE ((embedding::real[])[1:embedding_dim])::vector END"
+        )
+        dims = connection.execute(sa.text(f"SELECT DISTINCT embedding_dim FROM {table} WHERE embedding_dim IS NOT NULL")).scalars()
+        for dim in list(dims):
+            # skips (with a warning) the dimensions pgvector can't index: over 4000, or over 2000 before pgvector 0.7.0
+            create_embedding_index(connection, table, dim)
+
+
+def downgrade() -> None:
+    connection = op.get_bind()
+    for table in TABLES:
+        indexes = connection.execute(
+            sa.text("SELECT indexname FROM pg_indexes WHERE tablename = :table AND indexname LIKE :pattern"),
+            {"table": table, "pattern": f"ix_{table}_embedding_%_hnsw"},
+        ).scalars()
+        for index in list(indexes):
+            op.execute(f"DROP INDEX IF EXISTS {index}")
+        op.execute(
+            f"ALTER TABLE {table} ALTER COLUMN embedding TYPE vector({MAX_EMBEDDING_DIM}) USING "
+            f"(embedding::real[] || array_fill(0::real, ARRAY[{MAX_EMBEDDING_DIM} - vector_dims(embedding)]))::vector({MAX_EMBEDDING_DIM})"
+        )
+        op.drop_column(table, "embedding_dim")
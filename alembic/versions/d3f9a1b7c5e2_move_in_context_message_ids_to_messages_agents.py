@@ -0,0 +1,48 @@
+"""move in-context message ids to messages_agents
+
+Revision ID: d3f9a1b7c5e2
+Revises: c2d8f4a6b9e1
+Create Date: 2025-03-11 16:05:48.913270
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d3f9a1b7c5e2"
+down_revision: Union[str, None] = "c2d8f4a6b9e1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "messages_agents",
+        sa.Column("agent_id", sa.String(), nullable=False),
+        sa.Column("position", sa.Integer(), nullable=False),
+        sa.Column("message_id", sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(["agent_id"], ["agents.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("agent_id", "position"),
+    )
+    op.create_index("ix_messages_agents_message_id", "messages_agents", ["message_id"], unique=False)
+    op.execute(
+        "INSERT INTO messages_agents (agent_id, position, message_id) "
+        "SELECT agents.id, ids.position - 1, ids.message_id FROM agents, "
+        "json_array_elements_text(agents.message_ids::json) WITH ORDINALITY AS ids(message_id, position) "
+        "WHERE agents.message_ids IS NOT NULL"
+    )
+    op.drop_column("agents", "message_ids")
+
+
+def downgrade() -> None:
+    op.add_column("agents", sa.Column("message_ids", sa.JSON(), nullable=True))
+    op.execute(
+        "UPDATE agents SET message_ids = (SELECT json_agg(message_id ORDER BY position) FROM messages_agents "
+        "WHERE messages_agents.agent_id = agents.id)"
+    )
+    op.drop_index("ix_messages_agents_message_id", table_name="messages_agents")
+    op.drop_table("messages_agents")
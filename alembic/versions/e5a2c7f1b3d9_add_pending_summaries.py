@@ -0,0 +1,35 @@
+"""add pending_summaries
+
+Revision ID: e5a2c7f1b3d9
+Revises: d3f9a1b7c5e2
+Create Date: 2025-03-12 10:22:37.514208
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e5a2c7f1b3d9"
+down_revision: Union[str, None] = "d3f9a1b7c5e2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "pending_summaries",
+        sa.Column("agent_id", sa.String(), nullable=False),
+        sa.Column("summary_message_id", sa.String(), nullable=False),
+        sa.Column("summarized_message_ids", sa.JSON(), nullable=False),
+        sa.ForeignKeyConstraint(["agent_id"], ["agents.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["summary_message_id"], ["messages.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("agent_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("pending_summaries")
@@ -26,10 +26,11 @@ from letta.helpers import ToolRulesSolver
 from letta.helpers.composio_helpers import get_composio_api_key
 from letta.helpers.datetime_helpers import get_utc_time
 from letta.helpers.json_helpers import json_dumps, json_loads
+from letta.helpers.tokenizer_helpers import count_tokens_many
 from letta.interface import AgentInterface
-from letta.llm_api.helpers import calculate_summarizer_cutoff, get_token_counts_for_messages, is_context_overflow_error
+from letta.llm_api.helpers import calculate_summarizer_cutoff, count_prompt_tokens, get_token_counts_for_messages, is_context_overflow_error
 from letta.llm_api.llm_api_tools import create
-from letta.local_llm.utils import num_tokens_from_functions, num_tokens_from_messages
+from letta.local_llm.utils import num_tokens_from_functions
 from letta.log import get_logger
 from letta.memory import summarize_messages
 from letta.orm import User
@@ -48,6 +49,7 @@ from letta.schemas.tool import Tool
 from letta.schemas.tool_rule import TerminalToolRule
 from letta.schemas.usage import LettaUsageStatistics
 from letta.services.agent_manager import AgentManager
+from letta.services.background_summarizer import PendingSummary, get_background_summarizer
 from letta.services.block_manager import BlockManager
 from letta.services.helpers.agent_manager_helper import check_supports_structured_output, compile_memory_metadata_block
 from letta.services.job_manager import JobManager
@@ -61,15 +63,7 @@ from letta.settings import summarizer_settings
 from letta.streaming_interface import StreamingRefreshCLIInterface
 from letta.system import get_heartbeat, get_token_limit_warning, package_function_response, package_summarize_message, package_user_message
 from letta.tracing import trace_method
-from letta.utils import (
-    count_tokens,
-    get_friendly_error_msg,
-    get_tool_call_id,
-    log_telemetry,
-    parse_json,
-    printd,
-    validate_function_response,
-)
+from letta.utils import get_friendly_error_msg, get_tool_call_id, log_telemetry, parse_json, printd, validate_function_response
 
 logger = get_logger(__name__)
 
@@ -180,7 +174,7 @@ class Agent(BaseAgent):
         Returns:
             modified (bool): whether the memory was updated
         """
-        if self.agent_state.memory.compile() != new_memory.compile():
+        if self.agent_state.memory.compiles_differently(new_memory):
             # update the blocks (LRW) in the DB
             for label in self.agent_state.memory.list_block_labels():
                 updated_value = new_memory.get_block(label).value
@@ -737,7 +731,9 @@ class Agent(BaseAgent):
                 break
 
         if self.agent_state.message_buffer_autoclear:
-            self.agent_manager.trim_all_in_context_messages_except_system(self.agent_state.id, actor=self.user)
+            self.agent_state = self.agent_manager.trim_all_in_context_messages_except_system(
+                self.agent_state.id, actor=self.user, agent_state=self.agent_state
+            )
 
         return LettaUsageStatistics(**total_usage.model_dump(), step_count=step_count)
 
@@ -767,6 +763,10 @@ class Agent(BaseAgent):
             )  # read blocks from DB
             self.update_memory_if_changed(current_persisted_memory)
 
+            # Swap in the summary computed in the background since the memory warning, if it is ready
+            if summarizer_settings.proactive:
+                self._swap_in_background_summary()
+
             # Step 1: add user message
             if isinstance(messages, Message):
                 messages = [messages]
@@ -821,6 +821,7 @@ class Agent(BaseAgent):
             # Check the memory pressure and potentially issue a memory pressure warning
             current_total_tokens = response.usage.total_tokens
             active_memory_warning = False
+            summarize_in_background = False
 
             # We can't do summarize logic properly if context_window is undefined
             if self.agent_state.llm_config.context_window is None:
@@ -841,6 +842,9 @@ class Agent(BaseAgent):
                     active_memory_warning = True
                     self.agent_alerted_about_memory_pressure = True  # it's up to the outer loop to handle this
 
+                if summarizer_settings.proactive:
+                    summarize_in_background = True
+
             else:
                 printd(
                     f"last response total_tokens ({current_total_tokens}) < {summarizer_settings.memory_warning_threshold * int(self.agent_state.llm_config.context_window)}"
@@ -867,7 +871,7 @@ class Agent(BaseAgent):
 
             # Persisting into Messages
             self.agent_state = self.agent_manager.append_to_in_context_messages(
-                all_new_messages, agent_id=self.agent_state.id, actor=self.user
+                all_new_messages, agent_id=self.agent_state.id, actor=self.user, agent_state=self.agent_state
             )
             if job_id:
                 for message in all_new_messages:
@@ -877,6 +881,9 @@ class Agent(BaseAgent):
                         actor=self.user,
                     )
 
+            if summarize_in_background:
+                self._schedule_background_summary()
+
             return AgentStepResponse(
                 messages=all_new_messages,
                 heartbeat_request=heartbeat_request,
@@ -896,8 +903,12 @@ class Agent(BaseAgent):
                     logger.warning(
                         f"context window exceeded with limit {self.agent_state.llm_config.context_window}, attempting to summarize ({summarize_attempt_count}/{summarizer_settings.max_summarizer_retries}"
                     )
-                    # A separate API call to run a summarizer
-                    self.summarize_messages_inplace()
+                    if summarizer_settings.proactive and self._swap_in_background_summary(timeout=None):
+                        # the summary scheduled at the memory warning is used instead of summarizing again
+                        pass
+                    else:
+                        # A separate API call to run a summarizer
+                        self.summarize_messages_inplace()
 
                     # Try step again
                     return self.inner_step(
@@ -911,7 +922,7 @@ class Agent(BaseAgent):
                     )
                 else:
                     err_msg = f"Ran summarizer {summarize_attempt_count - 1} times for agent id={self.agent_state.id}, but messages are still overflowing the context window."
-                    token_counts = (get_token_counts_for_messages(in_context_messages),)
+                    token_counts = (get_token_counts_for_messages(in_context_messages, model=self.model),)
                     logger.error(err_msg)
                     logger.error(f"num_in_context_messages: {len(self.agent_state.message_ids)}")
                     logger.error(f"token_counts: {token_counts}")
@@ -962,65 +973,24 @@ class Agent(BaseAgent):
 
         return self.inner_step(messages=[user_message], **kwargs)
 
+    def prepare_summary(self, in_context_messages: List[Message]) -> PendingSummary:
+        """Summarize the oldest in-context messages (up to the cutoff of `calculate_summarizer_cutoff`)"""
+        return prepare_summary(self.agent_state, in_context_messages, actor=self.user, model=self.model)
+
     def summarize_messages_inplace(self):
         in_context_messages = self.agent_manager.get_in_context_messages(agent_id=self.agent_state.id, actor=self.user)
-        in_context_messages_openai = [m.to_openai_dict() for m in in_context_messages]
-        in_context_messages_openai_no_system = in_context_messages_openai[1:]
-        token_counts = get_token_counts_for_messages(in_context_messages)
-        logger.info(f"System message token count={token_counts[0]}")
-        logger.info(f"token_counts_no_system={token_counts[1:]}")
-
-        if in_context_messages_openai[0]["role"] != "system":
-            raise RuntimeError(f"in_context_messages_openai[0] should be system (instead got {in_context_messages_openai[0]})")
-
-        # If at this point there's nothing to summarize, throw an error
-        if len(in_context_messages_openai_no_system) == 0:
-            raise ContextWindowExceededError(
-                "Not enough messages to compress for summarization",
-                details={
-                    "num_candidate_messages": len(in_context_messages_openai_no_system),
-                    "num_total_messages": len(in_context_messages_openai),
-                },
-            )
-
-        cutoff = calculate_summarizer_cutoff(in_context_messages=in_context_messages, token_counts=token_counts, logger=logger)
-        message_sequence_to_summarize = in_context_messages[1:cutoff]  # do NOT get rid of the system message
-        logger.info(f"Attempting to summarize {len(message_sequence_to_summarize)} messages of {len(in_context_messages)}")
-
-        # We can't do summarize logic properly if context_window is undefined
-        if self.agent_state.llm_config.context_window is None:
-            # Fallback if for some reason context_window is missing, just set to the default
-            logger.warning(f"{CLI_WARNING_PREFIX}could not find context_window in config, setting to default {LLM_MAX_TOKENS['DEFAULT']}")
-            self.agent_state.llm_config.context_window = (
-                LLM_MAX_TOKENS[self.model] if (self.model is not None and self.model in LLM_MAX_TOKENS) else LLM_MAX_TOKENS["DEFAULT"]
-            )
+        pending_summary = self.prepare_summary(in_context_messages)
 
-        summary = summarize_messages(agent_state=self.agent_state, message_sequence_to_summarize=message_sequence_to_summarize)
-        logger.info(f"Got summary: {summary}")
-
-        # Metadata that's useful for the agent to see
-        all_time_message_count = self.message_manager.size(agent_id=self.agent_state.id, actor=self.user)
-        remaining_message_count = 1 + len(in_context_messages) - cutoff  # System + remaining
-        hidden_message_count = all_time_message_count - remaining_message_count
-        summary_message_count = len(message_sequence_to_summarize)
-        summary_message = package_summarize_message(summary, summary_message_count, hidden_message_count, all_time_message_count)
-        logger.info(f"Packaged into message: {summary_message}")
-
-        prior_len = len(in_context_messages_openai)
-        self.agent_state = self.agent_manager.trim_all_in_context_messages_except_system(agent_id=self.agent_state.id, actor=self.user)
-        packed_summary_message = {"role": "user", "content": summary_message}
+        prior_len = len(in_context_messages)
+        self.agent_state = self.agent_manager.trim_all_in_context_messages_except_system(
+            agent_id=self.agent_state.id, actor=self.user, agent_state=self.agent_state
+        )
         # Prepend the summary
         self.agent_state = self.agent_manager.prepend_to_in_context_messages(
-            messages=[
-                Message.dict_to_message(
-                    agent_id=self.agent_state.id,
-                    user_id=self.agent_state.created_by_id,
-                    model=self.model,
-                    openai_message_dict=packed_summary_message,
-                )
-            ],
+            messages=[pending_summary.summary_message],
             agent_id=self.agent_state.id,
             actor=self.user,
+            agent_state=self.agent_state,
         )
 
         # reset alert
@@ -1029,9 +999,45 @@ class Agent(BaseAgent):
 
         logger.info(f"Ran summarizer, messages length {prior_len} -> {len(curr_in_context_messages)}")
         logger.info(
-            f"Summarizer brought down total token count from {sum(token_counts)} -> {sum(get_token_counts_for_messages(curr_in_context_messages))}"
+            f"Summarizer brought down total token count from {sum(get_token_counts_for_messages(in_context_messages, model=self.model))} -> {sum(get_token_counts_for_messages(curr_in_context_messages, model=self.model))}"
         )
 
+    def _schedule_background_summary(self) -> None:
+        """Summarize the oldest in-context messages off the request path, a later step swaps the summary in"""
+        # the summary runs on another thread while this agent keeps stepping: it gets its own copy of the state
+        agent_state = self.agent_state.model_copy(deep=True)
+        actor, model = self.user, self.model
+
+        def summarize() -> None:
+            agent_manager = AgentManager()
+            in_context_messages = agent_manager.get_in_context_messages(agent_id=agent_state.id, actor=actor)
+            pending_summary = prepare_summary(agent_state, in_context_messages, actor=actor, model=model)
+            agent_manager.save_pending_summary(
+                pending_summary.summary_message, pending_summary.summarized_message_ids, agent_id=agent_state.id, actor=actor
+            )
+
+        if get_background_summarizer().schedule(agent_state.id, summarize):
+            self.logger.info("Memory warning threshold crossed, summarizing the oldest messages in the background")
+
+    def _swap_in_background_summary(self, timeout: Optional[float] = 0) -> bool:
+        """
+        Replace the summarized messages with the summary computed in the background, returns whether it was swapped in.
+
+        A summary still in progress in this process is waited for up to `timeout` seconds (None waits until it is done).
+        """
+        if timeout != 0:
+            get_background_summarizer().wait(self.agent_state.id, timeout=timeout)
+        agent_state = self.agent_manager.swap_in_pending_summary(
+            agent_id=self.agent_state.id, actor=self.user, agent_state=self.agent_state
+        )
+        if agent_state is None:
+            return False
+        self.agent_state = agent_state
+        # reset alert
+        self.agent_alerted_about_memory_pressure = False
+        self.logger.info("Swapped in the background summary")
+        return True
+
     def add_function(self, function_name: str) -> str:
         # TODO: refactor
         raise NotImplementedError
@@ -1051,14 +1057,11 @@ class Agent(BaseAgent):
         """Get the context window of the agent"""
 
         system_prompt = self.agent_state.system  # TODO is this the current system or the initial system?
-        num_tokens_system = count_tokens(system_prompt)
         core_memory = self.agent_state.memory.compile()
-        num_tokens_core_memory = count_tokens(core_memory)
 
         # Grab the in-context messages
         # conversion of messages to OpenAI dict format, which is passed to the token counter
         in_context_messages = self.agent_manager.get_in_context_messages(agent_id=self.agent_state.id, actor=self.user)
-        in_context_messages_openai = [m.to_openai_dict() for m in in_context_messages]
 
         # Check if there's a summary message in the message queue
         if (
@@ -1071,32 +1074,26 @@ class Agent(BaseAgent):
             # Summary message exists
             assert in_context_messages[1].text is not None
             summary_memory = in_context_messages[1].text
-            num_tokens_summary_memory = count_tokens(in_context_messages[1].text)
             # with a summary message, the real messages start at index 2
-            num_tokens_messages = (
-                num_tokens_from_messages(messages=in_context_messages_openai[2:], model=self.model)
-                if len(in_context_messages_openai) > 2
-                else 0
-            )
+            num_tokens_messages = count_prompt_tokens(in_context_messages[2:], model=self.model) if len(in_context_messages) > 2 else 0
 
         else:
             summary_memory = None
-            num_tokens_summary_memory = 0
             # with no summary message, the real messages start at index 1
-            num_tokens_messages = (
-                num_tokens_from_messages(messages=in_context_messages_openai[1:], model=self.model)
-                if len(in_context_messages_openai) > 1
-                else 0
-            )
+            num_tokens_messages = count_prompt_tokens(in_context_messages[1:], model=self.model) if len(in_context_messages) > 1 else 0
 
         agent_manager_passage_size = self.agent_manager.passage_size(actor=self.user, agent_id=self.agent_state.id)
         message_manager_size = self.message_manager.size(actor=self.user, agent_id=self.agent_state.id)
         external_memory_summary = compile_memory_metadata_block(
             memory_edit_timestamp=get_utc_time(),
-            previous_message_count=self.message_manager.size(actor=self.user, agent_id=self.agent_state.id),
-            archival_memory_size=self.agent_manager.passage_size(actor=self.user, agent_id=self.agent_state.id),
+            previous_message_count=message_manager_size,
+            archival_memory_size=agent_manager_passage_size,
+        )
+
+        # the prompt sections are tokenized together in one batch
+        num_tokens_system, num_tokens_core_memory, num_tokens_summary_memory, num_tokens_external_memory_summary = count_tokens_many(
+            [system_prompt, core_memory, summary_memory or "", external_memory_summary]
         )
-        num_tokens_external_memory_summary = count_tokens(external_memory_summary)
 
         # tokens taken up by function definitions
         agent_state_tool_jsons = [t.json_schema for t in self.agent_state.tools]
@@ -1147,6 +1144,61 @@ class Agent(BaseAgent):
         return context_window_breakdown.context_window_size_current
 
 
+def prepare_summary(
+    agent_state: AgentState, in_context_messages: List[Message], actor: User, model: Optional[str] = None
+) -> PendingSummary:
+    """Summarize the oldest in-context messages (up to the cutoff of `calculate_summarizer_cutoff`)"""
+    token_counts = get_token_counts_for_messages(in_context_messages, model=model)
+    logger.info(f"System message token count={token_counts[0]}")
+    logger.info(f"token_counts_no_system={token_counts[1:]}")
+
+    if in_context_messages[0].role != MessageRole.system:
+        raise RuntimeError(f"in_context_messages[0] should be system (instead got {in_context_messages[0].to_openai_dict()})")
+
+    # If at this point there's nothing to summarize, throw an error
+    if len(in_context_messages) == 1:
+        raise ContextWindowExceededError(
+            "Not enough messages to compress for summarization",
+            details={
+                "num_candidate_messages": len(in_context_messages) - 1,
+                "num_total_messages": len(in_context_messages),
+            },
+        )
+
+    cutoff = calculate_summarizer_cutoff(in_context_messages=in_context_messages, token_counts=token_counts, logger=logger)
+    message_sequence_to_summarize = in_context_messages[1:cutoff]  # do NOT get rid of the system message
+    logger.info(f"Attempting to summarize {len(message_sequence_to_summarize)} messages of {len(in_context_messages)}")
+
+    # We can't do summarize logic properly if context_window is undefined
+    if agent_state.llm_config.context_window is None:
+        # Fallback if for some reason context_window is missing, just set to the default
+        logger.warning(f"{CLI_WARNING_PREFIX}could not find context_window in config, setting to default {LLM_MAX_TOKENS['DEFAULT']}")
+        agent_state.llm_config.context_window = (
+            LLM_MAX_TOKENS[model] if (model is not None and model in LLM_MAX_TOKENS) else LLM_MAX_TOKENS["DEFAULT"]
+        )
+
+    summary = summarize_messages(agent_state=agent_state, message_sequence_to_summarize=message_sequence_to_summarize)
+    logger.info(f"Got summary: {summary}")
+
+    # Metadata that's useful for the agent to see
+    all_time_message_count = MessageManager().size(agent_id=agent_state.id, actor=actor)
+    remaining_message_count = 1 + len(in_context_messages) - cutoff  # System + remaining
+    hidden_message_count = all_time_message_count - remaining_message_count
+    summary_message_count = len(message_sequence_to_summarize)
+    summary_message = package_summarize_message(summary, summary_message_count, hidden_message_count, all_time_message_count)
+    logger.info(f"Packaged into message: {summary_message}")
+
+    return PendingSummary(
+        summarized_message_ids=[message.id for message in message_sequence_to_summarize],
+        summary_message=Message.dict_to_message(
+            agent_id=agent_state.id,
+            user_id=agent_state.created_by_id,
+            model=model,
+            openai_message_dict={"role": "user", "content": summary_message},
+        ),
+    )
+
+
 def save_agent(agent: Agent):
     """Save agent to metadata store"""
     agent_state = agent.agent_state
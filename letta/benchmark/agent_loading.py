@@ -0,0 +1,131 @@
+# type: ignore
+
+import gc
+import resource
+import time
+import tracemalloc
+from typing import Annotated
+
+import numpy as np
+import typer
+from sqlalchemy.orm import selectinload
+
+from letta.orm import Agent as AgentModel
+from letta.schemas.agent import CreateAgent
+from letta.schemas.block import CreateBlock
+from letta.schemas.embedding_config import EmbeddingConfig
+from letta.schemas.llm_config import LLMConfig
+from letta.schemas.message import Message
+from letta.schemas.passage import Passage
+from letta.server.server import SyncServer
+from letta.settings import settings
+
+app = typer.Typer()
+
+
+def reset_peak_rss() -> None:
+    # linux only: writing 5 to clear_refs resets the VmHWM (peak RSS) of the process
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in KB on linux, and never resets
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(fn, n: int):
+    """Mean latency of fn() in ms, peak Python allocations of one call in MB and the peak RSS during that call in MB"""
+    gc.collect()
+    reset_peak_rss()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss = peak_rss_mb()
+
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1000, peak / 1024 / 1024, rss
+
+
+@app.command()
+def bench(
+    n_messages: Annotated[int, typer.Option(help="Messages of the agent.")] = 50_000,
+    n_passages: Annotated[int, typer.Option(help="Archival passages of the agent.")] = 100_000,
+    n_runs: Annotated[int, typer.Option(help="Number of timed runs per path.")] = 5,
+    batch_size: Annotated[int, typer.Option(help="Rows per bulk insert while seeding the agent.")] = 1000,
+):
+    """Latency and memory of get_agent_by_id with the "state+tools" load profile against loading every relationship"""
+    server = SyncServer()
+    actor = server.user_manager.get_user_or_default()
+    embedding_config = EmbeddingConfig.default_config(provider="openai")
+    agent_state = server.agent_manager.create_agent(
+        CreateAgent(
+            name="bench_agent_loading",
+            memory_blocks=[CreateBlock(label="human", value="Human"), CreateBlock(label="persona", value="Persona")],
+            llm_config=LLMConfig.default_config("gpt-4"),
+            embedding_config=embedding_config,
+        ),
+        actor=actor,
+    )
+    rng = np.random.default_rng(0)
+    try:
+        for offset in range(0, n_messages, batch_size):
+            server.message_manager.create_many_messages(
+                [
+                    Message(agent_id=agent_state.id, organization_id=actor.organization_id, role="user", text=f"message {i}")
+                    for i in range(offset, min(offset + batch_size, n_messages))
+                ],
+                actor=actor,
+            )
+        for offset in range(0, n_passages, batch_size):
+            server.passage_manager.create_many_passages(
+                [
+                    Passage(
+                        agent_id=agent_state.id,
+                        organization_id=actor.organization_id,
+                        text=f"passage {i}",
+                        embedding=rng.normal(size=embedding_config.embedding_dim).tolist(),
+                        embedding_config=embedding_config,
+                    )
+                    for i in range(offset, min(offset + batch_size, n_passages))
+                ],
+                actor=actor,
+            )
+
+        def load_everything():
+            # the loading behaviour before load profiles: every relationship selectin loaded
+            with server.agent_manager.session_maker() as session:
+                options = [selectinload(getattr(AgentModel, rel.key)) for rel in AgentModel.__mapper__.relationships]
+                return AgentModel.read(db_session=session, identifier=agent_state.id, actor=actor, load_options=options).to_pydantic()
+
+        def load_profile():
+            return server.agent_manager.get_agent_by_id(agent_id=agent_state.id, actor=actor)
+
+        assert load_everything().id == load_profile().id
+
+        profile = measure(load_profile, n_runs)
+        everything = measure(load_everything, n_runs)
+        print(f"database: {'postgres' if settings.letta_pg_uri_no_default else 'sqlite'}, messages: {n_messages}, passages: {n_passages}")
+        print(f"{'path':>14} {'latency (ms)':>13} {'peak alloc (MB)':>16} {'peak RSS (MB)':>14}")
+        print(f"{'all selectin':>14} {everything[0]:>13.1f} {everything[1]:>16.1f} {everything[2]:>14.1f}")
+        print(f"{'state+tools':>14} {profile[0]:>13.1f} {profile[1]:>16.1f} {profile[2]:>14.1f}")
+        print(f"speedup: {everything[0] / profile[0]:.1f}x")
+    finally:
+        server.agent_manager.delete_agent(agent_id=agent_state.id, actor=actor)
+
+
+if __name__ == "__main__":
+    app()
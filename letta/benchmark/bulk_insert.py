@@ -0,0 +1,88 @@
+# type: ignore
+
+import time
+from typing import Annotated
+
+import numpy as np
+import typer
+
+from letta.schemas.agent import CreateAgent
+from letta.schemas.embedding_config import EmbeddingConfig
+from letta.schemas.llm_config import LLMConfig
+from letta.schemas.message import Message
+from letta.schemas.passage import Passage
+from letta.server.server import SyncServer
+from letta.settings import settings
+
+app = typer.Typer()
+
+
+def rows_per_second(fn, rows: int) -> float:
+    start = time.perf_counter()
+    fn()
+    return rows / (time.perf_counter() - start)
+
+
+@app.command()
+def bench(
+    n_rows: Annotated[int, typer.Option(help="Rows inserted per run.")] = 500,
+    batch_size: Annotated[int, typer.Option(help="Rows per create_many call (100 matches the data-source loader).")] = 100,
+):
+    """Insert throughput (rows/sec) of row-by-row creates against the bulk create_many paths, on the configured database"""
+    server = SyncServer()
+    actor = server.user_manager.get_user_or_default()
+    embedding_config = EmbeddingConfig.default_config(provider="openai")
+    agent_state = server.agent_manager.create_agent(
+        CreateAgent(
+            name="bench_bulk_insert",
+            memory_blocks=[],
+            llm_config=LLMConfig.default_config("gpt-4"),
+            embedding_config=embedding_config,
+        ),
+        actor=actor,
+    )
+    rng = np.random.default_rng(0)
+
+    def messages():
+        return [
+            Message(agent_id=agent_state.id, organization_id=actor.organization_id, role="user", text=f"message {i}") for i in range(n_rows)
+        ]
+
+    def passages():
+        return [
+            Passage(
+                agent_id=agent_state.id,
+                organization_id=actor.organization_id,
+                text=f"passage {i}",
+                embedding=rng.normal(size=embedding_config.embedding_dim).tolist(),
+                embedding_config=embedding_config,
+            )
+            for i in range(n_rows)
+        ]
+
+    def in_batches(create_many, rows):
+        for offset in range(0, len(rows), batch_size):
+            create_many(rows[offset : offset + batch_size], actor=actor)
+
+    try:
+        print(f"database: {'postgres' if settings.letta_pg_uri_no_default else 'sqlite'}, rows: {n_rows}, batch size: {batch_size}")
+        print(f"{'table':>10} {'row by row':>12} {'bulk':>12} {'speedup':>9}")
+
+        rows = messages()
+        single = rows_per_second(lambda: [server.message_manager.create_message(m, actor=actor) for m in rows], n_rows)
+        rows = messages()
+        bulk = rows_per_second(lambda: in_batches(server.message_manager.create_many_messages, rows), n_rows)
+        print(f"{'messages':>10} {single:>12.0f} {bulk:>12.0f} {bulk / single:>8.1f}x")
+
+        rows = passages()
+        single = rows_per_second(lambda: [server.passage_manager.create_passage(p, actor=actor) for p in rows], n_rows)
+        rows = passages()
+        bulk = rows_per_second(lambda: in_batches(server.passage_manager.create_many_passages, rows), n_rows)
+        print(f"{'passages':>10} {single:>12.0f} {bulk:>12.0f} {bulk / single:>8.1f}x")
+        print("(rows/sec)")
+    finally:
+        server.agent_manager.delete_agent(agent_id=agent_state.id, actor=actor)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,74 @@
+# type: ignore
+
+import sqlite3
+import time
+from typing import Annotated
+
+import numpy as np
+import typer
+
+from letta.benchmark.vector_search import synthetic_embeddings
+from letta.orm.sqlite_functions import adapt_array, convert_array, cosine_distance
+from letta.services.vector_index import top_k_cosine
+
+app = typer.Typer()
+
+
+def build_corpus(vectors: np.ndarray) -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    conn.create_function("cosine_distance", 2, cosine_distance)
+    conn.execute("CREATE TABLE passages (id TEXT PRIMARY KEY, embedding BLOB)")
+    conn.executemany("INSERT INTO passages VALUES (?, ?)", ((f"passage-{i}", adapt_array(v)) for i, v in enumerate(vectors)))
+    return conn
+
+
+def udf_search(conn: sqlite3.Connection, query: np.ndarray, k: int) -> list:
+    """Per-row scoring: SQLite calls the cosine_distance UDF once for every passage"""
+    return [
+        row[0] for row in conn.execute("SELECT id FROM passages ORDER BY cosine_distance(embedding, ?) LIMIT ?", (adapt_array(query), k))
+    ]
+
+
+def numpy_search(conn: sqlite3.Connection, query: np.ndarray, k: int, batch_size: int) -> list:
+    """Batched scoring: stream (id, blob) rows and rank each batch with one matrix-vector product"""
+    cursor = conn.execute("SELECT id, embedding FROM passages")
+
+    def batches():
+        while rows := cursor.fetchmany(batch_size):
+            yield [row[0] for row in rows], [convert_array(row[1]) for row in rows]
+
+    return [passage_id for passage_id, _ in top_k_cosine(query, batches(), k)]
+
+
+@app.command()
+def bench(
+    sizes: Annotated[str, typer.Option(help="Comma separated corpus sizes.")] = "1000,10000,50000",
+    dim: Annotated[int, typer.Option(help="Embedding dimension.")] = 768,
+    k: Annotated[int, typer.Option(help="Number of neighbours per query.")] = 10,
+    n_queries: Annotated[int, typer.Option(help="Number of queries per corpus size.")] = 5,
+    batch_size: Annotated[int, typer.Option(help="Rows scored per matrix-vector product.")] = 2000,
+):
+    """Compare per-query latency of exact vector search with the per-row UDF and with batched NumPy ranking"""
+    rng = np.random.default_rng(0)
+    print(f"{'passages':>10} {'udf (ms)':>10} {'numpy (ms)':>11} {'speedup':>9} {'same top-k':>11}")
+
+    for n in [int(s) for s in sizes.split(",")]:
+        vectors = synthetic_embeddings(n, dim, n_clusters=max(16, int(np.sqrt(n))), rng=rng)
+        queries = vectors[rng.choice(n, size=n_queries, replace=False)] + 0.1 * rng.normal(size=(n_queries, dim)).astype(np.float32)
+        conn = build_corpus(vectors)
+
+        start = time.perf_counter()
+        udf_results = [udf_search(conn, q, k) for q in queries]
+        udf_ms = (time.perf_counter() - start) / n_queries * 1000
+
+        start = time.perf_counter()
+        numpy_results = [numpy_search(conn, q, k, batch_size) for q in queries]
+        numpy_ms = (time.perf_counter() - start) / n_queries * 1000
+
+        same = all(a == b for a, b in zip(udf_results, numpy_results))
+        print(f"{n:>10} {udf_ms:>10.1f} {numpy_ms:>11.1f} {udf_ms / numpy_ms:>8.1f}x {str(same):>11}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,101 @@
+# type: ignore
+
+import json
+import logging
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Annotated
+
+import typer
+from openai import OpenAI
+
+from letta.helpers.http_clients import HTTPClientRegistry
+
+app = typer.Typer()
+
+COMPLETION = {
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "bench",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+
+
+class MockProvider(BaseHTTPRequestHandler):
+    """OpenAI compatible chat completions endpoint with HTTP/1.1 keep-alive, counting the connections it accepts"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        MockProvider.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps(COMPLETION).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def measure(fn, n: int):
+    """Median and p95 latency of fn() in ms, and the connections the mock server accepted meanwhile"""
+    MockProvider.connections = 0
+    latencies = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(0.95 * (len(latencies) - 1))], MockProvider.connections
+
+
+@app.command()
+def bench(
+    n_requests: Annotated[int, typer.Option(help="Chat completion requests per path.")] = 500,
+):
+    """Latency of chat completion requests against a local mock provider, with a new OpenAI client per call against the registry"""
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockProvider)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    request = {"model": "bench", "messages": [{"role": "user", "content": "hi"}]}
+    registry = HTTPClientRegistry()
+
+    def new_client():
+        # the behaviour before the registry: one client, and so one connection pool, per request
+        client = OpenAI(api_key="bench", base_url=base_url, max_retries=0)
+        client.chat.completions.create(**request)
+
+    def pooled_client():
+        registry.sdk_client("openai", OpenAI, api_key="bench", base_url=base_url, max_retries=0).chat.completions.create(**request)
+
+    try:
+        new_client()
+        pooled_client()
+        per_call = measure(new_client, n_requests)
+        pooled = measure(pooled_client, n_requests)
+        print(f"requests: {n_requests}")
+        print(f"{'path':>16} {'p50 (ms)':>9} {'p95 (ms)':>9} {'connections':>12}")
+        print(f"{'client per call':>16} {per_call[0]:>9.2f} {per_call[1]:>9.2f} {per_call[2]:>12}")
+        print(f"{'registry':>16} {pooled[0]:>9.2f} {pooled[1]:>9.2f} {pooled[2]:>12}")
+        print(f"speedup (p50): {per_call[0] / pooled[0]:.1f}x")
+        print(json.dumps(registry.stats(), indent=2))
+    finally:
+        registry.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,80 @@
+# type: ignore
+
+import time
+from typing import Annotated
+
+import typer
+
+from letta.schemas.agent import CreateAgent
+from letta.schemas.block import CreateBlock
+from letta.schemas.embedding_config import EmbeddingConfig
+from letta.schemas.llm_config import LLMConfig
+from letta.schemas.message import Message
+from letta.server.server import SyncServer
+
+app = typer.Typer()
+
+
+def timed(fn, n: int) -> float:
+    """Mean latency of fn() in ms"""
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1000
+
+
+@app.command()
+def bench(
+    n_messages: Annotated[int, typer.Option(help="Number of in-context messages.")] = 200,
+    n_runs: Annotated[int, typer.Option(help="Number of timed runs per path.")] = 50,
+    fetches_per_step: Annotated[
+        int, typer.Option(help="In-context message fetches per agent step (inner_step, overflow check, context window).")
+    ] = 3,
+):
+    """Compare the in-context message fetch through the hydrated agent with the single-query fetch"""
+    server = SyncServer()
+    actor = server.user_manager.get_user_or_default()
+    agent_state = server.agent_manager.create_agent(
+        CreateAgent(
+            name="bench_in_context_messages",
+            memory_blocks=[CreateBlock(label="human", value="Human"), CreateBlock(label="persona", value="Persona")],
+            llm_config=LLMConfig.default_config("gpt-4"),
+            embedding_config=EmbeddingConfig.default_config(provider="openai"),
+        ),
+        actor=actor,
+    )
+    try:
+        messages = [
+            Message(
+                agent_id=agent_state.id,
+                organization_id=actor.organization_id,
+                role="user" if i % 2 == 0 else "assistant",
+                text=f"message {i} " + "lorem ipsum " * 20,
+            )
+            for i in range(n_messages - len(agent_state.message_ids))
+        ]
+        server.agent_manager.append_to_in_context_messages(messages, agent_id=agent_state.id, actor=actor)
+
+        def hydrated_fetch():
+            message_ids = server.agent_manager.get_agent_by_id(agent_id=agent_state.id, actor=actor).message_ids
+            return server.message_manager.get_messages_by_ids(message_ids=message_ids, actor=actor)
+
+        def single_query_fetch():
+            return server.agent_manager.get_in_context_messages(agent_id=agent_state.id, actor=actor)
+
+        assert [m.id for m in hydrated_fetch()] == [m.id for m in single_query_fetch()]
+        n_in_context = len(single_query_fetch())
+
+        hydrated_ms = timed(hydrated_fetch, n_runs)
+        single_ms = timed(single_query_fetch, n_runs)
+        print(f"in-context messages: {n_in_context}")
+        print(f"{'path':>14} {'fetch (ms)':>11} {'per step (ms)':>14}")
+        print(f"{'hydrated':>14} {hydrated_ms:>11.2f} {hydrated_ms * fetches_per_step:>14.2f}")
+        print(f"{'single query':>14} {single_ms:>11.2f} {single_ms * fetches_per_step:>14.2f}")
+        print(f"speedup: {hydrated_ms / single_ms:.1f}x")
+    finally:
+        server.agent_manager.delete_agent(agent_id=agent_state.id, actor=actor)
+
+
+if __name__ == "__main__":
+    app()
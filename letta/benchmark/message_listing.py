@@ -0,0 +1,107 @@
+# type: ignore
+
+import logging
+import time
+from typing import Annotated
+
+import typer
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import selectinload
+
+from letta.orm import Agent as AgentModel
+from letta.orm.message import Message as MessageModel
+from letta.schemas.agent import CreateAgent
+from letta.schemas.block import CreateBlock
+from letta.schemas.embedding_config import EmbeddingConfig
+from letta.schemas.llm_config import LLMConfig
+from letta.schemas.message import Message
+from letta.server.rest_api.app import app as rest_app
+from letta.server.server import SyncServer
+
+app = typer.Typer()
+
+
+def timed(fn, n: int) -> float:
+    """Mean latency of fn() in ms"""
+    fn()
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1000
+
+
+def orm_listing(server: SyncServer, agent_id: str, actor, limit: int):
+    # the behaviour before: hydrated agent for the permission check, ORM rows with their organization and step, model_validate
+    with server.message_manager.session_maker() as session:
+        AgentModel.read(db_session=session, identifier=agent_id, actor=actor)
+        rows = (
+            session.query(MessageModel)
+            .options(selectinload(MessageModel.organization), selectinload(MessageModel.step))
+            .filter(MessageModel.agent_id == agent_id)
+            .order_by(MessageModel.created_at.desc(), MessageModel.id.desc())
+            .limit(limit)
+            .all()
+        )
+        return [row.to_pydantic() for row in rows]
+
+
+@app.command()
+def bench(
+    history_sizes: Annotated[str, typer.Option(help="Comma separated numbers of messages in the agent's history.")] = "100,1000,10000",
+    limit: Annotated[int, typer.Option(help="Messages per page, the `limit` of the request.")] = 50,
+    n_runs: Annotated[int, typer.Option(help="Timed runs per path and history size.")] = 50,
+):
+    """Latency of GET /v1/agents/{agent_id}/messages and of the listing behind it, ORM rows against selected columns"""
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    server = SyncServer()
+    actor = server.user_manager.get_user_or_default()
+    client = TestClient(rest_app)
+    agent_state = server.agent_manager.create_agent(
+        CreateAgent(
+            name="bench_message_listing",
+            memory_blocks=[CreateBlock(label="human", value="Human"), CreateBlock(label="persona", value="Persona")],
+            llm_config=LLMConfig.default_config("gpt-4"),
+            embedding_config=EmbeddingConfig.default_config(provider="openai"),
+        ),
+        actor=actor,
+    )
+    try:
+        print(f"page size: {limit}")
+        print(f"{'history':>8} {'orm rows (ms)':>14} {'columns (ms)':>13} {'speedup':>8} {'GET (ms)':>9}")
+        stored = server.message_manager.size(actor=actor, agent_id=agent_state.id)
+        for history_size in sorted(int(size) for size in history_sizes.split(",")):
+            messages = [
+                Message(
+                    agent_id=agent_state.id,
+                    organization_id=actor.organization_id,
+                    role="user" if i % 2 == 0 else "assistant",
+                    text=f"message {i} " + "lorem ipsum " * 20,
+                    token_count=42,
+                )
+                for i in range(stored, history_size)
+            ]
+            for start in range(0, len(messages), 1000):
+                server.message_manager.create_many_messages(messages[start : start + 1000], actor=actor)
+            stored = max(stored, history_size)
+
+            def columns_listing():
+                return server.message_manager.list_messages_for_agent(agent_id=agent_state.id, actor=actor, limit=limit, ascending=False)
+
+            def endpoint():
+                response = client.get(f"/v1/agents/{agent_state.id}/messages", params={"limit": limit}, headers={"user_id": actor.id})
+                response.raise_for_status()
+                return response
+
+            assert [m.model_dump() for m in orm_listing(server, agent_state.id, actor, limit)] == [
+                m.model_dump() for m in columns_listing()
+            ]
+            orm_ms = timed(lambda: orm_listing(server, agent_state.id, actor, limit), n_runs)
+            columns_ms = timed(columns_listing, n_runs)
+            endpoint_ms = timed(endpoint, n_runs)
+            print(f"{stored:>8} {orm_ms:>14.2f} {columns_ms:>13.2f} {orm_ms / columns_ms:>7.1f}x {endpoint_ms:>9.2f}")
+    finally:
+        server.agent_manager.delete_agent(agent_id=agent_state.id, actor=actor)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,122 @@
+# type: ignore
+
+import json
+import logging
+import multiprocessing
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Annotated
+
+import typer
+from openai import OpenAI
+
+from letta.llm_api.openai import openai_chat_completions_request_stream, prepare_openai_payload
+from letta.schemas.openai.chat_completion_request import ChatCompletionRequest
+from letta.schemas.openai.chat_completion_response import ChatCompletionChunkResponse
+from letta.server.rest_api.interface import StreamingServerInterface
+from letta.server.rest_api.utils import sse_data
+
+app = typer.Typer()
+
+
+def chunk_event(token: str) -> bytes:
+    chunk = {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "bench",
+        "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+    }
+    return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+
+def serve(port, n_tokens: int):
+    """OpenAI compatible streaming endpoint, run in its own process so its CPU time is not measured"""
+    body = b"".join(chunk_event(f" token{i}") for i in range(n_tokens)) + b"data: [DONE]\n\n"
+
+    class MockProvider(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockProvider)
+    port.value = server.server_address[1]
+    server.serve_forever()
+
+
+def sdk_stream(url: str, api_key: str, request: ChatCompletionRequest):
+    # the behaviour before: SDK chunk objects, dumped to dicts and validated again
+    client = OpenAI(api_key=api_key, base_url=url, max_retries=0)
+    data = prepare_openai_payload(request)
+    data["stream"] = True
+    for chunk in client.chat.completions.create(**data):
+        yield ChatCompletionChunkResponse(**chunk.model_dump(exclude_none=True))
+
+
+def old_sse(message) -> str:
+    return f"data: {json.dumps(message.model_dump(), separators=(',', ':'))}\n\n"
+
+
+def new_sse(message) -> str:
+    data = sse_data(message)
+    return f"data: {data if isinstance(data, str) else json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def run(stream, to_sse) -> float:
+    """Server CPU seconds to read the provider stream, turn it into letta messages and format them as SSE"""
+    interface = StreamingServerInterface(inner_thoughts_in_kwargs=False)
+    date = datetime.now(timezone.utc)
+    start = time.process_time()
+    for chunk in stream:
+        message = interface._process_chunk_to_letta_style(chunk=chunk, message_id="message-bench", message_date=date)
+        if message is not None:
+            to_sse(message)
+    return time.process_time() - start
+
+
+@app.command()
+def bench(
+    n_tokens: Annotated[int, typer.Option(help="Tokens streamed per request.")] = 2000,
+    n_requests: Annotated[int, typer.Option(help="Streamed requests per path.")] = 10,
+):
+    """Server CPU per 1k streamed tokens, SDK objects and dict round trips against the raw SSE path"""
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    port = multiprocessing.Value("i", 0)
+    server = multiprocessing.Process(target=serve, args=(port, n_tokens), daemon=True)
+    server.start()
+    while not port.value:
+        time.sleep(0.01)
+    url = f"http://127.0.0.1:{port.value}/v1"
+    request = ChatCompletionRequest(model="bench", messages=[{"role": "user", "content": "hi"}])
+
+    try:
+        paths = {
+            "sdk + dicts": lambda: run(sdk_stream(url, "bench", request), old_sse),
+            "raw sse": lambda: run(openai_chat_completions_request_stream(url, "bench", request), new_sse),
+        }
+        results = {}
+        for name, fn in paths.items():
+            fn()
+            results[name] = min(fn() for _ in range(n_requests)) / n_tokens * 1000 * 1000
+        print(f"tokens per request: {n_tokens}, requests: {n_requests}")
+        print(f"{'path':>12} {'cpu ms / 1k tokens':>19}")
+        for name, cpu in results.items():
+            print(f"{name:>12} {cpu:>19.2f}")
+        print(f"speedup: {results['sdk + dicts'] / results['raw sse']:.1f}x")
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,86 @@
+# type: ignore
+
+import json
+import time
+from typing import Annotated
+
+import typer
+
+from letta.streaming_utils import FunctionArgumentsStreamHandler, JSONInnerThoughtsExtractor, JSONStreamTokenizer
+
+app = typer.Typer()
+
+
+def send_message_fragments(n_chars: int, fragment_size: int):
+    """Arguments of a long `send_message` call with inner thoughts, split like a token stream"""
+    sentence = 'The quick brown fox says "hi" to the lazy dog.\n '
+    arguments = json.dumps(
+        {
+            "inner_thoughts": (sentence * (n_chars // len(sentence) // 4 + 1))[: n_chars // 4],
+            "message": (sentence * (n_chars // len(sentence) + 1))[:n_chars],
+        }
+    )
+    return [arguments[i : i + fragment_size] for i in range(0, len(arguments), fragment_size)]
+
+
+def loads_per_fragment(fragments):
+    # the reasoning content path before the tokenizer: json.loads of the whole buffer on every fragment
+    buffer = ""
+    for fragment in fragments:
+        buffer += fragment
+        try:
+            json.loads(buffer)
+        except json.JSONDecodeError:
+            pass
+
+
+def inner_thoughts_extractor(fragments):
+    extractor = JSONInnerThoughtsExtractor(wait_for_first_key=True)
+    for fragment in fragments:
+        extractor.process_fragment(fragment)
+
+
+def function_arguments_handler(fragments):
+    handler = FunctionArgumentsStreamHandler(json_key="message")
+    for fragment in fragments:
+        handler.process_json_chunk(fragment)
+
+
+def tokenizer(fragments):
+    tokenizer = JSONStreamTokenizer()
+    for fragment in fragments:
+        tokenizer.feed(fragment)
+
+
+def measure(fn, fragments, n: int) -> float:
+    """Best of n runs in ms"""
+    best = float("inf")
+    for _ in range(n):
+        start = time.perf_counter()
+        fn(fragments)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+@app.command()
+def bench(
+    n_chars: Annotated[int, typer.Option(help="Characters of the message.")] = 20000,
+    fragment_size: Annotated[int, typer.Option(help="Characters per streamed fragment.")] = 4,
+    n_runs: Annotated[int, typer.Option(help="Runs per reader, the best one counts.")] = 5,
+):
+    """Time to read a long streamed `send_message` call with each streaming JSON reader"""
+    fragments = send_message_fragments(n_chars, fragment_size)
+    print(f"arguments: {sum(len(fragment) for fragment in fragments)} chars in {len(fragments)} fragments")
+    print(f"{'reader':>30} {'ms':>9} {'us / fragment':>14}")
+    for name, fn in [
+        ("json.loads per fragment", loads_per_fragment),
+        ("JSONStreamTokenizer", tokenizer),
+        ("JSONInnerThoughtsExtractor", inner_thoughts_extractor),
+        ("FunctionArgumentsStreamHandler", function_arguments_handler),
+    ]:
+        ms = measure(fn, fragments, n_runs)
+        print(f"{name:>30} {ms:>9.2f} {ms * 1000 / len(fragments):>14.2f}")
+
+
+if __name__ == "__main__":
+    app()
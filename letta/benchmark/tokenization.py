@@ -0,0 +1,72 @@
+# type: ignore
+
+import os
+import time
+from typing import Annotated
+
+import numpy as np
+import tiktoken
+import typer
+
+from letta.local_llm.utils import num_tokens_from_messages
+
+app = typer.Typer()
+
+WORDS = "the agent remembers what the user said about their dog and plans a trip to the mountains next week".split()
+
+
+def synthetic_context(n_messages: int, words_per_message: int, rng: np.random.Generator) -> list:
+    return [
+        {
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": " ".join(rng.choice(WORDS, size=int(rng.integers(words_per_message // 2, words_per_message * 2)))),
+        }
+        for i in range(n_messages)
+    ]
+
+
+def per_call_lookup_count(messages: list, model: str) -> int:
+    """The previous path: resolve the encoder on every call and encode each message value one at a time"""
+    num_tokens = 0
+    for message in messages:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        num_tokens += 3
+        for value in message.values():
+            num_tokens += len(encoding.encode(value))
+    return num_tokens + 3
+
+
+@app.command()
+def bench(
+    n_messages: Annotated[int, typer.Option(help="Messages in the context.")] = 500,
+    words_per_message: Annotated[int, typer.Option(help="Average words per message.")] = 60,
+    n_runs: Annotated[int, typer.Option(help="Timed runs per path.")] = 20,
+    model: Annotated[str, typer.Option(help="Model whose tokenizer is used.")] = "gpt-4",
+):
+    """Tokens/sec of counting a whole context with per-call encoder lookups against the cached registry with encode_many"""
+    messages = synthetic_context(n_messages, words_per_message, np.random.default_rng(0))
+    total_tokens = num_tokens_from_messages(messages, model=model)
+    assert per_call_lookup_count(messages, model) == total_tokens
+
+    results = {}
+    for name, fn in (
+        ("per call lookup", lambda: per_call_lookup_count(messages, model)),
+        ("registry + encode_many", lambda: num_tokens_from_messages(messages, model=model)),
+    ):
+        start = time.perf_counter()
+        for _ in range(n_runs):
+            fn()
+        results[name] = total_tokens * n_runs / (time.perf_counter() - start)
+
+    print(f"messages: {n_messages}, tokens per context: {total_tokens}, cpus: {os.cpu_count()}")
+    print(f"{'path':>24} {'tokens/sec':>12}")
+    for name, tokens_per_second in results.items():
+        print(f"{name:>24} {tokens_per_second:>12.0f}")
+    print(f"speedup: {results['registry + encode_many'] / results['per call lookup']:.1f}x")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,101 @@
+# type: ignore
+
+import sqlite3
+import time
+from typing import Annotated
+
+import numpy as np
+import typer
+
+from letta.constants import MAX_EMBEDDING_DIM
+from letta.orm.sqlite_functions import adapt_array, cosine_distance
+from letta.services.vector_index import create_vector_index
+
+app = typer.Typer()
+
+
+def synthetic_embeddings(n: int, dim: int, n_clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Clustered vectors, closer to real text embeddings than uniform noise"""
+    centers = rng.normal(size=(n_clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, n_clusters, size=n)]
+    vectors += 0.3 * rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors
+
+
+def brute_force_latency(vectors: np.ndarray, queries: np.ndarray, k: int) -> float:
+    """Mean latency (ms) of the current SQLite path: ORDER BY the cosine_distance UDF over zero-padded base64 blobs"""
+    conn = sqlite3.connect(":memory:")
+    conn.create_function("cosine_distance", 2, cosine_distance)
+    conn.execute("CREATE TABLE passages (id TEXT PRIMARY KEY, embedding BLOB)")
+    pad = MAX_EMBEDDING_DIM - vectors.shape[1]
+    conn.executemany(
+        "INSERT INTO passages VALUES (?, ?)",
+        ((f"passage-{i}", adapt_array(np.pad(v, (0, pad)))) for i, v in enumerate(vectors)),
+    )
+    start = time.perf_counter()
+    for q in queries:
+        conn.execute(
+            "SELECT id FROM passages ORDER BY cosine_distance(embedding, ?) LIMIT ?", (adapt_array(np.pad(q, (0, pad))), k)
+        ).fetchall()
+    elapsed = (time.perf_counter() - start) / len(queries)
+    conn.close()
+    return elapsed * 1000
+
+
+@app.command()
+def bench(
+    sizes: Annotated[str, typer.Option(help="Comma separated corpus sizes.")] = "10000,100000,1000000",
+    dim: Annotated[int, typer.Option(help="Embedding dimension.")] = 768,
+    index_type: Annotated[str, typer.Option(help="Vector index type (flat or ivf).")] = "ivf",
+    nprobe: Annotated[int, typer.Option(help="Number of IVF lists scanned per query.")] = 8,
+    k: Annotated[int, typer.Option(help="Number of neighbours per query.")] = 10,
+    n_queries: Annotated[int, typer.Option(help="Number of queries per corpus size.")] = 20,
+    brute_force_max: Annotated[
+        int, typer.Option(help="Largest corpus to run through the SQLite UDF, larger sizes are extrapolated linearly.")
+    ] = 20000,
+):
+    """Compare recall@k and per-query latency of the ANN index against the brute-force SQLite UDF"""
+    rng = np.random.default_rng(0)
+    print(f"{'passages':>10} {'build (s)':>10} {'index (ms)':>11} {'udf (ms)':>12} {'speedup':>9} {'recall@' + str(k):>10}")
+
+    udf_ms_per_row = None
+    for n in [int(s) for s in sizes.split(",")]:
+        vectors = synthetic_embeddings(n, dim, n_clusters=max(16, int(np.sqrt(n))), rng=rng)
+        queries = vectors[rng.choice(n, size=n_queries, replace=False)] + 0.1 * rng.normal(size=(n_queries, dim)).astype(np.float32)
+
+        kwargs = {"nprobe": nprobe} if index_type == "ivf" else {}
+        index = create_vector_index(index_type, dim, **kwargs)
+        start = time.perf_counter()
+        ids = [f"passage-{i}" for i in range(n)]
+        for offset in range(0, n, 10000):
+            index.add(ids[offset : offset + 10000], ["agent"] * len(ids[offset : offset + 10000]), vectors[offset : offset + 10000])
+        build_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = [index.search(q, k, owners=["agent"]) for q in queries]
+        index_ms = (time.perf_counter() - start) / n_queries * 1000
+
+        # ground truth is exact cosine ranking, which is what the UDF path returns
+        normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        recalls = []
+        for q, result in zip(queries, results):
+            truth = set(np.argpartition(-(normed @ (q / np.linalg.norm(q))), k)[:k])
+            recalls.append(len(truth & {int(passage_id.split("-")[1]) for passage_id, _ in result}) / k)
+
+        if n <= brute_force_max:
+            udf_ms = brute_force_latency(vectors, queries[: min(n_queries, 5)], k)
+            udf_ms_per_row = udf_ms / n
+            udf_label = f"{udf_ms:12.1f}"
+        elif udf_ms_per_row is not None:
+            udf_ms = udf_ms_per_row * n
+            udf_label = f"{udf_ms:11.1f}*"
+        else:
+            udf_ms, udf_label = float("nan"), f"{'n/a':>12}"
+
+        print(f"{n:>10} {build_s:>10.2f} {index_ms:>11.2f} {udf_label} {udf_ms / index_ms:>8.0f}x {np.mean(recalls):>10.3f}")
+
+    print("* extrapolated linearly from the largest corpus run through the UDF")
+
+
+if __name__ == "__main__":
+    app()
@@ -1,17 +1,12 @@
-from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional, Union
 
 from letta.agent import Agent
 from letta.interface import AgentInterface
-from letta.prompts import gpt_system
-from letta.schemas.agent import AgentState, AgentType
-from letta.schemas.embedding_config import EmbeddingConfig
-from letta.schemas.llm_config import LLMConfig
-from letta.schemas.memory import BasicBlockMemory, Block
+from letta.schemas.agent import AgentState
 from letta.schemas.message import Message
 from letta.schemas.usage import LettaUsageStatistics
 from letta.schemas.user import User
-from letta.utils import get_persona_text
+from letta.services.memory_consolidation import get_memory_consolidation_service
 
 
 class ChatOnlyAgent(Agent):
@@ -27,7 +22,6 @@ class ChatOnlyAgent(Agent):
         super().__init__(interface, agent_state, user)
         self.first_message_verify_mono = first_message_verify_mono
         self.always_rethink_memory = always_rethink_memory
-        self.offline_memory_agent = None
         self.recent_convo_limit = recent_convo_limit
 
     def step(
@@ -40,62 +34,9 @@ class ChatOnlyAgent(Agent):
         letta_statistics = super().step(messages=messages, chaining=chaining, max_chaining_steps=max_chaining_steps, **kwargs)
 
         if self.always_rethink_memory:
-
-            def generate_offline_memory_agent():
-                from letta.client.client import create_client
-
-                client = create_client()
-                if self.offline_memory_agent:
-                    client.delete_agent(agent_id=self.offline_memory_agent.id)
-                    self.offline_memory_agent = None
-
-                conversation_human_block = self.agent_state.memory.get_block("chat_agent_human")
-                conversation_persona_block = self.agent_state.memory.get_block("chat_agent_persona")
-                offline_persona_block = Block(
-                    name="offline_memory_persona",
-                    label="offline_memory_persona",
-                    value=get_persona_text("offline_memory_persona"),
-                    limit=2000,
-                )
-                conversation_human_block_new = Block(
-                    name="chat_agent_human_new", label="chat_agent_human_new", value=conversation_human_block.value, limit=2000
-                )
-                conversation_persona_block_new = Block(
-                    name="chat_agent_persona_new", label="chat_agent_persona_new", value=conversation_persona_block.value, limit=2000
-                )
-                in_context_messages = self.agent_manager.get_in_context_messages(agent_id=self.agent_state.id, actor=self.user)
-                recent_convo = "".join([str(message) for message in in_context_messages[3:]])[-self.recent_convo_limit :]
-                conversation_messages_block = Block(
-                    name="conversation_block", label="conversation_block", value=recent_convo, limit=self.recent_convo_limit
-                )
-
-                offline_memory = BasicBlockMemory(
-                    blocks=[
-                        offline_persona_block,
-                        conversation_human_block,
-                        conversation_persona_block,
-                        conversation_human_block_new,
-                        conversation_persona_block_new,
-                        conversation_messages_block,
-                    ]
-                )
-
-                self.offline_memory_agent = client.create_agent(
-                    name="offline_memory_agent",
-                    agent_type=AgentType.offline_memory_agent,
-                    system=gpt_system.get_system_text("memgpt_offline_memory_chat"),
-                    memory=offline_memory,
-                    llm_config=LLMConfig.default_config("gpt-4"),
-                    embedding_config=EmbeddingConfig.default_config("text-embedding-ada-002"),
-                    tool_ids=self.agent_state.metadata.get("offline_memory_tools", []),
-                    include_base_tools=False,
-                )
-                self.offline_memory_agent.memory.update_block_value(label="conversation_block", value=recent_convo)
-                client.send_message(agent_id=self.offline_memory_agent.id, message="Reorganize the memory", role="user")
-                client.delete_agent(agent_id=self.offline_memory_agent.id)
-                self.offline_memory_agent = None
-
-            with ThreadPoolExecutor(max_workers=1) as executor:
-                executor.submit(generate_offline_memory_agent)
+            # the offline memory agent runs in the background, this turn doesn't wait for it
+            get_memory_consolidation_service().submit(
+                agent_id=self.agent_state.id, actor=self.user, recent_convo_limit=self.recent_convo_limit
+            )
 
         return letta_statistics
@@ -72,6 +72,41 @@ def server(
         raise NotImplementedError("WS suppport deprecated")
 
 
+def worker(
+    concurrency: Annotated[int, typer.Option(help="Number of runs processed at once")] = 1,
+    debug: Annotated[bool, typer.Option(help="Turn debugging output on")] = False,
+):
+    """Launch a worker process for the background runs created by the REST API (/v1/agents/{agent_id}/messages/async)"""
+    from letta.server.server import SyncServer
+    from letta.services.run_queue import RunWorker, get_run_queue
+    from letta.settings import settings
+
+    if settings.run_queue_backend != "database":
+        typer.secho(
+            f"The {settings.run_queue_backend} run queue is not shared between processes, set LETTA_RUN_QUEUE_BACKEND=database",
+            fg=typer.colors.RED,
+        )
+        sys.exit(1)
+    if debug:
+        logger.setLevel(logging.DEBUG)
+
+    server = SyncServer()
+    worker = RunWorker(
+        server,
+        get_run_queue(server.job_manager),
+        concurrency=concurrency,
+        poll_interval=settings.run_queue_poll_interval,
+        heartbeat_interval=settings.run_queue_heartbeat_interval,
+    )
+    typer.secho(f"Worker {worker.worker_id} waiting for runs...")
+    try:
+        worker.serve_forever()
+    except KeyboardInterrupt:
+        # Handle CTRL-C, serve_forever waits for the runs in progress
+        typer.secho("Terminating the worker...")
+        sys.exit(0)
+
+
 def run(
     persona: Annotated[Optional[str], typer.Option(help="Specify persona")] = None,
     agent: Annotated[Optional[str], typer.Option(help="Specify agent name")] = None,
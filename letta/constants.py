@@ -175,5 +175,10 @@ FUNC_FAILED_HEARTBEAT_MESSAGE = f"{NON_USER_MSG_PREFIX}Function call failed, ret
 
 RETRIEVAL_QUERY_DEFAULT_PAGE_SIZE = 5
 
+# text search configuration of the Postgres full text indexes (messages, passages)
+FULL_TEXT_SEARCH_LANGUAGE = "english"
+# rank offset of reciprocal rank fusion in hybrid archival search, 60 as in the original RRF paper
+RRF_K = 60
+
 MAX_FILENAME_LENGTH = 255
 RESERVED_FILENAMES = {"CON", "PRN", "AUX", "NUL", "COM1", "COM2", "LPT1", "LPT2"}
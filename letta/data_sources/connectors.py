@@ -3,12 +3,13 @@ from typing import Dict, Iterator, List, Tuple
 import typer
 
 from letta.data_sources.connectors_helper import assert_all_files_exist_locally, extract_metadata_from_files, get_filenames_in_dir
-from letta.embeddings import embedding_model
+from letta.embeddings import embed_texts, embedding_model, is_input_error
 from letta.schemas.file import FileMetadata
 from letta.schemas.passage import Passage
 from letta.schemas.source import Source
 from letta.services.passage_manager import PassageManager
 from letta.services.source_manager import SourceManager
+from letta.settings import settings
 
 
 class DataConnector:
@@ -44,35 +45,43 @@ def load_data(connector: DataConnector, source: Source, passage_manager: Passage
     # embedding model
     embed_model = embedding_model(embedding_config)
 
-    # insert passages/file
-    passages = []
+    # passages are embedded in groups of up to `flush_size` texts, which embed_texts splits into concurrent batches
+    flush_size = settings.embedding_batch_size * settings.embedding_max_concurrency
+    pending = []  # (passage_text, passage_metadata, file_metadata) waiting for an embedding
     embedding_to_document_name = {}
     passage_count = 0
     file_count = 0
-    for file_metadata in connector.find_files(source):
-        file_count += 1
-        source_manager.create_file(file_metadata, actor)
-
-        # generate passages
-        for passage_text, passage_metadata in connector.generate_passages(file_metadata, chunk_size=embedding_config.embedding_chunk_size):
-            # for some reason, llama index parsers sometimes return empty strings
-            if len(passage_text) == 0:
-                typer.secho(
-                    f"Warning: Llama index parser returned empty string, skipping insert of passage with metadata '{passage_metadata}' into VectorDB. You can usually ignore this warning.",
-                    fg=typer.colors.YELLOW,
-                )
-                continue
-
-            # get embedding
-            try:
-                embedding = embed_model.get_text_embedding(passage_text)
-            except Exception as e:
-                typer.secho(
-                    f"Warning: Failed to get embedding for {passage_text} (error: {str(e)}), skipping insert into VectorDB.",
-                    fg=typer.colors.YELLOW,
-                )
-                continue
 
+    def embed_pending() -> List[Tuple[str, Dict, FileMetadata, List[float]]]:
+        texts = [passage_text for passage_text, _, _ in pending]
+        try:
+            embeddings = embed_texts(embed_model, texts)
+        except Exception as e:
+            # retry one by one, so a single bad passage only drops itself: other errors (rate limits, an unavailable
+            # provider) were already retried by the client and fail the load instead of dropping the passages
+            if not is_input_error(e):
+                raise
+            typer.secho(
+                f"Warning: Failed to embed a batch of {len(texts)} passages (error: {str(e)}), retrying individually.",
+                fg=typer.colors.YELLOW,
+            )
+            embeddings = []
+            for passage_text in texts:
+                try:
+                    embeddings.append(embed_model.get_text_embedding(passage_text))
+                except Exception as e:
+                    if not is_input_error(e):
+                        raise
+                    typer.secho(
+                        f"Warning: Failed to get embedding for {passage_text} (error: {str(e)}), skipping insert into VectorDB.",
+                        fg=typer.colors.YELLOW,
+                    )
+                    embeddings.append(None)
+        return [(*item, embedding) for item, embedding in zip(pending, embeddings) if embedding is not None]
+
+    def flush_pending() -> int:
+        passages = []
+        for passage_text, passage_metadata, file_metadata, embedding in embed_pending():
             passage = Passage(
                 text=passage_text,
                 file_id=file_metadata.id,
@@ -94,17 +103,33 @@ def load_data(connector: DataConnector, source: Source, passage_manager: Passage
 
             passages.append(passage)
             embedding_to_document_name[hashable_embedding] = file_name
-            if len(passages) >= 100:
-                # insert passages into passage store
-                passage_manager.create_many_passages(passages, actor)
-
-                passage_count += len(passages)
-                passages = []
 
-    if len(passages) > 0:
         # insert passages into passage store
-        passage_manager.create_many_passages(passages, actor)
-        passage_count += len(passages)
+        for offset in range(0, len(passages), 100):
+            passage_manager.create_many_passages(passages[offset : offset + 100], actor)
+        pending.clear()
+        return len(passages)
+
+    for file_metadata in connector.find_files(source):
+        file_count += 1
+        source_manager.create_file(file_metadata, actor)
+
+        # generate passages
+        for passage_text, passage_metadata in connector.generate_passages(file_metadata, chunk_size=embedding_config.embedding_chunk_size):
+            # for some reason, llama index parsers sometimes return empty strings
+            if len(passage_text) == 0:
+                typer.secho(
+                    f"Warning: Llama index parser returned empty string, skipping insert of passage with metadata '{passage_metadata}' into VectorDB. You can usually ignore this warning.",
+                    fg=typer.colors.YELLOW,
+                )
+                continue
+
+            pending.append((passage_text, passage_metadata, file_metadata))
+            if len(pending) >= flush_size:
+                passage_count += flush_pending()
+
+    if len(pending) > 0:
+        passage_count += flush_pending()
 
     return passage_count, file_count
 
@@ -1,14 +1,21 @@
 import uuid
-from typing import Any, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator, List, Optional, Union
 
 import numpy as np
-import tiktoken
 
 from letta.constants import EMBEDDING_TO_TOKENIZER_DEFAULT, EMBEDDING_TO_TOKENIZER_MAP, MAX_EMBEDDING_DIM
+from letta.helpers.http_clients import get_http_client_registry
+from letta.helpers.tokenizer_helpers import get_encoding
 from letta.schemas.embedding_config import EmbeddingConfig
 from letta.utils import is_valid_url, printd
 
 
+def _batched(items: List[Any], batch_size: int) -> Iterator[List[Any]]:
+    for offset in range(0, len(items), batch_size):
+        yield items[offset : offset + batch_size]
+
+
 def parse_and_chunk_text(text: str, chunk_size: int) -> List[str]:
     from llama_index.core import Document as LlamaIndexDocument
     from llama_index.core.node_parser import SentenceSplitter
@@ -29,10 +36,10 @@ def check_and_split_text(text: str, embedding_model: str) -> List[str]:
     """Split text into chunks of max_length tokens or less"""
 
     if embedding_model in EMBEDDING_TO_TOKENIZER_MAP:
-        encoding = tiktoken.get_encoding(EMBEDDING_TO_TOKENIZER_MAP[embedding_model])
+        encoding = get_encoding(EMBEDDING_TO_TOKENIZER_MAP[embedding_model])
     else:
         print(f"Warning: couldn't find tokenizer for model {embedding_model}, using default tokenizer {EMBEDDING_TO_TOKENIZER_DEFAULT}")
-        encoding = tiktoken.get_encoding(EMBEDDING_TO_TOKENIZER_DEFAULT)
+        encoding = get_encoding(EMBEDDING_TO_TOKENIZER_DEFAULT)
 
     num_tokens = len(encoding.encode(text))
 
@@ -59,6 +66,9 @@ def check_and_split_text(text: str, embedding_model: str) -> List[str]:
 class EmbeddingEndpoint:
     """Implementation for OpenAI compatible endpoint"""
 
+    # TEI rejects requests with more inputs than its --max-client-batch-size (32 by default)
+    max_batch_size = 32
+
     # """ Based off llama index https://github.com/run-llama/llama_index/blob/a98bdb8ecee513dc2e880f56674e7fd157d1dc3a/llama_index/embeddings/text_embeddings_inference.py """
 
     # _user: str = PrivateAttr()
@@ -85,56 +95,115 @@ class EmbeddingEndpoint:
         self._base_url = base_url
         self._timeout = timeout
 
-    def _call_api(self, text: str) -> List[float]:
+    def _call_api(self, text: Union[str, List[str]]) -> Union[List[float], List[List[float]]]:
         if not is_valid_url(self._base_url):
             raise ValueError(
                 f"Embeddings endpoint does not have a valid URL (set to: '{self._base_url}'). Make sure embedding_endpoint is set correctly in your Letta config."
             )
-        import httpx
-
         headers = {"Content-Type": "application/json"}
         json_data = {"input": text, "model": self.model_name, "user": self._user}
 
-        with httpx.Client() as client:
-            response = client.post(
+        response = (
+            get_http_client_registry()
+            .httpx_client("embeddings", base_url=self._base_url)
+            .post(
                 f"{self._base_url}/embeddings",
                 headers=headers,
                 json=json_data,
                 timeout=self._timeout,
             )
+        )
 
         response_json = response.json()
 
         if isinstance(response_json, list):
             # embedding directly in response
-            embedding = response_json
+            embeddings = response_json
         elif isinstance(response_json, dict):
             # TEI embedding packaged inside openai-style response
             try:
-                embedding = response_json["data"][0]["embedding"]
-            except (KeyError, IndexError):
+                embeddings = [item["embedding"] for item in sorted(response_json["data"], key=lambda item: item.get("index", 0))]
+            except (KeyError, TypeError):
+                raise TypeError(f"Got back an unexpected payload from text embedding function, response=\n{response_json}")
+            if not embeddings:
                 raise TypeError(f"Got back an unexpected payload from text embedding function, response=\n{response_json}")
         else:
             # unknown response, can't parse
             raise TypeError(f"Got back an unexpected payload from text embedding function, response=\n{response_json}")
 
-        return embedding
+        if isinstance(text, str):
+            # a bare list is either the embedding itself or a one element batch
+            return embeddings[0] if isinstance(embeddings[0], list) else embeddings
+        return embeddings
 
     def get_text_embedding(self, text: str) -> List[float]:
         return self._call_api(text)
 
+    def get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        embeddings = []
+        for batch in _batched(texts, self.max_batch_size):
+            embeddings.extend(self._call_api(batch))
+        return embeddings
+
+
+class OpenAIEmbeddings:
+    """OpenAI (and OpenAI proxy) embeddings through the OpenAI SDK"""
+
+    max_batch_size = 2048
+
+    def __init__(self, api_key: str, base_url: str, model: str, user: Optional[str] = None):
+        from openai import OpenAI
+
+        from letta.settings import settings
+
+        # the SDK retries rate limits, connection errors and 5xx responses with backoff
+        self.client = get_http_client_registry().sdk_client(
+            "openai", OpenAI, api_key=api_key, base_url=base_url, max_retries=settings.embedding_max_retries
+        )
+        self.model = model
+        self.user = user
+
+    def get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        kwargs = {"user": self.user} if self.user else {}
+        embeddings = []
+        for batch in _batched(texts, self.max_batch_size):
+            response = self.client.embeddings.create(input=batch, model=self.model, **kwargs)
+            embeddings.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+        return embeddings
+
+    def get_text_embedding(self, text: str) -> List[float]:
+        return self.get_text_embeddings([text])[0]
+
 
 class AzureOpenAIEmbedding:
+
+    max_batch_size = 2048
+
     def __init__(self, api_endpoint: str, api_key: str, api_version: str, model: str):
         from openai import AzureOpenAI
 
-        self.client = AzureOpenAI(api_key=api_key, api_version=api_version, azure_endpoint=api_endpoint)
+        from letta.settings import settings
+
+        self.client = get_http_client_registry().sdk_client(
+            "azure",
+            AzureOpenAI,
+            api_key=api_key,
+            api_version=api_version,
+            azure_endpoint=api_endpoint,
+            max_retries=settings.embedding_max_retries,
+        )
         self.model = model
 
-    def get_text_embedding(self, text: str):
-        embeddings = self.client.embeddings.create(input=[text], model=self.model).data[0].embedding
+    def get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        embeddings = []
+        for batch in _batched(texts, self.max_batch_size):
+            response = self.client.embeddings.create(input=batch, model=self.model)
+            embeddings.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
         return embeddings
 
+    def get_text_embedding(self, text: str):
+        return self.get_text_embeddings([text])[0]
+
 
 class OllamaEmbeddings:
 
@@ -143,6 +212,14 @@ class OllamaEmbeddings:
     #   "model": "mxbai-embed-large",
     #   "prompt": "Llamas are members of the camelid family"
     # }'
+    #
+    # Batches go to /api/embed, which takes a list of inputs:
+    # curl http://localhost:11434/api/embed -d '{
+    #   "model": "mxbai-embed-large",
+    #   "input": ["Llamas are members of the camelid family", "..."]
+    # }'
+
+    max_batch_size = 64
 
     def __init__(self, model: str, base_url: str, ollama_additional_kwargs: dict):
         self.model = model
@@ -150,43 +227,71 @@ class OllamaEmbeddings:
         self.ollama_additional_kwargs = ollama_additional_kwargs
 
     def get_text_embedding(self, text: str):
-        import httpx
-
         headers = {"Content-Type": "application/json"}
         json_data = {"model": self.model, "prompt": text}
         json_data.update(self.ollama_additional_kwargs)
 
-        with httpx.Client() as client:
-            response = client.post(
+        response = (
+            get_http_client_registry()
+            .httpx_client("ollama", base_url=self.base_url)
+            .post(
                 f"{self.base_url}/api/embeddings",
                 headers=headers,
                 json=json_data,
             )
+        )
 
         response_json = response.json()
         return response_json["embedding"]
 
+    def get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        headers = {"Content-Type": "application/json"}
+        embeddings = []
+        for batch in _batched(texts, self.max_batch_size):
+            json_data = {"model": self.model, "input": batch}
+            json_data.update(self.ollama_additional_kwargs)
+            response = (
+                get_http_client_registry()
+                .httpx_client("ollama", base_url=self.base_url)
+                .post(f"{self.base_url}/api/embed", headers=headers, json=json_data)
+            )
+            response.raise_for_status()
+            embeddings.extend(response.json()["embeddings"])
+        return embeddings
+
 
 class GoogleEmbeddings:
+
+    # batchEmbedContents accepts at most 100 requests per call
+    max_batch_size = 100
+
     def __init__(self, api_key: str, model: str, base_url: str):
         self.api_key = api_key
         self.model = model
         self.base_url = base_url  # Expected to be "https://generativelanguage.googleapis.com"
 
     def get_text_embedding(self, text: str):
-        import httpx
-
         headers = {"Content-Type": "application/json"}
         # Build the URL based on the provided base_url, model, and API key.
         url = f"{self.base_url}/v1beta/models/{self.model}:embedContent?key={self.api_key}"
         payload = {"model": self.model, "content": {"parts": [{"text": text}]}}
-        with httpx.Client() as client:
-            response = client.post(url, headers=headers, json=payload)
+        response = get_http_client_registry().httpx_client("google_ai", base_url=self.base_url).post(url, headers=headers, json=payload)
         # Raise an error for non-success HTTP status codes.
         response.raise_for_status()
         response_json = response.json()
         return response_json["embedding"]["values"]
 
+    def get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        headers = {"Content-Type": "application/json"}
+        url = f"{self.base_url}/v1beta/models/{self.model}:batchEmbedContents?key={self.api_key}"
+        embeddings = []
+        for batch in _batched(texts, self.max_batch_size):
+            payload = {"requests": [{"model": f"models/{self.model}", "content": {"parts": [{"text": text}]}} for text in batch]}
+            response = get_http_client_registry().httpx_client("google_ai", base_url=self.base_url).post(url, headers=headers, json=payload)
+            response.raise_for_status()
+            embeddings.extend(embedding["values"] for embedding in response.json()["embeddings"])
+        return embeddings
+
 
 class GoogleVertexEmbeddings:
 
@@ -201,6 +306,49 @@ class GoogleVertexEmbeddings:
         return response.embeddings[0].embedding
 
 
+def embed_texts(
+    embedding_model, texts: List[str], batch_size: Optional[int] = None, max_concurrency: Optional[int] = None
+) -> List[List[float]]:
+    """
+    Embed `texts` in batches of `batch_size`, with at most `max_concurrency` requests in flight.
+
+    Embeddings are returned in the order of `texts`. Models without a batch API are called once per text.
+    """
+    from letta.settings import settings
+
+    batch_size = batch_size or settings.embedding_batch_size
+    max_concurrency = max_concurrency or settings.embedding_max_concurrency
+    if not texts:
+        return []
+
+    if hasattr(embedding_model, "get_text_embeddings"):
+        embed_batch = embedding_model.get_text_embeddings
+    else:
+        embed_batch = lambda batch: [embedding_model.get_text_embedding(text) for text in batch]
+
+    batches = list(_batched(texts, batch_size))
+    if len(batches) == 1 or max_concurrency <= 1:
+        results = [embed_batch(batch) for batch in batches]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(batches))) as executor:
+            results = list(executor.map(embed_batch, batches))
+
+    embeddings = [embedding for batch in results for embedding in batch]
+    if len(embeddings) != len(texts):
+        raise ValueError(f"Embedding model returned {len(embeddings)} embeddings for {len(texts)} texts")
+    return embeddings
+
+
+def is_input_error(error: Exception) -> bool:
+    """Whether an embedding request was rejected because of its texts (e.g. one over the token limit), rather than the provider"""
+    import httpx
+    import openai
+
+    if isinstance(error, (openai.APIStatusError, httpx.HTTPStatusError)):
+        return error.response.status_code in (400, 413, 422)
+    return False
+
+
 def query_embedding(embedding_model, query_text: str):
     """Generate padded embedding for querying database"""
     query_vec = embedding_model.get_text_embedding(query_text)
@@ -210,7 +358,20 @@ def query_embedding(embedding_model, query_text: str):
 
 
 def embedding_model(config: EmbeddingConfig, user_id: Optional[uuid.UUID] = None):
-    """Return LlamaIndex embedding model to use for embeddings"""
+    """Return the embedding model to use for embeddings, behind the embedding cache unless it is disabled"""
+    from letta.settings import settings
+
+    model = _provider_embedding_model(config, user_id)
+    if settings.embedding_cache_size_mb <= 0 and not settings.embedding_cache_persist:
+        return model
+
+    from letta.services.embedding_cache import CachedEmbeddingModel, get_embedding_cache
+
+    return CachedEmbeddingModel(model, config, get_embedding_cache())
+
+
+def _provider_embedding_model(config: EmbeddingConfig, user_id: Optional[uuid.UUID] = None):
+    """Return the provider's embedding model for `config`"""
 
     endpoint_type = config.embedding_endpoint_type
 
@@ -218,15 +379,12 @@ def embedding_model(config: EmbeddingConfig, user_id: Optional[uuid.UUID] = None
     from letta.settings import model_settings
 
     if endpoint_type == "openai":
-        from llama_index.embeddings.openai import OpenAIEmbedding
-
-        additional_kwargs = {"user_id": user_id} if user_id else {}
-        model = OpenAIEmbedding(
-            api_base=config.embedding_endpoint,
+        return OpenAIEmbeddings(
             api_key=model_settings.openai_api_key,
-            additional_kwargs=additional_kwargs,
+            base_url=config.embedding_endpoint,
+            model=config.embedding_model,
+            user=str(user_id) if user_id else None,
         )
-        return model
 
     elif endpoint_type == "azure":
         assert all(
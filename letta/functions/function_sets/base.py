@@ -20,10 +20,10 @@ def send_message(self: "Agent", message: str) -> Optional[str]:
 
 def conversation_search(self: "Agent", query: str, page: Optional[int] = 0) -> Optional[str]:
     """
-    Search prior conversation history using case-insensitive string matching.
+    Search prior conversation history using full text search, most relevant messages first.
 
     Args:
-        query (str): String to search for.
+        query (str): Words to search for.
         page (int): Allows you to page through results. Only use on a follow-up query. Defaults to 0 (first page).
 
     Returns:
@@ -34,6 +34,7 @@ def conversation_search(self: "Agent", query: str, page: Optional[int] = 0) -> O
 
     from letta.constants import RETRIEVAL_QUERY_DEFAULT_PAGE_SIZE
     from letta.helpers.json_helpers import json_dumps
+    from letta.schemas.enums import MessageRole
 
     if page is None or (isinstance(page, str) and page.lower().strip() == "none"):
         page = 0
@@ -42,15 +43,17 @@ def conversation_search(self: "Agent", query: str, page: Optional[int] = 0) -> O
     except:
         raise ValueError(f"'page' argument must be an integer")
     count = RETRIEVAL_QUERY_DEFAULT_PAGE_SIZE
-    # TODO: add paging by page number. currently cursor only works with strings.
-    # original: start=page * count
-    messages = self.message_manager.list_user_messages_for_agent(
+    messages = self.message_manager.search_messages_for_agent(
         agent_id=self.agent_state.id,
         actor=self.user,
         query_text=query,
+        role=MessageRole.user,
         limit=count,
+        offset=page * count,
+    )
+    total = self.message_manager.search_messages_size(
+        agent_id=self.agent_state.id, actor=self.user, query_text=query, role=MessageRole.user
     )
-    total = len(messages)
     num_pages = math.ceil(total / count) - 1  # 0 index
     if len(messages) == 0:
         results_str = f"No results found."
@@ -82,7 +85,7 @@ def archival_memory_insert(self: "Agent", content: str) -> Optional[str]:
 
 def archival_memory_search(self: "Agent", query: str, page: Optional[int] = 0, start: Optional[int] = 0) -> Optional[str]:
     """
-    Search archival memory using semantic (embedding-based) search.
+    Search archival memory using semantic (embedding-based) search, combined with keyword search.
 
     Args:
         query (str): String to search for.
@@ -105,13 +108,12 @@ def archival_memory_search(self: "Agent", query: str, page: Optional[int] = 0, s
 
     try:
         # Get results using passage manager
-        all_results = self.agent_manager.list_passages(
+        all_results = self.agent_manager.search_passages(
             actor=self.user,
             agent_id=self.agent_state.id,
             query_text=query,
             limit=count + start,  # Request enough results to handle offset
             embedding_config=self.agent_state.embedding_config,
-            embed_query=True,
         )
 
         # Apply pagination
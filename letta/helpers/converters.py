@@ -1,4 +1,3 @@
-import base64
 from typing import Any, Dict, List, Optional, Union
 
 import numpy as np
@@ -6,6 +5,7 @@ from openai.types.chat.chat_completion_message_tool_call import ChatCompletionMe
 from openai.types.chat.chat_completion_message_tool_call import Function as OpenAIFunction
 from sqlalchemy import Dialect
 
+from letta.orm.sqlite_functions import adapt_array, convert_array
 from letta.schemas.embedding_config import EmbeddingConfig
 from letta.schemas.enums import ToolRuleType
 from letta.schemas.llm_config import LLMConfig
@@ -133,21 +133,21 @@ def deserialize_tool_calls(data: Optional[List[Dict]]) -> List[OpenAIToolCall]:
 
 
 def serialize_vector(vector: Optional[Union[List[float], np.ndarray]]) -> Optional[bytes]:
-    """Convert a NumPy array or list into a base64-encoded byte string."""
+    """Convert a NumPy array or list into a raw little-endian byte string (see `letta.orm.sqlite_functions.adapt_array`)."""
     if vector is None:
         return None
     if isinstance(vector, list):
         vector = np.array(vector, dtype=np.float32)
 
-    return base64.b64encode(vector.tobytes())
+    return bytes(adapt_array(vector))
 
 
 def deserialize_vector(data: Optional[bytes], dialect: Dialect) -> Optional[np.ndarray]:
-    """Convert a base64-encoded byte string back into a NumPy array."""
+    """Convert a raw (or legacy base64-encoded) byte string back into a NumPy array."""
     if not data:
         return None
 
     if dialect.name == "sqlite":
-        data = base64.b64decode(data)
+        return convert_array(data)
 
     return np.frombuffer(data, dtype=np.float32)
@@ -0,0 +1,198 @@
+import atexit
+import threading
+from collections import OrderedDict
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from letta.settings import settings
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _origin(url: Optional[str]) -> Optional[str]:
+    """scheme://host[:port] of `url`, connections are pooled per origin anyway"""
+    if not url:
+        return None
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}" if parts.netloc else url
+
+
+def _cookie_jar() -> CookieJar:
+    """A jar that never stores a cookie: the pooled clients are shared by every user and api key of a provider"""
+    return CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+
+
+class HTTPClientRegistry:
+    """
+    Process wide HTTP clients of the LLM and embedding providers, keyed by (provider, origin).
+
+    Every client keeps a pool of keep-alive connections (HTTP/2 when the `h2` package is installed), so the TLS
+    handshake to a provider is paid once per process instead of once per agent step. Api keys are sent as request
+    headers, so one pool serves every key of an origin. Provider SDK clients (OpenAI, Anthropic, ...) are kept in an
+    LRU of `max_sdk_clients` per (provider, base url, api key, options) and all send their requests through the pooled
+    httpx client of their origin: evicting one leaves the shared pool open. Clients don't keep cookies, since they are
+    shared by every api key of their origin.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+        timeout: float = 600.0,
+        http2: bool = True,
+        max_sdk_clients: int = 256,
+    ):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.http2 = http2 and _http2_available()
+        self.max_sdk_clients = max_sdk_clients
+        self._httpx_clients: Dict[Tuple, httpx.Client] = {}
+        self._sessions: Dict[Tuple, requests.Session] = {}
+        self._sdk_clients: "OrderedDict[Tuple, Any]" = OrderedDict()  # least recently used first
+        self._requests: Dict[Tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, key: Tuple) -> None:
+        # dict item assignment is atomic enough for a statistic, no lock on the request path
+        self._requests[key] = self._requests.get(key, 0) + 1
+
+    def httpx_client(self, provider: str, base_url: Optional[str] = None) -> httpx.Client:
+        """Pooled httpx client of (provider, base url), shared by every api key"""
+        key = ("httpx", provider, _origin(base_url))
+        client = self._httpx_clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._httpx_clients.get(key)
+                if client is None:
+                    client = self._httpx_clients[key] = httpx.Client(
+                        limits=httpx.Limits(
+                            max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_keepalive_connections,
+                            keepalive_expiry=self.keepalive_expiry,
+                        ),
+                        timeout=httpx.Timeout(self.timeout, connect=10.0),
+                        http2=self.http2,
+                        cookies=_cookie_jar(),
+                        event_hooks={"request": [lambda request: self._count(key)]},
+                    )
+        return client
+
+    def requests_session(self, provider: str, base_url: Optional[str] = None) -> requests.Session:
+        """Pooled `requests` session of (provider, base url), for the call sites built on `requests`"""
+        key = ("requests", provider, _origin(base_url))
+        session = self._sessions.get(key)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(key)
+                if session is None:
+                    session = requests.Session()
+                    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                    # retries stay with the callers (retry_with_exponential_backoff), the adapter only pools
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_keepalive_connections, max_retries=0)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    session.hooks["response"].append(lambda response, *args, **kwargs: self._count(key))
+                    self._sessions[key] = session
+        return session
+
+    def sdk_client(self, provider: str, cls, api_key: Optional[str] = None, base_url: Optional[str] = None, **kwargs):
+        """
+        Cached provider SDK client `cls(api_key=..., base_url=..., **kwargs)` on the pooled httpx client of its origin.
+
+        `base_url` is only passed on when set, so SDKs keep their own default endpoint otherwise.
+        """
+        key = (cls.__module__, cls.__name__, provider, base_url, api_key, *sorted(kwargs.items()))
+        with self._lock:
+            client = self._sdk_clients.get(key)
+            if client is not None:
+                self._sdk_clients.move_to_end(key)
+                return client
+        http_client = self.httpx_client(provider, base_url=base_url or kwargs.get("azure_endpoint"))
+        with self._lock:
+            client = self._sdk_clients.get(key)
+            if client is None:
+                if base_url:
+                    kwargs["base_url"] = base_url
+                client = self._sdk_clients[key] = cls(api_key=api_key, http_client=http_client, **kwargs)
+                # not closed: the evicted client only holds a reference to the shared httpx client
+                while len(self._sdk_clients) > self.max_sdk_clients:
+                    self._sdk_clients.popitem(last=False)
+        return client
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Requests sent and connections held per client, keyed by "<kind> <provider> <origin>" """
+        stats = {}
+        with self._lock:
+            httpx_clients = list(self._httpx_clients.items())
+            sessions = list(self._sessions.items())
+        for key, client in httpx_clients:
+            connections = getattr(getattr(client._transport, "_pool", None), "connections", [])
+            stats[self._name(key)] = {
+                "requests": self._requests.get(key, 0),
+                "connections": len(connections),
+                "idle_connections": sum(1 for connection in connections if connection.is_idle()),
+                "http2": self.http2,
+            }
+        for key, session in sessions:
+            pools = [pool for adapter in set(session.adapters.values()) for pool in adapter.poolmanager.pools._container.values()]
+            stats[self._name(key)] = {
+                "requests": self._requests.get(key, 0),
+                "connections": sum(pool.num_connections for pool in pools),
+                # urllib3 fills the queue of a pool with None placeholders for connections it has not opened yet
+                "idle_connections": sum(1 for pool in pools if pool.pool is not None for conn in list(pool.pool.queue) if conn is not None),
+                "http2": False,
+            }
+        return stats
+
+    @staticmethod
+    def _name(key: Tuple) -> str:
+        kind, provider, origin = key
+        return f"{kind} {provider} {origin or '-'}"
+
+    def close(self) -> None:
+        """Close every pooled connection and forget all clients"""
+        with self._lock:
+            httpx_clients, self._httpx_clients = list(self._httpx_clients.values()), {}
+            sessions, self._sessions = list(self._sessions.values()), {}
+            self._sdk_clients = OrderedDict()
+            self._requests = {}
+        for client in httpx_clients:
+            client.close()
+        for session in sessions:
+            session.close()
+
+
+_registry: Optional[HTTPClientRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_http_client_registry() -> HTTPClientRegistry:
+    """Process wide registry used by the LLM and embedding clients"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = HTTPClientRegistry(
+                    max_connections=settings.http_max_connections,
+                    max_keepalive_connections=settings.http_max_keepalive_connections,
+                    keepalive_expiry=settings.http_keepalive_expiry,
+                    timeout=settings.http_timeout,
+                    http2=settings.http2,
+                    max_sdk_clients=settings.http_max_sdk_clients,
+                )
+                atexit.register(_registry.close)
+    return _registry
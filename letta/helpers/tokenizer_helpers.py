@@ -0,0 +1,54 @@
+import os
+from functools import lru_cache
+from typing import List, Optional
+
+import tiktoken
+
+from letta.log import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_ENCODING = "cl100k_base"
+
+# encode_many only fans out to threads for batches with at least this many characters
+ENCODE_MANY_MIN_CHARS = 50_000
+ENCODE_MANY_MAX_THREADS = 8
+
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name: str) -> tiktoken.Encoding:
+    """Return the tiktoken encoding `encoding_name`, loaded once per process"""
+    return tiktoken.get_encoding(encoding_name)
+
+
+@lru_cache(maxsize=None)
+def encoding_for_model(model: str) -> tiktoken.Encoding:
+    """
+    Return the tiktoken encoding of `model`, resolved once per model.
+
+    Models tiktoken doesn't know (local, Anthropic, Google, ...) are approximated with `DEFAULT_ENCODING`.
+    """
+    try:
+        encoding_name = tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        logger.debug(f"No tiktoken encoding for model {model}, using {DEFAULT_ENCODING}")
+        encoding_name = DEFAULT_ENCODING
+    return get_encoding(encoding_name)
+
+
+def encode_many(texts: List[str], model: str = "gpt-4", num_threads: Optional[int] = None) -> List[List[int]]:
+    """
+    Encode `texts` with tiktoken's multi-threaded `encode_batch`.
+
+    Small batches, and machines with a single core, are encoded sequentially: `encode_batch` starts a thread pool per
+    call, which costs more than it saves there.
+    """
+    encoding = encoding_for_model(model)
+    num_threads = num_threads or min(os.cpu_count() or 1, ENCODE_MANY_MAX_THREADS)
+    if num_threads <= 1 or len(texts) < 2 or sum(len(text) for text in texts) < ENCODE_MANY_MIN_CHARS:
+        return [encoding.encode(text) for text in texts]
+    return encoding.encode_batch(texts, num_threads=num_threads)
+
+
+def count_tokens_many(texts: List[str], model: str = "gpt-4", num_threads: Optional[int] = None) -> List[int]:
+    return [len(tokens) for tokens in encode_many(texts, model=model, num_threads=num_threads)]
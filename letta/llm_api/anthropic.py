@@ -19,6 +19,7 @@ from anthropic.types.beta import (
 
 from letta.errors import BedrockError, BedrockPermissionError
 from letta.helpers.datetime_helpers import get_utc_time
+from letta.helpers.http_clients import get_http_client_registry
 from letta.llm_api.aws_bedrock import get_bedrock_client
 from letta.llm_api.helpers import add_inner_thoughts_to_functions
 from letta.local_llm.constants import INNER_THOUGHTS_KWARG, INNER_THOUGHTS_KWARG_DESCRIPTION
@@ -104,9 +105,9 @@ def anthropic_get_model_list(url: str, api_key: Union[str, None]) -> dict:
 
     anthropic_override_key = ProviderManager().get_anthropic_override_key()
     if anthropic_override_key:
-        anthropic_client = anthropic.Anthropic(api_key=anthropic_override_key)
+        anthropic_client = get_http_client_registry().sdk_client("anthropic", anthropic.Anthropic, api_key=anthropic_override_key)
     elif model_settings.anthropic_api_key:
-        anthropic_client = anthropic.Anthropic()
+        anthropic_client = get_http_client_registry().sdk_client("anthropic", anthropic.Anthropic)
 
     models = anthropic_client.models.list()
     models_json = models.model_dump()
@@ -669,9 +670,9 @@ def anthropic_chat_completions_request(
     anthropic_client = None
     anthropic_override_key = ProviderManager().get_anthropic_override_key()
     if anthropic_override_key:
-        anthropic_client = anthropic.Anthropic(api_key=anthropic_override_key)
+        anthropic_client = get_http_client_registry().sdk_client("anthropic", anthropic.Anthropic, api_key=anthropic_override_key)
     elif model_settings.anthropic_api_key:
-        anthropic_client = anthropic.Anthropic()
+        anthropic_client = get_http_client_registry().sdk_client("anthropic", anthropic.Anthropic)
     data = _prepare_anthropic_request(
         data=data,
         inner_thoughts_xml_tag=inner_thoughts_xml_tag,
@@ -726,9 +727,9 @@ def anthropic_chat_completions_request_stream(
 
     anthropic_override_key = ProviderManager().get_anthropic_override_key()
     if anthropic_override_key:
-        anthropic_client = anthropic.Anthropic(api_key=anthropic_override_key)
+        anthropic_client = get_http_client_registry().sdk_client("anthropic", anthropic.Anthropic, api_key=anthropic_override_key)
     elif model_settings.anthropic_api_key:
-        anthropic_client = anthropic.Anthropic()
+        anthropic_client = get_http_client_registry().sdk_client("anthropic", anthropic.Anthropic)
 
     with anthropic_client.beta.messages.stream(
         **data,
@@ -120,7 +120,7 @@ def azure_openai_chat_completions_request(
         data.pop("tool_choice", None)  # extra safe,  should exist always (default="auto")
 
     url = get_azure_chat_completions_endpoint(model_settings.azure_base_url, llm_config.model, model_settings.azure_api_version)
-    response_json = make_post_request(url, headers, data)
+    response_json = make_post_request(url, headers, data, provider="azure")
     # NOTE: azure openai does not include "content" in the response when it is None, so we need to add it
     if "content" not in response_json["choices"][0].get("message"):
         response_json["choices"][0]["message"]["content"] = None
@@ -136,5 +136,5 @@ def azure_openai_embeddings_request(
     url = f"https://{resource_name}.openai.azure.com/openai/deployments/{deployment_id}/embeddings?api-version={api_version}"
     headers = {"Content-Type": "application/json", "api-key": f"{api_key}"}
 
-    response_json = make_post_request(url, headers, data)
+    response_json = make_post_request(url, headers, data, provider="azure")
     return EmbeddingResponse(**response_json)
@@ -5,6 +5,7 @@ from typing import List, Optional, Union
 import requests
 
 from letta.helpers.datetime_helpers import get_utc_time
+from letta.helpers.http_clients import get_http_client_registry
 from letta.helpers.json_helpers import json_dumps
 from letta.local_llm.utils import count_tokens
 from letta.schemas.message import Message
@@ -370,7 +371,7 @@ def cohere_chat_completions_request(
 
     printd(f"Sending request to {url}")
     try:
-        response = requests.post(url, headers=headers, json=data)
+        response = get_http_client_registry().requests_session("cohere", base_url=url).post(url, headers=headers, json=data)
         printd(f"response = {response}")
         response.raise_for_status()  # Raises HTTPError for 4XX/5XX status
         response = response.json()  # convert to dict from string
@@ -422,7 +422,7 @@ def google_ai_chat_completions_request(
     if add_postfunc_model_messages:
         data["contents"] = add_dummy_model_messages(data["contents"])
 
-    response_json = make_post_request(url, headers, data)
+    response_json = make_post_request(url, headers, data, provider="google_ai")
     try:
         return convert_google_ai_response_to_chatcompletion(
             response_json=response_json,
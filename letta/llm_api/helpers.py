@@ -2,16 +2,18 @@ import copy
 import json
 import warnings
 from collections import OrderedDict
-from typing import Any, List, Union
+from typing import Any, Iterable, Iterator, List, Optional, Union
 
 import requests
 
 from letta.constants import OPENAI_CONTEXT_WINDOW_ERROR_SUBSTRING
+from letta.helpers.http_clients import get_http_client_registry
 from letta.helpers.json_helpers import json_dumps
+from letta.local_llm.utils import REPLY_PRIMING_TOKENS, message_token_params, num_tokens_per_message
 from letta.schemas.message import Message
 from letta.schemas.openai.chat_completion_response import ChatCompletionResponse, Choice
 from letta.settings import summarizer_settings
-from letta.utils import count_tokens, printd
+from letta.utils import printd
 
 
 def _convert_to_structured_output_helper(property: dict) -> dict:
@@ -134,11 +136,30 @@ def convert_to_structured_output(openai_function: dict, allow_optional: bool = F
     return structured_output
 
 
-def make_post_request(url: str, headers: dict[str, str], data: dict[str, Any]) -> dict[str, Any]:
+def iter_sse_data(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Data of each event of a server-sent event stream (https://html.spec.whatwg.org/multipage/server-sent-events.html).
+
+    Multi-line data is joined with newlines. Comments and the event / id / retry fields are skipped, providers only send
+    their payloads as data.
+    """
+    data = []
+    for line in lines:
+        if not line:
+            if data:
+                yield "\n".join(data)
+                data = []
+        elif line.startswith("data:"):
+            data.append(line[6:] if line.startswith("data: ") else line[5:])
+    if data:
+        yield "\n".join(data)
+
+
+def make_post_request(url: str, headers: dict[str, str], data: dict[str, Any], provider: str = "http") -> dict[str, Any]:
     printd(f"Sending request to {url}")
     try:
         # Make the POST request
-        response = requests.post(url, headers=headers, json=data)
+        response = get_http_client_registry().requests_session(provider, base_url=url).post(url, headers=headers, json=data)
         printd(f"Response status code: {response.status_code}")
 
         # Raise for 4XX/5XX HTTP errors
@@ -306,8 +327,6 @@ def calculate_summarizer_cutoff(in_context_messages: List[Message], token_counts
             f"Given in_context_messages has different length from given token_counts: {len(in_context_messages)} != {len(token_counts)}"
         )
 
-    in_context_messages_openai = [m.to_openai_dict() for m in in_context_messages]
-
     if summarizer_settings.evict_all_messages:
         logger.info("Evicting all messages...")
         return len(in_context_messages)
@@ -320,21 +339,21 @@ def calculate_summarizer_cutoff(in_context_messages: List[Message], token_counts
 
         tokens_so_far = 0
         cutoff = 0
-        for i, msg in enumerate(in_context_messages_openai):
+        for i, msg in enumerate(in_context_messages):
             # Skip system
             if i == 0:
                 continue
             cutoff = i
             tokens_so_far += token_counts[i]
 
-            if msg["role"] not in ["user", "tool", "function"] and tokens_so_far >= desired_token_count_to_summarize:
+            if msg.role not in ["user", "tool", "function"] and tokens_so_far >= desired_token_count_to_summarize:
                 # Break if the role is NOT a user or tool/function and tokens_so_far is enough
                 break
             elif len(in_context_messages) - cutoff - 1 <= summarizer_settings.keep_last_n_messages:
                 # Also break if we reached the `keep_last_n_messages` threshold
                 # NOTE: This may be on a user, tool, or function in theory
                 logger.warning(
-                    f"Breaking summary cutoff early on role={msg['role']} because we hit the `keep_last_n_messages`={summarizer_settings.keep_last_n_messages}"
+                    f"Breaking summary cutoff early on role={msg.role} because we hit the `keep_last_n_messages`={summarizer_settings.keep_last_n_messages}"
                 )
                 break
 
@@ -342,10 +361,28 @@ def calculate_summarizer_cutoff(in_context_messages: List[Message], token_counts
         return cutoff + 1
 
 
-def get_token_counts_for_messages(in_context_messages: List[Message]) -> List[int]:
-    in_context_messages_openai = [m.to_openai_dict() for m in in_context_messages]
-    token_counts = [count_tokens(str(msg)) for msg in in_context_messages_openai]
-    return token_counts
+def get_token_counts_for_messages(in_context_messages: List[Message], model: Optional[str] = None) -> List[int]:
+    """
+    Per message token counts, as summed by `num_tokens_from_messages`.
+
+    A count is stored on `Message.token_count` the first time a message is counted (and persisted with the message), so
+    only messages that were never counted are tokenized. Models with a different message framing are counted fresh.
+    """
+    cacheable = model is None or message_token_params(model) == message_token_params()
+    uncounted = [message for message in in_context_messages if not cacheable or message.token_count is None]
+    if not cacheable:
+        return num_tokens_per_message([message.to_openai_dict() for message in uncounted], model=model)
+
+    # the messages that were never counted are tokenized together in one batch
+    new_counts = num_tokens_per_message([message.to_openai_dict() for message in uncounted], model=model or "gpt-4")
+    for message, token_count in zip(uncounted, new_counts):
+        message.token_count = token_count
+    return [message.token_count for message in in_context_messages]
+
+
+def count_prompt_tokens(messages: List[Message], model: Optional[str] = None) -> int:
+    """Same as `num_tokens_from_messages` on the OpenAI dicts of `messages`, reusing stored per message counts"""
+    return sum(get_token_counts_for_messages(messages, model=model)) + REPLY_PRIMING_TOKENS
 
 
 def is_context_overflow_error(exception: Union[requests.exceptions.RequestException, Exception]) -> bool:
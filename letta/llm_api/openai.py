@@ -1,10 +1,13 @@
+import json
 import warnings
 from typing import Generator, List, Optional, Union
 
 import requests
-from openai import OpenAI
+from openai import APIError, OpenAI
+from pydantic import ValidationError
 
-from letta.llm_api.helpers import add_inner_thoughts_to_functions, convert_to_structured_output, make_post_request
+from letta.helpers.http_clients import get_http_client_registry
+from letta.llm_api.helpers import add_inner_thoughts_to_functions, convert_to_structured_output, iter_sse_data, make_post_request
 from letta.local_llm.constants import INNER_THOUGHTS_KWARG, INNER_THOUGHTS_KWARG_DESCRIPTION, INNER_THOUGHTS_KWARG_DESCRIPTION_GO_FIRST
 from letta.local_llm.utils import num_tokens_from_functions, num_tokens_from_messages
 from letta.log import get_logger
@@ -53,7 +56,7 @@ def openai_get_model_list(
     response = None
     try:
         # TODO add query param "tool" to be true
-        response = requests.get(url, headers=headers, params=extra_params)
+        response = get_http_client_registry().requests_session("openai", base_url=url).get(url, headers=headers, params=extra_params)
         response.raise_for_status()  # Raises HTTPError for 4XX/5XX status
         response = response.json()  # convert to dict from string
         printd(f"response = {response}")
@@ -403,13 +406,30 @@ def openai_chat_completions_request_stream(
     api_key: str,
     chat_completion_request: ChatCompletionRequest,
 ) -> Generator[ChatCompletionChunkResponse, None, None]:
+    """
+    Stream a ChatCompletion from an OpenAI-compatible server.
+
+    The SDK only sends the request (and maps HTTP errors to its exceptions), the SSE body is read raw and every event is
+    validated straight from its JSON into a `ChatCompletionChunkResponse`, instead of being parsed into an SDK object,
+    dumped to a dict and validated again.
+    """
     data = prepare_openai_payload(chat_completion_request)
     data["stream"] = True
-    client = OpenAI(api_key=api_key, base_url=url, max_retries=0)
-    stream = client.chat.completions.create(**data)
-    for chunk in stream:
-        # TODO: Use the native OpenAI objects here?
-        yield ChatCompletionChunkResponse(**chunk.model_dump(exclude_none=True))
+    client = get_http_client_registry().sdk_client("openai", OpenAI, api_key=api_key, base_url=url, max_retries=0)
+    with client.chat.completions.with_streaming_response.create(**data) as response:
+        for event_data in iter_sse_data(response.iter_lines()):
+            if event_data.startswith("[DONE]"):
+                break
+            try:
+                yield ChatCompletionChunkResponse.model_validate_json(event_data)
+            except ValidationError:
+                error = json.loads(event_data).get("error") if event_data.startswith("{") else None
+                if error:
+                    message = error.get("message") if isinstance(error, dict) else str(error)
+                    raise APIError(
+                        message=message or "An error occurred during streaming", request=response.http_response.request, body=error
+                    )
+                raise
 
 
 def openai_chat_completions_request(
@@ -425,7 +445,7 @@ def openai_chat_completions_request(
     https://platform.openai.com/docs/guides/text-generation?lang=curl
     """
     data = prepare_openai_payload(chat_completion_request)
-    client = OpenAI(api_key=api_key, base_url=url, max_retries=0)
+    client = get_http_client_registry().sdk_client("openai", OpenAI, api_key=api_key, base_url=url, max_retries=0)
     chat_completion = client.chat.completions.create(**data)
     return ChatCompletionResponse(**chat_completion.model_dump())
 
@@ -435,7 +455,7 @@ def openai_embeddings_request(url: str, api_key: str, data: dict) -> EmbeddingRe
 
     url = smart_urljoin(url, "embeddings")
     headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
-    response_json = make_post_request(url, headers, data)
+    response_json = make_post_request(url, headers, data, provider="openai")
     return EmbeddingResponse(**response_json)
 
 
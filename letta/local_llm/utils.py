@@ -1,9 +1,6 @@
 import os
 import warnings
-from typing import List, Union
-
-import requests
-import tiktoken
+from typing import List, Tuple, Union
 
 import letta.local_llm.llm_chat_completion_wrappers.airoboros as airoboros
 import letta.local_llm.llm_chat_completion_wrappers.chatml as chatml
@@ -11,6 +8,8 @@ import letta.local_llm.llm_chat_completion_wrappers.configurable_wrapper as conf
 import letta.local_llm.llm_chat_completion_wrappers.dolphin as dolphin
 import letta.local_llm.llm_chat_completion_wrappers.llama3 as llama3
 import letta.local_llm.llm_chat_completion_wrappers.zephyr as zephyr
+from letta.helpers.http_clients import get_http_client_registry
+from letta.helpers.tokenizer_helpers import count_tokens_many, encoding_for_model
 from letta.log import get_logger
 from letta.schemas.openai.chat_completion_request import Tool, ToolCall
 
@@ -19,24 +18,25 @@ logger = get_logger(__name__)
 
 def post_json_auth_request(uri, json_payload, auth_type, auth_key):
     """Send a POST request with a JSON payload and optional authentication"""
+    session = get_http_client_registry().requests_session("local_llm", base_url=uri)
 
     # By default most local LLM inference servers do not have authorization enabled
     if auth_type is None or auth_type == "":
-        response = requests.post(uri, json=json_payload)
+        response = session.post(uri, json=json_payload)
 
     # Used by OpenAI, together.ai, Mistral AI
     elif auth_type == "bearer_token":
         if auth_key is None:
             raise ValueError(f"auth_type is {auth_type}, but auth_key is null")
         headers = {"Content-Type": "application/json", "Authorization": f"Bearer {auth_key}"}
-        response = requests.post(uri, json=json_payload, headers=headers)
+        response = session.post(uri, json=json_payload, headers=headers)
 
     # Used by OpenAI Azure
     elif auth_type == "api_key":
         if auth_key is None:
             raise ValueError(f"auth_type is {auth_type}, but auth_key is null")
         headers = {"Content-Type": "application/json", "api-key": f"{auth_key}"}
-        response = requests.post(uri, json=json_payload, headers=headers)
+        response = session.post(uri, json=json_payload, headers=headers)
 
     else:
         raise ValueError(f"Unsupport authentication type: {auth_type}")
@@ -77,10 +77,13 @@ def load_grammar_file(grammar):
     return grammar_str
 
 
+# tokens added once per prompt by num_tokens_from_messages, on top of the per message counts
+REPLY_PRIMING_TOKENS = 3
+
+
 # TODO: support tokenizers/tokenizer apis available in local models
 def count_tokens(s: str, model: str = "gpt-4") -> int:
-    encoding = tiktoken.encoding_for_model(model)
-    return len(encoding.encode(s))
+    return len(encoding_for_model(model).encode(s))
 
 
 def num_tokens_from_functions(functions: List[dict], model: str = "gpt-4"):
@@ -88,13 +91,7 @@ def num_tokens_from_functions(functions: List[dict], model: str = "gpt-4"):
 
     Copied from https://community.openai.com/t/how-to-calculate-the-tokens-when-using-function-call/266573/11
     """
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        from letta.utils import printd
-
-        printd(f"Warning: model not found. Using cl100k_base encoding.")
-        encoding = tiktoken.get_encoding("cl100k_base")
+    encoding = encoding_for_model(model)
 
     num_tokens = 0
     for function in functions:
@@ -155,11 +152,7 @@ def num_tokens_from_tool_calls(tool_calls: Union[List[dict], List[ToolCall]], mo
         }
     }]
     """
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        # print("Warning: model not found. Using cl100k_base encoding.")
-        encoding = tiktoken.get_encoding("cl100k_base")
+    encoding = encoding_for_model(model)
 
     num_tokens = 0
     for tool_call in tool_calls:
@@ -190,23 +183,8 @@ def num_tokens_from_tool_calls(tool_calls: Union[List[dict], List[ToolCall]], mo
     return num_tokens
 
 
-def num_tokens_from_messages(messages: List[dict], model: str = "gpt-4") -> int:
-    """Return the number of tokens used by a list of messages.
-
-    From: https://github.com/openai/openai-cookbook/blob/main/examples/How_to_count_tokens_with_tiktoken.ipynb
-
-    For counting tokens in function calling RESPONSES, see:
-        https://hmarr.com/blog/counting-openai-tokens/, https://github.com/hmarr/openai-chat-tokens
-
-    For counting tokens in function calling REQUESTS, see:
-        https://community.openai.com/t/how-to-calculate-the-tokens-when-using-function-call/266573/11
-    """
-    try:
-        # Attempt to search for the encoding based on the model string
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        # print("Warning: model not found. Using cl100k_base encoding.")
-        encoding = tiktoken.get_encoding("cl100k_base")
+def message_token_params(model: str = "gpt-4") -> Tuple[str, int, int]:
+    """Return (model, tokens_per_message, tokens_per_name) used to count the tokens of a chat message for `model`"""
     if model in {
         "gpt-3.5-turbo-0613",
         "gpt-3.5-turbo-16k-0613",
@@ -215,53 +193,82 @@ def num_tokens_from_messages(messages: List[dict], model: str = "gpt-4") -> int:
         "gpt-4-0613",
         "gpt-4-32k-0613",
     }:
-        tokens_per_message = 3
-        tokens_per_name = 1
+        return model, 3, 1
     elif model == "gpt-3.5-turbo-0301":
-        tokens_per_message = 4  # every message follows <|start|>{role/name}\n{content}<|end|>\n
-        tokens_per_name = -1  # if there's a name, the role is omitted
+        # every message follows <|start|>{role/name}\n{content}<|end|>\n
+        # if there's a name, the role is omitted
+        return model, 4, -1
     elif "gpt-3.5-turbo" in model:
         # print("Warning: gpt-3.5-turbo may update over time. Returning num tokens assuming gpt-3.5-turbo-0613.")
-        return num_tokens_from_messages(messages, model="gpt-3.5-turbo-0613")
+        return message_token_params("gpt-3.5-turbo-0613")
     elif "gpt-4" in model:
         # print("Warning: gpt-4 may update over time. Returning num tokens assuming gpt-4-0613.")
-        return num_tokens_from_messages(messages, model="gpt-4-0613")
+        return message_token_params("gpt-4-0613")
     else:
         from letta.utils import printd
 
         printd(
             f"num_tokens_from_messages() is not implemented for model {model}. See https://github.com/openai/openai-python/blob/main/chatml.md for information on how messages are converted to tokens."
         )
-        return num_tokens_from_messages(messages, model="gpt-4-0613")
+        return message_token_params("gpt-4-0613")
         # raise NotImplementedError(
         # f"""num_tokens_from_messages() is not implemented for model {model}. See https://github.com/openai/openai-python/blob/main/chatml.md for information on how messages are converted to tokens."""
         # )
-    num_tokens = 0
-    for message in messages:
-        num_tokens += tokens_per_message
+
+
+def num_tokens_from_message(message: dict, model: str = "gpt-4") -> int:
+    """Return the number of tokens one message adds to a prompt (see `num_tokens_from_messages`)"""
+    return num_tokens_per_message([message], model=model)[0]
+
+
+def num_tokens_per_message(messages: List[dict], model: str = "gpt-4") -> List[int]:
+    """Per message token counts of `messages`, with the text of all messages encoded in one `encode_many` batch"""
+    model, tokens_per_message, tokens_per_name = message_token_params(model)
+
+    num_tokens = []
+    texts, text_owners = [], []
+    for i, message in enumerate(messages):
+        message_tokens = tokens_per_message
         for key, value in message.items():
-            try:
+            if isinstance(value, list) and key == "tool_calls":
+                message_tokens += num_tokens_from_tool_calls(tool_calls=value, model=model)
+                # special case for tool calling (list)
+                # num_tokens += len(encoding.encode(value["name"]))
+                # num_tokens += len(encoding.encode(value["arguments"]))
+
+            elif value is not None:
+                if not isinstance(value, str):
+                    raise ValueError(f"Message has non-string value: {key} with value: {value} - message={message}")
+                texts.append(value)
+                text_owners.append(i)
+
+            if key == "name":
+                message_tokens += tokens_per_name
+        num_tokens.append(message_tokens)
+
+    try:
+        text_token_counts = count_tokens_many(texts, model=model)
+    except TypeError as e:
+        print(f"tiktoken encoding failed on: {texts}")
+        raise e
+    for i, text_tokens in zip(text_owners, text_token_counts):
+        num_tokens[i] += text_tokens
+    return num_tokens
 
-                if isinstance(value, list) and key == "tool_calls":
-                    num_tokens += num_tokens_from_tool_calls(tool_calls=value, model=model)
-                    # special case for tool calling (list)
-                    # num_tokens += len(encoding.encode(value["name"]))
-                    # num_tokens += len(encoding.encode(value["arguments"]))
 
-                else:
-                    if value is not None:
-                        if not isinstance(value, str):
-                            raise ValueError(f"Message has non-string value: {key} with value: {value} - message={message}")
-                        num_tokens += len(encoding.encode(value))
+def num_tokens_from_messages(messages: List[dict], model: str = "gpt-4") -> int:
+    """Return the number of tokens used by a list of messages.
 
-                if key == "name":
-                    num_tokens += tokens_per_name
+    From: https://github.com/openai/openai-cookbook/blob/main/examples/How_to_count_tokens_with_tiktoken.ipynb
 
-            except TypeError as e:
-                print(f"tiktoken encoding failed on: {value}")
-                raise e
+    For counting tokens in function calling RESPONSES, see:
+        https://hmarr.com/blog/counting-openai-tokens/, https://github.com/hmarr/openai-chat-tokens
 
-    num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
+    For counting tokens in function calling REQUESTS, see:
+        https://community.openai.com/t/how-to-calculate-the-tokens-when-using-function-call/266573/11
+    """
+    num_tokens = sum(num_tokens_per_message(messages, model=model))
+    num_tokens += REPLY_PRIMING_TOKENS  # every reply is primed with <|start|>assistant<|message|>
     return num_tokens
 
 
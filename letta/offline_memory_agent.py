@@ -1,3 +1,4 @@
+import time
 from typing import List, Optional, Union
 
 from letta.agent import Agent, AgentState, save_agent
@@ -129,10 +130,12 @@ class OfflineMemoryAgent(Agent):
         # extras
         first_message_verify_mono: bool = False,
         max_memory_rethinks: int = 10,
+        time_budget: Optional[float] = None,  # seconds, no new rethink is started once they are spent
     ):
         super().__init__(interface, agent_state, user)
         self.first_message_verify_mono = first_message_verify_mono
         self.max_memory_rethinks = max_memory_rethinks
+        self.time_budget = time_budget
 
     def step(
         self,
@@ -146,9 +149,15 @@ class OfflineMemoryAgent(Agent):
         counter = 0
         total_usage = UsageStatistics()
         step_count = 0
+        deadline = time.monotonic() + self.time_budget if self.time_budget else None
 
         while counter < self.max_memory_rethinks:
             if counter > 0:
+                if deadline is not None and time.monotonic() >= deadline:
+                    self.logger.warning(
+                        f"Stopped rethinking memory after {step_count} steps, the time budget of {self.time_budget}s is spent"
+                    )
+                    break
                 next_input_message = []
             kwargs["first_message"] = False
             step_response = self.inner_step(
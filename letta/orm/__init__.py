@@ -3,14 +3,17 @@ from letta.orm.agents_tags import AgentsTags
 from letta.orm.base import Base
 from letta.orm.block import Block
 from letta.orm.blocks_agents import BlocksAgents
+from letta.orm.embedding_cache import EmbeddingCacheEntry
 from letta.orm.file import FileMetadata
 from letta.orm.identities_agents import IdentitiesAgents
 from letta.orm.identity import Identity
 from letta.orm.job import Job
 from letta.orm.job_messages import JobMessage
 from letta.orm.message import Message
+from letta.orm.messages_agents import MessagesAgents
 from letta.orm.organization import Organization
 from letta.orm.passage import AgentPassage, BasePassage, SourcePassage
+from letta.orm.pending_summary import PendingSummary
 from letta.orm.provider import Provider
 from letta.orm.sandbox_config import AgentEnvironmentVariable, SandboxConfig, SandboxEnvironmentVariable
 from letta.orm.source import Source
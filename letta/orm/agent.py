@@ -1,13 +1,14 @@
 import uuid
-from typing import TYPE_CHECKING, List, Optional
+from typing import TYPE_CHECKING, Dict, List, Literal, Optional, Tuple
 
 from sqlalchemy import JSON, Boolean, Index, String
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, lazyload, mapped_column, raiseload, relationship, selectinload
 
 from letta.orm.block import Block
 from letta.orm.custom_columns import EmbeddingConfigColumn, LLMConfigColumn, ToolRulesColumn
 from letta.orm.identity import Identity
 from letta.orm.message import Message
+from letta.orm.messages_agents import MessagesAgents
 from letta.orm.mixins import OrganizationMixin
 from letta.orm.organization import Organization
 from letta.orm.sqlalchemy_base import SqlalchemyBase
@@ -19,12 +20,29 @@ from letta.schemas.memory import Memory
 from letta.schemas.tool_rule import ToolRule
 
 if TYPE_CHECKING:
+    from sqlalchemy.orm.interfaces import ORMOption
+
     from letta.orm.agents_tags import AgentsTags
     from letta.orm.identity import Identity
     from letta.orm.organization import Organization
     from letta.orm.source import Source
     from letta.orm.tool import Tool
 
+AgentLoadProfile = Literal["columns", "state", "state+tools", "full"]
+
+# relationships selectin loaded by each profile, the others are left to their default loader
+_STATE_RELATIONSHIPS = ("core_memory", "sources", "tags", "identities", "tool_exec_environment_variables", "in_context_messages")
+AGENT_LOAD_PROFILES: Dict[str, Tuple[str, ...]] = {
+    # agent columns only, e.g. to check the agent exists
+    "columns": (),
+    # everything `to_pydantic` needs except the tools
+    "state": _STATE_RELATIONSHIPS,
+    # everything `to_pydantic` needs
+    "state+tools": _STATE_RELATIONSHIPS + ("tools",),
+    # everything an export needs; passages are never loaded through the agent, query them directly
+    "full": _STATE_RELATIONSHIPS + ("tools", "messages"),
+}
+
 
 class Agent(SqlalchemyBase, OrganizationMixin):
     __tablename__ = "agents"
@@ -44,11 +62,6 @@ class Agent(SqlalchemyBase, OrganizationMixin):
     # System prompt
     system: Mapped[Optional[str]] = mapped_column(String, nullable=True, doc="The system prompt used by the agent.")
 
-    # In context memory
-    # TODO: This should be a separate mapping table
-    # This is dangerously flexible with the JSON type
-    message_ids: Mapped[Optional[List[str]]] = mapped_column(JSON, nullable=True, doc="List of message IDs in in-context memory.")
-
     # Metadata and configs
     metadata_: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True, doc="metadata for the agent.")
     llm_config: Mapped[Optional[LLMConfig]] = mapped_column(
@@ -88,13 +101,22 @@ class Agent(SqlalchemyBase, OrganizationMixin):
         back_populates="agents",
         doc="Blocks forming the core memory of the agent.",
     )
+    # messages and passages grow without bound, never load them implicitly (see `load_options`)
     messages: Mapped[List["Message"]] = relationship(
         "Message",
         back_populates="agent",
-        lazy="selectin",
+        lazy="raise",
         cascade="all, delete-orphan",  # Ensure messages are deleted when the agent is deleted
         passive_deletes=True,
     )
+    # In context memory, see `message_ids`
+    in_context_messages: Mapped[List["MessagesAgents"]] = relationship(
+        "MessagesAgents",
+        order_by="MessagesAgents.position",
+        lazy="selectin",
+        cascade="all, delete-orphan",
+        doc="The messages of the in-context window, in prompt order.",
+    )
     tags: Mapped[List["AgentsTags"]] = relationship(
         "AgentsTags",
         back_populates="agent",
@@ -107,7 +129,7 @@ class Agent(SqlalchemyBase, OrganizationMixin):
         secondary="sources_agents",  # The join table for Agent -> Source
         primaryjoin="Agent.id == sources_agents.c.agent_id",
         secondaryjoin="and_(SourcePassage.source_id == sources_agents.c.source_id)",
-        lazy="selectin",
+        lazy="raise",
         order_by="SourcePassage.created_at.desc()",
         viewonly=True,  # Ensures SQLAlchemy doesn't attempt to manage this relationship
         doc="All passages derived from sources associated with this agent.",
@@ -115,7 +137,7 @@ class Agent(SqlalchemyBase, OrganizationMixin):
     agent_passages: Mapped[List["AgentPassage"]] = relationship(
         "AgentPassage",
         back_populates="agent",
-        lazy="selectin",
+        lazy="raise",
         order_by="AgentPassage.created_at.desc()",
         cascade="all, delete-orphan",
         viewonly=True,  # Ensures SQLAlchemy doesn't attempt to manage this relationship
@@ -129,6 +151,38 @@ class Agent(SqlalchemyBase, OrganizationMixin):
         passive_deletes=True,
     )
 
+    @property
+    def message_ids(self) -> List[str]:
+        """IDs of the in-context messages, in prompt order"""
+        return [row.message_id for row in self.in_context_messages]
+
+    @message_ids.setter
+    def message_ids(self, message_ids: Optional[List[str]]) -> None:
+        # replaces the whole window, AgentManager has the O(changed rows) operations on it
+        self.in_context_messages = [
+            MessagesAgents(agent_id=self.id, position=position, message_id=message_id)
+            for position, message_id in enumerate(message_ids or [])
+        ]
+
+    @classmethod
+    def load_options(cls, profile: AgentLoadProfile = "state+tools") -> List["ORMOption"]:
+        """
+        Loader options for `read`/`list` that fetch the relationships of `profile` (see `AGENT_LOAD_PROFILES`).
+
+        Relationships outside the profile are loaded lazily on first access, except messages and passages which raise.
+        """
+        loaded = AGENT_LOAD_PROFILES[profile]
+        options = []
+        for relationship_ in cls.__mapper__.relationships:
+            attribute = getattr(cls, relationship_.key)
+            if relationship_.key in loaded:
+                options.append(selectinload(attribute))
+            elif relationship_.lazy == "raise":
+                options.append(raiseload(attribute))
+            else:
+                options.append(lazyload(attribute))
+        return options
+
     def to_pydantic(self) -> PydanticAgentState:
         """converts to the basic pydantic model counterpart"""
         # add default rule for having send_message be a terminal tool
@@ -0,0 +1,18 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import DateTime, LargeBinary, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from letta.orm.base import Base
+
+
+class EmbeddingCacheEntry(Base):
+    """Persistent tier of the embedding cache: one row per (embedding model, endpoint, text) content hash"""
+
+    __tablename__ = "embedding_cache"
+
+    key: Mapped[str] = mapped_column(String, primary_key=True, doc="sha256 of the embedding model, endpoint and text")
+    embedding_model: Mapped[str] = mapped_column(String, nullable=False, doc="The embedding model that produced the embedding")
+    embedding: Mapped[bytes] = mapped_column(LargeBinary, nullable=False, doc="The embedding as little-endian float32")
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), server_default=func.now())
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import TYPE_CHECKING, List, Optional
 
-from sqlalchemy import JSON, Index, String
+from sqlalchemy import JSON, DateTime, Index, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from letta.orm.enums import JobType
@@ -25,7 +25,10 @@ class Job(SqlalchemyBase, UserMixin):
 
     __tablename__ = "jobs"
     __pydantic_model__ = PydanticJob
-    __table_args__ = (Index("ix_jobs_created_at", "created_at", "id"),)
+    __table_args__ = (
+        Index("ix_jobs_created_at", "created_at", "id"),
+        Index("ix_jobs_queue", "job_type", "status", "created_at"),
+    )
 
     status: Mapped[JobStatus] = mapped_column(String, default=JobStatus.created, doc="The current status of the job.")
     completed_at: Mapped[Optional[datetime]] = mapped_column(nullable=True, doc="The unix timestamp of when the job was completed.")
@@ -39,6 +42,13 @@ class Job(SqlalchemyBase, UserMixin):
         JSON, nullable=True, doc="The request configuration for the job, stored as JSON."
     )
 
+    # run queue, see letta.services.run_queue
+    worker_id: Mapped[Optional[str]] = mapped_column(String, nullable=True, doc="The worker that claimed the run.")
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True, doc="The last heartbeat of the worker running the run."
+    )
+    attempts: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, default=0, doc="The number of times the run was claimed.")
+
     # relationships
     user: Mapped["User"] = relationship("User", back_populates="jobs")
     job_messages: Mapped[List["JobMessage"]] = relationship("JobMessage", back_populates="job", cascade="all, delete-orphan")
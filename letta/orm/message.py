@@ -1,12 +1,14 @@
-from typing import Optional
+from typing import Optional, Sequence
 
 from openai.types.chat.chat_completion_message_tool_call import ChatCompletionMessageToolCall as OpenAIToolCall
-from sqlalchemy import ForeignKey, Index
+from sqlalchemy import ForeignKey, Index, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+from letta.constants import FULL_TEXT_SEARCH_LANGUAGE
 from letta.orm.custom_columns import ToolCallColumn
 from letta.orm.mixins import AgentMixin, OrganizationMixin
 from letta.orm.sqlalchemy_base import SqlalchemyBase
+from letta.schemas.enums import MessageRole
 from letta.schemas.message import Message as PydanticMessage
 from letta.schemas.message import TextContent as PydanticTextContent
 
@@ -18,6 +20,12 @@ class Message(SqlalchemyBase, OrganizationMixin, AgentMixin):
     __table_args__ = (
         Index("ix_messages_agent_created_at", "agent_id", "created_at"),
         Index("ix_messages_created_at", "created_at", "id"),
+        # full text search on Postgres, SQLite uses the messages_fts FTS5 table (see sqlite_functions.create_sqlite_full_text_index)
+        Index(
+            "ix_messages_text_tsv",
+            text(f"to_tsvector('{FULL_TEXT_SEARCH_LANGUAGE}', coalesce(text, ''))"),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
     )
     __pydantic_model__ = PydanticMessage
 
@@ -28,14 +36,16 @@ class Message(SqlalchemyBase, OrganizationMixin, AgentMixin):
     name: Mapped[Optional[str]] = mapped_column(nullable=True, doc="Name for multi-agent scenarios")
     tool_calls: Mapped[OpenAIToolCall] = mapped_column(ToolCallColumn, doc="Tool call information")
     tool_call_id: Mapped[Optional[str]] = mapped_column(nullable=True, doc="ID of the tool call")
+    token_count: Mapped[Optional[int]] = mapped_column(nullable=True, doc="Number of tokens the message takes up in a prompt")
     step_id: Mapped[Optional[str]] = mapped_column(
         ForeignKey("steps.id", ondelete="SET NULL"), nullable=True, doc="ID of the step that this message belongs to"
     )
 
     # Relationships
-    agent: Mapped["Agent"] = relationship("Agent", back_populates="messages", lazy="selectin")
-    organization: Mapped["Organization"] = relationship("Organization", back_populates="messages", lazy="selectin")
-    step: Mapped["Step"] = relationship("Step", back_populates="messages", lazy="selectin")
+    # loaded on access only, listing messages never needs them
+    agent: Mapped["Agent"] = relationship("Agent", back_populates="messages", lazy="select")
+    organization: Mapped["Organization"] = relationship("Organization", back_populates="messages", lazy="select")
+    step: Mapped["Step"] = relationship("Step", back_populates="messages", lazy="select")
 
     # Job relationship
     job_message: Mapped[Optional["JobMessage"]] = relationship(
@@ -53,3 +63,67 @@ class Message(SqlalchemyBase, OrganizationMixin, AgentMixin):
         if self.text:
             model.content = [PydanticTextContent(text=self.text)]
         return model
+
+    @classmethod
+    def pydantic_columns(cls) -> tuple:
+        """Columns selected by the lean read path, rows of them are converted by `pydantic_from_row`"""
+        return (
+            cls.id,
+            cls.role,
+            cls.text,
+            cls.organization_id,
+            cls.agent_id,
+            cls.model,
+            cls.name,
+            cls.tool_calls,
+            cls.tool_call_id,
+            cls.step_id,
+            cls.token_count,
+            cls.created_at,
+            cls.updated_at,
+            cls._created_by_id,
+            cls._last_updated_by_id,
+        )
+
+    @staticmethod
+    def pydantic_from_row(row: Sequence) -> PydanticMessage:
+        """
+        `to_pydantic` of a row of `pydantic_columns()`.
+
+        No ORM object is built (so no relationship can be loaded) and the stored values are not validated again, which
+        makes listing messages several times cheaper than going through `to_pydantic`.
+        """
+        (
+            id_,
+            role,
+            text_,
+            organization_id,
+            agent_id,
+            model,
+            name,
+            tool_calls,
+            tool_call_id,
+            step_id,
+            token_count,
+            created_at,
+            updated_at,
+            created_by_id,
+            last_updated_by_id,
+        ) = row
+        return PydanticMessage.model_construct(
+            id=id_,
+            role=MessageRole(role),
+            content=[PydanticTextContent(text=text_)] if text_ else None,
+            organization_id=organization_id,
+            agent_id=agent_id,
+            model=model,
+            name=name,
+            tool_calls=tool_calls,
+            tool_call_id=tool_call_id,
+            step_id=step_id,
+            token_count=token_count,
+            created_at=created_at,
+            updated_at=updated_at,
+            created_by_id=created_by_id or None,
+            last_updated_by_id=last_updated_by_id or None,
+        )
@@ -0,0 +1,22 @@
+from sqlalchemy import ForeignKey, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from letta.orm.base import Base
+
+
+class MessagesAgents(Base):
+    """
+    The in-context window of an agent: the messages of its prompt, ordered by `position` (the system message first).
+
+    Positions only order the rows, they are not contiguous: appending takes the positions after the last one and
+    trimming deletes rows, so neither rewrites the rest of the window.
+    """
+
+    __tablename__ = "messages_agents"
+    __table_args__ = (Index("ix_messages_agents_message_id", "message_id"),)
+
+    agent_id: Mapped[str] = mapped_column(String, ForeignKey("agents.id", ondelete="CASCADE"), primary_key=True)
+    position: Mapped[int] = mapped_column(Integer, primary_key=True, doc="Order of the message in the prompt.")
+    # no foreign key to messages: the window may briefly reference messages that are not (or no longer) stored,
+    # the in-context queries join on `messages` and skip them
+    message_id: Mapped[str] = mapped_column(String, doc="The id of the in-context message.")
@@ -1,10 +1,10 @@
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 
-from sqlalchemy import JSON, Column, Index
+from sqlalchemy import JSON, Column, Index, Integer, event, text
 from sqlalchemy.orm import Mapped, declared_attr, mapped_column, relationship
 
 from letta.config import LettaConfig
-from letta.constants import MAX_EMBEDDING_DIM
+from letta.constants import FULL_TEXT_SEARCH_LANGUAGE
 from letta.orm.custom_columns import CommonVector, EmbeddingConfigColumn
 from letta.orm.mixins import AgentMixin, FileMixin, OrganizationMixin, SourceMixin
 from letta.orm.sqlalchemy_base import SqlalchemyBase
@@ -33,9 +33,12 @@ class BasePassage(SqlalchemyBase, OrganizationMixin):
     if settings.letta_pg_uri_no_default:
         from pgvector.sqlalchemy import Vector
 
-        embedding = mapped_column(Vector(MAX_EMBEDDING_DIM))
+        # stored at its real dimension, every dimension gets its own partial HNSW index (see letta.orm.pgvector_functions)
+        embedding = mapped_column(Vector())
     else:
+        # zero padded to MAX_EMBEDDING_DIM
         embedding = Column(CommonVector)
+    embedding_dim: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, doc="Dimension of the embedding before padding")
 
     @declared_attr
     def organization(cls) -> Mapped["Organization"]:
@@ -48,9 +51,37 @@ class BasePassage(SqlalchemyBase, OrganizationMixin):
             return (
                 Index(f"{cls.__tablename__}_org_idx", "organization_id"),
                 Index(f"{cls.__tablename__}_created_at_id_idx", "created_at", "id"),
+                # full text search, SQLite uses the <table>_fts FTS5 tables instead
+                Index(
+                    f"ix_{cls.__tablename__}_text_tsv",
+                    text(f"to_tsvector('{FULL_TEXT_SEARCH_LANGUAGE}', coalesce(text, ''))"),
+                    postgresql_using="gin",
+                ),
                 {"extend_existing": True},
             )
-        return (Index(f"{cls.__tablename__}_created_at_id_idx", "created_at", "id"), {"extend_existing": True})
+        return (
+            Index(f"{cls.__tablename__}_created_at_id_idx", "created_at", "id"),
+            # answers the per owner generation checks of the ANN vector index (PassageManager.sync_vector_index)
+            Index(
+                f"{cls.__tablename__}_owner_updated_at_idx",
+                "agent_id" if cls.__tablename__ == "agent_passages" else "source_id",
+                "updated_at",
+            ),
+            {"extend_existing": True},
+        )
+
+
+@event.listens_for(BasePassage, "before_insert", propagate=True)
+@event.listens_for(BasePassage, "before_update", propagate=True)
+def _set_embedding_dim(mapper, connection, target: BasePassage) -> None:
+    """Record the dimension of the embedding config, and store the embedding without its padding on Postgres"""
+    embedding_config = target.embedding_config
+    dim = embedding_config.get("embedding_dim") if isinstance(embedding_config, dict) else getattr(embedding_config, "embedding_dim", None)
+    if not dim or target.embedding is None:
+        return
+    target.embedding_dim = dim
+    if settings.letta_pg_uri_no_default and len(target.embedding) != dim:
+        target.embedding = list(target.embedding[:dim])
 
 
 class SourcePassage(BasePassage, FileMixin, SourceMixin):
@@ -85,4 +116,4 @@ class AgentPassage(BasePassage, AgentMixin):
     @declared_attr
     def agent(cls) -> Mapped["Agent"]:
         """Relationship to agent"""
-        return relationship("Agent", back_populates="agent_passages", lazy="selectin", passive_deletes=True)
+        return relationship("Agent", back_populates="agent_passages", lazy="select", passive_deletes=True)
@@ -0,0 +1,25 @@
+from typing import List
+
+from sqlalchemy import JSON, ForeignKey, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from letta.orm.base import Base
+
+
+class PendingSummary(Base):
+    """
+    A summary of the oldest in-context messages of an agent, computed in the background and not swapped in yet.
+
+    The summary message is stored but not in the window. Any process stepping the agent swaps it in
+    (`AgentManager.swap_in_pending_summary`), at most one summary per agent is pending.
+    """
+
+    __tablename__ = "pending_summaries"
+
+    agent_id: Mapped[str] = mapped_column(String, ForeignKey("agents.id", ondelete="CASCADE"), primary_key=True)
+    summary_message_id: Mapped[str] = mapped_column(
+        String, ForeignKey("messages.id", ondelete="CASCADE"), doc="The stored summary message, not in the window yet."
+    )
+    summarized_message_ids: Mapped[List[str]] = mapped_column(
+        JSON, doc="The in-context messages right after the system message that the summary replaces."
+    )
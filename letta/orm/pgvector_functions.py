@@ -0,0 +1,142 @@
+import re
+import threading
+from typing import Dict, Optional, Sequence, Set, Tuple
+
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import Float, bindparam, cast
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.types import UserDefinedType
+
+from letta.log import get_logger
+
+logger = get_logger(__name__)
+
+# pgvector builds HNSW indexes on vectors of up to 2000 dimensions, and on halfvecs of up to 4000 (pgvector >= 0.7.0).
+# Embeddings wider than that, or than 2000 on older pgvector versions, are searched with a sequential scan.
+HNSW_MAX_VECTOR_DIM = 2000
+HNSW_MAX_HALFVEC_DIM = 4000
+HALFVEC_MIN_PGVECTOR_VERSION = (0, 7, 0)
+
+
+class HalfVector(UserDefinedType):
+    """pgvector `halfvec(dim)`, only used in casts (pgvector-python only ships a HALFVEC type from 0.3.0 on)"""
+
+    cache_ok = True
+
+    def __init__(self, dim: int):
+        super().__init__()
+        self.dim = dim
+
+    def get_col_spec(self, **kw) -> str:
+        return f"HALFVEC({self.dim})"
+
+    def bind_processor(self, dialect):
+        def process(value):
+            if value is None:
+                return None
+            return "[" + ",".join(str(float(v)) for v in value) + "]"
+
+        return process
+
+
+def embedding_index_name(table: str, dim: int) -> str:
+    return f"ix_{table}_embedding_{dim}_hnsw"
+
+
+def pgvector_version(connection: Connection) -> Optional[Tuple[int, ...]]:
+    """Version of the installed pgvector extension, None if it isn't installed"""
+    version = connection.exec_driver_sql("SELECT extversion FROM pg_extension WHERE extname = 'vector'").scalar()
+    return tuple(int(part) for part in re.findall(r"\d+", version)) if version else None
+
+
+def supports_halfvec(connection: Connection) -> bool:
+    version = pgvector_version(connection)
+    return version is not None and version >= HALFVEC_MIN_PGVECTOR_VERSION
+
+
+_halfvec_support: Dict[str, bool] = {}
+
+
+def engine_supports_halfvec(engine: Engine) -> bool:
+    """`supports_halfvec` of the database of `engine`, checked once per process"""
+    key = str(engine.url)
+    if key not in _halfvec_support:
+        with engine.connect() as connection:
+            _halfvec_support[key] = supports_halfvec(connection)
+    return _halfvec_support[key]
+
+
+def embedding_index_type(dim: int, halfvec: bool = True) -> Optional[Tuple[str, str]]:
+    """
+    (cast type, operator class) of the HNSW index on embeddings of `dim`, None if `dim` is too wide to index.
+
+    Without `halfvec` (pgvector < 0.7.0), embeddings of more than HNSW_MAX_VECTOR_DIM dimensions can't be indexed.
+    """
+    if dim <= HNSW_MAX_VECTOR_DIM:
+        return f"vector({dim})", "vector_cosine_ops"
+    if dim <= HNSW_MAX_HALFVEC_DIM and halfvec:
+        return f"halfvec({dim})", "halfvec_cosine_ops"
+    return None
+
+
+def cosine_distance(column, query_embedding: Sequence[float], dim: int, halfvec: bool = True):
+    """
+    Cosine distance between the `embedding` column of a passage table (an unconstrained `vector`) and `query_embedding`.
+
+    The column is cast exactly like in the partial index of `dim`, so that `ORDER BY cosine_distance(...) LIMIT k` over
+    the rows with `embedding_dim = dim` is answered by an HNSW index scan. `halfvec` tells whether the database has the
+    halfvec type (see `engine_supports_halfvec`), without it the distance is computed on vectors.
+    """
+    query = [float(v) for v in list(query_embedding)[:dim]]
+    vector_type = HalfVector(dim) if embedding_index_type(dim, halfvec=halfvec) and dim > HNSW_MAX_VECTOR_DIM else Vector(dim)
+    return cast(column, vector_type).op("<=>", return_type=Float)(cast(bindparam(None, query, type_=vector_type), vector_type))
+
+
+def create_embedding_index(connection: Connection, table: str, dim: int, concurrently: bool = False) -> bool:
+    """
+    Create the partial HNSW index of the embeddings of `dim` in `table`, returns False if `dim` can't be indexed.
+
+    Dimensions that only a halfvec index can cover are skipped with a warning when pgvector is older than 0.7.0.
+    """
+    index_type = embedding_index_type(dim, halfvec=supports_halfvec(connection))
+    if index_type is None:
+        if dim <= HNSW_MAX_HALFVEC_DIM:
+            logger.warning(
+                f"pgvector {'.'.join(map(str, pgvector_version(connection) or ()))} has no halfvec type (0.7.0 or later is needed), "
+                f"the embeddings of {table} with {dim} dimensions are searched without an index"
+            )
+        return False
+    cast_type, opclass = index_type
+    connection.exec_driver_sql(
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {embedding_index_name(table, dim)} "
+        f"ON {table} USING hnsw ((embedding::{cast_type}) {opclass}) WHERE embedding_dim = {int(dim)}"
+    )
+    return True
+
+
+_indexed: Set[Tuple[str, int]] = set()
+_indexed_lock = threading.Lock()
+
+
+def ensure_embedding_index(engine: Engine, table: str, dim: int) -> None:
+    """
+    Make sure `table` has the HNSW index of the embeddings of `dim`, once per process.
+
+    The first passage of an embedding dimension nobody used before creates its index (concurrently, so writes to the
+    table are not blocked), every passage after that only costs a set lookup.
+    """
+    key = (table, dim)
+    if key in _indexed:
+        return
+    with _indexed_lock:
+        if key in _indexed:
+            return
+        try:
+            # CREATE INDEX CONCURRENTLY can't run inside a transaction block
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                create_embedding_index(connection, table, dim, concurrently=True)
+        except Exception as e:
+            # searches still work without the index, they just scan
+            logger.warning(f"Failed to create the embedding index of {table} for dimension {dim}: {e}")
+            return
+        _indexed.add(key)
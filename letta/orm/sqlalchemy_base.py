@@ -4,7 +4,7 @@ from functools import wraps
 from pprint import pformat
 from typing import TYPE_CHECKING, List, Literal, Optional, Tuple, Union
 
-from sqlalchemy import String, and_, func, or_, select
+from sqlalchemy import ColumnElement, String, and_, func, or_, select
 from sqlalchemy.exc import DBAPIError, IntegrityError, TimeoutError
 from sqlalchemy.orm import Mapped, Session, mapped_column
 
@@ -16,6 +16,7 @@ from letta.orm.sqlite_functions import adapt_array
 if TYPE_CHECKING:
     from pydantic import BaseModel
     from sqlalchemy.orm import Session
+    from sqlalchemy.orm.interfaces import ORMOption
 
 
 logger = get_logger(__name__)
@@ -60,6 +61,7 @@ class SqlalchemyBase(CommonSqlalchemyMetaMixins, Base):
         limit: Optional[int] = 50,
         query_text: Optional[str] = None,
         query_embedding: Optional[List[float]] = None,
+        embedding_dim: Optional[int] = None,
         ascending: bool = True,
         tags: Optional[List[str]] = None,
         match_all_tags: bool = False,
@@ -69,6 +71,8 @@ class SqlalchemyBase(CommonSqlalchemyMetaMixins, Base):
         join_model: Optional[Base] = None,
         join_conditions: Optional[Union[Tuple, List]] = None,
         identifier_keys: Optional[List[str]] = None,
+        load_options: Optional[List["ORMOption"]] = None,
+        filters: Optional[List[ColumnElement]] = None,
         **kwargs,
     ) -> List["SqlalchemyBase"]:
         """
@@ -84,9 +88,13 @@ class SqlalchemyBase(CommonSqlalchemyMetaMixins, Base):
             limit: Maximum number of items to return
             query_text: Text to search for
             query_embedding: Vector to search for similar embeddings
+            embedding_dim: Dimension of the embeddings searched (`embedding_config.embedding_dim`), defaults to the length
+                of query_embedding, which must then not be zero padded
             ascending: Sort direction
             tags: List of tags to filter by
             match_all_tags: If True, return items matching all tags. If False, match any tag.
+            load_options: Loader options (e.g. `selectinload`, `raiseload`) controlling which relationships are fetched
+            filters: Additional WHERE clauses, for conditions the keyword filters can't express
             **kwargs: Additional filters to apply
         """
         if start_date and end_date and start_date > end_date:
@@ -163,6 +171,9 @@ class SqlalchemyBase(CommonSqlalchemyMetaMixins, Base):
                 else:
                     query = query.where(column == value)
 
+            if filters:
+                query = query.where(*filters)
+
             # Date range filtering
             if start_date:
                 query = query.filter(cls.created_at > start_date)
@@ -216,8 +227,14 @@ class SqlalchemyBase(CommonSqlalchemyMetaMixins, Base):
                 from letta.settings import settings
 
                 if settings.letta_pg_uri_no_default:
-                    # PostgreSQL with pgvector
-                    query = query.order_by(cls.embedding.cosine_distance(query_embedding).asc())
+                    # PostgreSQL with pgvector, answered by the HNSW index of the embedding dimension
+                    from letta.orm.pgvector_functions import cosine_distance, engine_supports_halfvec
+
+                    dim = embedding_dim or len(query_embedding)
+                    halfvec = engine_supports_halfvec(db_session.get_bind())
+                    query = query.where(cls.embedding_dim == dim).order_by(
+                        cosine_distance(cls.embedding, query_embedding, dim, halfvec=halfvec).asc()
+                    )
                 else:
                     # SQLite with custom vector type
                     query_embedding_binary = adapt_array(query_embedding)
@@ -247,6 +264,9 @@ class SqlalchemyBase(CommonSqlalchemyMetaMixins, Base):
             else:
                 query = query.limit(limit)
 
+            if load_options:
+                query = query.options(*load_options)
+
             results = list(session.execute(query).scalars())
 
             # If we have both bounds, take the middle portion
@@ -267,6 +287,7 @@ class SqlalchemyBase(CommonSqlalchemyMetaMixins, Base):
         actor: Optional["User"] = None,
         access: Optional[List[Literal["read", "write", "admin"]]] = ["read"],
         access_type: AccessType = AccessType.ORGANIZATION,
+        load_options: Optional[List["ORMOption"]] = None,
         **kwargs,
     ) -> "SqlalchemyBase":
         """The primary accessor for an ORM record.
@@ -275,6 +296,7 @@ class SqlalchemyBase(CommonSqlalchemyMetaMixins, Base):
             identifier: the identifier of the record to read, can be the id string or the UUID object for backwards compatibility
             actor: if specified, results will be scoped only to records the user is able to access
             access: if actor is specified, records will be filtered to the minimum permission level for the actor
+            load_options: loader options (e.g. `selectinload`, `raiseload`) controlling which relationships are fetched
             kwargs: additional arguments to pass to the read, used for more complex objects
         Returns:
             The matching object
@@ -304,6 +326,8 @@ class SqlalchemyBase(CommonSqlalchemyMetaMixins, Base):
         if hasattr(cls, "is_deleted"):
             query = query.where(cls.is_deleted == False)
             query_conditions.append("is_deleted=False")
+        if load_options:
+            query = query.options(*load_options)
         if found := db_session.execute(query).scalar():
             return found
 
@@ -326,6 +350,33 @@ class SqlalchemyBase(CommonSqlalchemyMetaMixins, Base):
         except (DBAPIError, IntegrityError) as e:
             self._handle_dbapi_error(e)
 
+    @classmethod
+    @handle_db_timeout
+    def batch_create(cls, items: List["SqlalchemyBase"], db_session: "Session", actor: Optional["User"] = None) -> List["SqlalchemyBase"]:
+        """
+        Insert many rows in a single transaction.
+
+        The flush is sent as multi-row INSERTs (with RETURNING for server defaults where the dialect supports it) rather than
+        one commit and refresh per row. The returned objects are detached from the session and hold the values as written,
+        they are not re-read from the database.
+        """
+        logger.debug(f"Batch creating {len(items)} {cls.__name__} rows with actor={actor}")
+
+        if actor:
+            for item in items:
+                item._set_created_and_updated_by_fields(actor.id)
+        try:
+            with db_session as session:
+                session.add_all(items)
+                session.flush()
+                # detach before the commit expires them, so reading the rows back doesn't cost a refresh per row
+                for item in items:
+                    session.expunge(item)
+                session.commit()
+                return items
+        except (DBAPIError, IntegrityError) as e:
+            cls._handle_dbapi_error(e)
+
     @handle_db_timeout
     def delete(self, db_session: "Session", actor: Optional["User"] = None) -> "SqlalchemyBase":
         logger.debug(f"Soft deleting {self.__class__.__name__} with ID: {self.id} with actor={actor}")
@@ -1,17 +1,40 @@
 import base64
 import sqlite3
-from typing import Optional, Union
+import struct
+from typing import List, Optional, Union
 
 import numpy as np
-from sqlalchemy import event
-from sqlalchemy.engine import Engine
+from sqlalchemy import MetaData, event, text
+from sqlalchemy.engine import Connection, Engine
 
 from letta.constants import MAX_EMBEDDING_DIM
+from letta.log import get_logger
+from letta.settings import settings
 
+logger = get_logger(__name__)
 
-def adapt_array(arr):
+# Raw vector format: an 8 byte header followed by the little-endian vector data.
+#   byte 0     : 0x00 magic (never produced by base64, which is how legacy rows are told apart)
+#   byte 1     : dtype code, b"f" for float32 or b"e" for float16
+#   bytes 2-3  : reserved
+#   bytes 4-7  : uint32 number of stored dimensions
+# Trailing zeros (the MAX_EMBEDDING_DIM padding) are not stored, vectors are implicitly zero padded.
+VECTOR_HEADER = struct.Struct("<cc2xI")
+VECTOR_MAGIC = b"\x00"
+VECTOR_DTYPES = {b"f": np.dtype("<f4"), b"e": np.dtype("<f2")}
+VECTOR_DTYPE_CODES = {"float32": b"f", "float16": b"e"}
+
+# Bumped in `PRAGMA user_version` once legacy base64 embeddings have been rewritten
+SQLITE_VECTOR_FORMAT_VERSION = 1
+
+
+def adapt_array(arr, dtype: Optional[str] = None):
     """
     Converts numpy array to binary for SQLite storage
+
+    Args:
+        arr: Input embedding as a list or numpy array
+        dtype: Storage precision ("float32" or "float16"), defaults to `settings.sqlite_embedding_dtype`
     """
     if arr is None:
         return None
@@ -21,15 +44,23 @@ def adapt_array(arr):
     elif not isinstance(arr, np.ndarray):
         raise ValueError(f"Unsupported type: {type(arr)}")
 
-    # Convert to bytes and then base64 encode
-    bytes_data = arr.tobytes()
-    base64_data = base64.b64encode(bytes_data)
-    return sqlite3.Binary(base64_data)
+    if dtype is None:
+        dtype = settings.sqlite_embedding_dtype
+    dtype_code = VECTOR_DTYPE_CODES[dtype]
+
+    # Drop the zero padding, only the true dimension is stored
+    nonzero = np.flatnonzero(arr)
+    dim = int(nonzero[-1]) + 1 if len(nonzero) else 0
+    data = arr[:dim].astype(VECTOR_DTYPES[dtype_code], copy=False).tobytes()
+    return sqlite3.Binary(VECTOR_HEADER.pack(VECTOR_MAGIC, dtype_code, dim) + data)
 
 
 def convert_array(text):
     """
     Converts binary back to numpy array
+
+    Raw vectors are mapped onto the underlying buffer without a copy (the returned array is read-only).
+    Legacy base64 encoded vectors are still decoded.
     """
     if text is None:
         return None
@@ -38,13 +69,16 @@ def convert_array(text):
     if isinstance(text, np.ndarray):
         return text
 
-    # Handle both bytes and sqlite3.Binary
-    binary_data = bytes(text) if isinstance(text, sqlite3.Binary) else text
+    # Handle bytes, memoryview and sqlite3.Binary
+    binary_data = text if isinstance(text, bytes) else bytes(text)
 
     try:
-        # First decode base64
+        if binary_data[:1] == VECTOR_MAGIC:
+            _, dtype_code, dim = VECTOR_HEADER.unpack_from(binary_data)
+            return np.frombuffer(binary_data, dtype=VECTOR_DTYPES[dtype_code], count=dim, offset=VECTOR_HEADER.size)
+
+        # Legacy format: base64 encoded float32
         decoded_data = base64.b64decode(binary_data)
-        # Then convert to numpy array
         return np.frombuffer(decoded_data, dtype=np.float32)
     except Exception:
         return None
@@ -107,10 +141,12 @@ def cosine_distance(embedding1, embedding2, expected_dim=MAX_EMBEDDING_DIM):
     """
     Calculate cosine distance between two embeddings
 
+    Embeddings of different stored lengths are compared as if the shorter one was zero padded.
+
     Args:
         embedding1: First embedding
         embedding2: Second embedding
-        expected_dim: Expected embedding dimension (default 4096)
+        expected_dim: Maximum embedding dimension (default 4096)
 
     Returns:
         float: Cosine distance
@@ -119,18 +155,167 @@ def cosine_distance(embedding1, embedding2, expected_dim=MAX_EMBEDDING_DIM):
     if embedding1 is None or embedding2 is None:
         return 0.0  # Maximum distance if either embedding is None
 
-    try:
-        vec1 = validate_and_transform_embedding(embedding1, expected_dim)
-        vec2 = validate_and_transform_embedding(embedding2, expected_dim)
-    except ValueError:
+    vec1 = convert_array(embedding1) if isinstance(embedding1, (bytes, memoryview)) else convert_array(np.asarray(embedding1))
+    vec2 = convert_array(embedding2) if isinstance(embedding2, (bytes, memoryview)) else convert_array(np.asarray(embedding2))
+    if vec1 is None or vec2 is None or vec1.shape[0] > expected_dim or vec2.shape[0] > expected_dim:
         return 0.0
 
-    similarity = np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
+    vec1 = vec1.astype(np.float32, copy=False)
+    vec2 = vec2.astype(np.float32, copy=False)
+    shared = min(vec1.shape[0], vec2.shape[0])
+    similarity = np.dot(vec1[:shared], vec2[:shared]) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
     distance = float(1.0 - similarity)
 
     return distance
 
 
+def add_missing_sqlite_columns(connection: Connection, metadata: MetaData) -> List[str]:
+    """
+    Add nullable columns that exist on the ORM models but not in an existing SQLite database.
+
+    `create_all` only creates missing tables, so without this a new optional column breaks existing SQLite databases.
+
+    Returns:
+        List[str]: The added columns, as "table.column"
+    """
+    existing_tables = {row[0] for row in connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type='table'")}
+    added = []
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {row[1] for row in connection.exec_driver_sql(f"PRAGMA table_info({table.name})")}
+        for column in table.columns:
+            if column.name in existing_columns or not column.nullable or column.server_default is not None:
+                continue
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}')
+            added.append(f"{table.name}.{column.name}")
+    if added:
+        logger.info(f"Added missing SQLite columns: {', '.join(added)}")
+    return added
+
+
+def add_missing_sqlite_indexes(connection: Connection, metadata: MetaData) -> List[str]:
+    """
+    Create the indexes of the ORM models that an existing SQLite database doesn't have yet.
+
+    Like columns, `create_all` only creates the indexes of the tables it creates.
+
+    Returns:
+        List[str]: The created indexes
+    """
+    list_indexes = "SELECT name FROM sqlite_master WHERE type='index'"
+    existing_indexes = {row[0] for row in connection.exec_driver_sql(list_indexes)}
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                # skipped for indexes limited to Postgres
+                index.create(connection)
+    created = sorted({row[0] for row in connection.exec_driver_sql(list_indexes)} - existing_indexes)
+    if created:
+        logger.info(f"Created missing SQLite indexes: {', '.join(created)}")
+    return created
+
+
+def upgrade_sqlite_vector_storage(connection: Connection, tables=("agent_passages", "source_passages"), batch_size: int = 1000) -> int:
+    """
+    Rewrite legacy base64 embeddings in place using the raw vector format.
+
+    Runs once per database: the format version is recorded in `PRAGMA user_version` afterwards.
+
+    Returns:
+        int: Number of rewritten rows
+    """
+    if connection.exec_driver_sql("PRAGMA user_version").scalar() >= SQLITE_VECTOR_FORMAT_VERSION:
+        return 0
+
+    existing_tables = {row[0] for row in connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type='table'")}
+    rewritten = 0
+    for table in tables:
+        if table not in existing_tables:
+            continue
+        rows = connection.execute(
+            text(f"SELECT id, embedding FROM {table} WHERE embedding IS NOT NULL AND substr(embedding, 1, 1) != x'00'")
+        ).fetchall()
+        for start in range(0, len(rows), batch_size):
+            batch = [{"id": row[0], "embedding": adapt_array(convert_array(row[1]))} for row in rows[start : start + batch_size]]
+            connection.execute(text(f"UPDATE {table} SET embedding = :embedding WHERE id = :id"), batch)
+        rewritten += len(rows)
+
+    connection.exec_driver_sql(f"PRAGMA user_version = {SQLITE_VECTOR_FORMAT_VERSION}")
+    if rewritten:
+        logger.info(f"Rewrote {rewritten} legacy base64 embeddings into the raw vector format")
+    return rewritten
+
+
+def migrate_sqlite_in_context_messages(connection: Connection) -> int:
+    """
+    Move the legacy JSON `agents.message_ids` lists into the `messages_agents` table.
+
+    The moved lists are set to NULL, so this only does work once per agent.
+
+    Returns:
+        int: Number of migrated agents
+    """
+    agent_columns = {row[1] for row in connection.exec_driver_sql("PRAGMA table_info(agents)")}
+    if "message_ids" not in agent_columns:
+        return 0
+
+    connection.exec_driver_sql(
+        "INSERT OR IGNORE INTO messages_agents (agent_id, position, message_id) "
+        "SELECT agents.id, CAST(ids.key AS INTEGER), ids.value FROM agents, json_each(agents.message_ids) AS ids "
+        "WHERE agents.message_ids IS NOT NULL"
+    )
+    migrated = connection.exec_driver_sql("UPDATE agents SET message_ids = NULL WHERE message_ids IS NOT NULL").rowcount
+    if migrated:
+        logger.info(f"Moved the in-context message ids of {migrated} agents into messages_agents")
+    return migrated
+
+
+def create_sqlite_full_text_index(connection: Connection, table: str, column: str = "text") -> bool:
+    """
+    Create the `<table>_fts` FTS5 index of `table.column`, and the triggers keeping it in sync with the table.
+
+    The index is contentless, so the text is not stored twice, and keyed on the ids of `table` through the
+    `<table>_fts_keys` table (`fts_rowid`, `id`) rather than on the implicit rowids of `table`, which VACUUM can renumber
+    since the ids are TEXT primary keys. Rows that predate the index, or an index of an older layout keyed on the rowids
+    of `table`, are (re)indexed when it is created.
+
+    Returns:
+        bool: Whether the index was created
+    """
+    fts_table, keys_table = f"{table}_fts", f"{table}_fts_keys"
+    existing_tables = {row[0] for row in connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type='table'")}
+    if fts_table in existing_tables and keys_table in existing_tables:
+        return False
+    if fts_table in existing_tables:
+        for trigger in ("insert", "delete", "update"):
+            connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {fts_table}_{trigger}")
+        connection.exec_driver_sql(f"DROP TABLE {fts_table}")
+
+    connection.exec_driver_sql(f"CREATE TABLE {keys_table} (fts_rowid INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE)")
+    connection.exec_driver_sql(f"CREATE VIRTUAL TABLE {fts_table} USING fts5({column}, content='', tokenize='unicode61')")
+    insert = (
+        f"INSERT INTO {keys_table}(id) VALUES (new.id); "
+        f"INSERT INTO {fts_table}(rowid, {column}) SELECT fts_rowid, new.{column} FROM {keys_table} WHERE id = new.id;"
+    )
+    # contentless indexes forget a row through the 'delete' command, given the values it was indexed with
+    delete = (
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {column}) SELECT 'delete', fts_rowid, old.{column} FROM {keys_table} "
+        f"WHERE id = old.id; DELETE FROM {keys_table} WHERE id = old.id;"
+    )
+    connection.exec_driver_sql(f"CREATE TRIGGER {fts_table}_insert AFTER INSERT ON {table} BEGIN {insert} END")
+    connection.exec_driver_sql(f"CREATE TRIGGER {fts_table}_delete AFTER DELETE ON {table} BEGIN {delete} END")
+    connection.exec_driver_sql(f"CREATE TRIGGER {fts_table}_update AFTER UPDATE OF {column} ON {table} BEGIN {delete} {insert} END")
+    connection.exec_driver_sql(f"INSERT INTO {keys_table}(id) SELECT id FROM {table}")
+    connection.exec_driver_sql(
+        f"INSERT INTO {fts_table}(rowid, {column}) SELECT {keys_table}.fts_rowid, {table}.{column} FROM {keys_table} "
+        f"JOIN {table} ON {table}.id = {keys_table}.id"
+    )
+    logger.info(f"Created the {fts_table} full text index")
+    return True
+
+
 @event.listens_for(Engine, "connect")
 def register_functions(dbapi_connection, connection_record):
     """Register SQLite functions"""
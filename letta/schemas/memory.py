@@ -1,4 +1,7 @@
-from typing import TYPE_CHECKING, List, Optional
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 from jinja2 import Template, TemplateSyntaxError
 from pydantic import BaseModel, Field
@@ -13,6 +16,24 @@ from letta.constants import CORE_MEMORY_BLOCK_CHAR_LIMIT
 from letta.schemas.block import Block
 from letta.schemas.message import Message
 
+# rendered core memories kept by `Memory.compile`, one per agent whose memory is in use is enough
+RENDERED_MEMORY_CACHE_SIZE = 1024
+
+_rendered_memory: "OrderedDict[Tuple, str]" = OrderedDict()
+_rendered_memory_lock = threading.Lock()
+
+
+@lru_cache(maxsize=128)
+def get_compiled_template(prompt_template: str) -> Template:
+    """Jinja2 template of `prompt_template`, parsed and compiled once per process"""
+    return Template(prompt_template)
+
+
+def _block_render_key(block: Block, with_metadata: bool) -> Tuple:
+    # every field a template can read; strings cache their hash, so unchanged values are not rehashed
+    fields = tuple(value for name, value in block.__dict__.items() if name != "metadata")
+    return fields + (repr(block.metadata),) if with_metadata else fields
+
 
 class ContextWindowOverview(BaseModel):
     """
@@ -88,10 +109,10 @@ class Memory(BaseModel, validate_assignment=True):
         """
         try:
             # Validate Jinja2 syntax
-            Template(prompt_template)
+            template = get_compiled_template(prompt_template)
 
             # Validate compatibility with current memory structure
-            Template(prompt_template).render(blocks=self.blocks)
+            template.render(blocks=self.blocks)
 
             # If we get here, the template is valid and compatible
             self.prompt_template = prompt_template
@@ -101,9 +122,35 @@ class Memory(BaseModel, validate_assignment=True):
             raise ValueError(f"Prompt template is not compatible with current memory structure: {str(e)}")
 
     def compile(self) -> str:
-        """Generate a string representation of the memory in-context using the Jinja2 template"""
-        template = Template(self.prompt_template)
-        return template.render(blocks=self.blocks)
+        """
+        Generate a string representation of the memory in-context using the Jinja2 template.
+
+        Renders are memoized per template and block contents, so compiling an unchanged memory again returns the same
+        string object (and comparing two compiles of it is an identity check), while any edit to a block changes the key.
+        """
+        key = (self.prompt_template, tuple(_block_render_key(block, "metadata" in self.prompt_template) for block in self.blocks))
+        try:
+            hash(key)
+        except TypeError:
+            # a block subclass with unhashable fields, render without memoizing
+            return get_compiled_template(self.prompt_template).render(blocks=self.blocks)
+        with _rendered_memory_lock:
+            rendered = _rendered_memory.get(key)
+            if rendered is not None:
+                _rendered_memory.move_to_end(key)
+                return rendered
+
+        rendered = get_compiled_template(self.prompt_template).render(blocks=self.blocks)
+        with _rendered_memory_lock:
+            rendered = _rendered_memory.setdefault(key, rendered)
+            if len(_rendered_memory) > RENDERED_MEMORY_CACHE_SIZE:
+                _rendered_memory.popitem(last=False)
+        return rendered
+
+    def compiles_differently(self, other: "Memory") -> bool:
+        """Whether `other` renders to a different core memory, an identity check when both renders are memoized"""
+        compiled, other_compiled = self.compile(), other.compile()
+        return compiled is not other_compiled and compiled != other_compiled
 
     def list_block_labels(self) -> List[str]:
         """Return a list of the block names held inside the memory object"""
@@ -114,6 +114,7 @@ class Message(BaseMessage):
         created_at (datetime): The time the message was created.
         tool_calls (List[OpenAIToolCall,]): The list of tool calls requested.
         tool_call_id (str): The id of the tool call.
+        token_count (int): The number of tokens the message takes up in a prompt.
 
     """
 
@@ -127,6 +128,9 @@ class Message(BaseMessage):
     tool_calls: Optional[List[OpenAIToolCall,]] = Field(None, description="The list of tool calls requested.")
     tool_call_id: Optional[str] = Field(None, description="The id of the tool call.")
     step_id: Optional[str] = Field(None, description="The id of the step that this message was created in.")
+    token_count: Optional[int] = Field(
+        None, description="The number of tokens the message takes up in a prompt, counted once when it is created."
+    )
 
     # This overrides the optional base orm schema, created_at MUST exist on all messages objects
     created_at: datetime = Field(default_factory=get_utc_time, description="The timestamp when the object was created.")
@@ -17,6 +17,7 @@ class SerializedAgentSchema(BaseSchema):
     tool_rules = ToolRulesField()
 
     messages = fields.List(fields.Nested(SerializedMessageSchema))
+    message_ids = fields.List(fields.String())
 
     def __init__(self, *args, session=None, **kwargs):
         super().__init__(*args, **kwargs)
@@ -33,4 +34,4 @@ class SerializedAgentSchema(BaseSchema):
     class Meta(BaseSchema.Meta):
         model = Agent
         # TODO: Serialize these as well...
-        exclude = ("tools", "sources", "core_memory", "tags", "source_passages", "agent_passages", "organization")
+        exclude = ("tools", "sources", "core_memory", "tags", "source_passages", "agent_passages", "organization", "in_context_messages")
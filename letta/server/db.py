@@ -10,6 +10,13 @@ from sqlalchemy.orm import sessionmaker
 from letta.config import LettaConfig
 from letta.log import get_logger
 from letta.orm import Base
+from letta.orm.sqlite_functions import (
+    add_missing_sqlite_columns,
+    add_missing_sqlite_indexes,
+    create_sqlite_full_text_index,
+    migrate_sqlite_in_context_messages,
+    upgrade_sqlite_vector_storage,
+)
 
 # NOTE: hack to see if single session management works
 from letta.settings import settings
@@ -98,6 +105,16 @@ else:
 
     Base.metadata.create_all(bind=engine)
 
+    # SQLite has no alembic migrations, add new optional columns and indexes, the full text indexes, rewrite legacy base64
+    # embeddings in place and move legacy in-context message id lists into messages_agents
+    with engine.begin() as connection:
+        add_missing_sqlite_columns(connection, Base.metadata)
+        add_missing_sqlite_indexes(connection, Base.metadata)
+        for table in ("messages", "agent_passages", "source_passages"):
+            create_sqlite_full_text_index(connection, table)
+        upgrade_sqlite_vector_storage(connection)
+        migrate_sqlite_in_context_messages(connection)
+
 
 def get_db():
     db = SessionLocal()
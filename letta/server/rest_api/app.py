@@ -30,6 +30,7 @@ from letta.server.rest_api.routers.v1.organizations import router as organizatio
 from letta.server.rest_api.routers.v1.users import router as users_router  # TODO: decide on admin
 from letta.server.rest_api.static_files import mount_static_files
 from letta.server.server import SyncServer
+from letta.services.run_queue import RunWorker, get_run_queue
 from letta.settings import settings
 
 # TODO(ethan)
@@ -262,10 +263,28 @@ def create_application() -> "FastAPI":
     # / static files
     mount_static_files(app)
 
+    run_workers = []
+
+    @app.on_event("startup")
+    def on_startup():
+        # queued runs are processed in this process too, unless they are left to `letta worker` processes
+        if settings.run_queue_embedded_workers > 0:
+            worker = RunWorker(
+                server,
+                get_run_queue(server.job_manager),
+                concurrency=settings.run_queue_embedded_workers,
+                poll_interval=settings.run_queue_poll_interval,
+                heartbeat_interval=settings.run_queue_heartbeat_interval,
+            )
+            worker.start()
+            run_workers.append(worker)
+
     @app.on_event("shutdown")
     def on_shutdown():
         global server
         # server = None
+        for worker in run_workers:
+            worker.stop()
 
     return app
 
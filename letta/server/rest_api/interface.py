@@ -25,7 +25,7 @@ from letta.schemas.letta_message import (
 from letta.schemas.message import Message
 from letta.schemas.openai.chat_completion_response import ChatCompletionChunkResponse
 from letta.streaming_interface import AgentChunkStreamingInterface
-from letta.streaming_utils import FunctionArgumentsStreamHandler, JSONInnerThoughtsExtractor
+from letta.streaming_utils import FunctionArgumentsStreamHandler, JSONInnerThoughtsExtractor, JSONStreamTokenizer
 
 
 # TODO strip from code / deprecate
@@ -317,8 +317,9 @@ class StreamingServerInterface(AgentChunkStreamingInterface):
         self.debug = False
         self.timeout = 10 * 60  # 10 minute timeout
 
-        # for expect_reasoning_content, we should accumulate `content`
-        self.expect_reasoning_content_buffer = None
+        # for expect_reasoning_content, `content` streams the tool call as a JSON object
+        self.expect_reasoning_content_reader = JSONStreamTokenizer()
+        self.expect_reasoning_content_name = None
 
     def _reset_inner_thoughts_json_reader(self):
         # A buffer for accumulating function arguments (we want to buffer keys and run checks on each one)
@@ -327,6 +328,8 @@ class StreamingServerInterface(AgentChunkStreamingInterface):
         self.function_name_buffer = None
         self.function_args_buffer = None
         self.function_id_buffer = None
+        self.expect_reasoning_content_reader = JSONStreamTokenizer()
+        self.expect_reasoning_content_name = None
 
     async def _create_generator(self) -> AsyncGenerator[Union[LettaMessage, LegacyLettaMessage, MessageStreamStatus], None]:
         """An asynchronous generator that yields chunks as they become available."""
@@ -485,54 +488,30 @@ class StreamingServerInterface(AgentChunkStreamingInterface):
                 reasoning=message_delta.reasoning_content,
             )
         elif expect_reasoning_content and message_delta.content is not None:
-            # "ignore" content if we expect reasoning content
-            if self.expect_reasoning_content_buffer is None:
-                self.expect_reasoning_content_buffer = message_delta.content
-            else:
-                self.expect_reasoning_content_buffer += message_delta.content
-
-            # we expect this to be pure JSON
-            # OptimisticJSONParser
-
-            # If we can pull a name out, pull it
-
-            try:
-                # NOTE: this is hardcoded for our DeepSeek API integration
-                json_reasoning_content = json.loads(self.expect_reasoning_content_buffer)
-                print(f"json_reasoning_content: {json_reasoning_content}")
-
-                processed_chunk = ToolCallMessage(
-                    id=message_id,
-                    date=message_date,
-                    tool_call=ToolCallDelta(
-                        name=json_reasoning_content.get("name"),
-                        arguments=json.dumps(json_reasoning_content.get("arguments")),
-                        tool_call_id=None,
-                    ),
-                )
-
-            except json.JSONDecodeError as e:
-                print(f"Failed to interpret reasoning content ({self.expect_reasoning_content_buffer}) as JSON: {e}")
+            # "ignore" content if we expect reasoning content, it is the tool call as JSON
+            # NOTE: this is hardcoded for our DeepSeek API integration: {"name": ..., "arguments": {...}}
+            name, arguments = None, []
+            for kind, key, text in self.expect_reasoning_content_reader.feed(message_delta.content):
+                if key == "name" and kind == JSONStreamTokenizer.VALUE:
+                    self.expect_reasoning_content_name = (self.expect_reasoning_content_name or "") + text
+                elif key == "name" and kind == JSONStreamTokenizer.VALUE_END:
+                    # the name is only released once complete
+                    name = self.expect_reasoning_content_name
+                elif key == "arguments" and kind in (
+                    JSONStreamTokenizer.VALUE_START,
+                    JSONStreamTokenizer.VALUE,
+                    JSONStreamTokenizer.VALUE_END,
+                ):
+                    arguments.append(text)
 
+            arguments = "".join(arguments) or None
+            if name is None and arguments is None:
                 return None
-            # Else,
-            # return None
-            # processed_chunk = ToolCallMessage(
-            #     id=message_id,
-            #     date=message_date,
-            #     tool_call=ToolCallDelta(
-            #         # name=tool_call_delta.get("name"),
-            #         name=None,
-            #         arguments=message_delta.content,
-            #         # tool_call_id=tool_call_delta.get("id"),
-            #         tool_call_id=None,
-            #     ),
-            # )
-            # return processed_chunk
-
-            # TODO eventually output as tool call outputs?
-            # print(f"Hiding content delta stream: '{message_delta.content}'")
-            # return None
+            processed_chunk = ToolCallMessage(
+                id=message_id,
+                date=message_date,
+                tool_call=ToolCallDelta(name=name, arguments=arguments, tool_call_id=None),
+            )
         elif message_delta.content is not None:
             processed_chunk = ReasoningMessage(
                 id=message_id,
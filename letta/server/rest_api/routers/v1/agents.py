@@ -1,8 +1,7 @@
 import traceback
-from datetime import datetime
 from typing import Annotated, List, Optional
 
-from fastapi import APIRouter, BackgroundTasks, Body, Depends, Header, HTTPException, Query, status
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, status
 from fastapi.responses import JSONResponse
 from pydantic import Field
 
@@ -11,7 +10,7 @@ from letta.log import get_logger
 from letta.orm.errors import NoResultFound
 from letta.schemas.agent import AgentState, CreateAgent, UpdateAgent
 from letta.schemas.block import Block, BlockUpdate, CreateBlock  # , BlockLabelUpdate, BlockLimitUpdate
-from letta.schemas.job import JobStatus, JobUpdate, LettaRequestConfig
+from letta.schemas.job import JobStatus, LettaRequestConfig
 from letta.schemas.letta_message import LettaMessageUnion
 from letta.schemas.letta_request import LettaRequest, LettaStreamingRequest
 from letta.schemas.letta_response import LettaResponse
@@ -21,9 +20,9 @@ from letta.schemas.passage import Passage
 from letta.schemas.run import Run
 from letta.schemas.source import Source
 from letta.schemas.tool import Tool
-from letta.schemas.user import User
 from letta.server.rest_api.utils import get_letta_server
 from letta.server.server import SyncServer
+from letta.services.run_queue import get_run_queue
 from letta.tracing import trace_method
 
 # These can be forward refs, but because Fastapi needs them at runtime the must be imported normally
@@ -537,50 +536,6 @@ async def send_message_streaming(
     return result
 
 
-async def process_message_background(
-    job_id: str,
-    server: SyncServer,
-    actor: User,
-    agent_id: str,
-    messages: list,
-    use_assistant_message: bool,
-    assistant_message_tool_name: str,
-    assistant_message_tool_kwarg: str,
-) -> None:
-    """Background task to process the message and update job status."""
-    try:
-        # TODO(matt) we should probably make this stream_steps and log each step as it progresses, so the job update GET can see the total steps so far + partial usage?
-        result = await server.send_message_to_agent(
-            agent_id=agent_id,
-            actor=actor,
-            messages=messages,
-            stream_steps=False,  # NOTE(matt)
-            stream_tokens=False,
-            use_assistant_message=use_assistant_message,
-            assistant_message_tool_name=assistant_message_tool_name,
-            assistant_message_tool_kwarg=assistant_message_tool_kwarg,
-            metadata={"job_id": job_id},  # Pass job_id through metadata
-        )
-
-        # Update job status to completed
-        job_update = JobUpdate(
-            status=JobStatus.completed,
-            completed_at=datetime.utcnow(),
-            metadata={"result": result.model_dump()},  # Store the result in metadata
-        )
-        server.job_manager.update_job_by_id(job_id=job_id, job_update=job_update, actor=actor)
-
-    except Exception as e:
-        # Update job status to failed
-        job_update = JobUpdate(
-            status=JobStatus.failed,
-            completed_at=datetime.utcnow(),
-            metadata={"error": str(e)},
-        )
-        server.job_manager.update_job_by_id(job_id=job_id, job_update=job_update, actor=actor)
-        raise
-
-
 @router.post(
     "/{agent_id}/messages/async",
     response_model=Run,
@@ -589,7 +544,6 @@ async def process_message_background(
 @trace_method("POST /v1/agents/{agent_id}/messages/async")
 async def send_message_async(
     agent_id: str,
-    background_tasks: BackgroundTasks,
     server: SyncServer = Depends(get_letta_server),
     request: LettaRequest = Body(...),
     actor_id: Optional[str] = Header(None, alias="user_id"),
@@ -600,13 +554,14 @@ async def send_message_async(
     """
     actor = server.user_manager.get_user_or_default(user_id=actor_id)
 
-    # Create a new job
+    # Create a new job, the request is kept in its metadata until a worker claims it
     run = Run(
         user_id=actor.id,
         status=JobStatus.created,
         metadata={
             "job_type": "send_message_async",
             "agent_id": agent_id,
+            "request": request.model_dump(mode="json"),
         },
         request_config=LettaRequestConfig(
             use_assistant_message=request.use_assistant_message,
@@ -615,19 +570,7 @@ async def send_message_async(
         ),
     )
     run = server.job_manager.create_job(pydantic_job=run, actor=actor)
-
-    # Add the background task
-    background_tasks.add_task(
-        process_message_background,
-        job_id=run.id,
-        server=server,
-        actor=actor,
-        agent_id=agent_id,
-        messages=request.messages,
-        use_assistant_message=request.use_assistant_message,
-        assistant_message_tool_name=request.assistant_message_tool_name,
-        assistant_message_tool_kwarg=request.assistant_message_tool_kwarg,
-    )
+    get_run_queue(server.job_manager).enqueue(run)
 
     return run
 
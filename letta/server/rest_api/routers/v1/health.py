@@ -1,4 +1,4 @@
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, Dict
 
 from fastapi import APIRouter
 
@@ -18,3 +18,23 @@ def health_check():
         version=__version__,
         status="ok",
     )
+
+
+@router.get("/caches", response_model=Dict[str, Dict[str, float]], operation_id="cache_stats")
+def cache_stats():
+    """Size and hit rate of the in-process caches"""
+    from letta.services.agent_state_cache import get_agent_state_cache
+    from letta.services.embedding_cache import get_embedding_cache
+
+    return {
+        "agent_state": get_agent_state_cache().stats(),
+        "embedding": get_embedding_cache().stats(),
+    }
+
+
+@router.get("/http-clients", response_model=Dict[str, Dict[str, Any]], operation_id="http_client_stats")
+def http_client_stats():
+    """Requests sent and pooled connections of the provider HTTP clients"""
+    from letta.helpers.http_clients import get_http_client_registry
+
+    return get_http_client_registry().stats()
@@ -13,6 +13,7 @@ from letta.schemas.sandbox_config import SandboxConfigCreate, SandboxConfigUpdat
 from letta.server.rest_api.utils import get_letta_server, get_user_id
 from letta.server.server import SyncServer
 from letta.services.helpers.tool_execution_helper import create_venv_for_local_sandbox, install_pip_requirements_for_sandbox
+from letta.services.sandbox_worker_pool import get_sandbox_worker_pool
 
 router = APIRouter(prefix="/sandbox-config", tags=["sandbox-config"])
 
@@ -140,6 +141,8 @@ def force_recreate_local_sandbox_venv(
     # Recreate the virtual environment
     try:
         create_venv_for_local_sandbox(sandbox_dir_path=sandbox_dir, venv_path=str(venv_path), env=os.environ.copy(), force_recreate=True)
+        # warm workers still run on the deleted venv
+        get_sandbox_worker_pool().discard(sbx_config.fingerprint())
         logger.info(f"Successfully recreated virtual environment at: {venv_path}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to recreate venv: {e}")
@@ -45,6 +45,22 @@ def sse_formatter(data: Union[dict, str]) -> str:
     return f"data: {data_str}\n\n"
 
 
+def sse_data(chunk) -> Union[dict, str]:
+    """
+    SSE payload of a streamed chunk. Models without a custom `model_dump` are serialized to JSON by pydantic directly,
+    instead of through a dict and `json.dumps`.
+    """
+    if isinstance(chunk, BaseModel):
+        if type(chunk).model_dump is BaseModel.model_dump:
+            return chunk.model_dump_json()
+        return chunk.model_dump()
+    elif isinstance(chunk, Enum):
+        return str(chunk.value)
+    elif not isinstance(chunk, dict):
+        return str(chunk)
+    return chunk
+
+
 async def sse_async_generator(
     generator: AsyncGenerator,
     usage_task: Optional[asyncio.Task] = None,
@@ -61,14 +77,7 @@ async def sse_async_generator(
     """
     try:
         async for chunk in generator:
-            # yield f"data: {json.dumps(chunk)}\n\n"
-            if isinstance(chunk, BaseModel):
-                chunk = chunk.model_dump()
-            elif isinstance(chunk, Enum):
-                chunk = str(chunk.value)
-            elif not isinstance(chunk, dict):
-                chunk = str(chunk)
-            yield sse_formatter(chunk)
+            yield sse_formatter(sse_data(chunk))
 
         # If we have a usage task, wait for it and send its result
         if usage_task is not None:
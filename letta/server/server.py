@@ -70,6 +70,7 @@ from letta.server.rest_api.chat_completions_interface import ChatCompletionsStre
 from letta.server.rest_api.interface import StreamingServerInterface
 from letta.server.rest_api.utils import sse_async_generator
 from letta.services.agent_manager import AgentManager
+from letta.services.agent_state_cache import get_agent_state_cache
 from letta.services.block_manager import BlockManager
 from letta.services.identity_manager import IdentityManager
 from letta.services.job_manager import JobManager
@@ -201,6 +202,7 @@ class SyncServer(Server):
 
         # Managers that interface with parallelism
         self.per_agent_lock_manager = PerAgentLockManager()
+        self.agent_state_cache = get_agent_state_cache()
 
         # Make default user and org
         if init_with_default_org_and_user:
@@ -316,7 +318,17 @@ class SyncServer(Server):
         """Updated method to load agents from persisted storage"""
         agent_lock = self.per_agent_lock_manager.get_lock(agent_id)
         with agent_lock:
-            agent_state = self.agent_manager.get_agent_by_id(agent_id=agent_id, actor=actor)
+            agent_state, version = None, None
+            if self.agent_state_cache.max_size > 0:
+                # read before the state, so a write in between makes the cached state look stale rather than current
+                version = self.agent_manager.get_agent_version(agent_id=agent_id, actor=actor)
+                if version is not None:
+                    agent_state = self.agent_state_cache.get(agent_id, version=version)
+            if agent_state is None or agent_state.organization_id != actor.organization_id:
+                # cache miss (or an actor from another org, which get_agent_by_id rejects)
+                generation = self.agent_state_cache.generation
+                agent_state = self.agent_manager.get_agent_by_id(agent_id=agent_id, actor=actor)
+                self.agent_state_cache.put(agent_state, generation, version=version)
 
             interface = interface or self.default_interface_factory()
             if agent_state.agent_type == AgentType.memgpt_agent:
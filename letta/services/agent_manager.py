@@ -1,8 +1,9 @@
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
-from sqlalchemy import Select, and_, func, literal, or_, select, union_all
+from sqlalchemy import Select, and_, case, delete, func, insert, literal, or_, select, text, union_all, update
+from sqlalchemy.orm import noload
 
 from letta.constants import BASE_MEMORY_TOOLS, BASE_TOOLS, MAX_EMBEDDING_DIM, MULTI_AGENT_TOOLS
 from letta.embeddings import embedding_model
@@ -11,10 +12,16 @@ from letta.log import get_logger
 from letta.orm import Agent as AgentModel
 from letta.orm import AgentPassage, AgentsTags
 from letta.orm import Block as BlockModel
+from letta.orm import BlocksAgents, IdentitiesAgents
 from letta.orm import Identity as IdentityModel
+from letta.orm import JobMessage
+from letta.orm import Message as MessageModel
+from letta.orm import MessagesAgents
+from letta.orm import PendingSummary as PendingSummaryModel
 from letta.orm import Source as SourceModel
 from letta.orm import SourcePassage, SourcesAgents
 from letta.orm import Tool as ToolModel
+from letta.orm import ToolsAgents
 from letta.orm.errors import NoResultFound
 from letta.orm.sandbox_config import AgentEnvironmentVariable as AgentEnvironmentVariableModel
 from letta.orm.sqlite_functions import adapt_array
@@ -35,20 +42,26 @@ from letta.schemas.tool_rule import TerminalToolRule as PydanticTerminalToolRule
 from letta.schemas.tool_rule import ToolRule as PydanticToolRule
 from letta.schemas.user import User as PydanticUser
 from letta.serialize_schemas import SerializedAgentSchema
+from letta.services.agent_state_cache import get_agent_state_cache
 from letta.services.block_manager import BlockManager
 from letta.services.helpers.agent_manager_helper import (
+    OFFLINE_MEMORY_AGENT_TAG_PREFIX,
     _process_relationship,
     _process_tags,
     check_supports_structured_output,
     compile_system_message,
     derive_system_message,
     initialize_message_sequence,
+    offline_memory_agent_tag,
     package_initial_message_sequence,
 )
+from letta.services.helpers.full_text_search import covers_terms, full_text_match, is_identifier_query, reciprocal_rank_fusion, search_terms
 from letta.services.identity_manager import IdentityManager
 from letta.services.message_manager import MessageManager
+from letta.services.passage_manager import PassageManager
 from letta.services.source_manager import SourceManager
 from letta.services.tool_manager import ToolManager
+from letta.services.vector_index import top_k_cosine
 from letta.settings import settings
 from letta.utils import enforce_types, united_diff
 
@@ -68,6 +81,8 @@ class AgentManager:
         self.source_manager = SourceManager()
         self.message_manager = MessageManager()
         self.identity_manager = IdentityManager()
+        self.passage_manager = PassageManager()
+        self.agent_state_cache = get_agent_state_cache()
 
     # ======================================================================================================================
     # Basic CRUD operations
@@ -279,7 +294,9 @@ class AgentManager:
         """
         with self.session_maker() as session:
             # Retrieve the existing agent
-            agent = AgentModel.read(db_session=session, identifier=agent_id, actor=actor)
+            agent = AgentModel.read(
+                db_session=session, identifier=agent_id, actor=actor, load_options=AgentModel.load_options("state+tools")
+            )
 
             # Update scalar fields directly
             scalar_fields = {
@@ -318,6 +335,7 @@ class AgentManager:
 
             # Commit and refresh the agent
             agent.update(session, actor=actor)
+            self.agent_state_cache.invalidate(agent.id)
 
             # Convert to PydanticAgentState and return
             return agent.to_pydantic()
@@ -333,11 +351,19 @@ class AgentManager:
         match_all_tags: bool = False,
         query_text: Optional[str] = None,
         identifier_keys: Optional[List[str]] = None,
+        include_hidden: bool = False,
         **kwargs,
     ) -> List[PydanticAgentState]:
         """
         List agents that have the specified tags.
+
+        The offline memory agents the memory consolidation service keeps for chat only agents are internal, they are
+        left out unless `include_hidden` is set.
         """
+        filters = []
+        if not include_hidden:
+            hidden = select(AgentsTags.agent_id).where(AgentsTags.tag.startswith(OFFLINE_MEMORY_AGENT_TAG_PREFIX, autoescape=True))
+            filters.append(AgentModel.id.not_in(hidden))
         with self.session_maker() as session:
             agents = AgentModel.list(
                 db_session=session,
@@ -349,6 +375,8 @@ class AgentManager:
                 organization_id=actor.organization_id if actor else None,
                 query_text=query_text,
                 identifier_keys=identifier_keys,
+                load_options=AgentModel.load_options("state+tools"),
+                filters=filters,
                 **kwargs,
             )
 
@@ -358,14 +386,42 @@ class AgentManager:
     def get_agent_by_id(self, agent_id: str, actor: PydanticUser) -> PydanticAgentState:
         """Fetch an agent by its ID."""
         with self.session_maker() as session:
-            agent = AgentModel.read(db_session=session, identifier=agent_id, actor=actor)
+            agent = AgentModel.read(
+                db_session=session, identifier=agent_id, actor=actor, load_options=AgentModel.load_options("state+tools")
+            )
             return agent.to_pydantic()
 
+    @enforce_types
+    def get_agent_version(self, agent_id: str, actor: PydanticUser) -> Optional[tuple]:
+        """
+        Version of everything an agent state is built from, in one query: the `updated_at` of the agent row and, per
+        attached blocks, tools, sources and identities, their number and latest `updated_at`. None if there is no such agent.
+
+        Writes from any process change it (every window operation and relationship change bumps the agent row), so an
+        agent state cached in one process can be checked against the database before it is used.
+        """
+
+        def attached(model, join_model, foreign_key):
+            joined = select(func.max(model.updated_at)).join(join_model, foreign_key == model.id).where(join_model.agent_id == agent_id)
+            count = select(func.count()).select_from(join_model).where(join_model.agent_id == agent_id)
+            return count.scalar_subquery(), joined.scalar_subquery()
+
+        query = select(
+            AgentModel.updated_at,
+            *attached(BlockModel, BlocksAgents, BlocksAgents.block_id),
+            *attached(ToolModel, ToolsAgents, ToolsAgents.tool_id),
+            *attached(SourceModel, SourcesAgents, SourcesAgents.source_id),
+            *attached(IdentityModel, IdentitiesAgents, IdentitiesAgents.identity_id),
+        ).where(AgentModel.id == agent_id, AgentModel.organization_id == actor.organization_id, AgentModel.is_deleted == False)
+        with self.session_maker() as session:
+            row = session.execute(query).first()
+        return tuple(row) if row is not None else None
+
     @enforce_types
     def get_agent_by_name(self, agent_name: str, actor: PydanticUser) -> PydanticAgentState:
         """Fetch an agent by its ID."""
         with self.session_maker() as session:
-            agent = AgentModel.read(db_session=session, name=agent_name, actor=actor)
+            agent = AgentModel.read(db_session=session, name=agent_name, actor=actor, load_options=AgentModel.load_options("state+tools"))
             return agent.to_pydantic()
 
     @enforce_types
@@ -383,14 +439,28 @@ class AgentManager:
         """
         with self.session_maker() as session:
             # Retrieve the agent
-            agent = AgentModel.read(db_session=session, identifier=agent_id, actor=actor)
+            agent = AgentModel.read(
+                db_session=session, identifier=agent_id, actor=actor, load_options=AgentModel.load_options("state+tools")
+            )
+            # messages and passages are not loaded with the agent, so the ORM cascade can't reach them (and SQLite
+            # doesn't enforce the foreign key cascades): delete them in bulk
+            self._delete_agent_messages(session, agent_id)
+            session.execute(delete(AgentPassage).where(AgentPassage.agent_id == agent_id))
+            agent_type = agent.agent_type
             agent.hard_delete(session)
+            self.agent_state_cache.invalidate(agent_id)
+        self.passage_manager.remove_from_vector_index(AgentPassage, owners=[agent_id])
+
+        if agent_type == AgentType.chat_only_agent:
+            # the offline memory agent kept by the consolidation service goes with its chat agent
+            for offline_agent in self.list_agents(actor=actor, tags=[offline_memory_agent_tag(agent_id)], limit=None, include_hidden=True):
+                self.delete_agent(agent_id=offline_agent.id, actor=actor)
 
     @enforce_types
     def serialize(self, agent_id: str, actor: PydanticUser) -> dict:
         with self.session_maker() as session:
             # Retrieve the agent
-            agent = AgentModel.read(db_session=session, identifier=agent_id, actor=actor)
+            agent = AgentModel.read(db_session=session, identifier=agent_id, actor=actor, load_options=AgentModel.load_options("full"))
             schema = SerializedAgentSchema(session=session)
             return schema.dump(agent)
 
@@ -427,7 +497,9 @@ class AgentManager:
         """
         with self.session_maker() as session:
             # Retrieve the agent
-            agent = AgentModel.read(db_session=session, identifier=agent_id, actor=actor)
+            agent = AgentModel.read(
+                db_session=session, identifier=agent_id, actor=actor, load_options=AgentModel.load_options("state+tools")
+            )
 
             # Fetch existing environment variables as a dictionary
             existing_vars = {var.key: var for var in agent.tool_exec_environment_variables}
@@ -456,6 +528,7 @@ class AgentManager:
 
             # Update the agent in the database
             agent.update(session, actor=actor)
+            self.agent_state_cache.invalidate(agent.id)
 
             # Return the updated agent state
             return agent.to_pydantic()
@@ -463,20 +536,47 @@ class AgentManager:
     # ======================================================================================================================
     # In Context Messages Management
     # ======================================================================================================================
-    # TODO: There are several assumptions here that are not explicitly checked
-    # TODO: 1) These message ids are valid
-    # TODO: 2) These messages are ordered from oldest to newest
-    # TODO: This can be fixed by having an actual relationship in the ORM for message_ids
-    # TODO: This can also be made more efficient, instead of getting, setting, we can do it all in one db session for one query.
     @enforce_types
     def get_in_context_messages(self, agent_id: str, actor: PydanticUser) -> List[PydanticMessage]:
-        message_ids = self.get_agent_by_id(agent_id=agent_id, actor=actor).message_ids
-        return self.message_manager.get_messages_by_ids(message_ids=message_ids, actor=actor)
+        return self._list_in_context_messages(agent_id=agent_id, actor=actor)
 
     @enforce_types
     def get_system_message(self, agent_id: str, actor: PydanticUser) -> PydanticMessage:
-        message_ids = self.get_agent_by_id(agent_id=agent_id, actor=actor).message_ids
-        return self.message_manager.get_message_by_id(message_id=message_ids[0], actor=actor)
+        messages = self._list_in_context_messages(agent_id=agent_id, actor=actor, limit=1)
+        if not messages:
+            raise NoResultFound(f"Agent {agent_id} has no in-context messages")
+        return messages[0]
+
+    def _list_in_context_messages(self, agent_id: str, actor: PydanticUser, limit: Optional[int] = None) -> List[PydanticMessage]:
+        """
+        Fetch the agent's in-context messages in prompt order with a single query.
+
+        The `messages_agents` rows of the agent are joined to `messages`, only the message columns are selected, so neither
+        the agent (tools, sources, blocks, ...) nor the messages' own relationships are loaded.
+        """
+        query = (
+            select(*MessageModel.pydantic_columns())
+            .select_from(MessagesAgents)
+            .join(AgentModel, AgentModel.id == MessagesAgents.agent_id)
+            .join(MessageModel, MessageModel.id == MessagesAgents.message_id)
+            .where(
+                MessagesAgents.agent_id == agent_id,
+                AgentModel.organization_id == actor.organization_id,
+                AgentModel.is_deleted == False,
+                MessageModel.organization_id == actor.organization_id,
+                MessageModel.is_deleted == False,
+            )
+            .order_by(MessagesAgents.position)
+        )
+        if limit:
+            query = query.limit(limit)
+
+        with self.session_maker() as session:
+            messages = [MessageModel.pydantic_from_row(row) for row in session.execute(query)]
+            if not messages:
+                # keep the NoResultFound of the agent lookup for unknown (or foreign) agents
+                AgentModel.read(db_session=session, identifier=agent_id, actor=actor, load_options=AgentModel.load_options("columns"))
+            return messages
 
     @enforce_types
     def rebuild_system_prompt(self, agent_id: str, actor: PydanticUser, force=False, update_timestamp=True) -> PydanticAgentState:
@@ -530,47 +630,267 @@ class AgentManager:
                 openai_message_dict={"role": "system", "content": new_system_message_str},
             )
             message = self.message_manager.create_message(message, actor=actor)
-            message_ids = [message.id] + agent_state.message_ids[1:]  # swap index 0 (system)
-            return self._set_in_context_messages(agent_id=agent_id, message_ids=message_ids, actor=actor)
+            return self.swap_system_message(message.id, agent_id=agent_id, actor=actor)
         else:
             return agent_state
 
+    # The in-context window operations below each change only the `messages_agents` rows they add or remove, in one
+    # transaction that holds the agent row lock (on Postgres) or the database write lock (on SQLite), so concurrent writers
+    # of a window don't lose updates or collide on positions.
+    #
+    # Given the caller's current `agent_state` (like `Agent` does on every step), they return a copy of it with the new
+    # message ids instead of reloading the whole agent.
+    def _lock_in_context_window(self, session, agent_id: str, actor: PydanticUser) -> None:
+        """Check the agent exists for the actor, and lock its row (Postgres) or the database (SQLite) until the end of the transaction"""
+        query = select(AgentModel.id).where(
+            AgentModel.id == agent_id, AgentModel.organization_id == actor.organization_id, AgentModel.is_deleted == False
+        )
+        if settings.letta_pg_uri_no_default:
+            query = query.with_for_update()
+        else:
+            # the driver only begins the transaction at the first write, after the positions were read: take the write
+            # lock up front, so two appends can't both read the same max(position)
+            session.execute(text("BEGIN IMMEDIATE"))
+        if session.execute(query).scalar_one_or_none() is None:
+            raise NoResultFound(f"Agent with id {agent_id} not found for actor {actor.id}")
+
+    @staticmethod
+    def _window_positions(session, agent_id: str, offset: int = 0, limit: Optional[int] = None) -> List[int]:
+        query = select(MessagesAgents.position).where(MessagesAgents.agent_id == agent_id).order_by(MessagesAgents.position).offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+        return list(session.execute(query).scalars())
+
+    def _update_in_context_window(
+        self, agent_id: str, actor: PydanticUser, change, agent_state: Optional[PydanticAgentState] = None
+    ) -> PydanticAgentState:
+        """Run `change(session)` on the locked window of the agent, and return the updated agent state"""
+        updated_at = get_utc_time()
+        with self.session_maker() as session:
+            self._lock_in_context_window(session, agent_id, actor)
+            change(session)
+            session.execute(
+                update(AgentModel)
+                .where(AgentModel.id == agent_id)
+                .values(updated_at=updated_at, _last_updated_by_id=actor.id)
+                .execution_options(synchronize_session=False)
+            )
+            if agent_state is not None:
+                message_ids = list(
+                    session.execute(
+                        select(MessagesAgents.message_id).where(MessagesAgents.agent_id == agent_id).order_by(MessagesAgents.position)
+                    ).scalars()
+                )
+            session.commit()
+        self.agent_state_cache.invalidate(agent_id)
+        if agent_state is None:
+            return self.get_agent_by_id(agent_id=agent_id, actor=actor)
+        return agent_state.model_copy(update={"message_ids": message_ids, "updated_at": updated_at, "last_updated_by_id": actor.id})
+
     @enforce_types
-    def _set_in_context_messages(self, agent_id: str, message_ids: List[str], actor: PydanticUser) -> PydanticAgentState:
-        return self.update_agent(agent_id=agent_id, agent_update=UpdateAgent(message_ids=message_ids), actor=actor)
+    def swap_system_message(
+        self, message_id: str, agent_id: str, actor: PydanticUser, agent_state: Optional[PydanticAgentState] = None
+    ) -> PydanticAgentState:
+        """Replace the system message (the first in-context message) with `message_id`"""
+
+        def change(session):
+            first = self._window_positions(session, agent_id, limit=1)
+            if first:
+                session.execute(
+                    update(MessagesAgents)
+                    .where(MessagesAgents.agent_id == agent_id, MessagesAgents.position == first[0])
+                    .values(message_id=message_id)
+                )
+            else:
+                session.execute(insert(MessagesAgents).values(agent_id=agent_id, position=0, message_id=message_id))
+
+        return self._update_in_context_window(agent_id, actor, change, agent_state=agent_state)
 
     @enforce_types
-    def trim_older_in_context_messages(self, num: int, agent_id: str, actor: PydanticUser) -> PydanticAgentState:
-        message_ids = self.get_agent_by_id(agent_id=agent_id, actor=actor).message_ids
-        new_messages = [message_ids[0]] + message_ids[num:]  # 0 is system message
-        return self._set_in_context_messages(agent_id=agent_id, message_ids=new_messages, actor=actor)
+    def trim_older_in_context_messages(
+        self, num: int, agent_id: str, actor: PydanticUser, agent_state: Optional[PydanticAgentState] = None
+    ) -> PydanticAgentState:
+        """Drop the in-context messages 1 to `num` - 1, the system message (0) stays"""
+
+        def change(session):
+            if num <= 1:
+                return
+            positions = self._window_positions(session, agent_id, offset=1, limit=num - 1)
+            session.execute(delete(MessagesAgents).where(MessagesAgents.agent_id == agent_id, MessagesAgents.position.in_(positions)))
+
+        return self._update_in_context_window(agent_id, actor, change, agent_state=agent_state)
 
     @enforce_types
-    def trim_all_in_context_messages_except_system(self, agent_id: str, actor: PydanticUser) -> PydanticAgentState:
-        message_ids = self.get_agent_by_id(agent_id=agent_id, actor=actor).message_ids
-        # TODO: How do we know this?
-        new_messages = [message_ids[0]]  # 0 is system message
-        return self._set_in_context_messages(agent_id=agent_id, message_ids=new_messages, actor=actor)
+    def trim_all_in_context_messages_except_system(
+        self, agent_id: str, actor: PydanticUser, agent_state: Optional[PydanticAgentState] = None
+    ) -> PydanticAgentState:
+        def change(session):
+            first = self._window_positions(session, agent_id, limit=1)
+            if first:
+                session.execute(delete(MessagesAgents).where(MessagesAgents.agent_id == agent_id, MessagesAgents.position > first[0]))
+
+        return self._update_in_context_window(agent_id, actor, change, agent_state=agent_state)
 
     @enforce_types
-    def prepend_to_in_context_messages(self, messages: List[PydanticMessage], agent_id: str, actor: PydanticUser) -> PydanticAgentState:
-        message_ids = self.get_agent_by_id(agent_id=agent_id, actor=actor).message_ids
+    def prepend_to_in_context_messages(
+        self, messages: List[PydanticMessage], agent_id: str, actor: PydanticUser, agent_state: Optional[PydanticAgentState] = None
+    ) -> PydanticAgentState:
+        """Insert `messages` right after the system message"""
         new_messages = self.message_manager.create_many_messages(messages, actor=actor)
-        message_ids = [message_ids[0]] + [m.id for m in new_messages] + message_ids[1:]
-        return self._set_in_context_messages(agent_id=agent_id, message_ids=message_ids, actor=actor)
+
+        def change(session):
+            first, *rest = self._window_positions(session, agent_id, limit=2) or [-1]
+            if rest and rest[0] - first <= len(new_messages):
+                # no room between the system message and the next one: move the rest of the window up, through negative
+                # positions so that no intermediate row collides with the primary key
+                shift = len(new_messages) - (rest[0] - first - 1)
+                after_first = and_(MessagesAgents.agent_id == agent_id, MessagesAgents.position > first)
+                session.execute(update(MessagesAgents).where(after_first).values(position=-MessagesAgents.position))
+                session.execute(
+                    update(MessagesAgents)
+                    .where(MessagesAgents.agent_id == agent_id, MessagesAgents.position < 0)
+                    .values(position=-MessagesAgents.position + shift)
+                )
+            self._insert_in_context_rows(session, agent_id, [m.id for m in new_messages], start=first + 1)
+
+        return self._update_in_context_window(agent_id, actor, change, agent_state=agent_state)
 
     @enforce_types
-    def append_to_in_context_messages(self, messages: List[PydanticMessage], agent_id: str, actor: PydanticUser) -> PydanticAgentState:
+    def append_to_in_context_messages(
+        self, messages: List[PydanticMessage], agent_id: str, actor: PydanticUser, agent_state: Optional[PydanticAgentState] = None
+    ) -> PydanticAgentState:
         messages = self.message_manager.create_many_messages(messages, actor=actor)
-        message_ids = self.get_agent_by_id(agent_id=agent_id, actor=actor).message_ids or []
-        message_ids += [m.id for m in messages]
-        return self._set_in_context_messages(agent_id=agent_id, message_ids=message_ids, actor=actor)
+
+        def change(session):
+            last = session.execute(select(func.max(MessagesAgents.position)).where(MessagesAgents.agent_id == agent_id)).scalar()
+            self._insert_in_context_rows(session, agent_id, [m.id for m in messages], start=0 if last is None else last + 1)
+
+        return self._update_in_context_window(agent_id, actor, change, agent_state=agent_state)
+
+    @enforce_types
+    def swap_in_summary(
+        self,
+        summary_message: PydanticMessage,
+        summarized_message_ids: List[str],
+        agent_id: str,
+        actor: PydanticUser,
+        agent_state: Optional[PydanticAgentState] = None,
+    ) -> Optional[PydanticAgentState]:
+        """
+        Replace the in-context messages `summarized_message_ids`, right after the system message, with `summary_message`.
+
+        The messages added after the summarized ones stay in the window. If the window doesn't start with the summarized
+        messages anymore (it was summarized, trimmed or reset since the summary was computed), nothing changes and None
+        is returned.
+        """
+        if not summarized_message_ids:
+            return None
+        summary_message = self.message_manager.create_message(summary_message, actor=actor)
+        swapped = False
+
+        def change(session):
+            nonlocal swapped
+            swapped = self._swap_in_summary_rows(session, agent_id, summary_message.id, summarized_message_ids)
+
+        agent_state = self._update_in_context_window(agent_id, actor, change, agent_state=agent_state)
+        if not swapped:
+            self.message_manager.delete_message_by_id(summary_message.id, actor=actor)
+            return None
+        return agent_state
+
+    @enforce_types
+    def save_pending_summary(
+        self, summary_message: PydanticMessage, summarized_message_ids: List[str], agent_id: str, actor: PydanticUser
+    ) -> None:
+        """
+        Store a summary of the in-context messages `summarized_message_ids` for the next step of the agent to swap in
+        (`swap_in_pending_summary`), in whichever process it runs. It replaces the summary already pending, if any.
+        """
+        if not summarized_message_ids:
+            return
+        summary_message = self.message_manager.create_message(summary_message, actor=actor)
+        replaced_message_id = None
+        with self.session_maker() as session:
+            self._lock_in_context_window(session, agent_id, actor)
+            replaced = session.get(PendingSummaryModel, agent_id)
+            if replaced is not None:
+                replaced_message_id = replaced.summary_message_id
+                session.delete(replaced)
+                session.flush()
+            session.add(
+                PendingSummaryModel(agent_id=agent_id, summary_message_id=summary_message.id, summarized_message_ids=summarized_message_ids)
+            )
+            session.commit()
+        if replaced_message_id is not None:
+            self.message_manager.delete_message_by_id(replaced_message_id, actor=actor)
+
+    @enforce_types
+    def has_pending_summary(self, agent_id: str, actor: PydanticUser) -> bool:
+        with self.session_maker() as session:
+            return session.get(PendingSummaryModel, agent_id) is not None
+
+    @enforce_types
+    def swap_in_pending_summary(
+        self, agent_id: str, actor: PydanticUser, agent_state: Optional[PydanticAgentState] = None
+    ) -> Optional[PydanticAgentState]:
+        """
+        Swap in the summary saved by `save_pending_summary`, like `swap_in_summary`, and drop it from the pending ones.
+
+        Returns None if there is no pending summary, or if it was dropped because the window changed since it was computed.
+        """
+        if not self.has_pending_summary(agent_id=agent_id, actor=actor):
+            return None
+        summary_message_id = None
+        swapped = False
+
+        def change(session):
+            nonlocal summary_message_id, swapped
+            # read under the window lock, so two steps of the agent don't both take it
+            pending = session.get(PendingSummaryModel, agent_id)
+            if pending is None:
+                return
+            summary_message_id, summarized_message_ids = pending.summary_message_id, list(pending.summarized_message_ids)
+            session.delete(pending)
+            session.flush()
+            swapped = self._swap_in_summary_rows(session, agent_id, summary_message_id, summarized_message_ids)
+
+        agent_state = self._update_in_context_window(agent_id, actor, change, agent_state=agent_state)
+        if not swapped:
+            if summary_message_id is not None:
+                logger.info(f"Dropped the pending summary of agent {agent_id}, the in-context messages changed since it was computed")
+                self.message_manager.delete_message_by_id(summary_message_id, actor=actor)
+            return None
+        return agent_state
+
+    def _swap_in_summary_rows(self, session, agent_id: str, summary_message_id: str, summarized_message_ids: List[str]) -> bool:
+        """Replace the window rows of `summarized_message_ids` with `summary_message_id`, False if the window doesn't start with them"""
+        rows = session.execute(
+            select(MessagesAgents.position, MessagesAgents.message_id)
+            .where(MessagesAgents.agent_id == agent_id)
+            .order_by(MessagesAgents.position)
+            .offset(1)
+            .limit(len(summarized_message_ids))
+        ).all()
+        if [row.message_id for row in rows] != summarized_message_ids:
+            return False
+        positions = [row.position for row in rows]
+        session.execute(delete(MessagesAgents).where(MessagesAgents.agent_id == agent_id, MessagesAgents.position.in_(positions)))
+        self._insert_in_context_rows(session, agent_id, [summary_message_id], start=positions[0])
+        return True
+
+    @staticmethod
+    def _insert_in_context_rows(session, agent_id: str, message_ids: List[str], start: int) -> None:
+        if message_ids:
+            session.execute(
+                insert(MessagesAgents),
+                [{"agent_id": agent_id, "position": start + i, "message_id": message_id} for i, message_id in enumerate(message_ids)],
+            )
 
     @enforce_types
     def reset_messages(self, agent_id: str, actor: PydanticUser, add_default_initial_messages: bool = False) -> PydanticAgentState:
         """
         Removes all in-context messages for the specified agent by:
-          1) Clearing the agent.messages relationship (which cascades delete-orphans).
+          1) Deleting all of the agent's messages.
           2) Resetting the message_ids list to empty.
           3) Committing the transaction.
 
@@ -586,17 +906,19 @@ class AgentManager:
         """
         with self.session_maker() as session:
             # Retrieve the existing agent (will raise NoResultFound if invalid)
-            agent = AgentModel.read(db_session=session, identifier=agent_id, actor=actor)
+            agent = AgentModel.read(
+                db_session=session, identifier=agent_id, actor=actor, load_options=AgentModel.load_options("state+tools")
+            )
 
-            # Because of cascade="all, delete-orphan" on agent.messages, setting
-            # this relationship to an empty list will physically remove them from the DB.
-            agent.messages = []
+            # Delete the messages in bulk rather than loading the agent.messages relationship
+            self._delete_agent_messages(session, agent_id)
 
             # Also clear out the message_ids field to keep in-context memory consistent
             agent.message_ids = []
 
             # Commit the update
             agent.update(db_session=session, actor=actor)
+            self.agent_state_cache.invalidate(agent.id)
 
             agent_state = agent.to_pydantic()
 
@@ -615,6 +937,14 @@ class AgentManager:
             )
             return self.append_to_in_context_messages([system_message], agent_id=agent_state.id, actor=actor)
 
+    @staticmethod
+    def _delete_agent_messages(session, agent_id: str) -> None:
+        """Bulk delete the messages of an agent, along with their job links and its pending summary"""
+        agent_messages = select(MessageModel.id).where(MessageModel.agent_id == agent_id)
+        session.execute(delete(PendingSummaryModel).where(PendingSummaryModel.agent_id == agent_id))
+        session.execute(delete(JobMessage).where(JobMessage.message_id.in_(agent_messages)))
+        session.execute(delete(MessageModel).where(MessageModel.agent_id == agent_id))
+
     # TODO: I moved this from agent.py - replace all mentions of this with the agent_manager version
     @enforce_types
     def update_memory_if_changed(self, agent_id: str, new_memory: Memory, actor: PydanticUser) -> PydanticAgentState:
@@ -628,7 +958,7 @@ class AgentManager:
             modified (bool): whether the memory was updated
         """
         agent_state = self.get_agent_by_id(agent_id=agent_id, actor=actor)
-        if agent_state.memory.compile() != new_memory.compile():
+        if agent_state.memory.compiles_differently(new_memory):
             # update the blocks (LRW) in the DB
             for label in agent_state.memory.list_block_labels():
                 updated_value = new_memory.get_block(label).value
@@ -668,7 +998,9 @@ class AgentManager:
         """
         with self.session_maker() as session:
             # Verify both agent and source exist and user has permission to access them
-            agent = AgentModel.read(db_session=session, identifier=agent_id, actor=actor)
+            agent = AgentModel.read(
+                db_session=session, identifier=agent_id, actor=actor, load_options=AgentModel.load_options("state+tools")
+            )
 
             # The _process_relationship helper already handles duplicate checking via unique constraint
             _process_relationship(
@@ -683,6 +1015,7 @@ class AgentManager:
 
             # Commit the changes
             agent.update(session, actor=actor)
+            self.agent_state_cache.invalidate(agent.id)
             return agent.to_pydantic()
 
     @enforce_types
@@ -699,7 +1032,7 @@ class AgentManager:
         """
         with self.session_maker() as session:
             # Verify agent exists and user has permission to access it
-            agent = AgentModel.read(db_session=session, identifier=agent_id, actor=actor)
+            agent = AgentModel.read(db_session=session, identifier=agent_id, actor=actor, load_options=AgentModel.load_options("columns"))
 
             # Use the lazy-loaded relationship to get sources
             return [source.to_pydantic() for source in agent.sources]
@@ -716,7 +1049,9 @@ class AgentManager:
         """
         with self.session_maker() as session:
             # Verify agent exists and user has permission to access it
-            agent = AgentModel.read(db_session=session, identifier=agent_id, actor=actor)
+            agent = AgentModel.read(
+                db_session=session, identifier=agent_id, actor=actor, load_options=AgentModel.load_options("state+tools")
+            )
 
             # Remove the source from the relationship
             remaining_sources = [s for s in agent.sources if s.id != source_id]
@@ -729,6 +1064,7 @@ class AgentManager:
 
             # Commit the changes
             agent.update(session, actor=actor)
+            self.agent_state_cache.invalidate(agent.id)
             return agent.to_pydantic()
 
     # ======================================================================================================================
@@ -743,7 +1079,7 @@ class AgentManager:
     ) -> PydanticBlock:
         """Gets a block attached to an agent by its label."""
         with self.session_maker() as session:
-            agent = AgentModel.read(db_session=session, identifier=agent_id, actor=actor)
+            agent = AgentModel.read(db_session=session, identifier=agent_id, actor=actor, load_options=AgentModel.load_options("columns"))
             for block in agent.core_memory:
                 if block.label == block_label:
                     return block.to_pydantic()
@@ -759,7 +1095,9 @@ class AgentManager:
     ) -> PydanticAgentState:
         """Updates which block is assigned to a specific label for an agent."""
         with self.session_maker() as session:
-            agent = AgentModel.read(db_session=session, identifier=agent_id, actor=actor)
+            agent = AgentModel.read(
+                db_session=session, identifier=agent_id, actor=actor, load_options=AgentModel.load_options("state+tools")
+            )
             new_block = BlockModel.read(db_session=session, identifier=new_block_id, actor=actor)
 
             if new_block.label != block_label:
@@ -771,17 +1109,21 @@ class AgentManager:
             # Add new block
             agent.core_memory.append(new_block)
             agent.update(session, actor=actor)
+            self.agent_state_cache.invalidate(agent.id)
             return agent.to_pydantic()
 
     @enforce_types
     def attach_block(self, agent_id: str, block_id: str, actor: PydanticUser) -> PydanticAgentState:
         """Attaches a block to an agent."""
         with self.session_maker() as session:
-            agent = AgentModel.read(db_session=session, identifier=agent_id, actor=actor)
+            agent = AgentModel.read(
+                db_session=session, identifier=agent_id, actor=actor, load_options=AgentModel.load_options("state+tools")
+            )
             block = BlockModel.read(db_session=session, identifier=block_id, actor=actor)
 
             agent.core_memory.append(block)
             agent.update(session, actor=actor)
+            self.agent_state_cache.invalidate(agent.id)
             return agent.to_pydantic()
 
     @enforce_types
@@ -793,7 +1135,9 @@ class AgentManager:
     ) -> PydanticAgentState:
         """Detaches a block from an agent."""
         with self.session_maker() as session:
-            agent = AgentModel.read(db_session=session, identifier=agent_id, actor=actor)
+            agent = AgentModel.read(
+                db_session=session, identifier=agent_id, actor=actor, load_options=AgentModel.load_options("state+tools")
+            )
             original_length = len(agent.core_memory)
 
             agent.core_memory = [b for b in agent.core_memory if b.id != block_id]
@@ -802,6 +1146,7 @@ class AgentManager:
                 raise NoResultFound(f"No block with id '{block_id}' found for agent '{agent_id}' with actor id: '{actor.id}'")
 
             agent.update(session, actor=actor)
+            self.agent_state_cache.invalidate(agent.id)
             return agent.to_pydantic()
 
     @enforce_types
@@ -813,7 +1158,9 @@ class AgentManager:
     ) -> PydanticAgentState:
         """Detaches a block with the specified label from an agent."""
         with self.session_maker() as session:
-            agent = AgentModel.read(db_session=session, identifier=agent_id, actor=actor)
+            agent = AgentModel.read(
+                db_session=session, identifier=agent_id, actor=actor, load_options=AgentModel.load_options("state+tools")
+            )
             original_length = len(agent.core_memory)
 
             agent.core_memory = [b for b in agent.core_memory if b.label != block_label]
@@ -822,6 +1169,7 @@ class AgentManager:
                 raise NoResultFound(f"No block with label '{block_label}' found for agent '{agent_id}' with actor id: '{actor.id}'")
 
             agent.update(session, actor=actor)
+            self.agent_state_cache.invalidate(agent.id)
             return agent.to_pydantic()
 
     # ======================================================================================================================
@@ -842,18 +1190,50 @@ class AgentManager:
         ascending: bool = True,
         embedding_config: Optional[EmbeddingConfig] = None,
         agent_only: bool = False,
+        vector_index_k: Optional[int] = None,
+        vector_search_k: Optional[int] = None,
     ) -> Select:
         """Helper function to build the base passage query with all filters applied.
         Supports both before and after pagination across merged source and agent passages.
 
+        If `vector_index_k` is set and an ANN index is enabled (SQLite only), vector search is restricted to the
+        `vector_index_k` nearest passages returned by the index instead of scanning every row with the cosine_distance UDF.
+        Searches filtered by date, cursor or file don't use the index.
+
+        Otherwise, if `vector_search_k` is set and `settings.sqlite_vector_search` is "numpy" (SQLite only), the filtered
+        passages are ranked in NumPy by `top_k_cosine` and the query is restricted to the `vector_search_k` best ones.
+
         Returns the query before any limit or count operations are applied.
         """
         embedded_text = None
+        candidate_ids = None
+        rank_in_numpy = False
         if embed_query:
             assert embedding_config is not None, "embedding_config must be specified for vector search"
             assert query_text is not None, "query_text must be specified for vector search"
             embedded_text = embedding_model(embedding_config).get_text_embedding(query_text)
             embedded_text = np.array(embedded_text)
+            # the index hands back the top candidates before any SQL filter, so filters other than the owners would leave
+            # the page short: those searches scan exactly instead
+            filtered = start_date or end_date or before or after or file_id
+            if vector_index_k and not settings.letta_pg_uri_no_default and not filtered:
+                candidate_ids = self._search_passage_vector_index(
+                    actor=actor,
+                    query_embedding=embedded_text,
+                    k=vector_index_k,
+                    embedding_config=embedding_config,
+                    agent_id=agent_id,
+                    source_id=source_id,
+                    file_id=file_id,
+                    agent_only=agent_only,
+                )
+            rank_in_numpy = (
+                candidate_ids is None
+                and vector_search_k is not None
+                and not settings.letta_pg_uri_no_default
+                and settings.sqlite_vector_search == "numpy"
+            )
+            query_embedding = embedded_text
             embedded_text = np.pad(embedded_text, (0, MAX_EMBEDDING_DIM - embedded_text.shape[0]), mode="constant").tolist()
 
         with self.session_maker() as session:
@@ -887,6 +1267,7 @@ class AgentManager:
                         AgentPassage.embedding_config,
                         AgentPassage.metadata_,
                         AgentPassage.embedding,
+                        AgentPassage.embedding_dim,
                         AgentPassage.created_at,
                         AgentPassage.updated_at,
                         AgentPassage.is_deleted,
@@ -926,9 +1307,25 @@ class AgentManager:
 
             # Vector search
             if embedded_text:
-                if settings.letta_pg_uri_no_default:
-                    # PostgreSQL with pgvector
-                    main_query = main_query.order_by(combined_query.c.embedding.cosine_distance(embedded_text).asc())
+                if candidate_ids is not None:
+                    # ANN index already ranked the passages, only hydrate the top candidates
+                    main_query = main_query.where(combined_query.c.id.in_(candidate_ids))
+                    if candidate_ids:
+                        main_query = main_query.order_by(
+                            case({passage_id: rank for rank, passage_id in enumerate(candidate_ids)}, value=combined_query.c.id).asc()
+                        )
+                elif settings.letta_pg_uri_no_default:
+                    # PostgreSQL with pgvector, answered by the HNSW index of the embedding dimension
+                    from letta.orm.pgvector_functions import cosine_distance, engine_supports_halfvec
+
+                    dim = embedding_config.embedding_dim or len(query_embedding)
+                    halfvec = engine_supports_halfvec(session.get_bind())
+                    main_query = main_query.where(combined_query.c.embedding_dim == dim).order_by(
+                        cosine_distance(combined_query.c.embedding, query_embedding, dim, halfvec=halfvec).asc()
+                    )
+                elif rank_in_numpy:
+                    # Ranked below, once the pagination filters are applied as well
+                    pass
                 else:
                     # SQLite with custom vector type
                     query_embedding_binary = adapt_array(embedded_text)
@@ -996,6 +1393,17 @@ class AgentManager:
                             )
                         )
 
+            if rank_in_numpy:
+                ranked = self._rank_passages_by_embedding(
+                    session, main_query, combined_query.c.id, combined_query.c.embedding, query_embedding, vector_search_k
+                )
+                candidate_ids = [passage_id for passage_id, _ in ranked]
+                main_query = main_query.where(combined_query.c.id.in_(candidate_ids))
+                if candidate_ids:
+                    main_query = main_query.order_by(
+                        case({passage_id: rank for rank, passage_id in enumerate(candidate_ids)}, value=combined_query.c.id).asc()
+                    )
+
             # Add ordering if not already ordered by similarity
             if not embed_query:
                 if ascending:
@@ -1045,6 +1453,8 @@ class AgentManager:
                 ascending=ascending,
                 embedding_config=embedding_config,
                 agent_only=agent_only,
+                vector_index_k=max(limit or 0, settings.sqlite_vector_index_candidates),
+                vector_search_k=limit,
             )
 
             # Add limit
@@ -1070,6 +1480,135 @@ class AgentManager:
 
             return [p.to_pydantic() for p in passages]
 
+    def _rank_passages_by_embedding(
+        self,
+        session,
+        query: Select,
+        id_column,
+        embedding_column,
+        query_embedding: np.ndarray,
+        k: int,
+        batch_size: int = 2000,
+    ) -> List[Tuple[str, float]]:
+        """Exact top-k of the passages selected by `query`, scored in NumPy batches instead of per row by the cosine_distance UDF."""
+        rows = session.execute(query.with_only_columns(id_column, embedding_column).execution_options(yield_per=batch_size))
+        batches = (([row[0] for row in partition], [row[1] for row in partition]) for partition in rows.partitions())
+        return top_k_cosine(query_embedding, batches, k)
+
+    def _search_passage_vector_index(
+        self,
+        actor: PydanticUser,
+        query_embedding: np.ndarray,
+        k: int,
+        embedding_config: EmbeddingConfig,
+        agent_id: Optional[str] = None,
+        source_id: Optional[str] = None,
+        file_id: Optional[str] = None,
+        agent_only: bool = False,
+    ) -> Optional[List[str]]:
+        """Query the ANN indexes for the ids of the k passages closest to `query_embedding`.
+
+        Returns None if no index is enabled, in which case the caller falls back to the brute-force path.
+        """
+        embedding_dim = embedding_config.embedding_dim
+        agent_index = self.passage_manager.get_vector_index(AgentPassage, embedding_dim)
+        if agent_index is None:
+            return None
+
+        scored = []
+        # source_id / file_id filters exclude agent passages in the SQL query as well
+        if agent_id is not None and not source_id and not file_id:
+            self.passage_manager.sync_vector_index(agent_index, AgentPassage, embedding_dim, [agent_id])
+            scored.extend(agent_index.search(query_embedding, k, owners=[agent_id]))
+
+        if not agent_only:
+            if source_id:
+                source_ids = [source_id]
+            else:
+                with self.session_maker() as session:
+                    if agent_id is not None:
+                        query = select(SourcesAgents.source_id).where(SourcesAgents.agent_id == agent_id)
+                    else:
+                        query = select(SourceModel.id).where(SourceModel.organization_id == actor.organization_id)
+                    source_ids = list(session.execute(query).scalars())
+            if source_ids:
+                source_index = self.passage_manager.get_vector_index(SourcePassage, embedding_dim)
+                self.passage_manager.sync_vector_index(source_index, SourcePassage, embedding_dim, source_ids)
+                scored.extend(source_index.search(query_embedding, k, owners=source_ids))
+
+        scored.sort(key=lambda pair: pair[1], reverse=True)
+        return [passage_id for passage_id, _ in scored[:k]]
+
+    @enforce_types
+    def search_passages(
+        self,
+        actor: PydanticUser,
+        agent_id: str,
+        query_text: str,
+        embedding_config: EmbeddingConfig,
+        limit: int = 5,
+        agent_only: bool = False,
+    ) -> List[PydanticPassage]:
+        """
+        Archival memory search: the `limit` passages of an agent (and its sources) most relevant to `query_text`.
+
+        With `settings.archival_search_mode` "hybrid", the full text ranking of the passages is fused with their vector
+        ranking by reciprocal rank fusion. When the query names an identifier (see `is_identifier_query`) and at least
+        `limit` passages contain every word of it, the full text ranking alone answers the search and the query is not
+        embedded at all. Mode "vector" ranks by embedding only.
+        """
+        k = max(limit, settings.archival_search_candidates)
+        lexical = []
+        if settings.archival_search_mode == "hybrid":
+            terms = search_terms(query_text)
+            lexical = self._search_passages_full_text(actor=actor, agent_id=agent_id, terms=terms, k=k, agent_only=agent_only)
+            if is_identifier_query(query_text):
+                exact = [passage for passage in lexical if covers_terms(passage.text, terms)]
+                if len(exact) >= limit:
+                    return exact[:limit]
+
+        semantic = self.list_passages(
+            actor=actor,
+            agent_id=agent_id,
+            query_text=query_text,
+            limit=k,
+            embedding_config=embedding_config,
+            embed_query=True,
+            agent_only=agent_only,
+        )
+        if not lexical:
+            return semantic[:limit]
+
+        passages = {passage.id: passage for passage in semantic + lexical}
+        fused = reciprocal_rank_fusion([[passage.id for passage in semantic], [passage.id for passage in lexical]])
+        return [passages[passage_id] for passage_id in fused[:limit]]
+
+    def _search_passages_full_text(
+        self, actor: PydanticUser, agent_id: str, terms: List[str], k: int, agent_only: bool = False
+    ) -> List[PydanticPassage]:
+        """The k agent and source passages of the agent ranked highest by the full text index for any of `terms`"""
+        if not terms:
+            return []
+        with self.session_maker() as session:
+            query = session.query(AgentPassage).filter(
+                AgentPassage.agent_id == agent_id, AgentPassage.organization_id == actor.organization_id
+            )
+            query, score = full_text_match(query, AgentPassage, terms)
+            scored = query.options(noload("*")).add_columns(score).order_by(score.desc()).limit(k).all()
+
+            if not agent_only:
+                query = (
+                    session.query(SourcePassage)
+                    .join(SourcesAgents, SourcesAgents.source_id == SourcePassage.source_id)
+                    .filter(SourcesAgents.agent_id == agent_id, SourcePassage.organization_id == actor.organization_id)
+                )
+                query, score = full_text_match(query, SourcePassage, terms)
+                scored += query.options(noload("*")).add_columns(score).order_by(score.desc()).limit(k).all()
+
+            # scores of the two tables come from separate indexes, but are close enough to merge for a top k
+            scored.sort(key=lambda row: row[1], reverse=True)
+            return [passage.to_pydantic() for passage, _ in scored[:k]]
+
     @enforce_types
     def passage_size(
         self,
@@ -1130,7 +1669,9 @@ class AgentManager:
         """
         with self.session_maker() as session:
             # Verify the agent exists and user has permission to access it
-            agent = AgentModel.read(db_session=session, identifier=agent_id, actor=actor)
+            agent = AgentModel.read(
+                db_session=session, identifier=agent_id, actor=actor, load_options=AgentModel.load_options("state+tools")
+            )
 
             # Use the _process_relationship helper to attach the tool
             _process_relationship(
@@ -1145,6 +1686,7 @@ class AgentManager:
 
             # Commit and refresh the agent
             agent.update(session, actor=actor)
+            self.agent_state_cache.invalidate(agent.id)
             return agent.to_pydantic()
 
     @enforce_types
@@ -1165,7 +1707,9 @@ class AgentManager:
         """
         with self.session_maker() as session:
             # Verify the agent exists and user has permission to access it
-            agent = AgentModel.read(db_session=session, identifier=agent_id, actor=actor)
+            agent = AgentModel.read(
+                db_session=session, identifier=agent_id, actor=actor, load_options=AgentModel.load_options("state+tools")
+            )
 
             # Filter out the tool to be detached
             remaining_tools = [tool for tool in agent.tools if tool.id != tool_id]
@@ -1178,6 +1722,7 @@ class AgentManager:
 
             # Commit and refresh the agent
             agent.update(session, actor=actor)
+            self.agent_state_cache.invalidate(agent.id)
             return agent.to_pydantic()
 
     @enforce_types
@@ -1193,7 +1738,7 @@ class AgentManager:
             List[PydanticTool]: List of tools attached to the agent.
         """
         with self.session_maker() as session:
-            agent = AgentModel.read(db_session=session, identifier=agent_id, actor=actor)
+            agent = AgentModel.read(db_session=session, identifier=agent_id, actor=actor, load_options=AgentModel.load_options("columns"))
             return [tool.to_pydantic() for tool in agent.tools]
 
     # ======================================================================================================================
@@ -1220,6 +1765,7 @@ class AgentManager:
                 session.query(AgentsTags.tag)
                 .join(AgentModel, AgentModel.id == AgentsTags.agent_id)
                 .filter(AgentModel.organization_id == actor.organization_id)
+                .filter(~AgentsTags.tag.startswith(OFFLINE_MEMORY_AGENT_TAG_PREFIX, autoescape=True))
                 .distinct()
             )
 
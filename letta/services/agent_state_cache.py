@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Hashable, Iterable, Optional, Tuple
+
+from letta.settings import settings
+
+if TYPE_CHECKING:
+    from letta.schemas.agent import AgentState
+
+
+class AgentStateCache:
+    """
+    Bounded in-process LRU cache of hydrated agent states, keyed by agent id.
+
+    Entries are copied on the way in and out, since `Agent` mutates the state it is built from. Writes invalidate entries
+    through `invalidate` / `invalidate_all`. Each invalidation bumps a generation counter: a state read from the database
+    before an invalidation is never stored after it (see `generation` and `put`).
+
+    Invalidations only reach the cache of their own process. Writes from other processes (`letta worker`, other API
+    servers) are caught by the version each entry is stored with (`AgentManager.get_agent_version`): a lookup with a
+    different version is a miss.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[AgentState, Hashable]]" = OrderedDict()  # agent id -> (state, version)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, agent_id: str, version: Hashable = None) -> Optional["AgentState"]:
+        """The cached state of the agent, None if there is none or it was stored with another version"""
+        with self._lock:
+            entry = self._entries.get(agent_id)
+            if entry is not None and entry[1] != version:
+                # written by another process since it was cached
+                del self._entries[agent_id]
+                self.stale += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(agent_id)
+            self.hits += 1
+        return entry[0].model_copy(deep=True)
+
+    def put(self, agent_state: "AgentState", generation: int, version: Hashable = None) -> None:
+        """Cache `agent_state` as of `version`, unless something was invalidated since `generation` was read"""
+        if self.max_size <= 0:
+            return
+        agent_state = agent_state.model_copy(deep=True)
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[agent_state.id] = (agent_state, version)
+            self._entries.move_to_end(agent_state.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, agent_ids: Iterable[str]) -> None:
+        if isinstance(agent_ids, str):
+            agent_ids = [agent_ids]
+        with self._lock:
+            self._generation += 1
+            for agent_id in agent_ids:
+                if self._entries.pop(agent_id, None) is not None:
+                    self.invalidations += 1
+
+    def invalidate_all(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "stale": self.stale,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_cache: Optional[AgentStateCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_agent_state_cache() -> AgentStateCache:
+    """Process wide cache shared by `SyncServer.load_agent` and the managers that invalidate it"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AgentStateCache(max_size=settings.agent_state_cache_size)
+    return _cache
@@ -0,0 +1,88 @@
+import concurrent.futures
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from letta.log import get_logger
+from letta.schemas.message import Message as PydanticMessage
+from letta.settings import summarizer_settings
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class PendingSummary:
+    summarized_message_ids: List[str]  # the in-context messages right after the system message that the summary replaces
+    summary_message: PydanticMessage  # not persisted yet
+
+
+class BackgroundSummarizer:
+    """
+    Summaries of the oldest in-context messages of agents, computed off the request path.
+
+    `Agent.inner_step` schedules a summary once the memory warning threshold is crossed. The summary is saved as the
+    pending summary of the agent (`AgentManager.save_pending_summary`) and the start of a later step swaps it into the
+    window, in whichever process it runs, before the context window overflows.
+
+    Only the summaries in progress are tracked here, at most one per agent: a summary is forgotten as soon as it is
+    saved (or failed).
+    """
+
+    def __init__(self, max_workers: int = 2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="letta-summarizer")
+        self._futures: Dict[str, Future] = {}  # agent id -> summary in progress
+        self._lock = threading.Lock()
+
+    def schedule(self, agent_id: str, summarize: Callable[[], None]) -> bool:
+        """Run `summarize` in the background, False if the agent already has a summary in progress"""
+        with self._lock:
+            if agent_id in self._futures:
+                return False
+            future = self._executor.submit(summarize)
+            self._futures[agent_id] = future
+        future.add_done_callback(lambda future: self._done(agent_id, future))
+        return True
+
+    def in_progress(self, agent_id: str) -> bool:
+        with self._lock:
+            return agent_id in self._futures
+
+    def wait(self, agent_id: str, timeout: Optional[float] = None) -> bool:
+        """
+        Wait up to `timeout` seconds (None waits until it is done) for the summary of the agent in progress, returns
+        whether there was one and it was saved.
+        """
+        with self._lock:
+            future = self._futures.get(agent_id)
+        if future is None:
+            return False
+        try:
+            future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            return False
+        except Exception:
+            # logged by `_done`
+            return False
+        return True
+
+    def _done(self, agent_id: str, future: Future) -> None:
+        with self._lock:
+            if self._futures.get(agent_id) is future:
+                del self._futures[agent_id]
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Background summarization of agent {agent_id} failed", exc_info=future.exception())
+
+
+_summarizer: Optional[BackgroundSummarizer] = None
+_summarizer_lock = threading.Lock()
+
+
+def get_background_summarizer() -> BackgroundSummarizer:
+    """Process wide summarizer used when `summarizer_settings.proactive` is set"""
+    global _summarizer
+    if _summarizer is None:
+        with _summarizer_lock:
+            if _summarizer is None:
+                _summarizer = BackgroundSummarizer(max_workers=summarizer_settings.proactive_max_workers)
+    return _summarizer
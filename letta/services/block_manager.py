@@ -1,13 +1,17 @@
 import os
 from typing import List, Optional
 
+from sqlalchemy import select
+
 from letta.orm.block import Block as BlockModel
+from letta.orm.blocks_agents import BlocksAgents
 from letta.orm.errors import NoResultFound
 from letta.schemas.agent import AgentState as PydanticAgentState
 from letta.schemas.block import Block
 from letta.schemas.block import Block as PydanticBlock
 from letta.schemas.block import BlockUpdate, Human, Persona
 from letta.schemas.user import User as PydanticUser
+from letta.services.agent_state_cache import get_agent_state_cache
 from letta.utils import enforce_types, list_human_files, list_persona_files
 
 
@@ -19,6 +23,7 @@ class BlockManager:
         from letta.server.db import db_context
 
         self.session_maker = db_context
+        self.agent_state_cache = get_agent_state_cache()
 
     @enforce_types
     def create_or_update_block(self, block: Block, actor: PydanticUser) -> PydanticBlock:
@@ -47,6 +52,7 @@ class BlockManager:
                 setattr(block, key, value)
 
             block.update(db_session=session, actor=actor)
+            self.agent_state_cache.invalidate(self._get_agent_ids_for_block(session, block_id))
             return block.to_pydantic()
 
     @enforce_types
@@ -54,7 +60,9 @@ class BlockManager:
         """Delete a block by its ID."""
         with self.session_maker() as session:
             block = BlockModel.read(db_session=session, identifier=block_id)
+            agent_ids = self._get_agent_ids_for_block(session, block_id)
             block.hard_delete(db_session=session, actor=actor)
+            self.agent_state_cache.invalidate(agent_ids)
             return block.to_pydantic()
 
     @enforce_types
@@ -118,6 +126,9 @@ class BlockManager:
             name = os.path.basename(human_file).replace(".txt", "")
             self.create_or_update_block(Human(template_name=name, value=text, is_template=True), actor=actor)
 
+    def _get_agent_ids_for_block(self, session, block_id: str) -> List[str]:
+        return list(session.execute(select(BlocksAgents.agent_id).where(BlocksAgents.block_id == block_id)).scalars())
+
     @enforce_types
     def get_agents_for_block(self, block_id: str, actor: PydanticUser) -> List[PydanticAgentState]:
         """
@@ -0,0 +1,207 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from letta.log import get_logger
+from letta.schemas.embedding_config import EmbeddingConfig
+from letta.settings import settings
+
+logger = get_logger(__name__)
+
+# rough per-entry overhead of the key string, the ndarray header and the OrderedDict slot
+_ENTRY_OVERHEAD_BYTES = 250
+
+
+def embedding_cache_key(embedding_config: EmbeddingConfig, text: str) -> str:
+    """Content address of `text` embedded by the model and endpoint of `embedding_config`"""
+    digest = hashlib.sha256()
+    for part in (
+        embedding_config.embedding_endpoint_type,
+        embedding_config.embedding_endpoint or "",
+        embedding_config.embedding_model,
+        text,
+    ):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed cache of embeddings, keyed by `embedding_cache_key`.
+
+    The in-memory tier is an LRU bounded by `max_bytes` (embeddings are kept as float32). With `persist=True`, misses
+    fall through to the `embedding_cache` table and new embeddings are written back to it, so they survive restarts
+    and are shared between server processes.
+    """
+
+    def __init__(self, max_bytes: int, persist: bool = False, session_maker: Optional[Callable] = None):
+        self.max_bytes = max_bytes
+        self.persist = persist
+        self._session_maker = session_maker
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def session_maker(self) -> Callable:
+        if self._session_maker is None:
+            from letta.server.db import db_context
+
+            self._session_maker = db_context
+        return self._session_maker
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Return the cached embeddings among `keys`, checking memory first and then the persistent table"""
+        found = {}
+        with self._lock:
+            for key in keys:
+                embedding = self._entries.get(key)
+                if embedding is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = embedding
+        missing = [key for key in keys if key not in found]
+        if missing and self.persist:
+            stored = self._read_persistent(missing)
+            self._put_memory(stored)
+            found.update(stored)
+        with self._lock:
+            self.hits += len(keys) - len(missing)
+            self.persistent_hits += len(found) - (len(keys) - len(missing))
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, embedding_model: str, embeddings: Dict[str, np.ndarray]) -> None:
+        embeddings = {key: np.asarray(embedding, dtype=np.float32) for key, embedding in embeddings.items()}
+        self._put_memory(embeddings)
+        if self.persist:
+            self._write_persistent(embedding_model, embeddings)
+
+    def _put_memory(self, embeddings: Dict[str, np.ndarray]) -> None:
+        if self.max_bytes <= 0:
+            return
+        with self._lock:
+            for key, embedding in embeddings.items():
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    continue
+                self._entries[key] = embedding
+                self._bytes += embedding.nbytes + _ENTRY_OVERHEAD_BYTES
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes + _ENTRY_OVERHEAD_BYTES
+                self.evictions += 1
+
+    def _read_persistent(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        from sqlalchemy import select
+
+        from letta.orm.embedding_cache import EmbeddingCacheEntry
+
+        try:
+            with self.session_maker() as session:
+                rows = session.execute(
+                    select(EmbeddingCacheEntry.key, EmbeddingCacheEntry.embedding).where(EmbeddingCacheEntry.key.in_(keys))
+                ).all()
+        except Exception as e:
+            # the cache is an optimization, never fail an embedding request because of it
+            logger.warning(f"Failed to read the persistent embedding cache: {e}")
+            return {}
+        return {key: np.frombuffer(blob, dtype="<f4") for key, blob in rows}
+
+    def _write_persistent(self, embedding_model: str, embeddings: Dict[str, np.ndarray]) -> None:
+        from letta.orm.embedding_cache import EmbeddingCacheEntry
+
+        if not embeddings:
+            return
+        rows = [
+            {"key": key, "embedding_model": embedding_model, "embedding": embedding.astype("<f4").tobytes()}
+            for key, embedding in embeddings.items()
+        ]
+        try:
+            with self.session_maker() as session:
+                if session.bind.dialect.name == "postgresql":
+                    from sqlalchemy.dialects.postgresql import insert
+                else:
+                    from sqlalchemy.dialects.sqlite import insert
+                session.execute(insert(EmbeddingCacheEntry).values(rows).on_conflict_do_nothing(index_elements=["key"]))
+                session.commit()
+        except Exception as e:
+            logger.warning(f"Failed to write the persistent embedding cache: {e}")
+
+    def clear(self) -> None:
+        """Drop the in-memory tier (the persistent table is left alone)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.persistent_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.persistent_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class CachedEmbeddingModel:
+    """Wraps an embedding model from `letta.embeddings.embedding_model` so it only calls the provider on cache misses"""
+
+    def __init__(self, model, embedding_config: EmbeddingConfig, cache: EmbeddingCache):
+        self.provider_model = model
+        self.embedding_config = embedding_config
+        self.cache = cache
+
+    def get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        keys = [embedding_cache_key(self.embedding_config, text) for text in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+
+        # embed each missing text once, even if it is repeated in `texts`
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            if hasattr(self.provider_model, "get_text_embeddings"):
+                embeddings = self.provider_model.get_text_embeddings(list(missing.values()))
+            else:
+                embeddings = [self.provider_model.get_text_embedding(text) for text in missing.values()]
+            new = dict(zip(missing.keys(), embeddings))
+            self.cache.put_many(self.embedding_config.embedding_model, new)
+            found.update({key: np.asarray(embedding, dtype=np.float32) for key, embedding in new.items()})
+
+        return [found[key].tolist() for key in keys]
+
+    def get_text_embedding(self, text: str) -> List[float]:
+        return self.get_text_embeddings([text])[0]
+
+    def __getattr__(self, name):
+        if name == "provider_model":
+            raise AttributeError(name)
+        return getattr(self.provider_model, name)
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Process wide cache shared by every model returned from `embedding_model`"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(max_bytes=settings.embedding_cache_size_mb * 1024 * 1024, persist=settings.embedding_cache_persist)
+    return _cache
@@ -84,6 +84,15 @@ def _process_tags(agent: AgentModel, tags: List[str], replace=True):
         agent.tags.extend([tag for tag in new_tags if tag.tag not in existing_tags])
 
 
+# agents tagged with it are kept by the memory consolidation service and hidden from listings (see AgentManager.list_agents)
+OFFLINE_MEMORY_AGENT_TAG_PREFIX = "offline_memory_agent:"
+
+
+def offline_memory_agent_tag(agent_id: str) -> str:
+    """Tag of the offline memory agent that consolidates the memory of the chat only agent `agent_id`"""
+    return f"{OFFLINE_MEMORY_AGENT_TAG_PREFIX}{agent_id}"
+
+
 def derive_system_message(agent_type: AgentType, system: Optional[str] = None):
     if system is None:
         # TODO: don't hardcode
@@ -0,0 +1,70 @@
+import re
+from collections import defaultdict
+from typing import Dict, Hashable, List, Sequence, Tuple
+
+from sqlalchemy import ColumnElement, func, literal_column, select, text
+from sqlalchemy.orm import Query
+
+from letta.constants import FULL_TEXT_SEARCH_LANGUAGE, RRF_K
+from letta.settings import settings
+
+
+def search_terms(query_text: str) -> List[str]:
+    """
+    Lowercased words of `query_text` to search for. Only word characters reach the FTS5 / tsquery syntax, so input can't
+    break the query, and single characters (like the "s" of "what's") are dropped since they prefix half of all words.
+    """
+    return [term for term in re.findall(r"\w+", query_text.lower()) if len(term) > 1]
+
+
+def is_identifier_query(query_text: str) -> bool:
+    """
+    Whether `query_text` names something by an identifier (a token with a digit, `_` or an inner `-`, like an order number
+    or a snake_case name). Passages containing such a token are what the query asks for, which is not true of words in
+    general: a passage mentioning every word of a plain question may still answer it worse than its nearest embeddings.
+    """
+    return any(re.search(r"\d|\w[_-]\w", token) for token in query_text.split())
+
+
+def covers_terms(text_: str, terms: List[str]) -> bool:
+    """Whether every term is a word of `text_` or prefixes one, i.e. the document matches all terms and not just some"""
+    words = set(re.findall(r"\w+", (text_ or "").lower()))
+    return all(any(word.startswith(term) for word in words) for term in terms)
+
+
+def full_text_match(query: Query, model, terms: List[str]) -> Tuple[Query, ColumnElement]:
+    """
+    Restrict `query` to the rows of `model` whose text matches any of `terms` (or a word they prefix).
+
+    SQLite searches the `<table>_fts` FTS5 index (see `sqlite_functions.create_sqlite_full_text_index`), Postgres the GIN
+    indexed `to_tsvector` of the text column. Both indexes are maintained by the database on insert, update and delete.
+
+    Returns:
+        The filtered query, and its relevance score (higher is better: ts_rank on Postgres, negated bm25 on SQLite)
+    """
+    table = model.__tablename__
+    if settings.letta_pg_uri_no_default:
+        # literal arguments, so the expression matches the one of the GIN index
+        language = literal_column(f"'{FULL_TEXT_SEARCH_LANGUAGE}'")
+        vector = func.to_tsvector(language, func.coalesce(model.text, literal_column("''")))
+        tsquery = func.to_tsquery(language, " | ".join(f"{term}:*" for term in terms))
+        return query.filter(vector.op("@@")(tsquery)), func.ts_rank(vector, tsquery)
+
+    fts_table, keys_table = f"{table}_fts", f"{table}_fts_keys"
+    matches = (
+        select(literal_column(f"{keys_table}.id").label("id"), literal_column(f"bm25({fts_table})").label("rank"))
+        .select_from(text(f"{fts_table} JOIN {keys_table} ON {keys_table}.fts_rowid = {fts_table}.rowid"))
+        .where(text(f"{fts_table} MATCH :match").bindparams(match=" OR ".join(f'"{term}"*' for term in terms)))
+        .subquery()
+    )
+    # bm25 is lower for better matches
+    return query.join(matches, matches.c.id == model.id), -matches.c.rank
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = RRF_K) -> List[Hashable]:
+    """Fuse rankings of ids by their summed 1 / (k + rank), ties keep the order in which ids were first seen"""
+    scores: Dict[Hashable, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda item: scores[item], reverse=True)
@@ -0,0 +1,110 @@
+"""
+Long-lived worker process of the local sandbox worker pool (see `letta.services.sandbox_worker_pool`).
+
+The worker is started with the sandbox's python executable (usually the sandbox venv) and runs this file as a script, so
+it may only depend on the standard library. It reads requests from stdin and writes responses to stdout, both as
+length-prefixed JSON frames (`multiprocessing.connection`):
+
+    request:  {"code": <execution script>, "env": <environment of the call>, "result_var": <name of the result variable>,
+               "globals": <initial globals of the script>}
+    response: {"status": "success" | "error", "result": ..., "stdout": ..., "stderr": ..., "error": [name, message] | None}
+
+usage: python sandbox_worker.py <memory limit in MB, 0 for none>
+"""
+
+import builtins
+import io
+import json
+import linecache
+import os
+import sys
+import traceback
+from multiprocessing.connection import Connection
+
+SCRIPT_FILENAME = "<letta-sandbox-tool>"
+
+
+def limit_memory(limit_mb: int) -> None:
+    try:
+        import resource
+
+        limit = limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        # not available on this platform, the pool still recycles the worker after a timeout
+        pass
+
+
+def warm_up() -> None:
+    # execution scripts unpickle the agent state, which imports letta
+    try:
+        import letta  # noqa: F401
+    except ImportError:
+        pass
+
+
+def run(request: dict, base_env: dict, cwd: str) -> dict:
+    stdout, stderr = io.StringIO(), io.StringIO()
+    status, result, error = "success", None, None
+
+    # register the script source so tracebacks can show it
+    code = request["code"]
+    linecache.cache[SCRIPT_FILENAME] = (len(code), None, code.splitlines(True), SCRIPT_FILENAME)
+
+    os.environ.clear()
+    os.environ.update(request["env"])
+    sys.stdout, sys.stderr = stdout, stderr
+    try:
+        namespace = {**request.get("globals", {}), "__name__": "__main__", "__builtins__": builtins}
+        exec(compile(code, SCRIPT_FILENAME, "exec"), namespace)
+        result = namespace.get(request["result_var"])
+    except KeyboardInterrupt:
+        raise
+    except BaseException as e:
+        # includes SystemExit, a tool calling sys.exit() must not take the worker down
+        traceback.print_exc(file=stderr)
+        status, error = "error", [type(e).__name__, str(e)]
+    finally:
+        sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+        os.environ.clear()
+        os.environ.update(base_env)
+        os.chdir(cwd)
+
+    return {"status": status, "result": result, "stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "error": error}
+
+
+def main() -> None:
+    limit_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    if limit_mb > 0:
+        limit_memory(limit_mb)
+
+    # keep the protocol on private descriptors, anything the tool writes to fd 1 goes to stderr instead
+    requests = Connection(os.dup(0), writable=False)
+    responses = Connection(os.dup(1), readable=False)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(2, 1)
+
+    # tools import modules from the sandbox directory, like a script run from there would
+    cwd = os.getcwd()
+    sys.path.insert(0, cwd)
+    warm_up()
+    base_env = dict(os.environ)
+    responses.send_bytes(json.dumps({"ready": True}).encode("utf-8"))
+
+    while True:
+        try:
+            request = json.loads(requests.recv_bytes())
+        except EOFError:
+            # the server went away
+            return
+        response = run(request, base_env=base_env, cwd=cwd)
+        try:
+            payload = json.dumps(response)
+        except (TypeError, ValueError) as e:
+            payload = json.dumps({**response, "result": None, "status": "error", "error": [type(e).__name__, str(e)]})
+        responses.send_bytes(payload.encode("utf-8"))
+
+
+if __name__ == "__main__":
+    main()
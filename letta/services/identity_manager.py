@@ -9,6 +9,7 @@ from letta.orm.identity import Identity as IdentityModel
 from letta.schemas.identity import Identity as PydanticIdentity
 from letta.schemas.identity import IdentityCreate, IdentityType, IdentityUpdate
 from letta.schemas.user import User as PydanticUser
+from letta.services.agent_state_cache import get_agent_state_cache
 from letta.utils import enforce_types
 
 
@@ -18,6 +19,7 @@ class IdentityManager:
         from letta.server.db import db_context
 
         self.session_maker = db_context
+        self.agent_state_cache = get_agent_state_cache()
 
     @enforce_types
     def list_identities(
@@ -62,6 +64,7 @@ class IdentityManager:
             new_identity.organization_id = actor.organization_id
             self._process_agent_relationship(session=session, identity=new_identity, agent_ids=identity.agent_ids, allow_partial=False)
             new_identity.create(session, actor=actor)
+            self.agent_state_cache.invalidate(identity.agent_ids or [])
             return new_identity.to_pydantic()
 
     @enforce_types
@@ -122,6 +125,7 @@ class IdentityManager:
             session=session, identity=existing_identity, agent_ids=identity.agent_ids, allow_partial=False, replace=replace
         )
         existing_identity.update(session, actor=actor)
+        self.agent_state_cache.invalidate_all()
         return existing_identity.to_pydantic()
 
     @enforce_types
@@ -134,6 +138,7 @@ class IdentityManager:
                 raise HTTPException(status_code=403, detail="Forbidden")
             session.delete(identity)
             session.commit()
+            self.agent_state_cache.invalidate_all()
 
     def _process_agent_relationship(
         self, session: Session, identity: IdentityModel, agent_ids: List[str], allow_partial=False, replace=True
@@ -1,8 +1,9 @@
+from datetime import timedelta
 from functools import reduce
 from operator import add
 from typing import List, Literal, Optional, Union
 
-from sqlalchemy import select
+from sqlalchemy import func, select, update
 from sqlalchemy.orm import Session
 
 from letta.helpers.datetime_helpers import get_utc_time
@@ -312,6 +313,138 @@ class JobManager:
 
         return messages
 
+    @enforce_types
+    def claim_run(self, run_id: str, worker_id: str) -> Optional[PydanticJob]:
+        """
+        Claim a queued run for `worker_id`, moving it from created to running.
+
+        Returns:
+            The claimed run, or None if it was already claimed (or is gone)
+        """
+        with self.session_maker() as session:
+            job = self._claim(session, run_id, worker_id)
+            return job.to_pydantic() if job else None
+
+    @enforce_types
+    def claim_next_run(self, worker_id: str, job_type: JobType = JobType.RUN) -> Optional[PydanticJob]:
+        """
+        Claim the oldest queued run for `worker_id`, moving it from created to running.
+
+        On Postgres the candidate row is locked with `FOR UPDATE SKIP LOCKED`, so concurrent workers never wait on each
+        other and never claim the same run. SQLite has no row locks, the conditional update in `_claim` lets only one
+        of several racing workers win.
+
+        Returns:
+            The claimed run, or None if no run is queued
+        """
+        with self.session_maker() as session:
+            query = (
+                select(JobModel.id)
+                .where(JobModel.job_type == job_type, JobModel.status == JobStatus.created, JobModel.is_deleted == False)
+                .order_by(JobModel.created_at, JobModel.id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )
+            run_id = session.execute(query).scalar_one_or_none()
+            if run_id is None:
+                return None
+            job = self._claim(session, run_id, worker_id)
+            return job.to_pydantic() if job else None
+
+    @enforce_types
+    def heartbeat_run(self, run_id: str, worker_id: str, progress: Optional[dict] = None) -> bool:
+        """
+        Record that `worker_id` is still running the run, optionally storing its progress under `metadata["progress"]`.
+
+        Returns:
+            Whether the worker still owns the run, False once it was reclaimed or finished elsewhere
+        """
+        with self.session_maker() as session:
+            job = session.execute(
+                select(JobModel).where(JobModel.id == run_id, JobModel.worker_id == worker_id, JobModel.status == JobStatus.running)
+            ).scalar_one_or_none()
+            if job is None:
+                return False
+            job.heartbeat_at = get_utc_time()
+            if progress is not None:
+                job.metadata_ = {**(job.metadata_ or {}), "progress": progress}
+            session.commit()
+            return True
+
+    @enforce_types
+    def finish_run(self, run_id: str, worker_id: str, status: JobStatus, metadata: Optional[dict] = None) -> bool:
+        """
+        Move a run `worker_id` is running to its final `status`, replacing its metadata with `metadata` when given.
+
+        Returns:
+            Whether the worker still owned the run. If the run was reclaimed (or finished) by another worker in the
+            meantime, nothing is written and the caller's result is discarded
+        """
+        values = {"status": status, "completed_at": get_utc_time(), "updated_at": get_utc_time()}
+        if metadata is not None:
+            values["metadata_"] = metadata
+        with self.session_maker() as session:
+            result = session.execute(
+                update(JobModel)
+                .where(JobModel.id == run_id, JobModel.worker_id == worker_id, JobModel.status == JobStatus.running)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            session.commit()
+            return result.rowcount > 0
+
+    @enforce_types
+    def reclaim_stale_runs(self, stale_after: float, max_attempts: int, job_type: JobType = JobType.RUN) -> List[str]:
+        """
+        Put running runs whose worker missed its heartbeats for `stale_after` seconds back in the queue.
+
+        Runs that were already claimed `max_attempts` times are failed instead, so a run that crashes its worker does
+        not take down every worker in turn.
+
+        Returns:
+            The IDs of the requeued runs
+        """
+        with self.session_maker() as session:
+            query = (
+                select(JobModel)
+                .where(
+                    JobModel.job_type == job_type,
+                    JobModel.status == JobStatus.running,
+                    JobModel.worker_id.is_not(None),
+                    JobModel.heartbeat_at < get_utc_time() - timedelta(seconds=stale_after),
+                )
+                .with_for_update(skip_locked=True)
+            )
+            requeued = []
+            for job in session.execute(query).scalars():
+                if (job.attempts or 0) >= max_attempts:
+                    job.status = JobStatus.failed
+                    job.completed_at = get_utc_time()
+                    job.metadata_ = {**(job.metadata_ or {}), "error": f"Run was abandoned by {job.attempts} workers"}
+                else:
+                    job.status = JobStatus.created
+                    requeued.append(job.id)
+                job.worker_id = None
+            session.commit()
+            return requeued
+
+    def _claim(self, session: Session, run_id: str, worker_id: str) -> Optional[JobModel]:
+        result = session.execute(
+            update(JobModel)
+            .where(JobModel.id == run_id, JobModel.status == JobStatus.created)
+            .values(
+                status=JobStatus.running,
+                worker_id=worker_id,
+                heartbeat_at=get_utc_time(),
+                attempts=func.coalesce(JobModel.attempts, 0) + 1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+        if result.rowcount == 0:
+            return None
+        return session.get(JobModel, run_id)
+
     def _verify_job_access(
         self,
         session: Session,
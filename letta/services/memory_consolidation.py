@@ -0,0 +1,225 @@
+import atexit
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Set
+
+from letta.interface import CLIInterface
+from letta.log import get_logger
+from letta.offline_memory_agent import OfflineMemoryAgent
+from letta.orm.errors import NoResultFound
+from letta.prompts import gpt_system
+from letta.schemas.agent import AgentState, AgentType, CreateAgent
+from letta.schemas.block import BlockUpdate, CreateBlock
+from letta.schemas.embedding_config import EmbeddingConfig
+from letta.schemas.llm_config import LLMConfig
+from letta.schemas.message import Message, TextContent
+from letta.schemas.user import User as PydanticUser
+from letta.services.agent_manager import AgentManager
+from letta.services.block_manager import BlockManager
+from letta.services.helpers.agent_manager_helper import offline_memory_agent_tag
+from letta.settings import settings
+from letta.system import package_user_message
+from letta.utils import get_persona_text
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class ConsolidationRequest:
+    agent_id: str
+    actor: PydanticUser
+    recent_convo_limit: int = 2000
+
+
+def recent_conversation(in_context_messages: List[Message], limit: int) -> str:
+    """The last `limit` characters of the conversation, without the system prompt and the first messages of the agent"""
+    return "".join([str(message) for message in in_context_messages[3:]])[-limit:]
+
+
+class MemoryConsolidationService:
+    """
+    Rethinks the memory of chat only agents off the request path.
+
+    `ChatOnlyAgent.step` submits its agent after every turn and returns. Worker threads then run the offline memory
+    agent of the chat agent, which rewrites the shared `chat_agent_human` and `chat_agent_persona` blocks. Requests of an
+    agent that is already waiting are collapsed into one (the conversation is read when the consolidation runs, so it
+    covers every turn submitted in the meantime) and an agent is never consolidated by two workers at once.
+
+    Each chat agent has one offline memory agent, created on its first consolidation and found by its tag afterwards.
+    Later consolidations refresh its blocks and reset its messages instead of creating a new agent, and it is deleted
+    along with the chat agent. Offline memory agents are hidden from agent listings.
+
+    The queue lives in memory: consolidations still waiting when the process exits are dropped (and logged), the next
+    turn of the chat agent submits it again.
+    """
+
+    def __init__(self, workers: int = 1, max_pending: int = 100, time_budget: Optional[float] = None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.time_budget = time_budget
+        self.agent_manager = AgentManager()
+        self.block_manager = BlockManager()
+        self._pending: "OrderedDict[str, ConsolidationRequest]" = OrderedDict()  # agent id -> request, oldest first
+        self._running: Set[str] = set()  # agent ids being consolidated
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def submit(self, agent_id: str, actor: PydanticUser, recent_convo_limit: int = 2000) -> bool:
+        """Queue a consolidation of `agent_id`, False if the queue is full and the request was dropped"""
+        request = ConsolidationRequest(agent_id=agent_id, actor=actor, recent_convo_limit=recent_convo_limit)
+        with self._condition:
+            if agent_id not in self._pending and len(self._pending) >= self.max_pending:
+                logger.warning(f"Dropped the memory consolidation of agent {agent_id}, {len(self._pending)} agents are already waiting")
+                return False
+            # a repeat request keeps the place of the one it replaces
+            self._pending[agent_id] = request
+            self._condition.notify()
+        return True
+
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._pending)
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._work_loop, name=f"memory-consolidation-{i}", daemon=True) for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop taking requests from the queue and wait for the consolidations in progress"""
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        dropped = self.pending()
+        if dropped:
+            logger.warning(f"Dropped {dropped} pending memory consolidations on shutdown")
+
+    def wait_until_idle(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued consolidation ran, False on timeout"""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending and not self._running, timeout)
+
+    def run_once(self, timeout: Optional[float] = 0) -> bool:
+        """Run the next queued consolidation, waiting up to `timeout` seconds for one, returns whether there was one"""
+        request = self._claim(timeout)
+        if request is None:
+            return False
+        try:
+            self.consolidate(request)
+        except Exception:
+            logger.exception(f"Memory consolidation of agent {request.agent_id} failed")
+        finally:
+            with self._condition:
+                self._running.discard(request.agent_id)
+                self._condition.notify_all()
+        return True
+
+    def consolidate(self, request: ConsolidationRequest) -> None:
+        actor = request.actor
+        try:
+            chat_agent = self.agent_manager.get_agent_by_id(agent_id=request.agent_id, actor=actor)
+        except NoResultFound:
+            # deleted while it was waiting
+            return
+        in_context_messages = self.agent_manager.get_in_context_messages(agent_id=chat_agent.id, actor=actor)
+        recent_convo = recent_conversation(in_context_messages, request.recent_convo_limit)
+        offline_agent_state = self.prepare_offline_memory_agent(chat_agent, recent_convo, request.recent_convo_limit, actor)
+
+        offline_agent = OfflineMemoryAgent(
+            interface=CLIInterface(), agent_state=offline_agent_state, user=actor, time_budget=self.time_budget
+        )
+        message = Message(
+            agent_id=offline_agent_state.id,
+            role="user",
+            content=[TextContent(text=package_user_message("Reorganize the memory"))],
+        )
+        offline_agent.step(message)
+
+    def prepare_offline_memory_agent(
+        self, chat_agent: AgentState, recent_convo: str, recent_convo_limit: int, actor: PydanticUser
+    ) -> AgentState:
+        """The offline memory agent of `chat_agent`, with the current memory and conversation of the chat agent"""
+        human_block = chat_agent.memory.get_block("chat_agent_human")
+        persona_block = chat_agent.memory.get_block("chat_agent_persona")
+
+        tag = offline_memory_agent_tag(chat_agent.id)
+        offline_agents = self.agent_manager.list_agents(actor=actor, tags=[tag], limit=1, include_hidden=True)
+        if offline_agents:
+            offline_agent = offline_agents[0]
+            for label, value in (
+                ("chat_agent_human_new", human_block.value),
+                ("chat_agent_persona_new", persona_block.value),
+                ("conversation_block", recent_convo),
+            ):
+                block = offline_agent.memory.get_block(label)
+                if block.value != value:
+                    self.block_manager.update_block(block_id=block.id, block_update=BlockUpdate(value=value), actor=actor)
+            # start every consolidation from a fresh conversation, like a newly created offline agent
+            return self.agent_manager.reset_messages(agent_id=offline_agent.id, actor=actor, add_default_initial_messages=True)
+
+        return self.agent_manager.create_agent(
+            CreateAgent(
+                name="offline_memory_agent",
+                agent_type=AgentType.offline_memory_agent,
+                system=gpt_system.get_system_text("memgpt_offline_memory_chat"),
+                memory_blocks=[
+                    CreateBlock(label="offline_memory_persona", value=get_persona_text("offline_memory_persona"), limit=2000),
+                    CreateBlock(label="chat_agent_human_new", value=human_block.value, limit=2000),
+                    CreateBlock(label="chat_agent_persona_new", value=persona_block.value, limit=2000),
+                    CreateBlock(label="conversation_block", value=recent_convo, limit=recent_convo_limit),
+                ],
+                # the offline memory agent edits the blocks of the chat agent in place
+                block_ids=[human_block.id, persona_block.id],
+                llm_config=LLMConfig.default_config("gpt-4"),
+                embedding_config=EmbeddingConfig.default_config("text-embedding-ada-002"),
+                tool_ids=(chat_agent.metadata or {}).get("offline_memory_tools", []),
+                include_base_tools=False,
+                tags=[tag],
+            ),
+            actor=actor,
+        )
+
+    def _claim(self, timeout: Optional[float]) -> Optional[ConsolidationRequest]:
+        with self._condition:
+            self._condition.wait_for(lambda: self._stop.is_set() or self._next_agent_id() is not None, timeout)
+            agent_id = self._next_agent_id()
+            if agent_id is None:
+                return None
+            self._running.add(agent_id)
+            return self._pending.pop(agent_id)
+
+    def _next_agent_id(self) -> Optional[str]:
+        return next((agent_id for agent_id in self._pending if agent_id not in self._running), None)
+
+    def _work_loop(self) -> None:
+        while not self._stop.is_set():
+            self.run_once(timeout=1.0)
+
+
+_service: Optional[MemoryConsolidationService] = None
+_service_lock = threading.Lock()
+
+
+def get_memory_consolidation_service() -> MemoryConsolidationService:
+    """Process wide consolidation service used by `ChatOnlyAgent`, its workers start with it"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = MemoryConsolidationService(
+                    workers=settings.memory_consolidation_workers,
+                    max_pending=settings.memory_consolidation_max_pending,
+                    time_budget=settings.memory_consolidation_time_budget or None,
+                )
+                _service.start()
+                # let the consolidations in progress finish, and report the ones still waiting
+                atexit.register(_service.stop, 10.0)
+    return _service
@@ -1,7 +1,9 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Query
 
+from letta.llm_api.helpers import get_token_counts_for_messages
 from letta.log import get_logger
 from letta.orm.agent import Agent as AgentModel
 from letta.orm.errors import NoResultFound
@@ -10,6 +12,7 @@ from letta.schemas.enums import MessageRole
 from letta.schemas.message import Message as PydanticMessage
 from letta.schemas.message import MessageUpdate
 from letta.schemas.user import User as PydanticUser
+from letta.services.helpers.full_text_search import full_text_match, search_terms
 from letta.utils import enforce_types
 
 logger = get_logger(__name__)
@@ -37,7 +40,12 @@ class MessageManager:
     def get_messages_by_ids(self, message_ids: List[str], actor: PydanticUser) -> List[PydanticMessage]:
         """Fetch messages by ID and return them in the requested order."""
         with self.session_maker() as session:
-            results = MessageModel.list(db_session=session, id=message_ids, organization_id=actor.organization_id, limit=len(message_ids))
+            query = select(*MessageModel.pydantic_columns()).where(
+                MessageModel.id.in_(message_ids),
+                MessageModel.organization_id == actor.organization_id,
+                MessageModel.is_deleted == False,
+            )
+            results = [MessageModel.pydantic_from_row(row) for row in session.execute(query)]
 
             if len(results) != len(message_ids):
                 logger.warning(
@@ -45,7 +53,7 @@ class MessageManager:
                 )
 
             # Sort results directly based on message_ids
-            result_dict = {msg.id: msg.to_pydantic() for msg in results}
+            result_dict = {msg.id: msg for msg in results}
             return [result_dict[msg_id] for msg_id in message_ids]
 
     @enforce_types
@@ -54,6 +62,7 @@ class MessageManager:
         with self.session_maker() as session:
             # Set the organization id of the Pydantic message
             pydantic_msg.organization_id = actor.organization_id
+            self._count_tokens([pydantic_msg])
             msg_data = pydantic_msg.model_dump(to_orm=True)
             msg = MessageModel(**msg_data)
             msg.create(session, actor=actor)  # Persist to database
@@ -61,8 +70,29 @@ class MessageManager:
 
     @enforce_types
     def create_many_messages(self, pydantic_msgs: List[PydanticMessage], actor: PydanticUser) -> List[PydanticMessage]:
-        """Create multiple messages."""
-        return [self.create_message(m, actor=actor) for m in pydantic_msgs]
+        """Create multiple messages in a single transaction."""
+        if not pydantic_msgs:
+            return []
+
+        self._count_tokens(pydantic_msgs)
+        msgs = []
+        for pydantic_msg in pydantic_msgs:
+            pydantic_msg.organization_id = actor.organization_id
+            msgs.append(MessageModel(**pydantic_msg.model_dump(to_orm=True)))
+
+        with self.session_maker() as session:
+            msgs = MessageModel.batch_create(msgs, session, actor=actor)
+            return [msg.to_pydantic() for msg in msgs]
+
+    @staticmethod
+    def _count_tokens(pydantic_msgs: List[PydanticMessage]) -> List[Optional[int]]:
+        """Fill in `token_count` on messages that don't have one, so it is counted once and stored with the message"""
+        try:
+            get_token_counts_for_messages(pydantic_msgs)
+        except Exception as e:
+            # counting is only an optimization, the count is filled in lazily if the tokenizer is unavailable
+            logger.warning(f"Failed to count message tokens, storing messages without a token count: {e}")
+        return [pydantic_msg.token_count for pydantic_msg in pydantic_msgs]
 
     @enforce_types
     def update_message_by_id(self, message_id: str, message_update: MessageUpdate, actor: PydanticUser) -> PydanticMessage:
@@ -94,6 +124,10 @@ class MessageManager:
 
             for key, value in update_data.items():
                 setattr(message, key, value)
+            if update_data.keys() & {"role", "text", "name", "tool_calls", "tool_call_id"}:
+                # the stored token count no longer matches the message
+                message.token_count = None
+                message.token_count = self._count_tokens([message.to_pydantic()])[0]
             message.update(db_session=session, actor=actor)
 
             return message.to_pydantic()
@@ -128,6 +162,58 @@ class MessageManager:
         with self.session_maker() as session:
             return MessageModel.size(db_session=session, actor=actor, role=role, agent_id=agent_id)
 
+    def _build_search_query(self, session, agent_id: str, query_text: str, role: Optional[MessageRole]) -> Tuple[Optional[Query], list]:
+        """Messages of `agent_id` matching any word of `query_text` (or a word it prefixes), and their ordering by relevance"""
+        terms = search_terms(query_text)
+        if not terms:
+            return None, []
+
+        query = session.query(MessageModel).filter(MessageModel.agent_id == agent_id)
+        if role:
+            query = query.filter(MessageModel.role == role.value)
+        query, score = full_text_match(query, MessageModel, terms)
+        return query, [score.desc(), MessageModel.created_at.desc(), MessageModel.id.desc()]
+
+    @enforce_types
+    def search_messages_for_agent(
+        self,
+        agent_id: str,
+        actor: PydanticUser,
+        query_text: str,
+        role: Optional[MessageRole] = None,
+        limit: Optional[int] = 50,
+        offset: int = 0,
+    ) -> List[PydanticMessage]:
+        """
+        Full text search over the messages of an agent, most relevant first.
+
+        Args:
+            agent_id: The ID of the agent whose messages are searched.
+            actor: The user performing the action (used for permission checks).
+            query_text: Words to search for, a message matches if it contains any of them (or a word they prefix).
+            role: Optional MessageRole to filter messages by role.
+            limit: Maximum number of messages to return.
+            offset: Number of matching messages to skip, for paging through results.
+
+        Returns:
+            List[PydanticMessage]: The matching messages, ordered by relevance and then newest first.
+        """
+        with self.session_maker() as session:
+            AgentModel.read(db_session=session, identifier=agent_id, actor=actor, load_options=AgentModel.load_options("columns"))
+            query, order_by = self._build_search_query(session, agent_id, query_text, role)
+            if query is None:
+                return []
+            results = query.order_by(*order_by).offset(offset).limit(limit).all()
+            return [msg.to_pydantic() for msg in results]
+
+    @enforce_types
+    def search_messages_size(self, agent_id: str, actor: PydanticUser, query_text: str, role: Optional[MessageRole] = None) -> int:
+        """Number of messages `search_messages_for_agent` finds for `query_text`"""
+        with self.session_maker() as session:
+            AgentModel.read(db_session=session, identifier=agent_id, actor=actor, load_options=AgentModel.load_options("columns"))
+            query, _ = self._build_search_query(session, agent_id, query_text, role)
+            return query.count() if query is not None else 0
+
     @enforce_types
     def list_user_messages_for_agent(
         self,
@@ -181,17 +267,17 @@ class MessageManager:
             ascending: If True, sort by (created_at, id) ascending; if False, sort descending.
 
         Returns:
-            List[PydanticMessage]: A list of messages (converted via .to_pydantic()).
+            List[PydanticMessage]: A list of messages (built by MessageModel.pydantic_from_row).
 
         Raises:
             NoResultFound: If the provided after/before message IDs do not exist.
         """
         with self.session_maker() as session:
             # Permission check: raise if the agent doesn't exist or actor is not allowed.
-            AgentModel.read(db_session=session, identifier=agent_id, actor=actor)
+            AgentModel.read(db_session=session, identifier=agent_id, actor=actor, load_options=AgentModel.load_options("columns"))
 
-            # Build a query that directly filters the Message table by agent_id.
-            query = session.query(MessageModel).filter(MessageModel.agent_id == agent_id)
+            # Build a query that directly filters the Message table by agent_id, selecting only the columns of the pydantic model.
+            query = session.query(*MessageModel.pydantic_columns()).filter(MessageModel.agent_id == agent_id)
 
             # If query_text is provided, filter messages by partial match on text.
             if query_text:
@@ -242,6 +328,5 @@ class MessageManager:
             # Limit the number of results.
             query = query.limit(limit)
 
-            # Execute and convert each Message to its Pydantic representation.
-            results = query.all()
-            return [msg.to_pydantic() for msg in results]
+            # Execute and build each Pydantic Message straight from its row.
+            return [MessageModel.pydantic_from_row(row) for row in query.all()]
@@ -3,6 +3,7 @@ from typing import List, Optional
 from letta.orm.errors import NoResultFound
 from letta.orm.organization import Organization as OrganizationModel
 from letta.schemas.organization import Organization as PydanticOrganization
+from letta.services.agent_state_cache import get_agent_state_cache
 from letta.utils import enforce_types
 
 
@@ -19,6 +20,7 @@ class OrganizationManager:
         from letta.server.db import db_context
 
         self.session_maker = db_context
+        self.agent_state_cache = get_agent_state_cache()
 
     @enforce_types
     def get_default_organization(self) -> PydanticOrganization:
@@ -69,6 +71,7 @@ class OrganizationManager:
         with self.session_maker() as session:
             organization = OrganizationModel.read(db_session=session, identifier=org_id)
             organization.hard_delete(session)
+            self.agent_state_cache.invalidate_all()
 
     @enforce_types
     def list_organizations(self, after: Optional[str] = None, limit: Optional[int] = 50) -> List[PydanticOrganization]:
@@ -1,14 +1,17 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple, Type, Union
 
-from openai import OpenAI
+import numpy as np
+from sqlalchemy import func, select
 
-from letta.embeddings import embedding_model, parse_and_chunk_text
+from letta.embeddings import embed_texts, embedding_model, parse_and_chunk_text
 from letta.orm.errors import NoResultFound
-from letta.orm.passage import AgentPassage, SourcePassage
+from letta.orm.passage import AgentPassage, BasePassage, SourcePassage
 from letta.schemas.agent import AgentState
 from letta.schemas.passage import Passage as PydanticPassage
 from letta.schemas.user import User as PydanticUser
+from letta.services.vector_index import VectorIndex, get_vector_index_registry
+from letta.settings import settings
 from letta.utils import enforce_types
 
 
@@ -39,6 +42,42 @@ class PassageManager:
     @enforce_types
     def create_passage(self, pydantic_passage: PydanticPassage, actor: PydanticUser) -> PydanticPassage:
         """Create a new passage in the appropriate table based on whether it has agent_id or source_id."""
+        passage = self._to_orm_passage(pydantic_passage)
+        with self.session_maker() as session:
+            passage.create(session, actor=actor)
+            pydantic_passage = passage.to_pydantic()
+            self._add_to_vector_index(type(passage), pydantic_passage)
+        self._ensure_embedding_indexes([passage])
+        return pydantic_passage
+
+    @enforce_types
+    def create_many_passages(self, passages: List[PydanticPassage], actor: PydanticUser) -> List[PydanticPassage]:
+        """Create multiple passages in a single transaction."""
+        if not passages:
+            return []
+
+        orm_passages = [self._to_orm_passage(p) for p in passages]
+        with self.session_maker() as session:
+            # agent and source passages may be mixed, the flush groups them into one INSERT per table
+            orm_passages = BasePassage.batch_create(orm_passages, session, actor=actor)
+
+        pydantic_passages = [p.to_pydantic() for p in orm_passages]
+        for orm_passage, passage in zip(orm_passages, pydantic_passages):
+            self._add_to_vector_index(type(orm_passage), passage)
+        self._ensure_embedding_indexes(orm_passages)
+        return pydantic_passages
+
+    def _ensure_embedding_indexes(self, orm_passages: List[BasePassage]) -> None:
+        """On Postgres, create the HNSW index of every embedding dimension seen for the first time"""
+        if not settings.letta_pg_uri_no_default:
+            return
+        from letta.orm.pgvector_functions import ensure_embedding_index
+        from letta.server.db import engine
+
+        for table, dim in {(p.__tablename__, p.embedding_dim) for p in orm_passages if p.embedding_dim}:
+            ensure_embedding_index(engine, table, dim)
+
+    def _to_orm_passage(self, pydantic_passage: PydanticPassage) -> Union[AgentPassage, SourcePassage]:
         # Common fields for both passage types
         data = pydantic_passage.model_dump(to_orm=True)
         common_fields = {
@@ -68,14 +107,7 @@ class PassageManager:
         else:
             raise ValueError("Passage must have either agent_id or source_id")
 
-        with self.session_maker() as session:
-            passage.create(session, actor=actor)
-            return passage.to_pydantic()
-
-    @enforce_types
-    def create_many_passages(self, passages: List[PydanticPassage], actor: PydanticUser) -> List[PydanticPassage]:
-        """Create multiple passages."""
-        return [self.create_passage(p, actor) for p in passages]
+        return passage
 
     @enforce_types
     def insert_passage(
@@ -89,54 +121,21 @@ class PassageManager:
 
         embedding_chunk_size = agent_state.embedding_config.embedding_chunk_size
 
-        # TODO eventually migrate off of llama-index for embeddings?
-        # Already causing pain for OpenAI proxy endpoints like LM Studio...
-        if agent_state.embedding_config.embedding_endpoint_type != "openai":
-            embed_model = embedding_model(agent_state.embedding_config)
-
-        passages = []
+        # breakup string into passages, and embed them in batches
+        chunks = parse_and_chunk_text(text, embedding_chunk_size)
+        embeddings = embed_texts(embedding_model(agent_state.embedding_config), chunks)
 
-        try:
-            # breakup string into passages
-            for text in parse_and_chunk_text(text, embedding_chunk_size):
-
-                if agent_state.embedding_config.embedding_endpoint_type != "openai":
-                    embedding = embed_model.get_text_embedding(text)
-                else:
-                    # TODO should have the settings passed in via the server call
-                    from letta.settings import model_settings
-
-                    # Simple OpenAI client code
-                    client = OpenAI(
-                        api_key=model_settings.openai_api_key, base_url=agent_state.embedding_config.embedding_endpoint, max_retries=0
-                    )
-                    response = client.embeddings.create(input=text, model=agent_state.embedding_config.embedding_model)
-                    embedding = response.data[0].embedding
-
-                if isinstance(embedding, dict):
-                    try:
-                        embedding = embedding["data"][0]["embedding"]
-                    except (KeyError, IndexError):
-                        # TODO as a fallback, see if we can find any lists in the payload
-                        raise TypeError(
-                            f"Got back an unexpected payload from text embedding function, type={type(embedding)}, value={embedding}"
-                        )
-                passage = self.create_passage(
-                    PydanticPassage(
-                        organization_id=actor.organization_id,
-                        agent_id=agent_id,
-                        text=text,
-                        embedding=embedding,
-                        embedding_config=agent_state.embedding_config,
-                    ),
-                    actor=actor,
-                )
-                passages.append(passage)
-
-            return passages
-
-        except Exception as e:
-            raise e
+        passages = [
+            PydanticPassage(
+                organization_id=actor.organization_id,
+                agent_id=agent_id,
+                text=chunk,
+                embedding=embedding,
+                embedding_config=agent_state.embedding_config,
+            )
+            for chunk, embedding in zip(chunks, embeddings)
+        ]
+        return self.create_many_passages(passages, actor=actor)
 
     @enforce_types
     def update_passage_by_id(self, passage_id: str, passage: PydanticPassage, actor: PydanticUser, **kwargs) -> Optional[PydanticPassage]:
@@ -170,7 +169,10 @@ class PassageManager:
 
             # Commit changes
             curr_passage.update(session, actor=actor)
-            return curr_passage.to_pydantic()
+            pydantic_passage = curr_passage.to_pydantic()
+            if "embedding" in update_data:
+                self._add_to_vector_index(type(curr_passage), pydantic_passage)
+            return pydantic_passage
 
     @enforce_types
     def delete_passage_by_id(self, passage_id: str, actor: PydanticUser) -> bool:
@@ -182,16 +184,17 @@ class PassageManager:
             # Try source passages first
             try:
                 passage = SourcePassage.read(db_session=session, identifier=passage_id, actor=actor)
-                passage.hard_delete(session, actor=actor)
-                return True
             except NoResultFound:
                 # Try archival passages
                 try:
                     passage = AgentPassage.read(db_session=session, identifier=passage_id, actor=actor)
-                    passage.hard_delete(session, actor=actor)
-                    return True
                 except NoResultFound:
                     raise NoResultFound(f"Passage with id {passage_id} not found.")
+            passage_cls = type(passage)
+            passage.hard_delete(session, actor=actor)
+        # only once the delete is committed, a search in between still finds the row in the database
+        self.remove_from_vector_index(passage_cls, passage_ids=[passage_id])
+        return True
 
     def delete_passages(
         self,
@@ -203,3 +206,146 @@ class PassageManager:
         for passage in passages:
             self.delete_passage_by_id(passage_id=passage.id, actor=actor)
         return True
+
+    # ======================================================================================================================
+    # Vector index (SQLite only)
+    # ======================================================================================================================
+    def get_vector_index(self, passage_cls: Type[Union[AgentPassage, SourcePassage]], embedding_dim: int) -> Optional[VectorIndex]:
+        """Return the ANN index over `passage_cls` embeddings of the given dimension, or None if ANN search is disabled."""
+        registry = get_vector_index_registry()
+        if registry is None:
+            return None
+        return registry.get_or_load(
+            name=passage_cls.__tablename__,
+            dim=embedding_dim,
+            num_rows=lambda: self._count_passages_with_dim(passage_cls, embedding_dim),
+            rebuild=lambda index: self._populate_vector_index(index, passage_cls, embedding_dim),
+        )
+
+    def sync_vector_index(
+        self,
+        index: VectorIndex,
+        passage_cls: Type[Union[AgentPassage, SourcePassage]],
+        embedding_dim: int,
+        owners: List[str],
+        batch_size: int = 5000,
+    ) -> None:
+        """
+        Bring the entries of `owners` in the index up to date with the database before a search.
+
+        The index only sees the writes of this process, so the number of passages of every owner and their last update
+        are compared with the ones recorded when the owner was last synced. Owners whose passages changed since then
+        (inserts and deletes of other processes, bulk deletes) get the vanished ids removed and the new or updated
+        passages loaded, the others cost one indexed aggregate query for all of them.
+        """
+        registry = get_vector_index_registry()
+        owner_column = self._vector_index_owner_column(passage_cls)
+        with self.session_maker() as session:
+            # read before the passages: a write landing in between changes the generation again and is picked up next time
+            generations = self._vector_index_generations(session, passage_cls, owners)
+            for owner in owners:
+                generation = generations.get(owner, (0, None))
+                synced = index.generations.get(owner)
+                if synced == generation:
+                    continue
+                rows = session.execute(
+                    select(passage_cls.id, passage_cls.updated_at).where(
+                        owner_column == owner, *self._vector_index_filters(passage_cls, embedding_dim)
+                    )
+                ).all()
+                indexed = set(index.owner_ids(owner))
+                index.remove(indexed - {passage_id for passage_id, _ in rows})
+                synced_until = synced[1] if synced else None
+                stale_ids = [
+                    passage_id
+                    for passage_id, updated_at in rows
+                    if passage_id not in indexed or synced_until is None or updated_at is None or updated_at.isoformat() >= synced_until
+                ]
+                for start in range(0, len(stale_ids), batch_size):
+                    batch = session.execute(
+                        select(passage_cls.id, passage_cls.embedding).where(passage_cls.id.in_(stale_ids[start : start + batch_size]))
+                    ).all()
+                    index.add(
+                        ids=[row[0] for row in batch],
+                        owners=[owner] * len(batch),
+                        vectors=self._vector_index_matrix([row[1] for row in batch], embedding_dim),
+                    )
+                index.generations[owner] = generation
+                registry.mark_dirty(passage_cls.__tablename__, embedding_dim)
+
+    def remove_from_vector_index(
+        self, passage_cls: Type[Union[AgentPassage, SourcePassage]], passage_ids: Iterable[str] = (), owners: Iterable[str] = ()
+    ) -> None:
+        """Drop deleted passages, or every passage of deleted owners, from the indexes loaded in this process, once the delete is committed"""
+        registry = get_vector_index_registry()
+        if registry is None:
+            return
+        passage_ids, owners = list(passage_ids), list(owners)
+        for embedding_dim, index in registry.loaded(passage_cls.__tablename__):
+            index.remove(passage_ids)
+            index.remove_owners(owners)
+            registry.mark_dirty(passage_cls.__tablename__, embedding_dim)
+
+    @staticmethod
+    def _vector_index_owner_column(passage_cls: Type[Union[AgentPassage, SourcePassage]]):
+        # archival passages are scoped by agent, source passages by source
+        return passage_cls.agent_id if passage_cls is AgentPassage else passage_cls.source_id
+
+    def _vector_index_filters(self, passage_cls: Type[Union[AgentPassage, SourcePassage]], embedding_dim: int) -> list:
+        return [
+            passage_cls.embedding.isnot(None),
+            func.json_extract(passage_cls.embedding_config, "$.embedding_dim") == embedding_dim,
+        ]
+
+    def _vector_index_generations(
+        self, session, passage_cls: Type[Union[AgentPassage, SourcePassage]], owners: Optional[List[str]] = None
+    ) -> Dict[str, Tuple[int, Optional[str]]]:
+        """Number of passages and last update of every owner (of all dimensions, so it is answered from the owner index)"""
+        owner_column = self._vector_index_owner_column(passage_cls)
+        query = select(owner_column, func.count(), func.max(passage_cls.updated_at)).group_by(owner_column)
+        if owners is not None:
+            query = query.where(owner_column.in_(owners))
+        return {owner: (count, updated_at.isoformat() if updated_at else None) for owner, count, updated_at in session.execute(query)}
+
+    def _count_passages_with_dim(self, passage_cls: Type[Union[AgentPassage, SourcePassage]], embedding_dim: int) -> int:
+        with self.session_maker() as session:
+            query = select(func.count()).select_from(passage_cls).where(*self._vector_index_filters(passage_cls, embedding_dim))
+            return session.scalar(query) or 0
+
+    def _populate_vector_index(
+        self, index: VectorIndex, passage_cls: Type[Union[AgentPassage, SourcePassage]], embedding_dim: int, batch_size: int = 5000
+    ) -> None:
+        query = (
+            select(passage_cls.id, self._vector_index_owner_column(passage_cls), passage_cls.embedding)
+            .where(*self._vector_index_filters(passage_cls, embedding_dim))
+            .execution_options(yield_per=batch_size)
+        )
+        with self.session_maker() as session:
+            generations = self._vector_index_generations(session, passage_cls)
+            for rows in session.execute(query).partitions():
+                index.add(
+                    ids=[row[0] for row in rows],
+                    owners=[row[1] for row in rows],
+                    vectors=self._vector_index_matrix([row[2] for row in rows], embedding_dim),
+                )
+        index.generations.update(generations)
+
+    @staticmethod
+    def _vector_index_matrix(embeddings: List, embedding_dim: int) -> np.ndarray:
+        # stored vectors drop their trailing zeros, so they can be shorter (or padded longer) than embedding_dim
+        vectors = np.zeros((len(embeddings), embedding_dim), dtype=np.float32)
+        for i, embedding in enumerate(embeddings):
+            embedding = embedding[:embedding_dim]
+            vectors[i, : len(embedding)] = embedding
+        return vectors
+
+    def _add_to_vector_index(self, passage_cls: Type[Union[AgentPassage, SourcePassage]], passage: PydanticPassage) -> None:
+        if passage.embedding is None or passage.embedding_config is None:
+            return
+        embedding_dim = passage.embedding_config.embedding_dim
+        index = self.get_vector_index(passage_cls, embedding_dim)
+        if index is None:
+            return
+        owner = passage.agent_id if passage_cls is AgentPassage else passage.source_id
+        index.add(ids=[passage.id], owners=[owner], vectors=self._vector_index_matrix([passage.embedding], embedding_dim))
+        get_vector_index_registry().mark_dirty(passage_cls.__tablename__, embedding_dim)
@@ -0,0 +1,292 @@
+import asyncio
+import os
+import socket
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, List, Optional, Set
+
+from letta.log import get_logger
+from letta.schemas.enums import JobStatus
+from letta.schemas.job import Job as PydanticJob
+from letta.schemas.letta_request import LettaRequest
+from letta.schemas.run import Run as PydanticRun
+from letta.schemas.user import User as PydanticUser
+from letta.services.job_manager import JobManager
+from letta.settings import settings
+
+if TYPE_CHECKING:
+    from letta.server.server import SyncServer
+
+logger = get_logger(__name__)
+
+
+class RunQueue(ABC):
+    """
+    Queue of the runs created by `POST /v1/agents/{agent_id}/messages/async`.
+
+    A queued run is a row of the jobs table with status `created` and its request in `metadata["request"]`. Workers
+    claim runs (created -> running), send heartbeats while they run them and put runs whose worker went silent back in
+    the queue. The queue only decides which worker gets which run, the run itself always lives in the jobs table.
+
+    Delivery is at-least-once: a run whose worker went silent is handed to another worker, and the silent worker may
+    still be sending its messages to the agent. Only the worker that owns the run records its result (`finish`).
+    """
+
+    def __init__(self, job_manager: JobManager, stale_after: float = 60.0, max_attempts: int = 3):
+        self.job_manager = job_manager
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self._enqueued = threading.Condition()
+
+    @abstractmethod
+    def enqueue(self, run: PydanticRun) -> None:
+        """Make a created run available to the workers"""
+
+    def notify(self) -> None:
+        """Wake up the workers of this process waiting for runs"""
+        with self._enqueued:
+            self._enqueued.notify_all()
+
+    def wait(self, timeout: float) -> None:
+        """Wait up to `timeout` seconds for a run to be enqueued in this process (runs of other processes are polled)"""
+        with self._enqueued:
+            self._enqueued.wait(timeout)
+
+    @abstractmethod
+    def claim(self, worker_id: str) -> Optional[PydanticJob]:
+        """Claim the next queued run for `worker_id`, None if the queue is empty"""
+
+    def heartbeat(self, run_id: str, worker_id: str, progress: Optional[dict] = None) -> bool:
+        """Record that `worker_id` still runs the run, False if the run was reclaimed in the meantime"""
+        return self.job_manager.heartbeat_run(run_id=run_id, worker_id=worker_id, progress=progress)
+
+    def finish(self, run_id: str, worker_id: str, status: JobStatus, metadata: Optional[dict] = None) -> bool:
+        """Record the final status of a run `worker_id` owns, False (and nothing written) if it was reclaimed"""
+        return self.job_manager.finish_run(run_id=run_id, worker_id=worker_id, status=status, metadata=metadata)
+
+    def reclaim_stale(self) -> List[str]:
+        """Requeue the runs whose worker missed its heartbeats, returns their IDs"""
+        return self.job_manager.reclaim_stale_runs(stale_after=self.stale_after, max_attempts=self.max_attempts)
+
+
+class DatabaseRunQueue(RunQueue):
+    """Runs are claimed straight from the jobs table, so any number of API servers and `letta worker`s can share it"""
+
+    def enqueue(self, run: PydanticRun) -> None:
+        # the committed jobs row is the queue entry, the workers of this process don't need to wait for their next poll
+        self.notify()
+
+    def claim(self, worker_id: str) -> Optional[PydanticJob]:
+        return self.job_manager.claim_next_run(worker_id=worker_id)
+
+
+class InMemoryRunQueue(RunQueue):
+    """Runs are handed out in process, in the order they were enqueued (for tests and single process setups)"""
+
+    def __init__(self, job_manager: JobManager, stale_after: float = 60.0, max_attempts: int = 3):
+        super().__init__(job_manager, stale_after=stale_after, max_attempts=max_attempts)
+        self._queue: Deque[str] = deque()
+        self._lock = threading.Lock()
+
+    def enqueue(self, run: PydanticRun) -> None:
+        with self._lock:
+            self._queue.append(run.id)
+        self.notify()
+
+    def claim(self, worker_id: str) -> Optional[PydanticJob]:
+        while True:
+            with self._lock:
+                if not self._queue:
+                    return None
+                run_id = self._queue.popleft()
+            run = self.job_manager.claim_run(run_id=run_id, worker_id=worker_id)
+            if run is not None:
+                return run
+
+    def reclaim_stale(self) -> List[str]:
+        run_ids = super().reclaim_stale()
+        with self._lock:
+            self._queue.extend(run_ids)
+        if run_ids:
+            self.notify()
+        return run_ids
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+
+def create_run_queue(backend: str, job_manager: JobManager, **kwargs) -> RunQueue:
+    if backend == "database":
+        return DatabaseRunQueue(job_manager, **kwargs)
+    elif backend == "memory":
+        return InMemoryRunQueue(job_manager, **kwargs)
+    raise ValueError(f"Unknown run queue backend: {backend}")
+
+
+_queue: Optional[RunQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_run_queue(job_manager: JobManager) -> RunQueue:
+    """Process wide run queue of `settings.run_queue_backend`"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = create_run_queue(
+                    settings.run_queue_backend,
+                    job_manager,
+                    stale_after=settings.run_queue_stale_after,
+                    max_attempts=settings.run_queue_max_attempts,
+                )
+    return _queue
+
+
+class RunWorker:
+    """
+    Claims runs from a `RunQueue` and sends their messages to the agent, `concurrency` runs at a time.
+
+    One thread claims runs while fewer than `concurrency` are in progress and runs each in a thread of its own, so an
+    idle worker polls the queue once per `poll_interval` however large its concurrency (runs enqueued in the same
+    process wake it up right away). While runs are in progress, a heartbeat thread records the steps taken so far in
+    `metadata["progress"]` of each run and requeues the runs of other workers that went silent. Runs as `letta worker`,
+    and inside the API server when `settings.run_queue_embedded_workers` is set.
+    """
+
+    def __init__(
+        self,
+        server: "SyncServer",
+        queue: RunQueue,
+        concurrency: int = 1,
+        poll_interval: float = 1.0,
+        heartbeat_interval: float = 10.0,
+        worker_id: Optional[str] = None,
+    ):
+        self.server = server
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._running: Dict[str, PydanticUser] = {}  # run id -> actor of the runs in progress
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._run_threads: Set[threading.Thread] = set()
+        self._run_threads_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._heartbeat_loop, name=f"{self.worker_id}-heartbeat", daemon=True),
+            threading.Thread(target=self._work_loop, name=f"{self.worker_id}-claim", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop claiming runs and wait for the ones in progress"""
+        self._stop.set()
+        self.queue.notify()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        with self._run_threads_lock:
+            run_threads = list(self._run_threads)
+        for thread in run_threads:
+            thread.join(timeout)
+
+    def serve_forever(self) -> None:
+        self.start()
+        try:
+            while not self._stop.wait(1.0):
+                pass
+        finally:
+            self.stop()
+
+    def run_once(self) -> bool:
+        """Claim and process one run, returns whether there was one"""
+        run = self.queue.claim(self.worker_id)
+        if run is None:
+            return False
+        self.process(run)
+        return True
+
+    def process(self, run: PydanticJob) -> None:
+        actor = self.server.user_manager.get_user_by_id(user_id=run.user_id)
+        metadata = {key: value for key, value in (run.metadata or {}).items() if key != "request"}
+        self._running[run.id] = actor
+        try:
+            if not run.metadata or "request" not in run.metadata:
+                raise ValueError(f"Run {run.id} has no queued request")
+            request = LettaRequest(**run.metadata["request"])
+            logger.info(f"Worker {self.worker_id} running {run.id}")
+            result = asyncio.run(
+                self.server.send_message_to_agent(
+                    agent_id=metadata.get("agent_id"),
+                    actor=actor,
+                    messages=request.messages,
+                    stream_steps=False,
+                    stream_tokens=False,
+                    use_assistant_message=request.use_assistant_message,
+                    assistant_message_tool_name=request.assistant_message_tool_name,
+                    assistant_message_tool_kwarg=request.assistant_message_tool_kwarg,
+                    metadata={"job_id": run.id},  # Pass job_id through metadata
+                )
+            )
+            status, metadata = JobStatus.completed, {**metadata, "result": result.model_dump(mode="json")}
+        except Exception as e:
+            logger.exception(f"Run {run.id} failed")
+            status, metadata = JobStatus.failed, {**metadata, "error": str(e)}
+        finally:
+            self._running.pop(run.id, None)
+        if not self.queue.finish(run_id=run.id, worker_id=self.worker_id, status=status, metadata=metadata):
+            # the run went stale and another worker owns it now, its result is the one that counts
+            logger.warning(f"Worker {self.worker_id} discarded the result of run {run.id}, it was reclaimed by another worker")
+
+    def heartbeat(self) -> None:
+        """Report the progress of the runs in progress and requeue stale runs"""
+        for run_id, actor in list(self._running.items()):
+            usage = self.server.job_manager.get_job_usage(job_id=run_id, actor=actor)
+            progress = {"steps": usage.step_count, "total_tokens": usage.total_tokens, "worker_id": self.worker_id}
+            if not self.queue.heartbeat(run_id=run_id, worker_id=self.worker_id, progress=progress):
+                logger.warning(f"Worker {self.worker_id} lost run {run_id}, it was reclaimed by another worker")
+        for run_id in self.queue.reclaim_stale():
+            logger.warning(f"Requeued stale run {run_id}")
+
+    def _work_loop(self) -> None:
+        while not self._stop.is_set():
+            if not self._slots.acquire(timeout=self.poll_interval):
+                continue
+            try:
+                run = self.queue.claim(self.worker_id)
+            except Exception:
+                logger.exception(f"Worker {self.worker_id} failed to claim a run")
+                run = None
+            if run is None:
+                self._slots.release()
+                self.queue.wait(self.poll_interval)
+                continue
+            thread = threading.Thread(target=self._run_in_slot, args=(run,), name=f"{self.worker_id}-{run.id}", daemon=True)
+            with self._run_threads_lock:
+                self._run_threads.add(thread)
+            thread.start()
+
+    def _run_in_slot(self, run: PydanticJob) -> None:
+        try:
+            self.process(run)
+        except Exception:
+            logger.exception(f"Worker {self.worker_id} failed to record run {run.id}")
+        finally:
+            with self._run_threads_lock:
+                self._run_threads.discard(threading.current_thread())
+            self._slots.release()
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self.heartbeat()
+            except Exception:
+                logger.exception(f"Worker {self.worker_id} failed to send heartbeats")
@@ -1,3 +1,4 @@
+import threading
 from typing import Dict, List, Optional
 
 from letta.constants import LETTA_DIR_TOOL_SANDBOX
@@ -15,6 +16,8 @@ from letta.utils import enforce_types, printd
 
 logger = get_logger(__name__)
 
+_default_sandbox_config_lock = threading.Lock()
+
 
 class SandboxConfigManager:
     """Manager class to handle business logic related to SandboxConfig and SandboxEnvironmentVariable."""
@@ -27,18 +30,24 @@ class SandboxConfigManager:
     @enforce_types
     def get_or_create_default_sandbox_config(self, sandbox_type: SandboxType, actor: PydanticUser) -> PydanticSandboxConfig:
         sandbox_config = self.get_sandbox_config_by_type(sandbox_type, actor=actor)
-        if not sandbox_config:
-            logger.debug(f"Creating new sandbox config of type {sandbox_type}, none found for organization {actor.organization_id}.")
+        if sandbox_config:
+            return sandbox_config
 
-            # TODO: Add more sandbox types later
-            if sandbox_type == SandboxType.E2B:
-                default_config = {}  # Empty
-            else:
-                # TODO: May want to move this to environment variables v.s. persisting in database
-                default_local_sandbox_path = LETTA_DIR_TOOL_SANDBOX
-                default_config = LocalSandboxConfig(sandbox_dir=default_local_sandbox_path).model_dump(exclude_none=True)
+        # concurrent tool calls of a new organization would otherwise all try to create it
+        with _default_sandbox_config_lock:
+            sandbox_config = self.get_sandbox_config_by_type(sandbox_type, actor=actor)
+            if not sandbox_config:
+                logger.debug(f"Creating new sandbox config of type {sandbox_type}, none found for organization {actor.organization_id}.")
+
+                # TODO: Add more sandbox types later
+                if sandbox_type == SandboxType.E2B:
+                    default_config = {}  # Empty
+                else:
+                    # TODO: May want to move this to environment variables v.s. persisting in database
+                    default_local_sandbox_path = LETTA_DIR_TOOL_SANDBOX
+                    default_config = LocalSandboxConfig(sandbox_dir=default_local_sandbox_path).model_dump(exclude_none=True)
 
-            sandbox_config = self.create_or_update_sandbox_config(SandboxConfigCreate(config=default_config), actor=actor)
+                sandbox_config = self.create_or_update_sandbox_config(SandboxConfigCreate(config=default_config), actor=actor)
         return sandbox_config
 
     @enforce_types
@@ -0,0 +1,186 @@
+import atexit
+import json
+import os
+import subprocess
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from multiprocessing.connection import Connection
+from typing import Dict, Iterator, List, Optional
+
+from letta.log import get_logger
+from letta.schemas.sandbox_config import SandboxConfig
+from letta.services.helpers import sandbox_worker
+from letta.services.helpers.tool_execution_helper import install_pip_requirements_for_sandbox
+from letta.settings import tool_settings
+
+logger = get_logger(__name__)
+
+WORKER_SCRIPT = os.path.abspath(sandbox_worker.__file__)
+
+# time a new worker gets to start its interpreter and import letta
+WORKER_STARTUP_TIMEOUT = 120
+
+
+class SandboxWorkerError(RuntimeError):
+    """A sandbox worker died or broke the protocol while running a tool"""
+
+
+class SandboxWorker:
+    """
+    A long-lived python process (`letta/services/helpers/sandbox_worker.py`) running the tool execution scripts of one
+    sandbox config, so tool calls don't pay for interpreter startup and imports.
+    """
+
+    def __init__(self, python_executable: str, cwd: str, env: Dict[str, str], memory_limit_mb: int = 0):
+        self.process = subprocess.Popen(
+            [python_executable, WORKER_SCRIPT, str(memory_limit_mb)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=cwd,
+            env=env,
+        )
+        self._requests = Connection(os.dup(self.process.stdin.fileno()), readable=False)
+        self._responses = Connection(os.dup(self.process.stdout.fileno()), writable=False)
+        self.process.stdin.close()
+        self.process.stdout.close()
+        self.ready = False
+        self.calls = 0
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def _receive(self, timeout: float) -> dict:
+        if not self._responses.poll(timeout):
+            self.kill()
+            raise TimeoutError(f"Sandbox worker {self.process.pid} did not respond within {timeout}s")
+        try:
+            return json.loads(self._responses.recv_bytes())
+        except (EOFError, OSError) as e:
+            self.kill()
+            raise SandboxWorkerError(f"Sandbox worker {self.process.pid} exited with code {self.process.poll()}") from e
+
+    def run(self, code: str, env: Dict[str, str], result_var: str, timeout: float, init_globals: Optional[Dict[str, str]] = None) -> dict:
+        """Run an execution script, see `sandbox_worker.run` for the response format"""
+        if not self.ready:
+            self._receive(WORKER_STARTUP_TIMEOUT)
+            self.ready = True
+        try:
+            self._requests.send_bytes(
+                json.dumps({"code": code, "env": env, "result_var": result_var, "globals": init_globals or {}}).encode("utf-8")
+            )
+        except OSError as e:
+            self.kill()
+            raise SandboxWorkerError(f"Sandbox worker {self.process.pid} exited with code {self.process.poll()}") from e
+        response = self._receive(timeout)
+        self.calls += 1
+        return response
+
+    def kill(self) -> None:
+        if self.alive:
+            self.process.kill()
+        self.process.wait()
+        self._requests.close()
+        self._responses.close()
+
+
+class SandboxWorkerPool:
+    """
+    Warm `SandboxWorker`s per key (the sandbox config fingerprint for venv sandboxes).
+
+    A worker is checked out for one tool call at a time and goes back to the pool afterwards, unless it timed out or
+    died (it is killed) or served `max_calls` calls (it is replaced by a fresh worker, which warms up in the
+    background). Pip requirements are installed once per fingerprint, workers of a venv whose requirements changed are
+    retired.
+    """
+
+    def __init__(self, max_idle_workers: int = 2, max_calls: int = 100, memory_limit_mb: int = 0):
+        self.max_idle_workers = max_idle_workers
+        self.max_calls = max_calls
+        self.memory_limit_mb = memory_limit_mb
+        self._idle: Dict[str, List[SandboxWorker]] = defaultdict(list)
+        self._installed: Dict[str, str] = {}  # venv path -> fingerprint of the installed requirements
+        self._lock = threading.Lock()
+        self._install_lock = threading.Lock()
+
+    def ensure_requirements(self, sbx_config: SandboxConfig, venv_path: str, env: Dict[str, str], force: bool = False) -> None:
+        """Install the pip requirements of `sbx_config`, unless they already were for this fingerprint"""
+        fingerprint = sbx_config.fingerprint()
+        with self._install_lock:
+            if not force and self._installed.get(venv_path) == fingerprint:
+                return
+            previous = self._installed.pop(venv_path, None)
+            if previous:
+                self.discard(previous)
+            install_pip_requirements_for_sandbox(sbx_config.get_local_config(), env=env)
+            self._installed[venv_path] = fingerprint
+
+    @contextmanager
+    def worker(self, key: str, python_executable: str, cwd: str, env: Dict[str, str]) -> Iterator[SandboxWorker]:
+        """Check out a warm worker of `key`, starting one if none is idle"""
+        with self._lock:
+            idle = self._idle[key]
+            worker = None
+            while idle and worker is None:
+                candidate = idle.pop()
+                if candidate.alive:
+                    worker = candidate
+                else:
+                    candidate.kill()
+        if worker is None:
+            worker = SandboxWorker(python_executable, cwd=cwd, env=env, memory_limit_mb=self.memory_limit_mb)
+
+        try:
+            yield worker
+        finally:
+            self._release(key, worker, python_executable, cwd, env)
+
+    def _release(self, key: str, worker: SandboxWorker, python_executable: str, cwd: str, env: Dict[str, str]) -> None:
+        recycle = worker.alive and worker.calls >= self.max_calls
+        if recycle or not worker.alive:
+            worker.kill()
+            worker = SandboxWorker(python_executable, cwd=cwd, env=env, memory_limit_mb=self.memory_limit_mb) if recycle else None
+        if worker is None:
+            return
+        with self._lock:
+            idle = self._idle[key]
+            if len(idle) < self.max_idle_workers:
+                idle.append(worker)
+                return
+        worker.kill()
+
+    def discard(self, key: Optional[str] = None) -> None:
+        """Kill the idle workers of `key` (and forget its installed requirements), or of every key"""
+        with self._lock:
+            keys = [key] if key else list(self._idle)
+            workers = [worker for k in keys for worker in self._idle.pop(k, [])]
+            if key is None:
+                self._installed.clear()
+            else:
+                self._installed = {venv: fp for venv, fp in self._installed.items() if fp != key}
+        for worker in workers:
+            worker.kill()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {key: len(workers) for key, workers in self._idle.items() if workers}
+
+
+_pool: Optional[SandboxWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_sandbox_worker_pool() -> SandboxWorkerPool:
+    """Process wide pool used by `ToolExecutionSandbox` for local sandboxes"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SandboxWorkerPool(
+                    max_idle_workers=tool_settings.local_sandbox_max_idle_workers,
+                    max_calls=tool_settings.local_sandbox_worker_max_calls,
+                    memory_limit_mb=tool_settings.local_sandbox_worker_memory_mb,
+                )
+                atexit.register(_pool.discard)
+    return _pool
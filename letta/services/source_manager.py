@@ -1,13 +1,19 @@
 from typing import List, Optional
 
+from sqlalchemy import select
+
 from letta.orm.errors import NoResultFound
 from letta.orm.file import FileMetadata as FileMetadataModel
+from letta.orm.passage import SourcePassage
 from letta.orm.source import Source as SourceModel
+from letta.orm.sources_agents import SourcesAgents
 from letta.schemas.agent import AgentState as PydanticAgentState
 from letta.schemas.file import FileMetadata as PydanticFileMetadata
 from letta.schemas.source import Source as PydanticSource
 from letta.schemas.source import SourceUpdate
 from letta.schemas.user import User as PydanticUser
+from letta.services.agent_state_cache import get_agent_state_cache
+from letta.services.passage_manager import PassageManager
 from letta.utils import enforce_types, printd
 
 
@@ -18,6 +24,8 @@ class SourceManager:
         from letta.server.db import db_context
 
         self.session_maker = db_context
+        self.agent_state_cache = get_agent_state_cache()
+        self.passage_manager = PassageManager()
 
     @enforce_types
     def create_source(self, source: PydanticSource, actor: PydanticUser) -> PydanticSource:
@@ -49,6 +57,7 @@ class SourceManager:
                 for key, value in update_data.items():
                     setattr(source, key, value)
                 source.update(db_session=session, actor=actor)
+                self.agent_state_cache.invalidate(self._get_agent_ids_for_source(session, source_id))
             else:
                 printd(
                     f"`update_source` was called with user_id={actor.id}, organization_id={actor.organization_id}, name={source.name}, but found existing source with nothing to update."
@@ -61,9 +70,15 @@ class SourceManager:
         """Delete a source by its ID."""
         with self.session_maker() as session:
             source = SourceModel.read(db_session=session, identifier=source_id)
+            agent_ids = self._get_agent_ids_for_source(session, source_id)
             source.hard_delete(db_session=session, actor=actor)
+            self.agent_state_cache.invalidate(agent_ids)
+            self.passage_manager.remove_from_vector_index(SourcePassage, owners=[source_id])
             return source.to_pydantic()
 
+    def _get_agent_ids_for_source(self, session, source_id: str) -> List[str]:
+        return list(session.execute(select(SourcesAgents.agent_id).where(SourcesAgents.source_id == source_id)).scalars())
+
     @enforce_types
     def list_sources(self, actor: PydanticUser, after: Optional[str] = None, limit: Optional[int] = 50, **kwargs) -> List[PydanticSource]:
         """List all sources with optional pagination."""
@@ -163,5 +178,7 @@ class SourceManager:
         """Delete a file by its ID."""
         with self.session_maker() as session:
             file = FileMetadataModel.read(db_session=session, identifier=file_id)
+            passage_ids = list(session.execute(select(SourcePassage.id).where(SourcePassage.file_id == file_id)).scalars())
             file.hard_delete(db_session=session, actor=actor)
+            self.passage_manager.remove_from_vector_index(SourcePassage, passage_ids=passage_ids)
             return file.to_pydantic()
@@ -7,6 +7,7 @@ import runpy
 import subprocess
 import sys
 import tempfile
+import threading
 import traceback
 import uuid
 from typing import Any, Dict, Optional
@@ -22,6 +23,7 @@ from letta.services.helpers.tool_execution_helper import (
     install_pip_requirements_for_sandbox,
 )
 from letta.services.sandbox_config_manager import SandboxConfigManager
+from letta.services.sandbox_worker_pool import SandboxWorkerError, get_sandbox_worker_pool
 from letta.services.tool_manager import ToolManager
 from letta.settings import tool_settings
 from letta.utils import get_friendly_error_msg
@@ -42,6 +44,11 @@ class ToolExecutionSandbox:
     # We make this a long random string to avoid collisions with any variables in the user's code
     LOCAL_SANDBOX_RESULT_VAR_NAME = "result_ZQqiequkcFwRwwGQMqkt"
 
+    # Serializes the in-process runpy mode, which mutates process wide state
+    RUNPY_LOCK = threading.Lock()
+    # Worker pool key of the isolated runpy mode
+    RUNPY_WORKER_POOL_KEY = "local-runpy"
+
     def __init__(
         self, tool_name: str, args: dict, user: User, force_recreate=True, force_recreate_venv=False, tool_object: Optional[Tool] = None
     ):
@@ -130,6 +137,16 @@ class ToolExecutionSandbox:
             logger.warning(f"Sandbox directory does not exist, creating: {local_configs.sandbox_dir}")
             os.makedirs(local_configs.sandbox_dir)
 
+        use_worker = tool_settings.local_sandbox_worker_pool if local_configs.use_venv else tool_settings.local_sandbox_isolate_runpy
+        if use_worker:
+            code = self.generate_execution_script(agent_state=agent_state)
+            try:
+                return self.run_local_dir_sandbox_worker(sbx_config, env, code)
+            except Exception as e:
+                logger.error(f"Executing tool {self.tool_name} has an unexpected error: {e}")
+                logger.error(f"Logging out tool {self.tool_name} auto-generated code for debugging: \n\n{code}")
+                raise e
+
         # Write the code to a temp file in the sandbox_dir
         with tempfile.NamedTemporaryFile(mode="w", dir=local_configs.sandbox_dir, suffix=".py", delete=False) as temp_file:
             if local_configs.use_venv:
@@ -155,7 +172,8 @@ class ToolExecutionSandbox:
             # Clean up the temp file
             os.remove(temp_file_path)
 
-    def run_local_dir_sandbox_venv(self, sbx_config: SandboxConfig, env: Dict[str, str], temp_file_path: str) -> SandboxRunResult:
+    def _prepare_venv(self, sbx_config: SandboxConfig, env: Dict[str, str]) -> str:
+        """Create the sandbox venv if needed, point `env` at it and return its python executable"""
         local_configs = sbx_config.get_local_config()
         sandbox_dir = os.path.expanduser(local_configs.sandbox_dir)  # Expand tilde
         venv_path = os.path.join(sandbox_dir, local_configs.venv_name)
@@ -167,7 +185,11 @@ class ToolExecutionSandbox:
                 sandbox_dir_path=sandbox_dir, venv_path=venv_path, env=env, force_recreate=self.force_recreate_venv
             )
 
-        install_pip_requirements_for_sandbox(local_configs, env=env)
+        if tool_settings.local_sandbox_worker_pool:
+            # only reinstall when the config (and so its requirements) changed
+            get_sandbox_worker_pool().ensure_requirements(sbx_config, venv_path, env=env, force=self.force_recreate_venv)
+        else:
+            install_pip_requirements_for_sandbox(local_configs, env=env)
 
         # Ensure Python executable exists
         python_executable = find_python_executable(local_configs)
@@ -178,6 +200,72 @@ class ToolExecutionSandbox:
         env["VIRTUAL_ENV"] = venv_path
         env["PATH"] = os.path.join(venv_path, "bin") + ":" + env["PATH"]
         env["PYTHONWARNINGS"] = "ignore"
+        return python_executable
+
+    def run_local_dir_sandbox_worker(self, sbx_config: SandboxConfig, env: Dict[str, str], code: str) -> SandboxRunResult:
+        """
+        Run the execution script on a warm worker process (see `SandboxWorkerPool`).
+
+        Venv sandboxes get workers of the venv's python. Otherwise the workers run the server's own interpreter, which
+        keeps the semantics of the in-process runpy mode while letting calls from different threads run concurrently.
+        """
+        local_configs = sbx_config.get_local_config()
+        fingerprint = sbx_config.fingerprint()
+        # Workers outlive the call, so they start with the server's environment and only see the sandbox and agent
+        # variables of the call they run
+        worker_env = os.environ.copy()
+        if local_configs.use_venv:
+            python_executable = self._prepare_venv(sbx_config, env)
+            worker_env.update({key: env[key] for key in ("VIRTUAL_ENV", "PATH", "PYTHONWARNINGS")})
+            pool_key, cwd, init_globals = fingerprint, os.path.expanduser(local_configs.sandbox_dir), None
+        else:
+            # these workers only differ by the environment, which is sent with every call, so all configs share them
+            # (runpy.run_path(init_globals=env) also exposed the environment as globals of the script)
+            python_executable, pool_key, cwd, init_globals = sys.executable, self.RUNPY_WORKER_POOL_KEY, os.getcwd(), env
+
+        try:
+            with get_sandbox_worker_pool().worker(pool_key, python_executable, cwd=cwd, env=worker_env) as worker:
+                response = worker.run(
+                    code,
+                    env=env,
+                    result_var=self.LOCAL_SANDBOX_RESULT_VAR_NAME,
+                    timeout=tool_settings.local_sandbox_timeout,
+                    init_globals=init_globals,
+                )
+        except TimeoutError:
+            raise TimeoutError(f"Executing tool {self.tool_name} has timed out.")
+        except SandboxWorkerError as e:
+            logger.error(f"Executing tool {self.tool_name} has process error: {e}")
+            return SandboxRunResult(
+                func_return=get_friendly_error_msg(function_name=self.tool_name, exception_name=type(e).__name__, exception_message=str(e)),
+                agent_state=None,
+                stdout=[],
+                stderr=[],
+                status="error",
+                sandbox_config_fingerprint=fingerprint,
+            )
+
+        if response["status"] == "success":
+            func_return, agent_state = self.parse_best_effort(response["result"])
+        else:
+            exception_name, exception_message = response["error"]
+            func_return = get_friendly_error_msg(
+                function_name=self.tool_name, exception_name=exception_name, exception_message=exception_message
+            )
+            agent_state = None
+
+        return SandboxRunResult(
+            func_return=func_return,
+            agent_state=agent_state,
+            stdout=[response["stdout"]] if response["stdout"] else [],
+            stderr=[response["stderr"]] if response["stderr"] else [],
+            status=response["status"],
+            sandbox_config_fingerprint=fingerprint,
+        )
+
+    def run_local_dir_sandbox_venv(self, sbx_config: SandboxConfig, env: Dict[str, str], temp_file_path: str) -> SandboxRunResult:
+        sandbox_dir = os.path.expanduser(sbx_config.get_local_config().sandbox_dir)  # Expand tilde
+        python_executable = self._prepare_venv(sbx_config, env)
 
         # Execute the code
         try:
@@ -185,7 +273,7 @@ class ToolExecutionSandbox:
                 [python_executable, temp_file_path],
                 env=env,
                 cwd=sandbox_dir,
-                timeout=60,
+                timeout=tool_settings.local_sandbox_timeout,
                 capture_output=True,
                 text=True,
             )
@@ -225,6 +313,13 @@ class ToolExecutionSandbox:
             raise e
 
     def run_local_dir_sandbox_runpy(self, sbx_config: SandboxConfig, env: Dict[str, str], temp_file_path: str) -> SandboxRunResult:
+        # The in-process mode swaps sys.stdout/sys.stderr and os.environ, so only one call may run at a time
+        with self.RUNPY_LOCK:
+            return self._run_local_dir_sandbox_runpy_in_process(sbx_config, env, temp_file_path)
+
+    def _run_local_dir_sandbox_runpy_in_process(
+        self, sbx_config: SandboxConfig, env: Dict[str, str], temp_file_path: str
+    ) -> SandboxRunResult:
         status = "success"
         agent_state, stderr = None, None
 
@@ -13,6 +13,7 @@ from letta.orm.tool import Tool as ToolModel
 from letta.schemas.tool import Tool as PydanticTool
 from letta.schemas.tool import ToolCreate, ToolUpdate
 from letta.schemas.user import User as PydanticUser
+from letta.services.agent_state_cache import get_agent_state_cache
 from letta.utils import enforce_types, printd
 
 logger = get_logger(__name__)
@@ -34,6 +35,7 @@ class ToolManager:
         from letta.server.db import db_context
 
         self.session_maker = db_context
+        self.agent_state_cache = get_agent_state_cache()
 
     # TODO: Refactor this across the codebase to use CreateTool instead of passing in a Tool object
     @enforce_types
@@ -148,7 +150,10 @@ class ToolManager:
                 tool.name = new_schema["name"]
 
             # Save the updated tool to the database
-            return tool.update(db_session=session, actor=actor).to_pydantic()
+            tool = tool.update(db_session=session, actor=actor)
+            # tools are rarely written, drop every cached agent rather than looking up the ones using this tool
+            self.agent_state_cache.invalidate_all()
+            return tool.to_pydantic()
 
     @enforce_types
     def delete_tool_by_id(self, tool_id: str, actor: PydanticUser) -> None:
@@ -157,6 +162,7 @@ class ToolManager:
             try:
                 tool = ToolModel.read(db_session=session, identifier=tool_id, actor=actor)
                 tool.hard_delete(db_session=session, actor=actor)
+                self.agent_state_cache.invalidate_all()
             except NoResultFound:
                 raise ValueError(f"Tool with id {tool_id} not found.")
 
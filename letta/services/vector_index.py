@@ -0,0 +1,471 @@
+import atexit
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Type
+
+import numpy as np
+
+from letta.log import get_logger
+
+logger = get_logger(__name__)
+
+
+class VectorIndex(ABC):
+    """
+    In-process nearest neighbour index over passage embeddings.
+
+    Every vector is stored together with an owner key (the agent id for archival passages, the source id for source passages),
+    so that searches can be scoped to the passages an agent is allowed to see. Scores are cosine similarities.
+
+    `generations` records, per owner, the number of passages and their last update in the database when the entries of
+    the owner were last brought up to date (see `PassageManager.sync_vector_index`), so that writes made by other
+    processes are noticed before a search.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.generations: Dict[str, Tuple[int, Optional[str]]] = {}
+        self._lock = threading.RLock()
+
+    @abstractmethod
+    def add(self, ids: Sequence[str], owners: Sequence[str], vectors: np.ndarray) -> None:
+        """Insert (or overwrite) vectors for the given ids"""
+
+    @abstractmethod
+    def remove(self, ids: Iterable[str]) -> None:
+        """Remove ids from the index, unknown ids are ignored"""
+
+    @abstractmethod
+    def owner_ids(self, owner: str) -> List[str]:
+        """Ids of the vectors of `owner`"""
+
+    def remove_owners(self, owners: Iterable[str]) -> None:
+        """Remove every vector of the given owners, and forget when they were last synced"""
+        with self._lock:
+            for owner in owners:
+                self.remove(self.owner_ids(owner))
+                self.generations.pop(owner, None)
+
+    @abstractmethod
+    def search(self, query: np.ndarray, k: int, owners: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """Return up to k (id, similarity) pairs ordered from most to least similar"""
+
+    @abstractmethod
+    def state_dict(self) -> Dict[str, np.ndarray]:
+        """Serialize the index into plain NumPy arrays"""
+
+    @abstractmethod
+    def load_state_dict(self, state: Dict[str, np.ndarray]) -> None:
+        """Restore the index from the output of `state_dict`"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class FlatVectorIndex(VectorIndex):
+    """Exact index: scores every vector owned by the requested owners in a single matrix-vector product"""
+
+    def __init__(self, dim: int):
+        super().__init__(dim)
+        self._ids: List[Optional[str]] = []
+        self._row_of: Dict[str, int] = {}
+        self._owner_to_code: Dict[str, int] = {}
+        self._owner_names: List[str] = []
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._owner_codes = np.zeros(0, dtype=np.int32)  # -1 marks a removed row
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def _grow(self, n_new: int) -> None:
+        needed = len(self._ids) + n_new
+        capacity = self._vectors.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, 2 * capacity, 1024)
+        vectors = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        vectors[:capacity] = self._vectors
+        owner_codes = np.full(new_capacity, -1, dtype=np.int32)
+        owner_codes[:capacity] = self._owner_codes
+        self._vectors, self._owner_codes = vectors, owner_codes
+
+    def _owner_code(self, owner: str) -> int:
+        if owner not in self._owner_to_code:
+            self._owner_to_code[owner] = len(self._owner_names)
+            self._owner_names.append(owner)
+        return self._owner_to_code[owner]
+
+    def add(self, ids: Sequence[str], owners: Sequence[str], vectors: np.ndarray) -> None:
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim))
+        with self._lock:
+            self._grow(len(ids))
+            rows = []
+            for passage_id, owner in zip(ids, owners):
+                row = self._row_of.get(passage_id)
+                if row is None:
+                    row = len(self._ids)
+                    self._ids.append(passage_id)
+                    self._row_of[passage_id] = row
+                self._owner_codes[row] = self._owner_code(owner)
+                rows.append(row)
+            rows = np.asarray(rows, dtype=np.int64)
+            self._vectors[rows] = vectors
+            self._on_rows_added(rows)
+
+    def _on_rows_added(self, rows: np.ndarray) -> None:
+        """Hook for subclasses that keep per-row bookkeeping"""
+
+    def remove(self, ids: Iterable[str]) -> None:
+        with self._lock:
+            for passage_id in ids:
+                row = self._row_of.pop(passage_id, None)
+                if row is not None:
+                    self._ids[row] = None
+                    self._owner_codes[row] = -1
+
+    def owner_ids(self, owner: str) -> List[str]:
+        with self._lock:
+            if owner not in self._owner_to_code:
+                return []
+            rows = np.flatnonzero(self._owner_codes[: len(self._ids)] == self._owner_to_code[owner])
+            return [self._ids[row] for row in rows]
+
+    def _candidate_rows(self, owners: Optional[Iterable[str]]) -> np.ndarray:
+        owner_codes = self._owner_codes[: len(self._ids)]
+        if owners is None:
+            return np.flatnonzero(owner_codes >= 0)
+        codes = [self._owner_to_code[o] for o in owners if o in self._owner_to_code]
+        if not codes:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(np.isin(owner_codes, codes))
+
+    def _rank(self, rows: np.ndarray, query: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        if len(rows) == 0 or k <= 0:
+            return []
+        scores = self._vectors[rows] @ query
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(rows))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self._ids[rows[i]], float(scores[i])) for i in top]
+
+    def search(self, query: np.ndarray, k: int, owners: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        query = _normalize(np.asarray(query, dtype=np.float32)[: self.dim])
+        with self._lock:
+            return self._rank(self._candidate_rows(owners), query, k)
+
+    def _compact(self) -> None:
+        """Drop removed rows so that snapshots do not carry tombstones"""
+        live = np.flatnonzero(self._owner_codes[: len(self._ids)] >= 0)
+        if len(live) == len(self._ids):
+            return
+        self._ids = [self._ids[i] for i in live]
+        self._row_of = {passage_id: row for row, passage_id in enumerate(self._ids)}
+        self._vectors = self._vectors[live]
+        self._owner_codes = self._owner_codes[live]
+        self._on_compacted(live)
+
+    def _on_compacted(self, live: np.ndarray) -> None:
+        """Hook for subclasses that keep per-row bookkeeping"""
+
+    def state_dict(self) -> Dict[str, np.ndarray]:
+        with self._lock:
+            self._compact()
+            return {
+                "ids": np.asarray(self._ids, dtype=str),
+                "owner_names": np.asarray(self._owner_names, dtype=str),
+                "owner_codes": self._owner_codes[: len(self._ids)].copy(),
+                "vectors": self._vectors[: len(self._ids)].copy(),
+                "generation_owners": np.asarray(list(self.generations), dtype=str),
+                "generation_counts": np.asarray([count for count, _ in self.generations.values()], dtype=np.int64),
+                "generation_updated_at": np.asarray([updated_at or "" for _, updated_at in self.generations.values()], dtype=str),
+            }
+
+    def load_state_dict(self, state: Dict[str, np.ndarray]) -> None:
+        with self._lock:
+            self._ids = [str(i) for i in state["ids"]]
+            self._row_of = {passage_id: row for row, passage_id in enumerate(self._ids)}
+            self._owner_names = [str(o) for o in state["owner_names"]]
+            self._owner_to_code = {owner: code for code, owner in enumerate(self._owner_names)}
+            self._owner_codes = np.asarray(state["owner_codes"], dtype=np.int32)
+            self._vectors = np.asarray(state["vectors"], dtype=np.float32).reshape(len(self._ids), self.dim)
+            # snapshots written before generations were tracked get every owner synced on its first search
+            self.generations = {
+                str(owner): (int(count), str(updated_at) or None)
+                for owner, count, updated_at in zip(
+                    state.get("generation_owners", []), state.get("generation_counts", []), state.get("generation_updated_at", [])
+                )
+            }
+
+
+class IVFVectorIndex(FlatVectorIndex):
+    """
+    Inverted file index: vectors are clustered with spherical k-means and a query only scores the `nprobe` closest clusters.
+
+    Until `min_train_size` vectors have been added (and whenever the owner-filtered candidate set is small) the search is exact.
+    The coarse quantizer is retrained every time the index grows 4x past its last training size.
+    """
+
+    def __init__(self, dim: int, nprobe: int = 8, min_train_size: int = 2048, kmeans_iters: int = 10):
+        super().__init__(dim)
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.kmeans_iters = kmeans_iters
+        self._centroids: Optional[np.ndarray] = None
+        self._lists = np.zeros(0, dtype=np.int32)
+        self._trained_size = 0
+
+    def _assign(self, vectors: np.ndarray, batch_size: int = 65536) -> np.ndarray:
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), batch_size):
+            assignments[start : start + batch_size] = np.argmax(vectors[start : start + batch_size] @ self._centroids.T, axis=1)
+        return assignments
+
+    def _train(self) -> None:
+        rows = self._candidate_rows(None)
+        nlist = int(min(max(np.sqrt(len(rows)), 1), 4096))
+        rng = np.random.default_rng(0)
+        sample = self._vectors[rng.choice(rows, size=min(len(rows), 64 * nlist), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)]
+        for _ in range(self.kmeans_iters):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            empty = np.bincount(assignments, minlength=nlist) == 0
+            sums[empty] = centroids[empty]  # keep empty clusters where they were
+            centroids = _normalize(sums)
+        self._centroids = centroids.astype(np.float32)
+        self._lists = np.full(self._vectors.shape[0], -1, dtype=np.int32)
+        self._lists[: len(self._ids)] = self._assign(self._vectors[: len(self._ids)])
+        self._trained_size = len(rows)
+        logger.info(f"Trained IVF vector index with {nlist} lists on {len(rows)} vectors (dim={self.dim})")
+
+    def _on_rows_added(self, rows: np.ndarray) -> None:
+        if self._centroids is None:
+            if len(self) >= self.min_train_size:
+                self._train()
+            return
+        if len(self) > 4 * self._trained_size:
+            self._train()
+            return
+        if len(self._lists) < self._vectors.shape[0]:
+            lists = np.full(self._vectors.shape[0], -1, dtype=np.int32)
+            lists[: len(self._lists)] = self._lists
+            self._lists = lists
+        self._lists[rows] = self._assign(self._vectors[rows])
+
+    def _on_compacted(self, live: np.ndarray) -> None:
+        if self._centroids is not None:
+            self._lists = self._lists[live]
+
+    def search(self, query: np.ndarray, k: int, owners: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        query = _normalize(np.asarray(query, dtype=np.float32)[: self.dim])
+        with self._lock:
+            rows = self._candidate_rows(owners)
+            if self._centroids is not None and len(rows) > max(k, self.min_train_size):
+                probes = np.argsort(-(self._centroids @ query))[: self.nprobe]
+                probed = rows[np.isin(self._lists[rows], probes)]
+                # only fall back to an exact scan if the probed lists cannot fill the page
+                if len(probed) >= k:
+                    rows = probed
+            return self._rank(rows, query, k)
+
+    def state_dict(self) -> Dict[str, np.ndarray]:
+        with self._lock:
+            state = super().state_dict()
+            if self._centroids is not None:
+                state["centroids"] = self._centroids
+                state["lists"] = self._lists[: len(self._ids)].copy()
+                state["trained_size"] = np.asarray(self._trained_size)
+            return state
+
+    def load_state_dict(self, state: Dict[str, np.ndarray]) -> None:
+        with self._lock:
+            super().load_state_dict(state)
+            if "centroids" in state:
+                self._centroids = np.asarray(state["centroids"], dtype=np.float32)
+                self._lists = np.asarray(state["lists"], dtype=np.int32)
+                self._trained_size = int(state["trained_size"])
+
+
+VECTOR_INDEX_TYPES: Dict[str, Type[VectorIndex]] = {
+    "flat": FlatVectorIndex,
+    "ivf": IVFVectorIndex,
+}
+
+
+def top_k_cosine(
+    query: np.ndarray, batches: Iterable[Tuple[Sequence[str], Sequence[Optional[np.ndarray]]]], k: Optional[int] = None
+) -> List[Tuple[str, float]]:
+    """
+    Exact cosine ranking of streamed (ids, embeddings) batches, without building an index.
+
+    Each batch is scored with a single matrix-vector product and only the running top-k is kept, so memory is bounded by
+    the batch size. Embeddings may have different lengths (stored vectors drop their zero padding): they are compared as
+    if zero padded, like the cosine_distance UDF. Missing embeddings rank last.
+
+    Returns up to k (id, similarity) pairs ordered from most to least similar, all of them if k is None.
+    """
+    query = np.asarray(query, dtype=np.float32)
+    query = query[: np.flatnonzero(query)[-1] + 1] if query.any() else query[:1]
+    query = query / (np.linalg.norm(query) or 1.0)
+    dim = query.shape[0]
+
+    best_ids: List[str] = []
+    best_scores = np.zeros(0, dtype=np.float32)
+    for ids, embeddings in batches:
+        lengths = {len(embedding) for embedding in embeddings if embedding is not None}
+        missing = np.fromiter((embedding is None for embedding in embeddings), dtype=bool, count=len(ids))
+        if len(lengths) == 1 and not missing.any():
+            # common case, every row has the same stored dimension: a single copy into the matrix
+            full = np.stack(embeddings).astype(np.float32, copy=False)
+            norms = np.linalg.norm(full, axis=1)
+            matrix = full[:, :dim] if full.shape[1] >= dim else np.pad(full, ((0, 0), (0, dim - full.shape[1])))
+        else:
+            matrix = np.zeros((len(ids), dim), dtype=np.float32)
+            norms = np.zeros(len(ids), dtype=np.float32)
+            for i, embedding in enumerate(embeddings):
+                if embedding is not None:
+                    n = min(len(embedding), dim)
+                    matrix[i, :n] = embedding[:n]
+                    norms[i] = np.linalg.norm(np.asarray(embedding, dtype=np.float32))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = (matrix @ query) / norms
+        scores[missing | (norms == 0)] = -np.inf
+
+        best_ids.extend(ids)
+        best_scores = np.concatenate([best_scores, scores])
+        if k is not None and len(best_ids) > k:
+            keep = np.sort(np.argpartition(-best_scores, k - 1)[:k]) if k > 0 else np.zeros(0, dtype=np.int64)
+            best_ids = [best_ids[i] for i in keep]
+            best_scores = best_scores[keep]
+
+    order = np.argsort(-best_scores, kind="stable")
+    return [(best_ids[i], float(best_scores[i])) for i in order]
+
+
+def create_vector_index(index_type: str, dim: int, **kwargs) -> VectorIndex:
+    if index_type not in VECTOR_INDEX_TYPES:
+        raise ValueError(f"Unknown vector index type '{index_type}', expected one of {list(VECTOR_INDEX_TYPES)}")
+    index_cls = VECTOR_INDEX_TYPES[index_type]
+    if index_cls is IVFVectorIndex:
+        return index_cls(dim, **kwargs)
+    return index_cls(dim)
+
+
+def save_vector_index(index: VectorIndex, path: str) -> None:
+    """Atomically write a snapshot of the index to `path`"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **index.state_dict())
+    os.replace(tmp_path, path)
+
+
+def load_vector_index(index: VectorIndex, path: str) -> bool:
+    """Populate the index from a snapshot at `path`, returns False if no usable snapshot exists"""
+    if not os.path.exists(path):
+        return False
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            index.load_state_dict({key: data[key] for key in data.files})
+        return True
+    except Exception as e:
+        logger.warning(f"Discarding unreadable vector index snapshot {path}: {e}")
+        return False
+
+
+class VectorIndexRegistry:
+    """
+    Process-wide registry of persisted vector indexes, keyed by (name, dim).
+
+    Snapshots are written to `directory` every `persist_every` mutations and at interpreter exit. Because a crash can lose
+    the mutations since the last snapshot, `get_or_load` takes a `num_rows` callable and rebuilds the index from the
+    database if the snapshot does not match the source table.
+    """
+
+    def __init__(self, directory: str, index_type: str, persist_every: int = 100, **index_kwargs):
+        self.directory = directory
+        self.index_type = index_type
+        self.persist_every = persist_every
+        self.index_kwargs = index_kwargs
+        self._indexes: Dict[Tuple[str, int], VectorIndex] = {}
+        self._mutations: Dict[Tuple[str, int], int] = {}
+        self._lock = threading.RLock()
+
+    def _path(self, name: str, dim: int) -> str:
+        return os.path.join(self.directory, f"{name}_{self.index_type}_{dim}.npz")
+
+    def get_or_load(self, name: str, dim: int, num_rows: Callable[[], int], rebuild: Callable[[VectorIndex], None]) -> VectorIndex:
+        key = (name, dim)
+        with self._lock:
+            if key in self._indexes:
+                return self._indexes[key]
+            index = create_vector_index(self.index_type, dim, **self.index_kwargs)
+            if not load_vector_index(index, self._path(name, dim)) or len(index) != num_rows():
+                logger.info(f"Rebuilding {self.index_type} vector index for {name} (dim={dim}) from the database")
+                index = create_vector_index(self.index_type, dim, **self.index_kwargs)
+                rebuild(index)
+                save_vector_index(index, self._path(name, dim))
+            self._indexes[key] = index
+            self._mutations[key] = 0
+            return index
+
+    def loaded(self, name: str) -> List[Tuple[int, VectorIndex]]:
+        """The (dim, index) pairs of `name` loaded in this process"""
+        with self._lock:
+            return [(dim, index) for (index_name, dim), index in self._indexes.items() if index_name == name]
+
+    def mark_dirty(self, name: str, dim: int) -> None:
+        key = (name, dim)
+        with self._lock:
+            if key not in self._indexes:
+                return
+            self._mutations[key] += 1
+            if self._mutations[key] >= self.persist_every:
+                save_vector_index(self._indexes[key], self._path(name, dim))
+                self._mutations[key] = 0
+
+    def flush(self) -> None:
+        with self._lock:
+            for (name, dim), index in self._indexes.items():
+                if self._mutations.get((name, dim)):
+                    save_vector_index(index, self._path(name, dim))
+                    self._mutations[(name, dim)] = 0
+
+
+_registry: Optional[VectorIndexRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_vector_index_registry() -> Optional[VectorIndexRegistry]:
+    """Return the shared registry, or None if ANN search is disabled (Postgres, or `sqlite_vector_index` unset)"""
+    global _registry
+
+    from letta.settings import settings
+
+    if settings.letta_pg_uri_no_default or not settings.sqlite_vector_index:
+        return None
+
+    with _registry_lock:
+        if _registry is None or _registry.index_type != settings.sqlite_vector_index:
+            from letta.config import LettaConfig
+
+            kwargs = {"nprobe": settings.sqlite_vector_index_nprobe} if settings.sqlite_vector_index == "ivf" else {}
+            _registry = VectorIndexRegistry(
+                directory=os.path.join(LettaConfig.load().recall_storage_path, "vector_index"),
+                index_type=settings.sqlite_vector_index,
+                persist_every=settings.sqlite_vector_index_persist_every,
+                **kwargs,
+            )
+            atexit.register(_registry.flush)
+        return _registry
@@ -16,6 +16,15 @@ class ToolSettings(BaseSettings):
 
     # Local Sandbox configurations
     local_sandbox_dir: Optional[str] = None
+    local_sandbox_timeout: float = 60
+    # Run tools of the non-venv local sandbox on worker processes of the server's interpreter instead of in-process
+    local_sandbox_isolate_runpy: bool = True
+
+    # Warm worker pool of the local venv sandbox
+    local_sandbox_worker_pool: bool = True
+    local_sandbox_max_idle_workers: int = 2  # per sandbox config
+    local_sandbox_worker_max_calls: int = 100  # recycle a worker after this many tool calls
+    local_sandbox_worker_memory_mb: int = 1024  # 0 for no limit
 
 
 class SummarizerSettings(BaseSettings):
@@ -45,6 +54,13 @@ class SummarizerSettings(BaseSettings):
     # These serve as in-context examples of how to use functions / what user messages look like
     keep_last_n_messages: int = 0
 
+    # Summarize before the context window overflows: once memory_warning_threshold is crossed, the oldest messages are
+    # summarized in the background and the next step swaps the summary in, instead of summarizing in-band on overflow
+    proactive: bool = False
+
+    # The number of summaries computed at once in the background
+    proactive_max_workers: int = 2
+
 
 class ModelSettings(BaseSettings):
 
@@ -154,6 +170,53 @@ class Settings(BaseSettings):
     pg_pool_recycle: int = 1800  # When to recycle connections
     pg_echo: bool = False  # Logging
 
+    # sqlite vector search
+    sqlite_embedding_dtype: str = "float32"  # Storage precision of embeddings on SQLite ("float32" or "float16")
+    sqlite_vector_search: str = "numpy"  # Exact search without an index: "numpy" ranks in batched matrix products, "udf" per row in SQL
+    sqlite_vector_index: Optional[str] = None  # ANN index for passage search on SQLite ("flat" or "ivf"), None searches exactly
+    sqlite_vector_index_nprobe: int = 8  # Number of IVF lists scanned per query
+    sqlite_vector_index_candidates: int = 256  # Number of nearest passage ids hydrated from SQL per query
+    sqlite_vector_index_persist_every: int = 100  # Index mutations between snapshots written next to sqlite.db
+
+    # agent state cache
+    agent_state_cache_size: int = 100  # Agent states kept by SyncServer.load_agent, checked against the DB on every hit, 0 disables it
+
+    # archival memory search
+    archival_search_mode: str = "hybrid"  # "hybrid" fuses full text and vector rankings, "vector" only ranks by embedding
+    archival_search_candidates: int = 50  # Passages taken from each ranking before fusing them
+
+    # embedding requests made during archival inserts and source loading
+    embedding_batch_size: int = 100  # Texts per embed_texts batch (providers split further to their own request limits)
+    embedding_max_concurrency: int = 4  # Embedding batches in flight at once
+    embedding_max_retries: int = 10  # Retries (with backoff) of a rate limited or failed OpenAI embedding request
+
+    # embedding cache
+    embedding_cache_size_mb: int = 64  # Memory bound of the in-process embedding LRU, 0 disables it
+    embedding_cache_persist: bool = False  # Also keep embeddings in the embedding_cache table of the Letta DB
+
+    # pooled HTTP clients of the LLM and embedding providers
+    http_max_connections: int = 100  # Open connections per client (one client per provider and origin)
+    http_max_keepalive_connections: int = 20  # Idle connections kept alive per client
+    http_keepalive_expiry: float = 60.0  # Seconds an idle connection is kept before it is closed
+    http_timeout: float = 600.0  # Read timeout of provider requests, long enough for slow completions
+    http2: bool = True  # Negotiate HTTP/2 with providers that support it (needs the h2 package)
+    http_max_sdk_clients: int = 256  # Provider SDK clients (one per api key and options) kept for reuse, least recently used first
+
+    # background runs (POST /v1/agents/{agent_id}/messages/async)
+    run_queue_backend: str = "database"  # "database" shares the jobs table with every server and `letta worker`, "memory" is per process
+    # Runs the API server processes at once (the thread pool the background tasks of async requests ran on), 0 leaves the
+    # queue to `letta worker` processes
+    run_queue_embedded_workers: int = 40
+    run_queue_poll_interval: float = 1.0  # Seconds an idle worker waits before checking the queue again
+    run_queue_heartbeat_interval: float = 10.0  # Seconds between the heartbeats (and progress reports) of a worker
+    run_queue_stale_after: float = 60.0  # Seconds without a heartbeat after which a running run is requeued
+    run_queue_max_attempts: int = 3  # Claims of a run before it is failed instead of requeued
+
+    # offline memory consolidation of chat only agents
+    memory_consolidation_workers: int = 1  # Background threads running offline memory agents
+    memory_consolidation_max_pending: int = 100  # Agents waiting for a consolidation, further requests are dropped
+    memory_consolidation_time_budget: float = 120.0  # Seconds an offline memory agent may keep rethinking, 0 for no limit
+
     # multi agent settings
     multi_agent_send_message_max_retries: int = 3
     multi_agent_send_message_timeout: int = 20 * 60
@@ -1,7 +1,188 @@
-from typing import Optional, Tuple
+import re
+from typing import List, Optional, Tuple
 
 from letta.constants import DEFAULT_MESSAGE_TOOL_KWARG
 
+# the characters that end a span of string contents
+_STRING_SPECIAL = re.compile(r'["\\]')
+# the characters that end a span of a nested object or array, outside of its strings
+_NESTED_SPECIAL = re.compile(r'["{}\[\]]')
+# the characters that end a scalar (number, true, false, null)
+_SCALAR_END = re.compile(r"[,}\s]")
+_WHITESPACE = " \t\n\r"
+
+
+class JSONStreamTokenizer:
+    """
+    Incremental tokenizer of a JSON object that arrives in fragments, e.g. the arguments of a streamed tool call.
+
+    The tokenizer keeps its state across fragments and scans string contents a whole span at a time, so feeding a stream
+    costs O(total length) regardless of how it is fragmented. Every `feed` returns the events of the fragment as
+    `(kind, key, text)` tuples, `key` being the top-level key the event belongs to (None for the braces and commas of the
+    object itself) and `text` its raw JSON text, escape sequences in strings are kept as is:
+
+    - `object_start` / `object_end`: the braces of the top-level object
+    - `key`: a top-level key, emitted once its colon arrived (`text` is the raw key, without quotes)
+    - `value_start`: the first character of the value of `key` (`"` for strings, `{` / `[` for nested values)
+    - `value`: a delta of the value of `key`: the contents of a string (without quotes), or the raw text of anything else
+    - `value_end`: the end of the value of `key` (the closing quote / bracket, or "" after a scalar)
+    - `comma`: the comma between two members
+
+    Values nested deeper than the top-level object are passed through as `value` deltas of their top-level key.
+    Anything after the end of the top-level object is ignored.
+    """
+
+    OBJECT_START = "object_start"
+    KEY = "key"
+    VALUE_START = "value_start"
+    VALUE = "value"
+    VALUE_END = "value_end"
+    COMMA = "comma"
+    OBJECT_END = "object_end"
+
+    def __init__(self):
+        # before_object, before_key, key, before_colon, before_value, string, nested, scalar, after_value, done
+        self.state = "before_object"
+        self.key: Optional[str] = None
+        self.escaped = False
+        # key contents while the key is streaming
+        self._key_parts: List[str] = []
+        # nesting depth and string state of a nested value
+        self._depth = 0
+        self._nested_in_string = False
+
+    @property
+    def done(self) -> bool:
+        """Whether the top-level object is complete"""
+        return self.state == "done"
+
+    def _scan_string(self, fragment: str, i: int) -> Tuple[int, str, bool]:
+        """Contents of the string at `fragment[i:]` up to its closing quote: (end, contents, closed)"""
+        n = len(fragment)
+        start = i
+        while i < n:
+            if self.escaped:
+                self.escaped = False
+                i += 1
+                continue
+            match = _STRING_SPECIAL.search(fragment, i)
+            if match is None:
+                return n, fragment[start:], False
+            i = match.end()
+            if match.group() == "\\":
+                self.escaped = True
+            else:
+                return i, fragment[start : i - 1], True
+        return n, fragment[start:], False
+
+    def _scan_nested(self, fragment: str, i: int) -> Tuple[int, bool]:
+        """Scan the nested value at `fragment[i:]` up to its closing bracket: (end, closed)"""
+        n = len(fragment)
+        while i < n:
+            if self._nested_in_string:
+                i, _, closed = self._scan_string(fragment, i)
+                if closed:
+                    self._nested_in_string = False
+                continue
+            match = _NESTED_SPECIAL.search(fragment, i)
+            if match is None:
+                return n, False
+            i = match.end()
+            c = match.group()
+            if c == '"':
+                self._nested_in_string = True
+            elif c in "{[":
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    return i, True
+        return n, False
+
+    def feed(self, fragment: str) -> List[Tuple[str, Optional[str], str]]:
+        if self.state == "string" and not self.escaped and '"' not in fragment and "\\" not in fragment:
+            # the common case of a fragment in the middle of a long string value
+            return [(self.VALUE, self.key, fragment)] if fragment else []
+        events = []
+        i, n = 0, len(fragment)
+        while i < n:
+            state = self.state
+            if state == "string":
+                end, contents, closed = self._scan_string(fragment, i)
+                if contents:
+                    events.append((self.VALUE, self.key, contents))
+                if closed:
+                    events.append((self.VALUE_END, self.key, '"'))
+                    self.state = "after_value"
+                i = end
+            elif state == "key":
+                end, contents, closed = self._scan_string(fragment, i)
+                self._key_parts.append(contents)
+                if closed:
+                    self.key = "".join(self._key_parts)
+                    self._key_parts = []
+                    self.state = "before_colon"
+                i = end
+            elif state == "nested":
+                end, closed = self._scan_nested(fragment, i)
+                if closed:
+                    if end - 1 > i:
+                        events.append((self.VALUE, self.key, fragment[i : end - 1]))
+                    events.append((self.VALUE_END, self.key, fragment[end - 1]))
+                    self.state = "after_value"
+                elif end > i:
+                    events.append((self.VALUE, self.key, fragment[i:end]))
+                i = end
+            elif state == "scalar":
+                match = _SCALAR_END.search(fragment, i)
+                end = match.start() if match else n
+                if end > i:
+                    events.append((self.VALUE, self.key, fragment[i:end]))
+                if match:
+                    # the terminator is handled as the token after the value
+                    events.append((self.VALUE_END, self.key, ""))
+                    self.state = "after_value"
+                i = end
+            elif state == "done":
+                break
+            else:
+                c = fragment[i]
+                i += 1
+                if c in _WHITESPACE:
+                    continue
+                if state == "before_object":
+                    if c == "{":
+                        events.append((self.OBJECT_START, None, c))
+                        self.state = "before_key"
+                elif state == "before_key":
+                    if c == '"':
+                        self.state = "key"
+                    elif c == "}":
+                        events.append((self.OBJECT_END, None, c))
+                        self.state = "done"
+                elif state == "before_colon":
+                    if c == ":":
+                        events.append((self.KEY, self.key, self.key))
+                        self.state = "before_value"
+                elif state == "before_value":
+                    events.append((self.VALUE_START, self.key, c))
+                    if c == '"':
+                        self.state = "string"
+                    elif c in "{[":
+                        self._depth = 1
+                        self.state = "nested"
+                    else:
+                        # the first character of a scalar is its start, the rest streams as value deltas
+                        self.state = "scalar"
+                elif state == "after_value":
+                    if c == ",":
+                        events.append((self.COMMA, None, c))
+                        self.state = "before_key"
+                    elif c == "}":
+                        events.append((self.OBJECT_END, None, c))
+                        self.state = "done"
+        return events
+
 
 class JSONInnerThoughtsExtractor:
     """
@@ -37,176 +218,63 @@ class JSONInnerThoughtsExtractor:
     def __init__(self, inner_thoughts_key="inner_thoughts", wait_for_first_key=False):
         self.inner_thoughts_key = inner_thoughts_key
         self.wait_for_first_key = wait_for_first_key
-        self.main_buffer = ""
-        self.inner_thoughts_buffer = ""
-        self.state = "start"  # Possible states: start, key, colon, value, comma_or_end, end
-        self.in_string = False
-        self.escaped = False
-        self.current_key = ""
+        self.tokenizer = JSONStreamTokenizer()
+        self.main_parts = []
+        self.inner_thoughts_parts = []
         self.is_inner_thoughts_value = False
         self.inner_thoughts_processed = False
         self.hold_main_json = wait_for_first_key
-        self.main_json_held_buffer = ""
+        self.main_json_held_parts = []
+        # `"key":` of the current member, sent together with the first character of its value
+        self.pending_key = ""
 
     def process_fragment(self, fragment: str) -> Tuple[str, str]:
-        updates_main_json = ""
-        updates_inner_thoughts = ""
-        i = 0
-        while i < len(fragment):
-            c = fragment[i]
-            if self.escaped:
-                self.escaped = False
-                if self.in_string:
-                    if self.state == "key":
-                        self.current_key += c
-                    elif self.state == "value":
-                        if self.is_inner_thoughts_value:
-                            updates_inner_thoughts += c
-                            self.inner_thoughts_buffer += c
-                        else:
-                            if self.hold_main_json:
-                                self.main_json_held_buffer += c
-                            else:
-                                updates_main_json += c
-                                self.main_buffer += c
-                else:
-                    if not self.is_inner_thoughts_value:
-                        if self.hold_main_json:
-                            self.main_json_held_buffer += c
-                        else:
-                            updates_main_json += c
-                            self.main_buffer += c
-            elif c == "\\":
-                self.escaped = True
-                if self.in_string:
-                    if self.state == "key":
-                        self.current_key += c
-                    elif self.state == "value":
-                        if self.is_inner_thoughts_value:
-                            updates_inner_thoughts += c
-                            self.inner_thoughts_buffer += c
-                        else:
-                            if self.hold_main_json:
-                                self.main_json_held_buffer += c
-                            else:
-                                updates_main_json += c
-                                self.main_buffer += c
+        updates_main_json = []
+        updates_inner_thoughts = []
+        main = self.main_json_held_parts if self.hold_main_json else updates_main_json
+
+        for kind, key, text in self.tokenizer.feed(fragment):
+            if kind == JSONStreamTokenizer.VALUE:
+                if self.is_inner_thoughts_value:
+                    updates_inner_thoughts.append(text)
                 else:
-                    if not self.is_inner_thoughts_value:
-                        if self.hold_main_json:
-                            self.main_json_held_buffer += c
-                        else:
-                            updates_main_json += c
-                            self.main_buffer += c
-            elif c == '"':
-                if not self.escaped:
-                    self.in_string = not self.in_string
-                    if self.in_string:
-                        if self.state in ["start", "comma_or_end"]:
-                            self.state = "key"
-                            self.current_key = ""
-                            # Release held main_json when starting to process the next key
-                            if self.wait_for_first_key and self.hold_main_json and self.inner_thoughts_processed:
-                                updates_main_json += self.main_json_held_buffer
-                                self.main_buffer += self.main_json_held_buffer
-                                self.main_json_held_buffer = ""
-                                self.hold_main_json = False
-                    else:
-                        if self.state == "key":
-                            self.state = "colon"
-                        elif self.state == "value":
-                            # End of value
-                            if self.is_inner_thoughts_value:
-                                self.inner_thoughts_processed = True
-                                # Do not release held main_json here
-                            else:
-                                if self.hold_main_json:
-                                    self.main_json_held_buffer += '"'
-                                else:
-                                    updates_main_json += '"'
-                                    self.main_buffer += '"'
-                            self.state = "comma_or_end"
+                    main.append(text)
+            elif kind == JSONStreamTokenizer.KEY:
+                self.is_inner_thoughts_value = key == self.inner_thoughts_key
+                if not self.is_inner_thoughts_value:
+                    self.pending_key = f'"{key}":'
+            elif kind == JSONStreamTokenizer.VALUE_START:
+                if not self.is_inner_thoughts_value:
+                    main.append(self.pending_key + text)
+                    self.pending_key = ""
+                elif text != '"':
+                    updates_inner_thoughts.append(text)
+            elif kind == JSONStreamTokenizer.VALUE_END:
+                if self.is_inner_thoughts_value:
+                    # Do not release held main_json here
+                    self.inner_thoughts_processed = True
+                    if text != '"':
+                        updates_inner_thoughts.append(text)
                 else:
-                    self.escaped = False
-                    if self.in_string:
-                        if self.state == "key":
-                            self.current_key += '"'
-                        elif self.state == "value":
-                            if self.is_inner_thoughts_value:
-                                updates_inner_thoughts += '"'
-                                self.inner_thoughts_buffer += '"'
-                            else:
-                                if self.hold_main_json:
-                                    self.main_json_held_buffer += '"'
-                                else:
-                                    updates_main_json += '"'
-                                    self.main_buffer += '"'
-            elif self.in_string:
-                if self.state == "key":
-                    self.current_key += c
-                elif self.state == "value":
-                    if self.is_inner_thoughts_value:
-                        updates_inner_thoughts += c
-                        self.inner_thoughts_buffer += c
-                    else:
-                        if self.hold_main_json:
-                            self.main_json_held_buffer += c
-                        else:
-                            updates_main_json += c
-                            self.main_buffer += c
+                    main.append(text)
+            elif kind == JSONStreamTokenizer.COMMA:
+                # The comma after the inner thoughts is dropped along with them
+                if not self.is_inner_thoughts_value:
+                    main.append(text)
             else:
-                if c == ":" and self.state == "colon":
-                    self.state = "value"
-                    self.is_inner_thoughts_value = self.current_key == self.inner_thoughts_key
-                    if self.is_inner_thoughts_value:
-                        pass  # Do not include 'inner_thoughts' key in main_json
-                    else:
-                        key_colon = f'"{self.current_key}":'
-                        if self.hold_main_json:
-                            self.main_json_held_buffer += key_colon + '"'
-                        else:
-                            updates_main_json += key_colon + '"'
-                            self.main_buffer += key_colon + '"'
-                elif c == "," and self.state == "comma_or_end":
-                    if self.is_inner_thoughts_value:
-                        # Inner thoughts value ended
-                        self.is_inner_thoughts_value = False
-                        self.state = "start"
-                        # Do not release held main_json here
-                    else:
-                        if self.hold_main_json:
-                            self.main_json_held_buffer += c
-                        else:
-                            updates_main_json += c
-                            self.main_buffer += c
-                        self.state = "start"
-                elif c == "{":
-                    if not self.is_inner_thoughts_value:
-                        if self.hold_main_json:
-                            self.main_json_held_buffer += c
-                        else:
-                            updates_main_json += c
-                            self.main_buffer += c
-                elif c == "}":
-                    self.state = "end"
-                    if self.hold_main_json:
-                        self.main_json_held_buffer += c
-                    else:
-                        updates_main_json += c
-                        self.main_buffer += c
-                else:
-                    if self.state == "value":
-                        if self.is_inner_thoughts_value:
-                            updates_inner_thoughts += c
-                            self.inner_thoughts_buffer += c
-                        else:
-                            if self.hold_main_json:
-                                self.main_json_held_buffer += c
-                            else:
-                                updates_main_json += c
-                                self.main_buffer += c
-            i += 1
+                self.is_inner_thoughts_value = False
+                main.append(text)
+
+        # Release held main_json once the next key started
+        if self.hold_main_json and self.inner_thoughts_processed and self.tokenizer.state not in ("after_value", "before_key", "done"):
+            updates_main_json.extend(self.main_json_held_parts)
+            self.main_json_held_parts = []
+            self.hold_main_json = False
 
+        updates_main_json = "".join(updates_main_json)
+        updates_inner_thoughts = "".join(updates_inner_thoughts)
+        self.main_parts.append(updates_main_json)
+        self.inner_thoughts_parts.append(updates_inner_thoughts)
         return updates_main_json, updates_inner_thoughts
 
     # def process_anthropic_fragment(self, fragment) -> Tuple[str, str]:
@@ -216,61 +284,24 @@ class JSONInnerThoughtsExtractor:
 
     @property
     def main_json(self):
-        return self.main_buffer
+        return "".join(self.main_parts)
 
     @property
     def inner_thoughts(self):
-        return self.inner_thoughts_buffer
+        return "".join(self.inner_thoughts_parts)
 
 
 class FunctionArgumentsStreamHandler:
-    """State machine that can process a stream of"""
+    """Extracts the (raw, still escaped) value of `json_key` from the streamed arguments of a function call"""
 
     def __init__(self, json_key=DEFAULT_MESSAGE_TOOL_KWARG):
         self.json_key = json_key
         self.reset()
 
     def reset(self):
-        self.in_message = False
-        self.key_buffer = ""
-        self.accumulating = False
-        self.message_started = False
+        self.tokenizer = JSONStreamTokenizer()
 
     def process_json_chunk(self, chunk: str) -> Optional[str]:
         """Process a chunk from the function arguments and return the plaintext version"""
-        # Use strip to handle only leading and trailing whitespace in control structures
-        if self.accumulating:
-            clean_chunk = chunk.strip()
-            if self.json_key in self.key_buffer:
-                if ":" in clean_chunk:
-                    self.in_message = True
-                    self.accumulating = False
-                    return None
-            self.key_buffer += clean_chunk
-            return None
-
-        if self.in_message:
-            if chunk.strip() == '"' and self.message_started:
-                self.in_message = False
-                self.message_started = False
-                return None
-            if not self.message_started and chunk.strip() == '"':
-                self.message_started = True
-                return None
-            if self.message_started:
-                if chunk.strip().endswith('"'):
-                    self.in_message = False
-                    return chunk.rstrip('"\n')
-                return chunk
-
-        if chunk.strip() == "{":
-            self.key_buffer = ""
-            self.accumulating = True
-            return None
-
-        if chunk.strip() == "}":
-            self.in_message = False
-            self.message_started = False
-            return None
-
-        return None
+        text = "".join(text for kind, key, text in self.tokenizer.feed(chunk) if kind == JSONStreamTokenizer.VALUE and key == self.json_key)
+        return text or None
@@ -20,7 +20,6 @@ from typing import Any, Coroutine, List, Union, _GenericAlias, get_args, get_ori
 from urllib.parse import urljoin, urlparse
 
 import demjson3 as demjson
-import tiktoken
 from pathvalidate import sanitize_filename as pathvalidate_sanitize_filename
 
 import letta
@@ -34,6 +33,7 @@ from letta.constants import (
     TOOL_CALL_ID_MAX_LEN,
 )
 from letta.helpers.json_helpers import json_dumps, json_loads
+from letta.helpers.tokenizer_helpers import encoding_for_model
 from letta.schemas.openai.chat_completion_response import ChatCompletionResponse
 
 DEBUG = False
@@ -803,8 +803,7 @@ class OpenAIBackcompatUnpickler(pickle.Unpickler):
 
 
 def count_tokens(s: str, model: str = "gpt-4") -> int:
-    encoding = tiktoken.encoding_for_model(model)
-    return len(encoding.encode(s))
+    return len(encoding_for_model(model).encode(s))
 
 
 def printd(*args, **kwargs):
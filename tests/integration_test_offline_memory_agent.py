@@ -15,6 +15,7 @@ from letta.schemas.agent import AgentType
 from letta.schemas.embedding_config import EmbeddingConfig
 from letta.schemas.llm_config import LLMConfig
 from letta.schemas.tool_rule import TerminalToolRule
+from letta.services.memory_consolidation import get_memory_consolidation_service
 from letta.utils import get_human_text, get_persona_text
 
 
@@ -157,6 +158,8 @@ def test_chat_only_agent(client, mock_e2b_api_key_none):
         client.send_message(agent_id=chat_only_agent.id, message=message, role="user")
         chat_only_agent = client.get_agent(agent_id=chat_only_agent.id)
 
+    # the memory is consolidated in the background
+    assert get_memory_consolidation_service().wait_until_idle(timeout=300)
     chat_only_agent = client.get_agent(agent_id=chat_only_agent.id)
     assert chat_only_agent.memory.get_block("chat_agent_human").value != get_human_text(DEFAULT_HUMAN)
 
@@ -1,6 +1,9 @@
+import os
 import secrets
 import string
+import sys
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from unittest.mock import patch
 
@@ -20,6 +23,7 @@ from letta.schemas.sandbox_config import E2BSandboxConfig, LocalSandboxConfig, P
 from letta.schemas.user import User
 from letta.services.organization_manager import OrganizationManager
 from letta.services.sandbox_config_manager import SandboxConfigManager
+from letta.services.sandbox_worker_pool import SandboxWorkerPool
 from letta.services.tool_execution_sandbox import ToolExecutionSandbox
 from letta.services.tool_manager import ToolManager
 from letta.services.user_manager import UserManager
@@ -310,6 +314,23 @@ def test_local_sandbox_env(mock_e2b_api_key_none, get_env_tool, test_user):
     assert long_random_string in result.func_return
 
 
+@pytest.mark.local_sandbox
+def test_local_sandbox_concurrent_calls_are_isolated(mock_e2b_api_key_none, get_env_tool, test_user):
+    secret_words = ["".join(secrets.choice(string.ascii_letters + string.digits) for _ in range(20)) for _ in range(4)]
+
+    def run(secret_word):
+        sandbox = ToolExecutionSandbox(get_env_tool.name, {}, user=test_user)
+        return sandbox.run(additional_env_vars={"secret_word": secret_word})
+
+    with ThreadPoolExecutor(max_workers=len(secret_words)) as executor:
+        results = list(executor.map(run, secret_words))
+
+    for secret_word, result in zip(secret_words, results):
+        assert result.func_return == secret_word
+        assert result.stdout == [secret_word + "\n"]
+    assert "secret_word" not in os.environ
+
+
 @pytest.mark.local_sandbox
 def test_local_sandbox_per_agent_env(mock_e2b_api_key_none, get_env_tool, agent_state, test_user):
     manager = SandboxConfigManager()
@@ -368,6 +389,46 @@ def test_local_sandbox_with_venv_and_warnings_does_not_error(
     assert result.func_return == "Hello World"
 
 
+@pytest.mark.local_sandbox
+def test_local_sandbox_worker_pool_reuses_and_recycles_workers(tmp_path):
+    pool = SandboxWorkerPool(max_idle_workers=1, max_calls=2)
+    script = "import os\nprint('hello')\nresult = os.environ['GREETING']\n"
+
+    def run(greeting, code=script, timeout=30):
+        env = {**os.environ, "GREETING": greeting}
+        with pool.worker("fingerprint", sys.executable, cwd=str(tmp_path), env=env) as worker:
+            return worker.process.pid, worker.run(code, env=env, result_var="result", timeout=timeout)
+
+    try:
+        first_pid, response = run("hi")
+        assert response["status"] == "success"
+        assert response["result"] == "hi"
+        assert response["stdout"] == "hello\n"
+
+        # the warm worker is reused, with the environment of the new call
+        second_pid, response = run("bonjour")
+        assert second_pid == first_pid
+        assert response["result"] == "bonjour"
+
+        # after max_calls the worker is replaced
+        third_pid, _ = run("hola")
+        assert third_pid != first_pid
+
+        # errors are reported without killing the worker
+        error_pid, response = run("hi", code="1 / 0")
+        assert error_pid == third_pid
+        assert response["status"] == "error"
+        assert response["error"][0] == "ZeroDivisionError"
+        assert "ZeroDivisionError" in response["stderr"]
+
+        # a call that times out kills its worker
+        with pytest.raises(TimeoutError):
+            run("hi", code="import time\ntime.sleep(30)", timeout=1)
+        assert pool.stats() == {}
+    finally:
+        pool.discard()
+
+
 @pytest.mark.e2b_sandbox
 def test_local_sandbox_with_venv_errors(mock_e2b_api_key_none, custom_test_sandbox_config, always_err_tool, test_user):
     sandbox = ToolExecutionSandbox(always_err_tool.name, {}, user=test_user)
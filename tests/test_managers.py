@@ -1,20 +1,30 @@
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
+import numpy as np
 import pytest
+import sqlalchemy
 from openai.types.chat.chat_completion_message_tool_call import ChatCompletionMessageToolCall as OpenAIToolCall
 from openai.types.chat.chat_completion_message_tool_call import Function as OpenAIFunction
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import IntegrityError, InvalidRequestError
 
 from letta.config import LettaConfig
 from letta.constants import BASE_MEMORY_TOOLS, BASE_TOOLS, MULTI_AGENT_TOOLS
 from letta.embeddings import embedding_model
 from letta.functions.functions import derive_openai_json_schema, parse_source_code
+from letta.orm import Agent as AgentModel
 from letta.orm import Base
+from letta.orm import Block as BlockModel
 from letta.orm.enums import JobType, ToolType
 from letta.orm.errors import NoResultFound, UniqueConstraintViolationError
-from letta.schemas.agent import CreateAgent, UpdateAgent
+from letta.orm.message import Message as MessageModel
+from letta.orm.messages_agents import MessagesAgents
+from letta.orm.passage import AgentPassage, SourcePassage
+from letta.orm.sqlite_functions import create_sqlite_full_text_index, migrate_sqlite_in_context_messages
+from letta.schemas.agent import AgentType, CreateAgent, UpdateAgent
 from letta.schemas.block import Block as PydanticBlock
 from letta.schemas.block import BlockUpdate, CreateBlock
 from letta.schemas.embedding_config import EmbeddingConfig
@@ -39,8 +49,14 @@ from letta.schemas.tool_rule import InitToolRule
 from letta.schemas.user import User as PydanticUser
 from letta.schemas.user import UserUpdate
 from letta.server.server import SyncServer
+from letta.services.agent_manager import AgentManager
+from letta.services.background_summarizer import BackgroundSummarizer
 from letta.services.block_manager import BlockManager
+from letta.services.helpers.agent_manager_helper import offline_memory_agent_tag
+from letta.services.helpers.full_text_search import is_identifier_query
+from letta.services.memory_consolidation import MemoryConsolidationService
 from letta.services.organization_manager import OrganizationManager
+from letta.services.run_queue import InMemoryRunQueue, RunWorker
 from letta.settings import tool_settings
 from tests.helpers.utils import comprehensive_agent_checks
 
@@ -573,6 +589,63 @@ def test_update_agent(server: SyncServer, comprehensive_test_agent_fixture, othe
     assert updated_agent.updated_at > last_updated_timestamp
 
 
+def test_load_agent_state_cache(server: SyncServer, charles_agent, print_tool, default_user):
+    """load_agent serves repeated loads from the agent state cache, and writes invalidate it"""
+    cache = server.agent_state_cache
+    cache.invalidate_all()
+    hits = cache.hits
+
+    assert server.load_agent(agent_id=charles_agent.id, actor=default_user).agent_state.name == "charles_agent"
+    agent = server.load_agent(agent_id=charles_agent.id, actor=default_user)
+    assert cache.hits == hits + 1
+    assert cache.stats()["size"] >= 1
+
+    # agents get their own copy of the cached state
+    agent.agent_state.name = "mutated"
+    assert server.load_agent(agent_id=charles_agent.id, actor=default_user).agent_state.name == "charles_agent"
+
+    # agent manager writes
+    server.agent_manager.update_agent(charles_agent.id, UpdateAgent(name="renamed"), actor=default_user)
+    assert server.load_agent(agent_id=charles_agent.id, actor=default_user).agent_state.name == "renamed"
+    server.agent_manager.attach_tool(agent_id=charles_agent.id, tool_id=print_tool.id, actor=default_user)
+    assert print_tool.id in [t.id for t in server.load_agent(agent_id=charles_agent.id, actor=default_user).agent_state.tools]
+
+    # block manager writes reach every agent the block is attached to
+    block = server.agent_manager.get_block_with_label(agent_id=charles_agent.id, block_label="human", actor=default_user)
+    server.block_manager.update_block(block.id, BlockUpdate(value="Charles, updated"), actor=default_user)
+    memory = server.load_agent(agent_id=charles_agent.id, actor=default_user).agent_state.memory
+    assert memory.get_block("human").value == "Charles, updated"
+
+    # tool manager writes
+    server.tool_manager.update_tool_by_id(print_tool.id, ToolUpdate(description="updated description"), actor=default_user)
+    tools = server.load_agent(agent_id=charles_agent.id, actor=default_user).agent_state.tools
+    assert [t.description for t in tools if t.id == print_tool.id] == ["updated description"]
+
+    # writes from another process don't invalidate this cache, the version check catches them
+    server.load_agent(agent_id=charles_agent.id, actor=default_user)
+    stale = cache.stale
+    with server.block_manager.session_maker() as session:
+        session.execute(
+            sqlalchemy.update(BlockModel).where(BlockModel.id == block.id).values(value="Charles, elsewhere", updated_at=datetime.utcnow())
+        )
+        session.commit()
+    memory = server.load_agent(agent_id=charles_agent.id, actor=default_user).agent_state.memory
+    assert memory.get_block("human").value == "Charles, elsewhere"
+    assert cache.stale == stale + 1
+    with server.agent_manager.session_maker() as session:
+        session.execute(
+            sqlalchemy.update(AgentModel)
+            .where(AgentModel.id == charles_agent.id)
+            .values(name="renamed elsewhere", updated_at=datetime.utcnow())
+        )
+        session.commit()
+    assert server.load_agent(agent_id=charles_agent.id, actor=default_user).agent_state.name == "renamed elsewhere"
+
+    server.agent_manager.delete_agent(charles_agent.id, actor=default_user)
+    with pytest.raises(NoResultFound):
+        server.load_agent(agent_id=charles_agent.id, actor=default_user)
+
+
 # ======================================================================================================================
 # AgentManager Tests - Tools Relationship
 # ======================================================================================================================
@@ -1073,6 +1146,298 @@ def test_reset_messages_idempotency(server: SyncServer, sarah_agent, default_use
     assert server.message_manager.size(agent_id=sarah_agent.id, actor=default_user) == 1
 
 
+def test_agent_load_profiles(server: SyncServer, sarah_agent, default_user):
+    """Agent reads only fetch the relationships of their load profile, messages are never loaded implicitly"""
+    server.agent_manager.append_to_in_context_messages(
+        [PydanticMessage(agent_id=sarah_agent.id, organization_id=default_user.organization_id, role="user", text="hello")],
+        agent_id=sarah_agent.id,
+        actor=default_user,
+    )
+
+    with server.agent_manager.session_maker() as session:
+        agent = AgentModel.read(
+            db_session=session, identifier=sarah_agent.id, actor=default_user, load_options=AgentModel.load_options("state+tools")
+        )
+        unloaded = sqlalchemy.inspect(agent).unloaded
+        assert {"messages", "agent_passages", "source_passages"} <= unloaded
+        assert not {"tools", "core_memory", "sources", "tags", "identities"} & unloaded
+        with pytest.raises(InvalidRequestError):
+            agent.messages
+
+    with server.agent_manager.session_maker() as session:
+        agent = AgentModel.read(
+            db_session=session, identifier=sarah_agent.id, actor=default_user, load_options=AgentModel.load_options("full")
+        )
+        assert len(agent.messages) == server.message_manager.size(agent_id=sarah_agent.id, actor=default_user)
+
+    # messages are deleted with the agent even though they are never loaded
+    server.agent_manager.delete_agent(agent_id=sarah_agent.id, actor=default_user)
+    assert server.message_manager.size(agent_id=sarah_agent.id, actor=default_user) == 0
+
+
+def test_get_in_context_messages_follows_message_ids_order(server: SyncServer, sarah_agent, default_user):
+    """In-context messages come back in message_ids order (not creation order), with the system message first"""
+    messages = server.message_manager.create_many_messages(
+        [
+            PydanticMessage(agent_id=sarah_agent.id, organization_id=default_user.organization_id, role="user", text=f"message {i}")
+            for i in range(3)
+        ],
+        actor=default_user,
+    )
+    system_message_id = sarah_agent.message_ids[0]
+    message_ids = [system_message_id] + [m.id for m in reversed(messages)]
+    server.agent_manager.update_agent(sarah_agent.id, UpdateAgent(message_ids=message_ids), actor=default_user)
+
+    in_context_messages = server.agent_manager.get_in_context_messages(agent_id=sarah_agent.id, actor=default_user)
+    assert [m.id for m in in_context_messages] == message_ids
+    assert [m.text for m in in_context_messages[1:]] == ["message 2", "message 1", "message 0"]
+    assert server.agent_manager.get_system_message(agent_id=sarah_agent.id, actor=default_user).id == system_message_id
+
+    with pytest.raises(NoResultFound):
+        server.agent_manager.get_in_context_messages(agent_id="agent-does-not-exist", actor=default_user)
+
+
+def test_in_context_window_operations(server: SyncServer, sarah_agent, default_user):
+    """Append, prepend, trim and system swap only touch the window rows they add or remove"""
+
+    def new_messages(n, label):
+        return [
+            PydanticMessage(agent_id=sarah_agent.id, organization_id=default_user.organization_id, role="user", text=f"{label} {i}")
+            for i in range(n)
+        ]
+
+    def window_rows():
+        with server.agent_manager.session_maker() as session:
+            rows = session.query(MessagesAgents).filter(MessagesAgents.agent_id == sarah_agent.id).order_by(MessagesAgents.position)
+            return {row.message_id: row.position for row in rows}
+
+    expected = list(sarah_agent.message_ids)
+    before = window_rows()
+    agent_state = server.agent_manager.append_to_in_context_messages(
+        new_messages(2, "appended"), agent_id=sarah_agent.id, actor=default_user
+    )
+    assert agent_state.message_ids[: len(expected)] == expected
+    expected = agent_state.message_ids
+    assert len(expected) == len(before) + 2
+    assert {message_id: window_rows()[message_id] for message_id in before} == before
+
+    # the window has no gap after the system message, prepending moves the rest of it
+    agent_state = server.agent_manager.prepend_to_in_context_messages(
+        new_messages(3, "prepended"), agent_id=sarah_agent.id, actor=default_user
+    )
+    prepended = agent_state.message_ids[1:4]
+    assert agent_state.message_ids == expected[:1] + prepended + expected[1:]
+    expected = agent_state.message_ids
+    in_context = server.agent_manager.get_in_context_messages(agent_id=sarah_agent.id, actor=default_user)
+    assert [m.text for m in in_context[1:4]] == ["prepended 0", "prepended 1", "prepended 2"]
+
+    agent_state = server.agent_manager.trim_older_in_context_messages(num=3, agent_id=sarah_agent.id, actor=default_user)
+    assert agent_state.message_ids == expected[:1] + expected[3:]
+    expected = agent_state.message_ids
+
+    system_message = server.message_manager.create_message(
+        PydanticMessage(agent_id=sarah_agent.id, organization_id=default_user.organization_id, role="system", text="new system"),
+        actor=default_user,
+    )
+    agent_state = server.agent_manager.swap_system_message(system_message.id, agent_id=sarah_agent.id, actor=default_user)
+    assert agent_state.message_ids == [system_message.id] + expected[1:]
+    assert server.agent_manager.get_system_message(agent_id=sarah_agent.id, actor=default_user).text == "new system"
+
+    agent_state = server.agent_manager.trim_all_in_context_messages_except_system(agent_id=sarah_agent.id, actor=default_user)
+    assert agent_state.message_ids == [system_message.id]
+    assert server.agent_manager.get_agent_by_id(agent_id=sarah_agent.id, actor=default_user).message_ids == [system_message.id]
+
+
+def test_in_context_window_appends_are_not_lost(server: SyncServer, sarah_agent, default_user):
+    """Appends from two copies of an agent state both land in the window, nothing is written from the stale copies"""
+    stale_state = server.agent_manager.get_agent_by_id(agent_id=sarah_agent.id, actor=default_user)
+    first = PydanticMessage(agent_id=sarah_agent.id, organization_id=default_user.organization_id, role="user", text="first")
+    second = PydanticMessage(agent_id=sarah_agent.id, organization_id=default_user.organization_id, role="user", text="second")
+    server.agent_manager.append_to_in_context_messages([first], agent_id=stale_state.id, actor=default_user)
+    agent_state = server.agent_manager.append_to_in_context_messages([second], agent_id=stale_state.id, actor=default_user)
+    assert agent_state.message_ids == stale_state.message_ids + [first.id, second.id]
+
+    def message(text):
+        return PydanticMessage(agent_id=sarah_agent.id, organization_id=default_user.organization_id, role="user", text=text)
+
+    # given the caller's state, only the window is read back, with the appends of others
+    third = message("third")
+    lean_state = server.agent_manager.append_to_in_context_messages(
+        [third], agent_id=stale_state.id, actor=default_user, agent_state=stale_state
+    )
+    assert lean_state.message_ids == stale_state.message_ids + [first.id, second.id, third.id]
+    assert lean_state.memory == stale_state.memory and stale_state.message_ids == agent_state.message_ids[:-2]
+
+    # concurrent appends each get positions of their own instead of colliding on the same max(position)
+    def append(i):
+        return server.agent_manager.append_to_in_context_messages([message(f"concurrent {i}")], agent_id=sarah_agent.id, actor=default_user)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(append, range(8)))
+    window = server.agent_manager.get_agent_by_id(agent_id=sarah_agent.id, actor=default_user).message_ids
+    assert window[: len(lean_state.message_ids)] == lean_state.message_ids
+    assert len(window) == len(lean_state.message_ids) + 8
+
+
+def test_swap_in_summary(server: SyncServer, sarah_agent, default_user):
+    """A background summary replaces the messages it summarized and keeps the ones added since, a stale one is dropped"""
+    messages = [
+        PydanticMessage(agent_id=sarah_agent.id, organization_id=default_user.organization_id, role="user", text=f"message {i}")
+        for i in range(4)
+    ]
+    agent_state = server.agent_manager.append_to_in_context_messages(messages, agent_id=sarah_agent.id, actor=default_user)
+    window = agent_state.message_ids
+
+    def summary(text):
+        return PydanticMessage(agent_id=sarah_agent.id, organization_id=default_user.organization_id, role="user", text=text)
+
+    summarized = window[1:-2]
+    agent_state = server.agent_manager.swap_in_summary(summary("summary"), summarized, agent_id=sarah_agent.id, actor=default_user)
+    assert len(agent_state.message_ids) == 4
+    assert agent_state.message_ids[0] == window[0] and agent_state.message_ids[2:] == window[-2:]
+    in_context = server.agent_manager.get_in_context_messages(agent_id=sarah_agent.id, actor=default_user)
+    assert in_context[1].text == "summary"
+
+    # the window doesn't start with these messages anymore
+    stale = summary("stale summary")
+    assert server.agent_manager.swap_in_summary(stale, summarized, agent_id=sarah_agent.id, actor=default_user) is None
+    assert server.agent_manager.get_agent_by_id(agent_id=sarah_agent.id, actor=default_user).message_ids == agent_state.message_ids
+    assert server.message_manager.get_message_by_id(stale.id, actor=default_user) is None
+
+
+def test_swap_in_pending_summary(server: SyncServer, sarah_agent, default_user):
+    """A saved summary is swapped in by any agent manager once, a newer one replaces it, a stale one is dropped"""
+    messages = [
+        PydanticMessage(agent_id=sarah_agent.id, organization_id=default_user.organization_id, role="user", text=f"message {i}")
+        for i in range(4)
+    ]
+    window = server.agent_manager.append_to_in_context_messages(messages, agent_id=sarah_agent.id, actor=default_user).message_ids
+
+    def summary(text):
+        return PydanticMessage(agent_id=sarah_agent.id, organization_id=default_user.organization_id, role="user", text=text)
+
+    assert server.agent_manager.swap_in_pending_summary(agent_id=sarah_agent.id, actor=default_user) is None
+    replaced = summary("replaced summary")
+    server.agent_manager.save_pending_summary(replaced, window[1:-3], agent_id=sarah_agent.id, actor=default_user)
+    server.agent_manager.save_pending_summary(summary("summary"), window[1:-2], agent_id=sarah_agent.id, actor=default_user)
+    assert server.message_manager.get_message_by_id(replaced.id, actor=default_user) is None
+    # the summary stays out of the window until it is swapped in
+    assert server.agent_manager.get_agent_by_id(agent_id=sarah_agent.id, actor=default_user).message_ids == window
+
+    # e.g. a run worker in another process
+    agent_state = AgentManager().swap_in_pending_summary(agent_id=sarah_agent.id, actor=default_user)
+    assert agent_state.message_ids[0] == window[0] and agent_state.message_ids[2:] == window[-2:]
+    in_context = server.agent_manager.get_in_context_messages(agent_id=sarah_agent.id, actor=default_user)
+    assert in_context[1].text == "summary"
+    assert not server.agent_manager.has_pending_summary(agent_id=sarah_agent.id, actor=default_user)
+
+    # the window doesn't start with these messages anymore
+    stale = summary("stale summary")
+    server.agent_manager.save_pending_summary(stale, window[1:-2], agent_id=sarah_agent.id, actor=default_user)
+    assert server.agent_manager.swap_in_pending_summary(agent_id=sarah_agent.id, actor=default_user) is None
+    assert server.agent_manager.get_agent_by_id(agent_id=sarah_agent.id, actor=default_user).message_ids == agent_state.message_ids
+    assert server.message_manager.get_message_by_id(stale.id, actor=default_user) is None
+    assert not server.agent_manager.has_pending_summary(agent_id=sarah_agent.id, actor=default_user)
+
+
+def test_background_summarizer_one_summary_per_agent():
+    """An agent has at most one summary in progress, it is forgotten once done or failed"""
+    summarizer = BackgroundSummarizer(max_workers=1)
+    release = threading.Event()
+
+    def summarize():
+        release.wait(5)
+
+    assert summarizer.schedule("agent-1", summarize)
+    assert not summarizer.schedule("agent-1", summarize)
+    assert not summarizer.wait("agent-1", timeout=0)
+    assert summarizer.in_progress("agent-1")
+
+    release.set()
+    assert summarizer.wait("agent-1", timeout=5)
+    assert not summarizer.in_progress("agent-1")
+    assert not summarizer.wait("agent-1")
+
+    def fail():
+        raise ValueError("no summary")
+
+    assert summarizer.schedule("agent-1", fail)
+    assert not summarizer.wait("agent-1", timeout=5)
+    assert not summarizer.in_progress("agent-1")
+
+
+def test_migrate_sqlite_in_context_messages():
+    """Legacy JSON message_ids lists are moved into messages_agents once"""
+    engine = sqlalchemy.create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE agents (id VARCHAR PRIMARY KEY, message_ids JSON)")
+        MessagesAgents.__table__.create(connection)
+        connection.exec_driver_sql("""INSERT INTO agents VALUES ('agent-1', '["message-a", "message-b"]'), ('agent-2', NULL)""")
+
+        assert migrate_sqlite_in_context_messages(connection) == 1
+        rows = connection.exec_driver_sql("SELECT agent_id, position, message_id FROM messages_agents ORDER BY position").fetchall()
+        assert [tuple(row) for row in rows] == [("agent-1", 0, "message-a"), ("agent-1", 1, "message-b")]
+        assert migrate_sqlite_in_context_messages(connection) == 0
+
+
+def test_memory_consolidation_queue_collapses_requests(default_user):
+    """Repeat requests of a waiting agent take one slot, requests beyond the bound are dropped"""
+    service = MemoryConsolidationService(max_pending=2)
+    assert service.submit("agent-1", actor=default_user)
+    assert service.submit("agent-2", actor=default_user)
+    assert service.submit("agent-1", actor=default_user, recent_convo_limit=10)
+    assert not service.submit("agent-3", actor=default_user)
+    assert service.pending() == 2
+
+    # agent-1 keeps its place but runs the latest request
+    request = service._claim(timeout=0)
+    assert (request.agent_id, request.recent_convo_limit) == ("agent-1", 10)
+    # an agent being consolidated is not handed to another worker
+    assert service.submit("agent-1", actor=default_user)
+    assert service._claim(timeout=0).agent_id == "agent-2"
+    assert service._claim(timeout=0) is None
+
+
+def test_memory_consolidation_reuses_offline_agent(server: SyncServer, default_user):
+    """A chat only agent keeps one offline memory agent, refreshed on every consolidation and deleted with it"""
+    chat_agent = server.agent_manager.create_agent(
+        CreateAgent(
+            name="chat_agent",
+            agent_type=AgentType.chat_only_agent,
+            memory_blocks=[CreateBlock(label="chat_agent_human", value="Human"), CreateBlock(label="chat_agent_persona", value="Persona")],
+            llm_config=LLMConfig.default_config("gpt-4"),
+            embedding_config=EmbeddingConfig.default_config(provider="openai"),
+            include_base_tools=False,
+        ),
+        actor=default_user,
+    )
+    service = MemoryConsolidationService()
+
+    offline_agent = service.prepare_offline_memory_agent(chat_agent, "first conversation", 2000, actor=default_user)
+    assert offline_agent.agent_type == AgentType.offline_memory_agent
+    assert offline_agent.memory.get_block("chat_agent_human").id == chat_agent.memory.get_block("chat_agent_human").id
+    assert offline_agent.memory.get_block("conversation_block").value == "first conversation"
+
+    human_block = chat_agent.memory.get_block("chat_agent_human")
+    server.block_manager.update_block(human_block.id, BlockUpdate(value="Human, rethought"), actor=default_user)
+    chat_agent = server.agent_manager.get_agent_by_id(chat_agent.id, actor=default_user)
+    reused = service.prepare_offline_memory_agent(chat_agent, "second conversation", 2000, actor=default_user)
+    assert reused.id == offline_agent.id
+    assert reused.memory.get_block("conversation_block").value == "second conversation"
+    assert reused.memory.get_block("chat_agent_human_new").value == "Human, rethought"
+    assert len(server.agent_manager.get_in_context_messages(agent_id=reused.id, actor=default_user)) == len(offline_agent.message_ids)
+
+    # the offline memory agent is internal: hidden from agent and tag listings unless asked for
+    assert [agent.id for agent in server.agent_manager.list_agents(actor=default_user)] == [chat_agent.id]
+    assert offline_memory_agent_tag(chat_agent.id) not in server.agent_manager.list_tags(actor=default_user)
+    listed = server.agent_manager.list_agents(actor=default_user, tags=[offline_memory_agent_tag(chat_agent.id)], include_hidden=True)
+    assert [agent.id for agent in listed] == [offline_agent.id]
+
+    server.agent_manager.delete_agent(chat_agent.id, actor=default_user)
+    with pytest.raises(NoResultFound):
+        server.agent_manager.get_agent_by_id(offline_agent.id, actor=default_user)
+
+
 # ======================================================================================================================
 # AgentManager Tests - Blocks Relationship
 # ======================================================================================================================
@@ -1351,6 +1716,229 @@ def test_agent_list_passages_vector_search(server, default_user, sarah_agent, de
     assert agent_only_results[1].text == "blue shoes"
 
 
+def test_agent_list_passages_vector_index(server, default_user, sarah_agent, default_source, monkeypatch, tmp_path):
+    """Vector search through the SQLite ANN index should rank passages the same way as the brute-force path"""
+    if not USING_SQLITE:
+        pytest.skip("The ANN vector index is only used on SQLite")
+
+    import letta.services.agent_manager as agent_manager_module
+    import letta.services.vector_index as vector_index_module
+    from letta.settings import settings
+
+    dim = DEFAULT_EMBEDDING_CONFIG.embedding_dim
+    embeddings = {
+        "I like red": np.eye(dim)[0],
+        "random text": np.eye(dim)[1],
+        "blue shoes": 0.6 * np.eye(dim)[0] + 0.8 * np.eye(dim)[2],
+        "What's my favorite color?": np.eye(dim)[0],
+    }
+
+    class FakeEmbeddingModel:
+        def get_text_embedding(self, text):
+            return embeddings[text].tolist()
+
+    monkeypatch.setattr(agent_manager_module, "embedding_model", lambda config: FakeEmbeddingModel())
+    server.agent_manager.attach_source(agent_id=sarah_agent.id, source_id=default_source.id, actor=default_user)
+
+    def search(**kwargs):
+        results = server.agent_manager.list_passages(
+            actor=default_user,
+            agent_id=sarah_agent.id,
+            query_text="What's my favorite color?",
+            embedding_config=DEFAULT_EMBEDDING_CONFIG,
+            embed_query=True,
+            **kwargs,
+        )
+        return [p.text for p in results]
+
+    monkeypatch.setattr(settings, "sqlite_vector_index", "flat")
+    monkeypatch.setattr(vector_index_module, "_registry", vector_index_module.VectorIndexRegistry(str(tmp_path), "flat"))
+
+    created = []
+    for i, text in enumerate(["I like red", "random text", "blue shoes"]):
+        owner = {"agent_id": sarah_agent.id} if i % 2 == 0 else {"source_id": default_source.id}
+        passage = PydanticPassage(
+            text=text,
+            organization_id=default_user.organization_id,
+            embedding_config=DEFAULT_EMBEDDING_CONFIG,
+            embedding=embeddings[text].tolist(),
+            **owner,
+        )
+        created.append(server.passage_manager.create_passage(passage, default_user))
+
+    indexed_results = search()
+    assert indexed_results == ["I like red", "blue shoes", "random text"]
+    assert search(agent_only=True) == ["I like red", "blue shoes"]
+    assert search(limit=1) == ["I like red"]
+
+    # exact paths (batched NumPy ranking and the per-row UDF) agree with the index
+    monkeypatch.setattr(settings, "sqlite_vector_index", None)
+    assert search() == indexed_results
+    assert search(limit=2) == indexed_results[:2]
+    monkeypatch.setattr(settings, "sqlite_vector_search", "udf")
+    assert search() == indexed_results
+
+    # deleted passages are dropped from the index
+    monkeypatch.setattr(settings, "sqlite_vector_index", "flat")
+    server.passage_manager.delete_passage_by_id(passage_id=created[0].id, actor=default_user)
+    assert search() == ["blue shoes", "random text"]
+
+    # writes that bypass this process's index (other processes, bulk deletes) are picked up before the next search
+    with server.passage_manager.session_maker() as session:
+        session.add(
+            AgentPassage(
+                id="passage-0ffe12ab",
+                text="I like red",
+                agent_id=sarah_agent.id,
+                organization_id=default_user.organization_id,
+                embedding_config=DEFAULT_EMBEDDING_CONFIG,
+                embedding=embeddings["I like red"].tolist(),
+                metadata_={},
+            )
+        )
+        session.commit()
+    assert search() == ["I like red", "blue shoes", "random text"]
+    with server.passage_manager.session_maker() as session:
+        session.execute(sqlalchemy.delete(AgentPassage).where(AgentPassage.agent_id == sarah_agent.id))
+        session.commit()
+    assert search() == ["random text"]
+
+    # filters applied after the ranking don't go through the index, the page is still filled
+    server.passage_manager.create_passage(
+        PydanticPassage(
+            text="I like red",
+            agent_id=sarah_agent.id,
+            organization_id=default_user.organization_id,
+            embedding_config=DEFAULT_EMBEDDING_CONFIG,
+            embedding=embeddings["I like red"].tolist(),
+        ),
+        default_user,
+    )
+    assert search(start_date=created[1].created_at, limit=1) == ["I like red"]
+
+
+def test_postgres_embedding_indexes(server, default_user, sarah_agent, monkeypatch):
+    """Each embedding dimension gets its HNSW index on Postgres as far as the installed pgvector can index it, and is searched either way"""
+    if USING_SQLITE:
+        pytest.skip("Embeddings are indexed per dimension on Postgres only")
+
+    import letta.services.agent_manager as agent_manager_module
+    from letta.orm.pgvector_functions import HNSW_MAX_VECTOR_DIM, embedding_index_name, embedding_index_type, engine_supports_halfvec
+    from letta.server.db import engine
+
+    # wider than a vector index can cover, only a halfvec index (pgvector >= 0.7.0) can
+    assert embedding_index_type(HNSW_MAX_VECTOR_DIM + 1, halfvec=False) is None
+    halfvec = engine_supports_halfvec(engine)
+
+    for dim in (8, 3072):
+        embedding_config = DEFAULT_EMBEDDING_CONFIG.model_copy(update={"embedding_dim": dim})
+        embeddings = {"I like red": np.eye(dim)[0], "random text": np.eye(dim)[1], "What's my favorite color?": np.eye(dim)[0]}
+
+        class FakeEmbeddingModel:
+            def get_text_embedding(self, text):
+                return embeddings[text].tolist()
+
+        monkeypatch.setattr(agent_manager_module, "embedding_model", lambda config: FakeEmbeddingModel())
+        server.passage_manager.create_many_passages(
+            [
+                PydanticPassage(
+                    text=text,
+                    agent_id=sarah_agent.id,
+                    organization_id=default_user.organization_id,
+                    embedding_config=embedding_config,
+                    embedding=embeddings[text].tolist(),
+                )
+                for text in ("random text", "I like red")
+            ],
+            actor=default_user,
+        )
+
+        with engine.connect() as connection:
+            indexed = connection.execute(
+                sqlalchemy.text("SELECT 1 FROM pg_indexes WHERE indexname = :name"), {"name": embedding_index_name("agent_passages", dim)}
+            ).first()
+        assert bool(indexed) == bool(embedding_index_type(dim, halfvec=halfvec))
+
+        results = server.agent_manager.list_passages(
+            actor=default_user,
+            agent_id=sarah_agent.id,
+            query_text="What's my favorite color?",
+            embedding_config=embedding_config,
+            embed_query=True,
+            agent_only=True,
+            limit=1,
+        )
+        assert [p.text for p in results] == ["I like red"]
+
+
+def test_agent_search_passages_hybrid(server, default_user, sarah_agent, default_source, monkeypatch):
+    """Archival search fuses full text and vector rankings, and skips embedding the query when the full text hits suffice"""
+    import letta.services.agent_manager as agent_manager_module
+    from letta.settings import settings
+
+    dim = DEFAULT_EMBEDDING_CONFIG.embedding_dim
+    embeddings = {
+        "I like red": np.eye(dim)[0],
+        "random text": np.eye(dim)[1],
+        "blue shoes": 0.6 * np.eye(dim)[0] + 0.8 * np.eye(dim)[2],
+        "order ORD-7731 shipped to Berlin": np.eye(dim)[3],
+        "What's my favorite color?": np.eye(dim)[0],
+        "Berlin preferences": np.eye(dim)[0],
+        "ORD-7731": np.eye(dim)[3],
+    }
+    embedded = []
+
+    class FakeEmbeddingModel:
+        def get_text_embedding(self, text):
+            embedded.append(text)
+            return embeddings[text].tolist()
+
+    monkeypatch.setattr(agent_manager_module, "embedding_model", lambda config: FakeEmbeddingModel())
+    monkeypatch.setattr(settings, "archival_search_mode", "hybrid")
+    server.agent_manager.attach_source(agent_id=sarah_agent.id, source_id=default_source.id, actor=default_user)
+    for text in ["I like red", "random text", "order ORD-7731 shipped to Berlin", "blue shoes"]:
+        owner = {"source_id": default_source.id} if text == "blue shoes" else {"agent_id": sarah_agent.id}
+        server.passage_manager.create_passage(
+            PydanticPassage(
+                text=text,
+                organization_id=default_user.organization_id,
+                embedding_config=DEFAULT_EMBEDDING_CONFIG,
+                embedding=embeddings[text].tolist(),
+                **owner,
+            ),
+            default_user,
+        )
+
+    def search(query, limit):
+        results = server.agent_manager.search_passages(
+            actor=default_user, agent_id=sarah_agent.id, query_text=query, embedding_config=DEFAULT_EMBEDDING_CONFIG, limit=limit
+        )
+        return [p.text for p in results]
+
+    # an exact identifier hit answers the search without embedding the query
+    assert is_identifier_query("ORD-7731") and is_identifier_query("snake_case name") and is_identifier_query("invoice 2024")
+    assert not is_identifier_query("What's my favorite color?") and not is_identifier_query("random - text")
+    assert search("ORD-7731", limit=1) == ["order ORD-7731 shipped to Berlin"]
+    assert embedded == []
+
+    # no full text hits, vector ranking only
+    assert search("What's my favorite color?", limit=2) == ["I like red", "blue shoes"]
+    assert embedded == ["What's my favorite color?"]
+
+    # the keyword hit the embedding ranks last is fused to the top
+    assert search("Berlin preferences", limit=2) == ["order ORD-7731 shipped to Berlin", "I like red"]
+
+    # plain words are always fused with the vector ranking, even when passages contain all of them
+    embedded.clear()
+    assert search("random text", limit=1) == ["random text"]
+    assert embedded == ["random text"]
+
+    monkeypatch.setattr(settings, "archival_search_mode", "vector")
+    embedded.clear()
+    assert search("ORD-7731", limit=1) == ["order ORD-7731 shipped to Berlin"]
+    assert embedded == ["ORD-7731"]
+
+
 def test_list_source_passages_only(server: SyncServer, default_user, default_source, agent_passages_setup):
     """Test listing passages from a source without specifying an agent."""
 
@@ -1448,6 +2036,138 @@ def test_passage_create_source(server: SyncServer, source_passage_fixture, defau
     assert retrieved.text == source_passage_fixture.text
 
 
+def test_passage_create_many(server: SyncServer, sarah_agent, default_source, default_user):
+    """Agent and source passages are inserted together in one batch, and come back in input order"""
+    passages = [
+        PydanticPassage(
+            text=f"Batch passage {i}",
+            organization_id=default_user.organization_id,
+            embedding=[0.1 * i] * 1024,
+            embedding_config=DEFAULT_EMBEDDING_CONFIG,
+            **({"agent_id": sarah_agent.id} if i % 2 == 0 else {"source_id": default_source.id}),
+        )
+        for i in range(1, 7)
+    ]
+    created = server.passage_manager.create_many_passages(passages, actor=default_user)
+
+    assert [p.text for p in created] == [p.text for p in passages]
+    assert all(p.created_by_id == default_user.id for p in created)
+    for passage in created:
+        retrieved = server.passage_manager.get_passage_by_id(passage.id, actor=default_user)
+        assert retrieved.text == passage.text
+        assert retrieved.agent_id == passage.agent_id
+        assert retrieved.source_id == passage.source_id
+    assert server.passage_manager.create_many_passages([], actor=default_user) == []
+
+
+def test_passage_create_records_embedding_dim(server: SyncServer, sarah_agent, default_source, default_user):
+    """The dimension of the embedding config is stored with each passage, archival search routes on it on Postgres"""
+    passages = [
+        PydanticPassage(
+            text=f"Dimension passage {i}",
+            organization_id=default_user.organization_id,
+            embedding=[0.1] * DEFAULT_EMBEDDING_CONFIG.embedding_dim,
+            embedding_config=DEFAULT_EMBEDDING_CONFIG,
+            **({"agent_id": sarah_agent.id} if i % 2 == 0 else {"source_id": default_source.id}),
+        )
+        for i in range(3)
+    ]
+    created = server.passage_manager.create_many_passages(passages[:2], actor=default_user)
+    created.append(server.passage_manager.create_passage(passages[2], actor=default_user))
+
+    with server.passage_manager.session_maker() as session:
+        for passage in created:
+            passage_cls = AgentPassage if passage.agent_id else SourcePassage
+            assert session.get(passage_cls, passage.id).embedding_dim == DEFAULT_EMBEDDING_CONFIG.embedding_dim
+
+
+def test_insert_passage_embeds_in_batches(server: SyncServer, sarah_agent, default_user, monkeypatch):
+    """Archival inserts embed all chunks through the batch API, in bounded batches, and keep chunk order"""
+    from letta.settings import settings
+
+    class FakeEmbeddingModel:
+        def __init__(self):
+            self.batches = []
+
+        def get_text_embeddings(self, texts):
+            self.batches.append(list(texts))
+            return [[float(text.split()[1]) + 1.0] * 1536 for text in texts]
+
+    fake_model = FakeEmbeddingModel()
+    monkeypatch.setattr("letta.services.passage_manager.embedding_model", lambda config: fake_model)
+    monkeypatch.setattr("letta.services.passage_manager.parse_and_chunk_text", lambda text, chunk_size: text.split("|"))
+    monkeypatch.setattr(settings, "embedding_batch_size", 2)
+    monkeypatch.setattr(settings, "embedding_max_concurrency", 2)
+
+    text = "|".join(f"chunk {i}" for i in range(5))
+    passages = server.passage_manager.insert_passage(agent_state=sarah_agent, agent_id=sarah_agent.id, text=text, actor=default_user)
+
+    assert sorted(len(batch) for batch in fake_model.batches) == [1, 2, 2]
+    assert [p.text for p in passages] == [f"chunk {i}" for i in range(5)]
+    assert [p.embedding[0] for p in passages] == [float(i) + 1.0 for i in range(5)]
+
+
+def test_embedding_cache_memory_and_persistent_tiers(server: SyncServer):
+    """Repeated texts are embedded once, the persistent table serves a cold memory tier, and memory stays bounded"""
+    from letta.services.embedding_cache import CachedEmbeddingModel, EmbeddingCache
+
+    class FakeEmbeddingModel:
+        def __init__(self):
+            self.embedded = []
+
+        def get_text_embeddings(self, texts):
+            self.embedded.extend(texts)
+            return [[float(len(text))] * 1024 for text in texts]
+
+    fake_model = FakeEmbeddingModel()
+    cache = EmbeddingCache(max_bytes=10 * 1024 * 1024, persist=True)
+    model = CachedEmbeddingModel(fake_model, DEFAULT_EMBEDDING_CONFIG, cache)
+    texts = [f"cache test {time.time()} {i}" for i in range(3)]
+
+    assert model.get_text_embeddings(texts + texts[:1]) == [[float(len(text))] * 1024 for text in texts + texts[:1]]
+    assert model.get_text_embedding(texts[1]) == [float(len(texts[1]))] * 1024
+    assert fake_model.embedded == texts
+
+    cache.clear()
+    model.get_text_embeddings(texts)
+    assert fake_model.embedded == texts
+    stats = cache.stats()
+    assert (stats["hits"], stats["persistent_hits"], stats["misses"]) == (1, 3, 3)
+
+    # another model or endpoint never shares entries
+    other_config = DEFAULT_EMBEDDING_CONFIG.model_copy(update={"embedding_model": "other-model"})
+    CachedEmbeddingModel(fake_model, other_config, cache).get_text_embedding(texts[0])
+    assert fake_model.embedded == texts + texts[:1]
+
+    small_cache = EmbeddingCache(max_bytes=2 * (1024 * 4 + 250))
+    CachedEmbeddingModel(fake_model, DEFAULT_EMBEDDING_CONFIG, small_cache).get_text_embeddings(texts)
+    assert len(small_cache) == 2
+    assert small_cache.stats()["evictions"] == 1
+
+
+def test_embedding_errors_and_retries():
+    """OpenAI embedding requests are retried by the SDK, only errors caused by the texts are treated as input errors"""
+    import httpx
+    import openai
+
+    from letta.embeddings import OpenAIEmbeddings, is_input_error
+    from letta.settings import settings
+
+    model = OpenAIEmbeddings(api_key="sk-test", base_url="https://api.openai.com/v1", model="text-embedding-ada-002")
+    assert model.client.max_retries == settings.embedding_max_retries
+
+    request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+
+    def status_error(status_code):
+        return openai.APIStatusError("error", response=httpx.Response(status_code, request=request), body=None)
+
+    assert is_input_error(status_error(400))
+    assert is_input_error(httpx.HTTPStatusError("error", request=request, response=httpx.Response(413, request=request)))
+    assert not is_input_error(status_error(429))
+    assert not is_input_error(status_error(503))
+    assert not is_input_error(openai.APIConnectionError(request=request))
+
+
 def test_passage_create_invalid(server: SyncServer, agent_passage_fixture, default_user):
     """Test creating an agent passage."""
     assert agent_passage_fixture is not None
@@ -1803,6 +2523,42 @@ def test_message_update(server: SyncServer, hello_world_message_fixture, default
     assert retrieved.last_updated_by_id == other_user.id
 
 
+def test_message_token_count_stored_on_create(server: SyncServer, sarah_agent, default_user, monkeypatch):
+    """Messages are tokenized once when created, later counts read the stored value, and edits recount"""
+    from letta.llm_api.helpers import count_prompt_tokens, get_token_counts_for_messages
+
+    tokenized = []
+
+    def fake_num_tokens_per_message(messages, model="gpt-4"):
+        tokenized.extend(message["content"] for message in messages)
+        return [len(message["content"].split()) for message in messages]
+
+    monkeypatch.setattr("letta.llm_api.helpers.num_tokens_per_message", fake_num_tokens_per_message)
+
+    created = server.message_manager.create_many_messages(
+        [
+            PydanticMessage(agent_id=sarah_agent.id, role="user", text="one two three"),
+            PydanticMessage(agent_id=sarah_agent.id, role="assistant", text="four five"),
+        ],
+        actor=default_user,
+    )
+    assert [m.token_count for m in created] == [3, 2]
+    assert len(tokenized) == 2
+
+    retrieved = server.message_manager.get_messages_by_ids([m.id for m in created], actor=default_user)
+    assert get_token_counts_for_messages(retrieved) == [3, 2]
+    assert count_prompt_tokens(retrieved, model="gpt-4o") == 3 + 2 + 3
+    assert len(tokenized) == 2
+
+    # a model with a different message framing is always counted from scratch
+    assert get_token_counts_for_messages(retrieved, model="gpt-3.5-turbo-0301") == [3, 2]
+    assert len(tokenized) == 4
+
+    updated = server.message_manager.update_message_by_id(created[0].id, MessageUpdate(content="just one"), actor=default_user)
+    assert updated.token_count == 2
+    assert server.message_manager.get_message_by_id(created[0].id, actor=default_user).token_count == 2
+
+
 def test_message_delete(server: SyncServer, hello_world_message_fixture, default_user):
     """Test deleting a message"""
     server.message_manager.delete_message_by_id(hello_world_message_fixture.id, actor=default_user)
@@ -1862,6 +2618,34 @@ def test_get_messages_by_ids(server: SyncServer, hello_world_message_fixture, de
     assert sorted(message_ids) == sorted([r.id for r in results])
 
 
+def test_message_lean_read_path_matches_orm(server: SyncServer, hello_world_message_fixture, default_user, sarah_agent):
+    """Messages built from selected columns are the same as the ones converted from ORM objects"""
+    tool_message = server.message_manager.create_message(
+        PydanticMessage(
+            role=MessageRole.assistant,
+            text="Calling a tool",
+            organization_id=default_user.organization_id,
+            agent_id=sarah_agent.id,
+            tool_calls=[OpenAIToolCall(id="call_1", type="function", function=OpenAIFunction(name="test_tool", arguments="{}"))],
+        ),
+        actor=default_user,
+    )
+    empty_message = server.message_manager.create_message(
+        PydanticMessage(role=MessageRole.tool, text="", organization_id=default_user.organization_id, agent_id=sarah_agent.id),
+        actor=default_user,
+    )
+    message_ids = [hello_world_message_fixture.id, tool_message.id, empty_message.id]
+
+    with server.message_manager.session_maker() as session:
+        expected = {message.id: message.to_pydantic() for message in session.query(MessageModel).filter(MessageModel.id.in_(message_ids))}
+    listed = server.message_manager.list_messages_for_agent(agent_id=sarah_agent.id, actor=default_user, limit=1000)
+    by_ids = server.message_manager.get_messages_by_ids(message_ids=message_ids, actor=default_user)
+    for message in by_ids + [message for message in listed if message.id in expected]:
+        assert message.model_dump() == expected[message.id].model_dump()
+        assert message.model_dump_json() == expected[message.id].model_dump_json()
+    assert [message.id for message in by_ids] == message_ids
+
+
 def test_message_listing_basic(server: SyncServer, hello_world_message_fixture, default_user, sarah_agent):
     """Test basic message listing with limit"""
     create_test_messages(server, hello_world_message_fixture, default_user)
@@ -1934,6 +2718,73 @@ def test_message_listing_text_search(server: SyncServer, hello_world_message_fix
     assert len(search_results) == 0
 
 
+def test_message_full_text_search(server: SyncServer, hello_world_message_fixture, default_user, sarah_agent):
+    """Test ranked full text search over an agent's messages, including index maintenance on update and delete"""
+    texts = ["the banana bread recipe", "bananas are yellow, banana banana", "I went hiking yesterday", "apple pie"]
+    messages = server.message_manager.create_many_messages(
+        [PydanticMessage(organization_id=default_user.organization_id, agent_id=sarah_agent.id, role="user", text=t) for t in texts],
+        actor=default_user,
+    )
+
+    def search(query, **kwargs):
+        return [
+            m.text
+            for m in server.message_manager.search_messages_for_agent(
+                agent_id=sarah_agent.id, actor=default_user, query_text=query, **kwargs
+            )
+        ]
+
+    # prefix matches, best match first
+    assert search("banana") == [texts[1], texts[0]]
+    assert server.message_manager.search_messages_size(agent_id=sarah_agent.id, actor=default_user, query_text="banana") == 2
+    # any of the words matches, query syntax is ignored
+    assert set(search('hiking "pie*')) == {texts[2], texts[3]}
+    assert search("banana", limit=1, offset=1) == [texts[0]]
+    assert search("banana", role=MessageRole.assistant) == []
+    assert search("!!!") == []
+
+    server.message_manager.update_message_by_id(messages[3].id, MessageUpdate(content="cherry pie"), actor=default_user)
+    assert search("apple") == []
+    assert search("cherry") == ["cherry pie"]
+    server.message_manager.delete_message_by_id(messages[1].id, actor=default_user)
+    assert search("banana") == [texts[0]]
+
+
+def test_sqlite_full_text_index_is_keyed_on_ids():
+    """The FTS5 index follows the ids of the rows, VACUUM renumbering the rowids of a TEXT primary key table doesn't matter"""
+    engine = sqlalchemy.create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE notes (id VARCHAR PRIMARY KEY, text TEXT)")
+        connection.exec_driver_sql(
+            "INSERT INTO notes VALUES ('note-a', 'banana bread'), ('note-b', 'apple pie'), ('note-c', 'banana split')"
+        )
+        # an index of the older layout, keyed on the rowids of the table, is replaced
+        connection.exec_driver_sql("CREATE VIRTUAL TABLE notes_fts USING fts5(text, content='notes', content_rowid='rowid')")
+        assert create_sqlite_full_text_index(connection, "notes")
+        assert not create_sqlite_full_text_index(connection, "notes")
+
+    def search(term):
+        with engine.connect() as connection:
+            rows = connection.exec_driver_sql(
+                "SELECT notes_fts_keys.id FROM notes_fts JOIN notes_fts_keys ON notes_fts_keys.fts_rowid = notes_fts.rowid "
+                f"WHERE notes_fts MATCH '{term}' ORDER BY notes_fts_keys.id"
+            )
+            return [row[0] for row in rows]
+
+    assert search("banana") == ["note-a", "note-c"]
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DELETE FROM notes WHERE id = 'note-a'")
+    with engine.connect() as connection:
+        connection.execution_options(isolation_level="AUTOCOMMIT").exec_driver_sql("VACUUM")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("INSERT INTO notes VALUES ('note-d', 'cherry pie')")
+        connection.exec_driver_sql("UPDATE notes SET text = 'plum pie' WHERE id = 'note-b'")
+        connection.exec_driver_sql("DELETE FROM notes WHERE id = 'note-c'")
+    assert search("banana") == []
+    assert search("pie") == ["note-b", "note-d"]
+    assert search("apple") == []
+
+
 # ======================================================================================================================
 # Block Manager Tests
 # ======================================================================================================================
@@ -3210,6 +4061,108 @@ def test_job_usage_stats_add_nonexistent_job(server: SyncServer, default_user):
         )
 
 
+def test_run_queue_claim_heartbeat_and_reclaim(server: SyncServer, default_user):
+    """Test claiming queued runs, reporting progress and requeueing the runs of a silent worker."""
+    job_manager = server.job_manager
+    runs = [
+        job_manager.create_job(pydantic_job=PydanticRun(user_id=default_user.id, status=JobStatus.created), actor=default_user)
+        for _ in range(2)
+    ]
+
+    # each run is claimed by exactly one worker
+    first = job_manager.claim_next_run(worker_id="worker-a")
+    second = job_manager.claim_next_run(worker_id="worker-b")
+    assert {first.id, second.id} == {run.id for run in runs}
+    assert first.status == JobStatus.running
+    assert job_manager.claim_next_run(worker_id="worker-a") is None
+    assert job_manager.claim_run(run_id=first.id, worker_id="worker-b") is None
+
+    # only the owner can send heartbeats
+    assert job_manager.heartbeat_run(run_id=first.id, worker_id="worker-a", progress={"steps": 2})
+    assert not job_manager.heartbeat_run(run_id=first.id, worker_id="worker-b")
+    assert job_manager.get_job_by_id(job_id=first.id, actor=default_user).metadata["progress"] == {"steps": 2}
+
+    # a run whose worker went silent goes back in the queue, until it used up its attempts
+    time.sleep(0.05)
+    assert job_manager.heartbeat_run(run_id=second.id, worker_id="worker-b")
+    assert job_manager.reclaim_stale_runs(stale_after=0.04, max_attempts=2) == [first.id]
+    assert job_manager.get_job_by_id(job_id=second.id, actor=default_user).status == JobStatus.running
+    assert not job_manager.heartbeat_run(run_id=first.id, worker_id="worker-a")
+
+    assert job_manager.claim_next_run(worker_id="worker-c").id == first.id
+    time.sleep(0.05)
+    assert job_manager.heartbeat_run(run_id=second.id, worker_id="worker-b")
+    assert job_manager.reclaim_stale_runs(stale_after=0.04, max_attempts=2) == []
+    failed = job_manager.get_job_by_id(job_id=first.id, actor=default_user)
+    assert failed.status == JobStatus.failed
+    assert "abandoned" in failed.metadata["error"]
+
+    # only the owner of a running run can record its result
+    assert not job_manager.finish_run(run_id=second.id, worker_id="worker-a", status=JobStatus.completed, metadata={"result": "stale"})
+    assert job_manager.get_job_by_id(job_id=second.id, actor=default_user).status == JobStatus.running
+    assert job_manager.finish_run(run_id=second.id, worker_id="worker-b", status=JobStatus.completed, metadata={"result": "done"})
+    finished = job_manager.get_job_by_id(job_id=second.id, actor=default_user)
+    assert finished.status == JobStatus.completed
+    assert finished.completed_at is not None
+    assert finished.metadata == {"result": "done"}
+    assert not job_manager.finish_run(run_id=second.id, worker_id="worker-b", status=JobStatus.failed)
+
+
+def test_run_worker_processes_queued_runs(server: SyncServer, default_user):
+    """Test a worker draining an in-memory run queue."""
+    queue = InMemoryRunQueue(server.job_manager)
+    worker = RunWorker(server, queue, worker_id="worker-test")
+    run = server.job_manager.create_job(
+        pydantic_job=PydanticRun(user_id=default_user.id, status=JobStatus.created, metadata={"agent_id": "agent-missing"}),
+        actor=default_user,
+    )
+    queue.enqueue(run)
+
+    assert worker.run_once()
+    assert not worker.run_once()
+    # the run has no request to send, so it fails, but it keeps its metadata
+    run = server.job_manager.get_job_by_id(job_id=run.id, actor=default_user)
+    assert run.status == JobStatus.failed
+    assert run.completed_at is not None
+    assert run.metadata["agent_id"] == "agent-missing"
+    assert "no queued request" in run.metadata["error"]
+
+    # a worker whose run was reclaimed in the meantime discards its result
+    run = server.job_manager.create_job(pydantic_job=PydanticRun(user_id=default_user.id, status=JobStatus.created), actor=default_user)
+    queue.enqueue(run)
+    claimed = queue.claim("worker-test")
+    server.job_manager.reclaim_stale_runs(stale_after=0.0, max_attempts=3)
+    assert server.job_manager.claim_run(run_id=run.id, worker_id="worker-other") is not None
+    worker.process(claimed)
+    run = server.job_manager.get_job_by_id(job_id=run.id, actor=default_user)
+    assert run.status == JobStatus.running
+    assert "error" not in (run.metadata or {})
+
+
+def test_run_worker_runs_claimed_runs_concurrently(server: SyncServer, default_user):
+    """Test a started worker draining the queue with several runs in progress at once."""
+    queue = InMemoryRunQueue(server.job_manager)
+    worker = RunWorker(server, queue, concurrency=3, poll_interval=5.0, worker_id="worker-concurrent")
+    worker.start()
+    try:
+        runs = [
+            server.job_manager.create_job(pydantic_job=PydanticRun(user_id=default_user.id, status=JobStatus.created), actor=default_user)
+            for _ in range(5)
+        ]
+        for run in runs:
+            queue.enqueue(run)
+        # enqueueing wakes the idle worker up, it doesn't wait for its next poll
+        deadline = time.time() + 4.0
+        while time.time() < deadline:
+            statuses = [server.job_manager.get_job_by_id(job_id=run.id, actor=default_user).status for run in runs]
+            if all(status == JobStatus.failed for status in statuses):
+                break
+            time.sleep(0.05)
+        assert all(status == JobStatus.failed for status in statuses)
+    finally:
+        worker.stop(timeout=5.0)
+
+
 def test_list_tags(server: SyncServer, default_user, default_organization):
     """Test listing tags functionality."""
     # Create multiple agents with different tags
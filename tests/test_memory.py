@@ -73,3 +73,25 @@ def test_memory_jinja2_set_template(sample_memory: Memory):
     )
     with pytest.raises(ValueError):
         sample_memory.set_prompt_template(prompt_template=template_bad_memory_structure)
+
+
+def test_memory_compile_is_memoized(sample_memory: Memory):
+    """Compiling unchanged memory returns the memoized render, any block edit or template change renders again"""
+    compiled = sample_memory.compile()
+    assert sample_memory.compile() is compiled
+    # an equal memory with its own block objects shares the render
+    copy = Memory(blocks=[block.model_copy() for block in sample_memory.blocks])
+    assert copy.compile() is compiled
+    assert not sample_memory.compiles_differently(copy)
+
+    sample_memory.update_block_value(label="human", value="Another user")
+    recompiled = sample_memory.compile()
+    assert "Another user" in recompiled and "Another user" not in compiled
+    assert sample_memory.compiles_differently(copy)
+
+    sample_memory.get_block("persona").limit = 9000
+    assert 'characters="10/9000"' in sample_memory.compile()
+
+    sample_memory.set_prompt_template("{% for block in blocks %}{{ block.label }}={{ block.metadata }};{% endfor %}")
+    sample_memory.get_block("human").metadata = {"source": "test"}
+    assert "human={'source': 'test'}" in sample_memory.compile()
@@ -2,7 +2,7 @@ import json
 
 import pytest
 
-from letta.streaming_utils import JSONInnerThoughtsExtractor
+from letta.streaming_utils import FunctionArgumentsStreamHandler, JSONInnerThoughtsExtractor, JSONStreamTokenizer
 
 
 @pytest.mark.parametrize("wait_for_first_key", [True, False])
@@ -244,3 +244,34 @@ def test_inner_thoughts_not_in_args():
     assert (
         handler2.inner_thoughts == expected_final_inner_thoughts2
     ), f"Test Case 2: Final inner_thoughts mismatch.\nExpected: '{expected_final_inner_thoughts2}'\nGot: '{handler2.inner_thoughts}'"
+
+
+@pytest.mark.parametrize("fragment_size", [1, 3, 1000])
+def test_json_stream_tokenizer(fragment_size):
+    arguments = '{"inner_thoughts": "say \\"hi\\"\\\\", "args": {"a": [1, {"b": "}"}]}, "n": -1.5, "ok":true}'
+    fragments = [arguments[i : i + fragment_size] for i in range(0, len(arguments), fragment_size)]
+
+    tokenizer = JSONStreamTokenizer()
+    events = [event for fragment in fragments for event in tokenizer.feed(fragment)]
+    assert tokenizer.done
+
+    # keys are emitted once, value deltas concatenate to the raw value
+    assert [key for kind, key, _ in events if kind == JSONStreamTokenizer.KEY] == ["inner_thoughts", "args", "n", "ok"]
+    values = {}
+    for kind, key, text in events:
+        if kind in (JSONStreamTokenizer.VALUE_START, JSONStreamTokenizer.VALUE, JSONStreamTokenizer.VALUE_END):
+            values[key] = values.get(key, "") + text
+    assert {key: json.loads(value) for key, value in values.items()} == json.loads(arguments)
+    assert (
+        "".join(text for kind, key, text in events if kind == JSONStreamTokenizer.VALUE and key == "inner_thoughts") == 'say \\"hi\\"\\\\'
+    )
+
+
+@pytest.mark.parametrize("fragment_size", [1, 4, 1000])
+def test_function_arguments_stream_handler(fragment_size):
+    arguments = '{"message": "Hello \\"there\\", how are you?", "request_heartbeat": false}'
+    fragments = [arguments[i : i + fragment_size] for i in range(0, len(arguments), fragment_size)]
+
+    handler = FunctionArgumentsStreamHandler(json_key="message")
+    message = "".join(update for update in map(handler.process_json_chunk, fragments) if update is not None)
+    assert message == 'Hello \\"there\\", how are you?'
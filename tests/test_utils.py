@@ -1,6 +1,13 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import pytest
+from openai import OpenAI
 
 from letta.constants import MAX_FILENAME_LENGTH
+from letta.helpers import tokenizer_helpers
+from letta.helpers.http_clients import HTTPClientRegistry
+from letta.llm_api.helpers import iter_sse_data
 from letta.utils import sanitize_filename
 
 
@@ -64,3 +71,110 @@ def test_unique_filenames():
     assert sanitized2.startswith("duplicate_")
     assert sanitized1.endswith(".txt")
     assert sanitized2.endswith(".txt")
+
+
+@pytest.fixture
+def byte_level_encoding(monkeypatch):
+    """A byte-level tiktoken encoding standing in for the downloaded BPE files, counting every get_encoding call"""
+    import tiktoken
+
+    encoding = tiktoken.Encoding("byte_level", pat_str=r"\S+|\s+", mergeable_ranks={bytes([i]): i for i in range(256)}, special_tokens={})
+    loads = []
+
+    def get_encoding(encoding_name):
+        loads.append(encoding_name)
+        return encoding
+
+    monkeypatch.setattr(tokenizer_helpers.tiktoken, "get_encoding", get_encoding)
+    tokenizer_helpers.get_encoding.cache_clear()
+    tokenizer_helpers.encoding_for_model.cache_clear()
+    yield loads
+    tokenizer_helpers.get_encoding.cache_clear()
+    tokenizer_helpers.encoding_for_model.cache_clear()
+
+
+def test_encoding_for_model_resolves_once(byte_level_encoding):
+    for _ in range(3):
+        tokenizer_helpers.encoding_for_model("gpt-4")
+        tokenizer_helpers.encoding_for_model("gpt-4-0613")
+    # unknown models fall back to the default encoding instead of raising
+    tokenizer_helpers.encoding_for_model("claude-3-5-sonnet")
+    assert byte_level_encoding == ["cl100k_base"]
+
+
+def test_encode_many_matches_encode(byte_level_encoding, monkeypatch):
+    texts = ["hello world", "", "ünïcode text"] + ["lorem ipsum " * 50] * 200
+    expected = [len(text.encode("utf-8")) for text in texts]
+    assert tokenizer_helpers.count_tokens_many(texts, num_threads=1) == expected
+    monkeypatch.setattr(tokenizer_helpers, "ENCODE_MANY_MIN_CHARS", 0)
+    assert tokenizer_helpers.count_tokens_many(texts, num_threads=4) == expected
+    assert tokenizer_helpers.encode_many([]) == []
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", "2")
+        self.send_header("Set-Cookie", "session=tenant-a; Path=/")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+def test_http_client_registry_reuses_clients_and_connections():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    registry = HTTPClientRegistry()
+    try:
+        client = registry.httpx_client("local_llm", base_url=f"{base_url}/v1")
+        assert registry.httpx_client("local_llm", base_url=f"{base_url}/api") is client
+        assert registry.httpx_client("other_llm", base_url=base_url) is not client
+        sdk_client = registry.sdk_client("local_llm", OpenAI, api_key="secret", base_url=f"{base_url}/v1", max_retries=0)
+        assert registry.sdk_client("local_llm", OpenAI, api_key="secret", base_url=f"{base_url}/v1", max_retries=0) is sdk_client
+        other_sdk_client = registry.sdk_client("local_llm", OpenAI, api_key="other", base_url=f"{base_url}/v1", max_retries=0)
+        assert other_sdk_client is not sdk_client
+        # every api key of the origin shares its connection pool
+        assert sdk_client._client is client and other_sdk_client._client is client
+
+        for _ in range(3):
+            client.post(f"{base_url}/v1/completions", json={}).raise_for_status()
+            registry.requests_session("local_llm", base_url=base_url).post(f"{base_url}/completion", json={}).raise_for_status()
+
+        stats = registry.stats()
+        assert stats[f"httpx local_llm {base_url}"] == {"requests": 3, "connections": 1, "idle_connections": 1, "http2": False}
+        assert stats[f"requests local_llm {base_url}"] == {"requests": 3, "connections": 1, "idle_connections": 1, "http2": False}
+        assert not any("secret" in name for name in stats)
+        # cookies of one tenant are not sent on behalf of the next
+        assert not client.cookies and not registry.requests_session("local_llm", base_url=base_url).cookies
+    finally:
+        registry.close()
+        server.shutdown()
+
+
+def test_http_client_registry_evicts_sdk_clients():
+    """SDK clients are kept in an LRU, evicting one leaves the shared httpx client open"""
+    registry = HTTPClientRegistry(max_sdk_clients=2)
+    try:
+        first = registry.sdk_client("openai", OpenAI, api_key="key-1", base_url="https://api.openai.com/v1")
+        second = registry.sdk_client("openai", OpenAI, api_key="key-2", base_url="https://api.openai.com/v1")
+        assert registry.sdk_client("openai", OpenAI, api_key="key-1", base_url="https://api.openai.com/v1") is first
+        registry.sdk_client("openai", OpenAI, api_key="key-3", base_url="https://api.openai.com/v1")
+        # key-2 was the least recently used
+        assert registry.sdk_client("openai", OpenAI, api_key="key-1", base_url="https://api.openai.com/v1") is first
+        assert registry.sdk_client("openai", OpenAI, api_key="key-2", base_url="https://api.openai.com/v1") is not second
+        assert not second._client.is_closed
+        assert len(registry.stats()) == 1
+    finally:
+        registry.close()
+
+
+def test_iter_sse_data():
+    lines = [": keep-alive", "", 'data: {"a": 1}', "", "event: message", "id: 2", 'data:{"b":', "data: 2}", "", "data: [DONE]"]
+    assert list(iter_sse_data(lines)) == ['{"a": 1}', '{"b":\n2}', "[DONE]"]
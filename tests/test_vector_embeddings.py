@@ -1,7 +1,11 @@
+import base64
+
 import numpy as np
+from sqlalchemy import create_engine, text
 
 from letta.orm.sqlalchemy_base import adapt_array
-from letta.orm.sqlite_functions import convert_array, verify_embedding_dimension
+from letta.orm.sqlite_functions import convert_array, cosine_distance, upgrade_sqlite_vector_storage, verify_embedding_dimension
+from letta.services.vector_index import FlatVectorIndex, IVFVectorIndex, load_vector_index, save_vector_index, top_k_cosine
 
 
 def test_vector_conversions():
@@ -36,4 +40,126 @@ def test_vector_conversions():
     print("✓ None handling verified")
 
 
-# Run the tests
+def test_vector_storage_is_raw_and_unpadded():
+    """Embeddings are stored as raw little-endian floats without the zero padding"""
+    embedding = np.random.random(1024).astype(np.float32)
+    padded = np.pad(embedding, (0, 4096 - 1024))
+
+    encoded = adapt_array(padded)
+    assert len(encoded) == 8 + 1024 * 4
+    assert bytes(encoded[8:]) == embedding.astype("<f4").tobytes()
+
+    decoded = convert_array(encoded)
+    assert decoded.shape == (1024,)
+    np.testing.assert_array_equal(decoded, embedding)
+
+    # half precision halves the payload again
+    encoded_half = adapt_array(padded, dtype="float16")
+    assert len(encoded_half) == 8 + 1024 * 2
+    np.testing.assert_allclose(convert_array(encoded_half), embedding, rtol=1e-3)
+
+    # the shorter vectors are compared as if they were zero padded
+    assert abs(cosine_distance(encoded, adapt_array(padded)) - 0.0) < 1e-6
+    assert abs(cosine_distance(encoded_half, padded) - cosine_distance(padded, padded)) < 1e-3
+
+
+def test_legacy_base64_vectors_are_read_and_upgraded():
+    """Base64 embeddings written by older versions are still decoded, and rewritten in place by the upgrade"""
+    original = np.random.random(4096).astype(np.float32)
+    original[1024:] = 0
+    legacy = base64.b64encode(original.tobytes())
+    np.testing.assert_array_equal(convert_array(legacy), original)
+
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE agent_passages (id TEXT PRIMARY KEY, embedding BLOB)"))
+        connection.execute(text("INSERT INTO agent_passages VALUES ('passage-1', :embedding), ('passage-2', NULL)"), {"embedding": legacy})
+        assert upgrade_sqlite_vector_storage(connection) == 1
+        assert upgrade_sqlite_vector_storage(connection) == 0
+
+        stored = connection.execute(text("SELECT embedding FROM agent_passages WHERE id = 'passage-1'")).scalar()
+        assert len(stored) == 8 + 1024 * 4
+        np.testing.assert_array_equal(convert_array(stored), original[:1024])
+
+
+def test_flat_vector_index_matches_brute_force():
+    """The flat index should return exactly the brute-force cosine ranking"""
+    rng = np.random.default_rng(42)
+    vectors = rng.normal(size=(500, 64)).astype(np.float32)
+    ids = [f"passage-{i}" for i in range(len(vectors))]
+    owners = ["agent-a" if i % 2 == 0 else "agent-b" for i in range(len(vectors))]
+
+    index = FlatVectorIndex(dim=64)
+    index.add(ids, owners, vectors)
+    assert len(index) == 500
+
+    query = rng.normal(size=64).astype(np.float32)
+    results = index.search(query, k=10, owners=["agent-a"])
+
+    distances = [cosine_distance(v, query, expected_dim=64) for v in vectors]
+    expected = [ids[i] for i in np.argsort(distances) if owners[i] == "agent-a"][:10]
+    assert [passage_id for passage_id, _ in results] == expected
+
+    # unknown owners and removed ids are never returned
+    assert index.search(query, k=10, owners=["agent-c"]) == []
+    index.remove([expected[0]])
+    assert expected[0] not in [passage_id for passage_id, _ in index.search(query, k=10, owners=["agent-a"])]
+
+    # removing an owner drops all of its vectors and its sync generation
+    index.generations["agent-b"] = (250, "2025-01-01T00:00:00")
+    assert len(index.owner_ids("agent-b")) == 250
+    index.remove_owners(["agent-b"])
+    assert index.owner_ids("agent-b") == [] and "agent-b" not in index.generations
+    assert index.search(query, k=10, owners=["agent-b"]) == []
+
+
+def test_ivf_vector_index_recall_and_persistence(tmp_path):
+    """IVF search should find most true neighbours and survive a save/load round trip"""
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(32, 48))
+    vectors = (centers[rng.integers(0, 32, size=5000)] + 0.1 * rng.normal(size=(5000, 48))).astype(np.float32)
+    ids = [f"passage-{i}" for i in range(len(vectors))]
+
+    index = IVFVectorIndex(dim=48, nprobe=8, min_train_size=1000)
+    index.add(ids, ["agent-a"] * len(ids), vectors)
+    exact = FlatVectorIndex(dim=48)
+    exact.add(ids, ["agent-a"] * len(ids), vectors)
+
+    recalls = []
+    for query in vectors[rng.choice(len(vectors), size=20, replace=False)]:
+        approx_ids = {passage_id for passage_id, _ in index.search(query, k=10, owners=["agent-a"])}
+        exact_ids = {passage_id for passage_id, _ in exact.search(query, k=10, owners=["agent-a"])}
+        recalls.append(len(approx_ids & exact_ids) / 10)
+    assert np.mean(recalls) > 0.9
+
+    path = str(tmp_path / "index.npz")
+    index.generations = {"agent-a": (5000, "2025-01-01T00:00:00"), "agent-b": (0, None)}
+    save_vector_index(index, path)
+    restored = IVFVectorIndex(dim=48, nprobe=8, min_train_size=1000)
+    assert load_vector_index(restored, path)
+    assert len(restored) == len(index)
+    assert restored.generations == index.generations
+    assert restored.search(vectors[0], k=5, owners=["agent-a"]) == index.search(vectors[0], k=5, owners=["agent-a"])
+
+
+def test_top_k_cosine_matches_udf_ranking():
+    """Batched NumPy ranking returns the same order as the cosine_distance UDF, across batches and unpadded vectors"""
+    rng = np.random.default_rng(7)
+    vectors = rng.normal(size=(300, 32)).astype(np.float32)
+    vectors[::7, 24:] = 0  # stored without their trailing zeros
+    ids = [f"passage-{i}" for i in range(len(vectors))]
+    stored = [convert_array(adapt_array(np.pad(v, (0, 4096 - 32)))) for v in vectors]
+    stored[5] = None
+    query = rng.normal(size=32).astype(np.float32)
+
+    batches = [(ids[i : i + 64], stored[i : i + 64]) for i in range(0, len(ids), 64)]
+    results = top_k_cosine(query, batches, k=10)
+
+    distances = [cosine_distance(v, query, expected_dim=32) for v in vectors]
+    assert [passage_id for passage_id, _ in results] == [ids[i] for i in np.argsort(distances)[:10]]
+    np.testing.assert_allclose([score for _, score in results], [1 - distances[i] for i in np.argsort(distances)[:10]], rtol=1e-5)
+
+    # without k everything is returned, missing embeddings last
+    everything = top_k_cosine(query, batches)
+    assert len(everything) == 300
+    assert everything[-1][0] == "passage-5"